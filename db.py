@@ -71,292 +71,10 @@ def get_engine():
     return _cached_engine
 
 def init_db():
-    """Create tables needed by the app. Add more DDLs as the app requires."""
+    """Create or upgrade the tables needed by the app. Tables and indexes are declared in modules/schema.py."""
+    from modules.schema import apply_schema
     eng = get_engine()
-    dialect = eng.url.get_backend_name()
-
-    # All the tables needed by the app
-    tables = []
-    
-    if dialect == "sqlite":
-        tables = [
-            # access_codes table
-            """
-            CREATE TABLE IF NOT EXISTS access_codes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                admin_code TEXT NOT NULL,
-                user_code TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                updated_by TEXT
-            );
-            """,
-            # project_site_access_codes table
-            """
-            CREATE TABLE IF NOT EXISTS project_site_access_codes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_site TEXT NOT NULL,
-                admin_code TEXT NOT NULL,
-                user_code TEXT NOT NULL,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(project_site)
-            );
-            """,
-            # project_sites table
-            """
-            CREATE TABLE IF NOT EXISTS project_sites (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                is_active INTEGER DEFAULT 1
-            );
-            """,
-            # users table
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL,
-                user_type TEXT CHECK(user_type IN ('admin', 'user')) NOT NULL,
-                project_site TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                is_active INTEGER DEFAULT 1
-            );
-            """,
-            # items table
-            """
-            CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT UNIQUE,
-                name TEXT NOT NULL,
-                category TEXT CHECK(category IN ('materials','labour')) NOT NULL,
-                unit TEXT,
-                qty REAL NOT NULL DEFAULT 0,
-                unit_cost REAL,
-                budget TEXT,
-                section TEXT,
-                grp TEXT,
-                building_type TEXT,
-                project_site TEXT DEFAULT 'Lifecamp Kafe',
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            # requests table
-            """
-            CREATE TABLE IF NOT EXISTS requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ts TEXT NOT NULL,
-                section TEXT CHECK(section IN ('materials','labour')) NOT NULL,
-                item_id INTEGER NOT NULL,
-                qty REAL NOT NULL,
-                requested_by TEXT,
-                note TEXT,
-                building_subtype TEXT,
-                status TEXT CHECK(status IN ('Pending','Approved','Rejected')) NOT NULL DEFAULT 'Pending',
-                approved_by TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(item_id) REFERENCES items(id)
-            );
-            """,
-            # notifications table
-            """
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                notification_type TEXT NOT NULL,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                user_id INTEGER,
-                request_id INTEGER,
-                is_read INTEGER DEFAULT 0,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (request_id) REFERENCES requests (id)
-            );
-            """,
-            # access_logs table
-            """
-            CREATE TABLE IF NOT EXISTS access_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                access_code TEXT NOT NULL,
-                user_name TEXT,
-                access_time TEXT NOT NULL,
-                success INTEGER DEFAULT 1,
-                role TEXT
-            );
-            """,
-            # actuals table
-            """
-            CREATE TABLE IF NOT EXISTS actuals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                item_id INTEGER NOT NULL,
-                actual_qty REAL NOT NULL,
-                actual_cost REAL NOT NULL,
-                actual_date TEXT NOT NULL,
-                recorded_by TEXT,
-                notes TEXT,
-                building_subtype TEXT,
-                project_site TEXT DEFAULT 'Lifecamp Kafe',
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(item_id) REFERENCES items(id)
-            );
-            """,
-            # deleted_requests table
-            """
-            CREATE TABLE IF NOT EXISTS deleted_requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                req_id INTEGER,
-                item_name TEXT,
-                qty REAL,
-                requested_by TEXT,
-                status TEXT,
-                deleted_at TEXT,
-                deleted_by TEXT
-            );
-            """
-        ]
-    else:
-        # PostgreSQL tables
-        tables = [
-            # access_codes table
-            """
-            CREATE TABLE IF NOT EXISTS access_codes (
-                id SERIAL PRIMARY KEY,
-                admin_code TEXT NOT NULL,
-                user_code TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                updated_by TEXT
-            );
-            """,
-            # project_site_access_codes table
-            """
-            CREATE TABLE IF NOT EXISTS project_site_access_codes (
-                id SERIAL PRIMARY KEY,
-                project_site TEXT NOT NULL,
-                admin_code TEXT NOT NULL,
-                user_code TEXT NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(project_site)
-            );
-            """,
-            # project_sites table
-            """
-            CREATE TABLE IF NOT EXISTS project_sites (
-                id SERIAL PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active INTEGER DEFAULT 1
-            );
-            """,
-            # users table
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL,
-                user_type TEXT CHECK(user_type IN ('admin', 'user')) NOT NULL,
-                project_site TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active INTEGER DEFAULT 1
-            );
-            """,
-            # items table
-            """
-            CREATE TABLE IF NOT EXISTS items (
-                id SERIAL PRIMARY KEY,
-                code TEXT UNIQUE,
-                name TEXT NOT NULL,
-                category TEXT CHECK(category IN ('materials','labour')) NOT NULL,
-                unit TEXT,
-                qty REAL NOT NULL DEFAULT 0,
-                unit_cost REAL,
-                budget TEXT,
-                section TEXT,
-                grp TEXT,
-                building_type TEXT,
-                project_site TEXT DEFAULT 'Lifecamp Kafe',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            # requests table
-            """
-            CREATE TABLE IF NOT EXISTS requests (
-                id SERIAL PRIMARY KEY,
-                ts TEXT NOT NULL,
-                section TEXT CHECK(section IN ('materials','labour')) NOT NULL,
-                item_id INTEGER NOT NULL,
-                qty REAL NOT NULL,
-                requested_by TEXT,
-                note TEXT,
-                building_subtype TEXT,
-                status TEXT CHECK(status IN ('Pending','Approved','Rejected')) NOT NULL DEFAULT 'Pending',
-                approved_by TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(item_id) REFERENCES items(id)
-            );
-            """,
-            # notifications table
-            """
-            CREATE TABLE IF NOT EXISTS notifications (
-                id SERIAL PRIMARY KEY,
-                notification_type TEXT NOT NULL,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                user_id INTEGER,
-                request_id INTEGER,
-                is_read INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (request_id) REFERENCES requests (id)
-            );
-            """,
-            # access_logs table
-            """
-            CREATE TABLE IF NOT EXISTS access_logs (
-                id SERIAL PRIMARY KEY,
-                access_code TEXT NOT NULL,
-                user_name TEXT,
-                access_time TIMESTAMP NOT NULL,
-                success INTEGER DEFAULT 1,
-                role TEXT
-            );
-            """,
-            # actuals table
-            """
-            CREATE TABLE IF NOT EXISTS actuals (
-                id SERIAL PRIMARY KEY,
-                item_id INTEGER NOT NULL,
-                actual_qty REAL NOT NULL,
-                actual_cost REAL NOT NULL,
-                actual_date TEXT NOT NULL,
-                recorded_by TEXT,
-                notes TEXT,
-                building_subtype TEXT,
-                project_site TEXT DEFAULT 'Lifecamp Kafe',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(item_id) REFERENCES items(id)
-            );
-            """,
-            # deleted_requests table
-            """
-            CREATE TABLE IF NOT EXISTS deleted_requests (
-                id SERIAL PRIMARY KEY,
-                req_id INTEGER,
-                item_name TEXT,
-                qty REAL,
-                requested_by TEXT,
-                status TEXT,
-                deleted_at TIMESTAMP,
-                deleted_by TEXT
-            );
-            """
-        ]
-
-    with eng.begin() as conn:
-        for ddl in tables:
-            conn.execute(text(ddl))
+    apply_schema(eng)
     
     # Fix existing table structure if needed
     fix_table_structure(eng)
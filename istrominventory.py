@@ -1,4 +1,5 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import sqlite3
 import pandas as pd
 import re
@@ -9,12 +10,10 @@ from pathlib import Path
 import time
 import threading
 import pytz
-import shutil
 import json
 import os
 from sqlalchemy import text
-from db import get_engine, init_db
-from schema_init import ensure_schema
+from db import get_engine, init_default_access_codes
 from logger import log_info, log_warning, log_error, log_debug
 # Import authentication functions from modules (refactored)
 from modules.auth import (
@@ -22,6 +21,43 @@ from modules.auth import (
     authenticate_user, show_login_interface, check_session_validity,
     restore_session_from_cookie, save_session_to_cookie, is_admin
 )
+from modules.request_ledger import (
+    init_request_ledger, apply_ledger_delta, apply_ledger_transition,
+    get_requested_qty, rebuild_ledger
+)
+from modules.request_ids import (
+    init_request_id_pool, allocate_request_id, reserve_request_ids, release_request_id, rebuild_id_pool,
+    format_request_ids
+)
+from modules.notification_summary import (
+    SITE_NOTIFICATION_TYPES, init_notification_summary, get_notification_summary,
+    rebuild_summary, add_notifications_to_summary, mark_notifications_read, delete_notifications
+)
+from modules.notification_outbox import queue_notification, flush_notifications
+from modules.budget_labels import (
+    BUDGET_COLUMNS, parse_budget, budget_label, budget_mask, with_budget_columns,
+    refresh_budget_columns, init_budget_columns
+)
+from modules.budget_rollup import (
+    init_budget_rollup, refresh_site_rollup, refresh_item_rollups, rebuild_rollup, get_budget_rollup, budget_totals
+)
+from modules.item_upsert import normalize_items, upsert_item_rows, init_item_keys
+from modules.boq_import import import_boq, IMPORT_CHUNK_ROWS
+from modules import boq_import
+from modules.data_versions import versioned, bump_versions, bump_item_versions
+from modules.frame_schema import read_frame, typed_columns
+from modules.delta_frames import refresh_frame, clear_frames, shared_frame, ITEM_FRAME, REQUEST_FRAME
+from modules.bounded_cache import bounded_cache, clear_caches, cache_stats
+from modules.bootstrap import run_bootstrap
+from modules.maintenance import MAINTENANCE_JOBS, HOUR, DAY, start_maintenance, run_due_jobs, get_maintenance_runs
+from modules.backup_log import request_backup, run_backup, backups_enabled
+from modules.db_backup import backup_database, restore_database, list_backups, remove_backup
+from modules.profiler import (
+    start_rerun, checkpoint, finish_rerun, profile_call, profile_miss, install_query_hook
+)
+
+# to_number moved to modules/boq_import.py with the importer; kept importable from here
+to_number = boq_import.to_number
 # Email functionality removed for better performance
 
 st.set_page_config(
@@ -31,6 +67,12 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Wall-clock start of this rerun (logged at the end of the script)
+rerun_started_at = time.perf_counter()
+# Opt-in profiler (PERF_PROFILER=1 or the Admin tab toggle) - no-op when off
+start_rerun()
+checkpoint("startup")
+
 # Prevent automatic reruns - only rerun when explicitly needed
 if 'prevent_rerun' not in st.session_state:
     st.session_state.prevent_rerun = False
@@ -394,395 +436,79 @@ window.addEventListener('beforeunload', function() {
 </script>
 """, unsafe_allow_html=True)
 
-# Initialize DB/tables at startup
-init_db()          # if you already have it, keep it
-ensure_schema()    # <-- create items/actuals when missing
-
-# Migration: Add current_price column to requests table if it doesn't exist
-def migrate_add_current_price_column():
-    """Add current_price column to requests table if it doesn't exist"""
-    try:
-        from sqlalchemy import text
-        from db import get_engine
-        
-        engine = get_engine()
-        backend = engine.url.get_backend_name()
-        
-        with engine.begin() as conn:
-            if backend == 'postgresql':
-                # PostgreSQL: Check if column exists before adding
-                try:
-                    result = conn.execute(text("""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_schema = 'public' 
-                        AND table_name = 'requests' 
-                        AND column_name = 'current_price'
-                    """))
-                    exists = result.fetchone()
-                    if not exists:
-                        conn.execute(text("ALTER TABLE requests ADD COLUMN current_price DOUBLE PRECISION"))
-                        log_info("Added current_price column to requests table (PostgreSQL)")
-                    else:
-                        log_info("current_price column already exists in requests table (PostgreSQL)")
-                except Exception as pg_error:
-                    # Fallback: try to add directly, catch error if it exists
-                    try:
-                        conn.execute(text("ALTER TABLE requests ADD COLUMN current_price DOUBLE PRECISION"))
-                        log_info("Added current_price column to requests table (PostgreSQL - fallback)")
-                    except Exception:
-                        log_warning(f"Note: current_price column may already exist (PostgreSQL): {pg_error}")
-            else:
-                # SQLite: Try to add column, ignore if it already exists
-                try:
-                    conn.execute(text("ALTER TABLE requests ADD COLUMN current_price REAL"))
-                    log_info("Added current_price column to requests table (SQLite)")
-                except Exception as sqlite_error:
-                    # Column already exists, ignore
-                    log_info(f"current_price column already exists in requests table (SQLite)")
-    except Exception as e:
-        log_warning(f"Migration error (continuing anyway): {e}")
-
-migrate_add_current_price_column()
-
-
-def migrate_add_building_subtype_column():
-    """Add building_subtype column to requests table if it doesn't exist"""
-    try:
-        from sqlalchemy import text
-        from db import get_engine
-
-        engine = get_engine()
-        backend = engine.url.get_backend_name()
-
-        with engine.begin() as conn:
-            if backend == 'postgresql':
-                try:
-                    result = conn.execute(text("""
-                        SELECT column_name
-                        FROM information_schema.columns
-                        WHERE table_schema = 'public'
-                        AND table_name = 'requests'
-                        AND column_name = 'building_subtype'
-                    """))
-                    exists = result.fetchone()
-                    if not exists:
-                        conn.execute(text("ALTER TABLE requests ADD COLUMN building_subtype TEXT"))
-                        log_info("Added building_subtype column to requests table (PostgreSQL)")
-                    else:
-                        log_info("building_subtype column already exists in requests table (PostgreSQL)")
-                except Exception as pg_error:
-                    try:
-                        conn.execute(text("ALTER TABLE requests ADD COLUMN building_subtype TEXT"))
-                        log_info("Added building_subtype column to requests table (PostgreSQL - fallback)")
-                    except Exception:
-                        log_warning(f"Note: building_subtype column may already exist (PostgreSQL): {pg_error}")
-            else:
-                try:
-                    conn.execute(text("ALTER TABLE requests ADD COLUMN building_subtype TEXT"))
-                    log_info("Added building_subtype column to requests table (SQLite)")
-                except Exception:
-                    log_info("building_subtype column already exists in requests table (SQLite)")
-    except Exception as e:
-        log_warning(f"Migration error (continuing anyway): {e}")
-
-
-migrate_add_building_subtype_column()
-
-
-def migrate_add_deleted_requests_building_subtype_column():
-    """Add building_subtype column to deleted_requests table if it doesn't exist"""
-    try:
-        from sqlalchemy import text
-        from db import get_engine
-
-        engine = get_engine()
-        backend = engine.url.get_backend_name()
-
-        with engine.begin() as conn:
-            if backend == 'postgresql':
-                try:
-                    result = conn.execute(text("""
-                        SELECT column_name
-                        FROM information_schema.columns
-                        WHERE table_schema = 'public'
-                        AND table_name = 'deleted_requests'
-                        AND column_name = 'building_subtype'
-                    """))
-                    exists = result.fetchone()
-                    if not exists:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN building_subtype TEXT"))
-                        log_info("Added building_subtype column to deleted_requests table (PostgreSQL)")
-                    else:
-                        log_info("building_subtype column already exists in deleted_requests table (PostgreSQL)")
-                except Exception as pg_error:
-                    try:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN building_subtype TEXT"))
-                        log_info("Added building_subtype column to deleted_requests table (PostgreSQL - fallback)")
-                    except Exception:
-                        log_warning(f"Note: building_subtype column may already exist in deleted_requests table (PostgreSQL): {pg_error}")
-            else:
-                try:
-                    conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN building_subtype TEXT"))
-                    log_info("Added building_subtype column to deleted_requests table (SQLite)")
-                except Exception:
-                    log_info("building_subtype column already exists in deleted_requests table (SQLite)")
-    except Exception as e:
-        log_warning(f"Migration error for deleted_requests building_subtype (continuing anyway): {e}")
-
-migrate_add_deleted_requests_building_subtype_column()
-
-
-def migrate_add_actuals_building_subtype_column():
-    """Add building_subtype column to actuals table if it doesn't exist"""
-    try:
-        from sqlalchemy import text
-        from db import get_engine
-
-        engine = get_engine()
-        backend = engine.url.get_backend_name()
-
-        with engine.begin() as conn:
-            if backend == 'postgresql':
-                try:
-                    result = conn.execute(text("""
-                        SELECT column_name
-                        FROM information_schema.columns
-                        WHERE table_schema = 'public'
-                          AND table_name = 'actuals'
-                          AND column_name = 'building_subtype'
-                    """))
-                    exists = result.fetchone()
-                    if not exists:
-                        conn.execute(text("ALTER TABLE actuals ADD COLUMN building_subtype TEXT"))
-                        log_info("Added building_subtype column to actuals table (PostgreSQL)")
-                    else:
-                        log_info("building_subtype column already exists in actuals table (PostgreSQL)")
-                except Exception as pg_error:
-                    try:
-                        conn.execute(text("ALTER TABLE actuals ADD COLUMN building_subtype TEXT"))
-                        log_info("Added building_subtype column to actuals table (PostgreSQL - fallback)")
-                    except Exception:
-                        log_warning(f"Note: building_subtype column may already exist in actuals table (PostgreSQL): {pg_error}")
-            else:
-                try:
-                    conn.execute(text("ALTER TABLE actuals ADD COLUMN building_subtype TEXT"))
-                    log_info("Added building_subtype column to actuals table (SQLite)")
-                except Exception:
-                    log_info("building_subtype column already exists in actuals table (SQLite)")
-    except Exception as e:
-        log_warning(f"Migration error while adding building_subtype to actuals (continuing anyway): {e}")
-
-
-migrate_add_actuals_building_subtype_column()
-
-def migrate_add_deleted_requests_note_column():
-    """Add note column to deleted_requests table if it doesn't exist"""
-    try:
-        from sqlalchemy import text
-        from db import get_engine
-
-        engine = get_engine()
-        backend = engine.url.get_backend_name()
-
-        with engine.begin() as conn:
-            if backend == 'postgresql':
-                try:
-                    result = conn.execute(text("""
-                        SELECT column_name
-                        FROM information_schema.columns
-                        WHERE table_schema = 'public'
-                        AND table_name = 'deleted_requests'
-                        AND column_name = 'note'
-                    """))
-                    exists = result.fetchone()
-                    if not exists:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN note TEXT"))
-                        log_info("Added note column to deleted_requests table (PostgreSQL)")
-                    else:
-                        log_info("note column already exists in deleted_requests table (PostgreSQL)")
-                except Exception as pg_error:
-                    try:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN note TEXT"))
-                        log_info("Added note column to deleted_requests table (PostgreSQL - fallback)")
-                    except Exception:
-                        log_warning(f"Note: note column may already exist in deleted_requests table (PostgreSQL): {pg_error}")
-            else:
-                try:
-                    conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN note TEXT"))
-                    log_info("Added note column to deleted_requests table (SQLite)")
-                except Exception:
-                    log_info("note column already exists in deleted_requests table (SQLite)")
-    except Exception as e:
-        log_warning(f"Migration error for deleted_requests note column (continuing anyway): {e}")
-
-migrate_add_deleted_requests_note_column()
-
-def migrate_add_deleted_requests_approved_by_column():
-    """Add approved_by column to deleted_requests table if it doesn't exist"""
-    try:
-        from sqlalchemy import text
-        from db import get_engine
-
-        engine = get_engine()
-        backend = engine.url.get_backend_name()
+# Tables and indexes are declared in modules/schema.py and applied by the startup bootstrap (once per process)
 
-        with engine.begin() as conn:
-            if backend == 'postgresql':
-                try:
-                    result = conn.execute(text("""
-                        SELECT column_name
-                        FROM information_schema.columns
-                        WHERE table_schema = 'public'
-                        AND table_name = 'deleted_requests'
-                        AND column_name = 'approved_by'
-                    """))
-                    exists = result.fetchone()
-                    if not exists:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN approved_by TEXT"))
-                        log_info("Added approved_by column to deleted_requests table (PostgreSQL)")
-                    else:
-                        log_info("approved_by column already exists in deleted_requests table (PostgreSQL)")
-                except Exception as pg_error:
-                    try:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN approved_by TEXT"))
-                        log_info("Added approved_by column to deleted_requests table (PostgreSQL - fallback)")
-                    except Exception:
-                        log_warning(f"Note: approved_by column may already exist in deleted_requests table (PostgreSQL): {pg_error}")
-            else:
-                try:
-                    conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN approved_by TEXT"))
-                    log_info("Added approved_by column to deleted_requests table (SQLite)")
-                except Exception:
-                    log_info("approved_by column already exists in deleted_requests table (SQLite)")
-    except Exception as e:
-        log_warning(f"Migration error for deleted_requests approved_by column (continuing anyway): {e}")
+engine = get_engine()
 
-migrate_add_deleted_requests_approved_by_column()
+# Database connection check (run once per process by the startup bootstrap)
+def check_database_connection():
+    """Test the database connection - raises if the database is unreachable"""
+    with get_engine().connect() as c:
+        c.execute(text("SELECT 1"))
+        log_info("Database connection successful")
 
-def migrate_add_deleted_requests_price_columns():
-    """Add current_price and planned_price columns to deleted_requests table if they don't exist"""
+# PRODUCTION DATA PROTECTION - Check if database has data and flag it for the process
+def check_existing_data():
+    """Set DATABASE_HAS_DATA when the database already holds users or items"""
     try:
-        from sqlalchemy import text
-        from db import get_engine
-
-        engine = get_engine()
-        backend = engine.url.get_backend_name()
-
-        with engine.begin() as conn:
-            if backend == 'postgresql':
-                try:
-                    # Check for current_price column
-                    result = conn.execute(text("""
-                        SELECT column_name
-                        FROM information_schema.columns
-                        WHERE table_schema = 'public'
-                        AND table_name = 'deleted_requests'
-                        AND column_name = 'current_price'
-                    """))
-                    exists_current = result.fetchone()
-                    if not exists_current:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN current_price REAL"))
-                        log_info("Added current_price column to deleted_requests table (PostgreSQL)")
-                    
-                    # Check for planned_price column
-                    result = conn.execute(text("""
-                        SELECT column_name
-                        FROM information_schema.columns
-                        WHERE table_schema = 'public'
-                        AND table_name = 'deleted_requests'
-                        AND column_name = 'planned_price'
-                    """))
-                    exists_planned = result.fetchone()
-                    if not exists_planned:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN planned_price REAL"))
-                        log_info("Added planned_price column to deleted_requests table (PostgreSQL)")
-                except Exception as pg_error:
-                    try:
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN current_price REAL"))
-                        conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN planned_price REAL"))
-                        log_info("Added price columns to deleted_requests table (PostgreSQL - fallback)")
-                    except Exception:
-                        log_warning(f"Note: price columns may already exist in deleted_requests table (PostgreSQL): {pg_error}")
-            else:
-                try:
-                    conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN current_price REAL"))
-                    conn.execute(text("ALTER TABLE deleted_requests ADD COLUMN planned_price REAL"))
-                    log_info("Added price columns to deleted_requests table (SQLite)")
-                except Exception:
-                    log_info("Price columns may already exist in deleted_requests table (SQLite)")
-    except Exception as e:
-        log_warning(f"Migration error for deleted_requests price columns (continuing anyway): {e}")
-
-migrate_add_deleted_requests_price_columns()
-engine = get_engine()
+        with get_engine().connect() as conn:
+            # Check if database already has data
+            result = conn.execute(text("SELECT COUNT(*) FROM users"))
+            user_count = result.fetchone()[0]
+            
+            result = conn.execute(text("SELECT COUNT(*) FROM items"))
+            item_count = result.fetchone()[0]
+            
+            # If database has data, set a flag to prevent any operations
+            if user_count > 0 or item_count > 0:
+                print("🚫 DATABASE HAS EXISTING DATA - ALL OPERATIONS BLOCKED")
+                print("🚫 YOUR USERS AND DATA ARE PROTECTED")
+                
+                # Set environment variable to block all operations
+                os.environ['DATABASE_HAS_DATA'] = 'true'
+    except Exception:
+        # If database doesn't exist or can't connect, continue normally
+        pass
 
-# Database connection check with proper error handling
+# Schema, migrations and startup checks run once per server process, not on every rerun.
+# Completed steps are recorded in schema_version so new processes skip them as well.
 try:
-    with engine.connect() as c:
-        # Test basic connection
-        c.execute(text("SELECT 1"))
-        log_info("Database connection successful")
+    run_bootstrap(
+        steps=[
+            # Requested-quantity ledger per (item, building subtype) - backfilled from requests
+            ("011_request_ledger", init_request_ledger),
+            # Free-id pool for request id reuse - seeded with existing gaps
+            ("012_request_id_pool", init_request_id_pool),
+            # Unread count / latest id per project site - backfilled from notifications
+            ("013_notification_summary", init_notification_summary),
+            # Structured budget_num / building type / category columns parsed from items.budget
+            ("014_budget_columns", init_budget_columns),
+            # Planned totals per (site, budget number, building type, category) - built from items
+            ("015_budget_rollup", init_budget_rollup),
+            # Item codes unique per project site: drops the global UNIQUE(code) of older databases
+            # (016_item_keys created the natural-key index, a schema migration now)
+            ("017_item_code_per_site", init_item_keys),
+        ],
+        checks=[
+            ("database_connection", check_database_connection),
+            ("default_access_codes", lambda: init_default_access_codes(get_engine())),
+            ("existing_data", check_existing_data),
+        ]
+    )
 except Exception as e:
-    st.error(f"❌ Database connection failed: {e}")
+    st.error(f"❌ Database startup failed: {e}")
     st.error("Please check your database configuration and try again.")
     st.stop()  # Stop the app if database connection fails
-
-# Migration: Create dismissed_over_planned_alerts table if it doesn't exist
-def migrate_create_dismissed_alerts_table():
-    """Create dismissed_over_planned_alerts table if it doesn't exist"""
-    try:
-        from sqlalchemy import text
-        from db import get_engine
-        
-        engine = get_engine()
-        with engine.begin() as conn:
-            # Check if we're using PostgreSQL
-            database_url = os.getenv('DATABASE_URL', '')
-            if database_url and 'postgresql://' in database_url:
-                # PostgreSQL: Check if table exists
-                result = conn.execute(text("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = 'dismissed_over_planned_alerts'
-                    )
-                """))
-                exists = result.fetchone()[0]
-                if not exists:
-                    conn.execute(text("""
-                        CREATE TABLE IF NOT EXISTS dismissed_over_planned_alerts (
-                            id SERIAL PRIMARY KEY,
-                            request_id INTEGER NOT NULL,
-                            item_name TEXT,
-                            full_details TEXT,
-                            dismissed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            UNIQUE(request_id)
-                        )
-                    """))
-                    print("✅ Created dismissed_over_planned_alerts table (PostgreSQL)")
-                else:
-                    print("✓ dismissed_over_planned_alerts table already exists (PostgreSQL)")
-            else:
-                # SQLite: Try to create table, ignore if it already exists
-                try:
-                    conn.execute(text("""
-                        CREATE TABLE IF NOT EXISTS dismissed_over_planned_alerts (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            request_id INTEGER NOT NULL UNIQUE,
-                            item_name TEXT,
-                            full_details TEXT,
-                            dismissed_at TEXT DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """))
-                    print("✅ Created dismissed_over_planned_alerts table (SQLite)")
-                except Exception as sqlite_error:
-                    print(f"⚠️ Error creating dismissed_over_planned_alerts table (SQLite): {sqlite_error}")
-    except Exception as e:
-        print(f"⚠️ Migration error for dismissed_over_planned_alerts table (continuing anyway): {e}")
-
-# Run migration
-migrate_create_dismissed_alerts_table()
+install_query_hook(get_engine())
+# Retention purges, planner statistics and SQLite compaction on a background thread (one per process)
+start_maintenance(MAINTENANCE_JOBS + [
+    ("database_backup", DAY, lambda engine: sum(entry["rows"] for entry in backup_database(engine, BACKUP_DIR)["tables"])),
+    ("cleanup_old_backups", DAY, lambda engine: cleanup_old_backups()),
+] + ([
+    # Picks up writes that don't queue a backup themselves (requests, actuals); off wherever queued backups are
+    ("backup_changes", HOUR, lambda engine: run_backup()["rows"]),
+] if backups_enabled() else []))
+checkpoint("header & alerts")
 
 # Check if we're on Render with PostgreSQL
 database_url = os.getenv('DATABASE_URL', '')
@@ -854,177 +580,6 @@ DB_PATH = Path("istrominventory.db")
 BACKUP_DIR = Path("backups")
 BACKUP_DIR.mkdir(exist_ok=True)
 # --------------- DB helpers ---------------
-def create_postgresql_tables(conn):
-    """Create PostgreSQL tables if they don't exist"""
-    try:
-
-        cur = conn.cursor()
-        
-        # Create project_sites table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS project_sites (
-                id SERIAL PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                created_at TEXT DEFAULT (datetime('now', '+1 hour')),
-                is_active INTEGER DEFAULT 1
-            )
-        """)
-        
-        # Create project_site_access_codes table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS project_site_access_codes (
-                id SERIAL PRIMARY KEY,
-                project_site TEXT NOT NULL,
-                admin_code TEXT NOT NULL,
-                user_code TEXT NOT NULL,
-                updated_at TEXT DEFAULT (datetime('now', '+1 hour')),
-                UNIQUE(project_site)
-            )
-        """)
-        
-        # Create items table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS items (
-                id SERIAL PRIMARY KEY,
-                code TEXT UNIQUE,
-                name TEXT NOT NULL,
-                category TEXT CHECK(category IN ('materials','labour')) NOT NULL,
-                unit TEXT,
-                qty REAL NOT NULL DEFAULT 0,
-                unit_cost REAL,
-                budget TEXT,
-                section TEXT,
-                grp TEXT,
-                building_type TEXT,
-                project_site TEXT DEFAULT 'Lifecamp Kafe',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create requests table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS requests (
-                id SERIAL PRIMARY KEY,
-                ts TEXT NOT NULL,
-                section TEXT CHECK(section IN ('materials','labour')) NOT NULL,
-                item_id INTEGER NOT NULL,
-                qty REAL NOT NULL,
-                requested_by TEXT,
-                note TEXT,
-                building_subtype TEXT,
-                status TEXT CHECK(status IN ('Pending','Approved','Rejected')) NOT NULL DEFAULT 'Pending',
-                approved_by TEXT,
-                created_at TEXT DEFAULT (datetime('now', '+1 hour')),
-                updated_at TEXT DEFAULT (datetime('now', '+1 hour')),
-                FOREIGN KEY(item_id) REFERENCES items(id)
-            )
-        """)
-        
-        # Create notifications table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS notifications (
-                id SERIAL PRIMARY KEY,
-                notification_type TEXT NOT NULL,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                user_id INTEGER,
-                request_id INTEGER,
-                is_read INTEGER DEFAULT 0,
-                created_at TEXT DEFAULT (datetime('now', '+1 hour')),
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (request_id) REFERENCES requests (id)
-            )
-        """)
-        
-        # Create access_logs table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS access_logs (
-                id SERIAL PRIMARY KEY,
-                access_code TEXT NOT NULL,
-                user_name TEXT,
-                access_time TIMESTAMP NOT NULL,
-                success INTEGER DEFAULT 1,
-                role TEXT
-            )
-        """)
-        
-        # Create users table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL,
-                user_type TEXT CHECK(user_type IN ('admin', 'project_site')) NOT NULL,
-                project_site TEXT,
-                created_at TEXT DEFAULT (datetime('now', '+1 hour')),
-                is_active INTEGER DEFAULT 1
-            )
-        """)
-        
-        # Create access_codes table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS access_codes (
-                id SERIAL PRIMARY KEY,
-                admin_code TEXT NOT NULL,
-                user_code TEXT NOT NULL,
-                updated_at TIMESTAMP NOT NULL,
-                updated_by TEXT
-            )
-        """)
-        
-        # Create deleted_requests table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS deleted_requests (
-                id SERIAL PRIMARY KEY,
-                req_id INTEGER,
-                item_name TEXT,
-                qty REAL,
-                requested_by TEXT,
-                status TEXT,
-                deleted_at TIMESTAMP,
-                deleted_by TEXT
-            )
-        """)
-        
-        # Add current_price column to requests table if it doesn't exist (PostgreSQL migration)
-        try:
-            cur.execute("""
-                DO $$ 
-                BEGIN 
-                    IF NOT EXISTS (
-                        SELECT 1 FROM information_schema.columns 
-                        WHERE table_name='requests' AND column_name='current_price'
-                    ) THEN
-                        ALTER TABLE requests ADD COLUMN current_price REAL;
-                    END IF;
-                END $$;
-            """)
-        except Exception as e:
-            print(f"Note: current_price column migration: {e}")
-        
-        try:
-            cur.execute("""
-                DO $$ 
-                BEGIN 
-                    IF NOT EXISTS (
-                        SELECT 1 FROM information_schema.columns 
-                        WHERE table_name='requests' AND column_name='building_subtype'
-                    ) THEN
-                        ALTER TABLE requests ADD COLUMN building_subtype TEXT;
-                    END IF;
-                END $$;
-            """)
-        except Exception as e:
-            print(f"Note: building_subtype column migration: {e}")
-        
-        conn.commit()
-        print("PostgreSQL tables created/verified successfully!")
-        
-    except Exception as e:
-        print(f"Error creating PostgreSQL tables: {e}")
-        conn.rollback()
-
 def get_conn():
     """Legacy wrapper for compatibility - returns a context manager that works with cursor()"""
     class ConnectionWrapper:
@@ -1093,7 +648,7 @@ def get_conn():
             pass
     
     return ConnectionWrapper(engine)
-# NOTE: init_db() is now imported from db.py (line 16)
+# NOTE: init_db() lives in db.py and runs as a bootstrap step
 # The function below is dead code and kept for reference only
 # All database initialization is handled by db.py's init_db() function
 def init_db_legacy():
@@ -1314,6 +869,10 @@ def delete_user(user_id):
         result = conn.execute(text("DELETE FROM requests WHERE requested_by = :full_name OR note LIKE :note_pattern"), 
                             {"full_name": full_name, "note_pattern": f"%{full_name}%"})
         additional_requests_deleted = result.rowcount
+        rebuild_ledger(conn)
+        rebuild_id_pool(conn)
+        rebuild_summary(conn)
+        bump_versions(conn, "requests")
         
         # Delete any actuals where this user is mentioned
         result = conn.execute(text("DELETE FROM actuals WHERE recorded_by = :full_name OR notes LIKE :notes_pattern"), 
@@ -1640,16 +1199,17 @@ def create_notification_sound(frequency=500, duration=0.2, sample_rate=44100):
     except Exception as e:
 
         return None
-def log_request_activity(request_id, action, actor):
-    """Log all request activities for audit trail"""
+def log_request_activity(request_id, action, actor, conn=None):
+    """Log all request activities for audit trail (on the caller's transaction when conn is given)"""
     try:
 
         from sqlalchemy import text
         from db import get_engine
+        from contextlib import nullcontext
         
         engine = get_engine()
         
-        with engine.connect() as conn:
+        with (nullcontext(conn) if conn is not None else engine.begin()) as conn:
 
         
             # Get request details for logging
@@ -1670,14 +1230,15 @@ def log_request_activity(request_id, action, actor):
                 
                 # Insert into access_logs for audit trail
                 conn.execute(text("""
-                    INSERT INTO access_logs (access_code, user_name, access_time, success, role)
-                    VALUES (:access_code, :user_name, :access_time, :success, :role)
+                    INSERT INTO access_logs (access_code, user_name, access_time, success, role, details)
+                    VALUES (:access_code, :user_name, :access_time, :success, :role, :details)
                 """), {
                     "access_code": "REQUEST_SYSTEM",
                     "user_name": actor,
                     "access_time": get_nigerian_time_iso(),
                     "success": 1,
-                    "role": st.session_state.get('user_type', 'project_site')
+                    "role": st.session_state.get('user_type', 'project_site'),
+                    "details": log_message
                 })
                 
                 print(f"📝 Request Activity Logged: {log_message}")
@@ -1750,9 +1311,10 @@ def create_notification(notification_type, title, message, user_id=None, request
             if actual_user_id is None:
 
                 # Create admin notification with user_id = NULL (visible to all admins)
-                conn.execute(text('''
+                result = conn.execute(text('''
                     INSERT INTO notifications (notification_type, title, message, user_id, request_id, created_at)
                     VALUES (:notification_type, :title, :message, :user_id, :request_id, :created_at)
+                    RETURNING id
                 '''), {
                     "notification_type": notification_type, 
                     "title": title, 
@@ -1761,6 +1323,9 @@ def create_notification(notification_type, title, message, user_id=None, request
                     "request_id": valid_request_id,
                     "created_at": nigerian_timestamp
                 })
+                notif_id = result.scalar()
+                if notification_type in SITE_NOTIFICATION_TYPES:
+                    add_notifications_to_summary(conn, [notif_id])
                 print(f"✅ Admin notification created successfully")
                 return True
             else:
@@ -1780,6 +1345,8 @@ def create_notification(notification_type, title, message, user_id=None, request
                     "created_at": nigerian_timestamp
                 })
                 notif_id = result.fetchone()[0] if result else None
+                if notification_type in SITE_NOTIFICATION_TYPES:
+                    add_notifications_to_summary(conn, [notif_id])
                 print(f"✅ Project site account notification created successfully - ID={notif_id}, user_id={actual_user_id}, request_id={valid_request_id}")
                 
                 # Show popup for project site account notifications when it's an approval/rejection
@@ -1972,8 +1539,33 @@ def get_all_notifications():
         st.error(f"Notification log retrieval error: {e}")
         return []
 
+def current_notification_site():
+    """Project site whose notifications the current account sees"""
+    return st.session_state.get('project_site', st.session_state.get('current_project_site', None))
+
+@profile_call("get_project_site_notifications", cached=True)
 def get_project_site_notifications():
-    """Get notifications for the current project site by linking to the same requests shown in Review & History tab.
+    """Notifications for the current project site, memoized in the session.
+    The memo is keyed on the site's notification_summary version and latest id, so the banner, popups
+    and Notifications tab share one fetch per rerun, and later reruns refetch only after a notification
+    was created, read or deleted. Sites with no notification rows (derived list) refetch once per rerun.
+    """
+    project_site = current_notification_site()
+    summary = get_notification_summary(project_site)
+    if summary and summary['latest_id']:
+        memo_key = (project_site, summary['version'], summary['latest_id'])
+    else:
+        memo_key = (project_site, summary['version'] if summary else None, rerun_started_at)
+    memo = st.session_state.get('ps_notifications_memo')
+    if memo and memo['key'] == memo_key:
+        return list(memo['notifications'])
+    notifications = fetch_project_site_notifications(project_site)
+    st.session_state['ps_notifications_memo'] = {'key': memo_key, 'notifications': notifications}
+    return list(notifications)
+
+@profile_miss("get_project_site_notifications")
+def fetch_project_site_notifications(project_site):
+    """Get notifications for a project site by linking to the same requests shown in Review & History tab.
     This uses the EXACT same filtering logic as df_requests() to ensure consistency.
     """
     try:
@@ -1981,7 +1573,6 @@ def get_project_site_notifications():
         from db import get_engine
         
         engine = get_engine()
-        project_site = st.session_state.get('project_site', st.session_state.get('current_project_site', None))
         if not project_site:
             print(f"⚠️ No project_site found in session state")
             return []
@@ -2138,8 +1729,7 @@ def mark_notification_read(notification_id):
 
         with engine.begin() as conn:
 
-            conn.execute(text('UPDATE notifications SET is_read = 1 WHERE id = :notification_id'), 
-                       {"notification_id": notification_id})
+            mark_notifications_read(conn, [notification_id])
             return True
     except Exception as e:
 
@@ -2152,8 +1742,7 @@ def delete_notification(notification_id):
 
         with engine.begin() as conn:
 
-            conn.execute(text("DELETE FROM notifications WHERE id = :notification_id"), 
-                       {"notification_id": notification_id})
+            delete_notifications(conn, [notification_id])
             
             # Clear caches to prevent data from reappearing
             clear_cache()
@@ -2239,7 +1828,8 @@ def clear_all_access_logs():
         return False
 
 def fix_dataframe_types(df):
-    """Fix DataFrame column types to prevent PyArrow serialization errors"""
+    """Fix DataFrame column types to prevent PyArrow serialization errors - columns typed at read time
+    (modules/frame_schema.py) are left alone, so item/request/actuals frames pass through untouched"""
     if df is None or df.empty:
 
         return df
@@ -2253,9 +1843,10 @@ def fix_dataframe_types(df):
             df['S/N'] = df['S/N'].astype(str)
         
         # Fix any other problematic columns
+        typed = typed_columns(df)
         for col in df.columns:
 
-            if df[col].dtype == 'object':
+            if col not in typed and df[col].dtype == 'object':
 
                 # Check if column has mixed types
                 try:
@@ -2275,36 +1866,26 @@ def fix_dataframe_types(df):
 
 # --------------- Backup and Data Protection Functions ---------------
 def create_backup():
-    """Create a timestamped backup of the database"""
-    # Use West African Time (WAT) for backup timestamps
-    wat_timezone = pytz.timezone('Africa/Lagos')
-    current_time = datetime.now(wat_timezone)
-    timestamp = current_time.strftime("%Y%m%d_%H%M%S")
-    backup_path = BACKUP_DIR / f"istrominventory_backup_{timestamp}.db"
-    
+    """Take a consistent backup of the whole database (see modules/db_backup.py); returns its path"""
     try:
-
-    
-        shutil.copy2(DB_PATH, backup_path)
-        return str(backup_path)
+        return backup_database(get_engine(), BACKUP_DIR)["path"]
     except Exception as e:
-
+        log_error(f"Backup failed: {e}")
         st.error(f" Failed to create backup: {str(e)}")
         return None
 
 def get_backup_list():
-    """Get list of available backups"""
-    backup_files = list(BACKUP_DIR.glob("istrominventory_backup_*.db"))
-    return sorted(backup_files, key=lambda x: x.stat().st_mtime, reverse=True)
+    """Get list of available backups, newest first"""
+    return list_backups(BACKUP_DIR)
 
 def restore_backup(backup_path):
     """Restore database from backup"""
     try:
-
-        shutil.copy2(backup_path, DB_PATH)
+        restore_database(get_engine(), backup_path)
+        clear_cache()
         return True
     except Exception as e:
-
+        log_error(f"Restore from {backup_path} failed: {e}")
         st.error(f" Failed to restore backup: {str(e)}")
         return False
 
@@ -2402,19 +1983,30 @@ def import_data(json_data):
                     "approved_by": request.get('approved_by')
                 })
             
+            # Requests were replaced wholesale - recompute the requested-quantity ledger, free ids and notification summary
+            # (and parse the imported items' budget labels)
+            rebuild_ledger(conn)
+            rebuild_id_pool(conn)
+            rebuild_summary(conn)
+            refresh_budget_columns(conn)
+            rebuild_rollup(conn)
+            bump_versions(conn, "items")
+            bump_versions(conn, "requests")
+            
             # Import access logs
             for log in data.get("access_logs", []):
 
                 conn.execute(text("""
-                    INSERT INTO access_logs (id, access_code, user_name, access_time, success, role)
-                    VALUES (:id, :access_code, :user_name, :access_time, :success, :role)
+                    INSERT INTO access_logs (id, access_code, user_name, access_time, success, role, details)
+                    VALUES (:id, :access_code, :user_name, :access_time, :success, :role, :details)
                 """), {
                     "id": log.get('id'),
                     "access_code": log.get('access_code'),
                     "user_name": log.get('user_name'),
                     "access_time": log.get('access_time'),
                     "success": log.get('success'),
-                    "role": log.get('role')
+                    "role": log.get('role'),
+                    "details": log.get('details')
                 })
             
             conn.commit()
@@ -2424,38 +2016,20 @@ def import_data(json_data):
         st.error(f" Failed to import data: {str(e)}")
         return False
 def cleanup_old_backups(max_backups=10):
-    """Keep only the most recent backups"""
+    """Keep only the most recent backups; returns the number removed"""
     backup_files = get_backup_list()
+    removed = 0
     if len(backup_files) > max_backups:
 
         for old_backup in backup_files[max_backups:]:
             try:
 
-                old_backup.unlink()
+                remove_backup(old_backup)
+                removed += 1
             except Exception:
 
                 pass
-def ensure_indexes():
-    """Create database indexes for better performance"""
-    try:
-
-        from db import get_engine
-        engine = get_engine()
-        with engine.begin() as conn:
-
-            # Create indexes for frequently queried columns
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_items_budget ON items(budget)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_items_section ON items(section)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_items_building_type ON items(building_type)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_items_category ON items(category)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_items_name ON items(name)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_items_code ON items(code)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(status)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_requests_item_id ON requests(item_id)"))
-    except Exception as e:
-
-        pass
-
+    return removed
 def clear_cache():
     """Clear the cached data when items are updated or project site changes - WITHOUT triggering reruns"""
     try:
@@ -2501,6 +2075,8 @@ def clear_cache():
                 # Silently skip - cache might be in use or doesn't exist
                 # This prevents ForwardMsg MISS errors
                 pass
+        # Held item/request frames too, so the next read is a full one
+        clear_frames()
             
         # DO NOT call st.cache_data.clear() or st.cache_resource.clear() here
         # These cause automatic page reruns which interrupt user workflow
@@ -2512,12 +2088,23 @@ def clear_cache():
         # Don't print errors to avoid cluttering logs with non-critical issues
         pass
 
+def clear_request_caches():
+    """Clear only the request-derived caches (request lists, over-planned alerts) - item caches stay warm"""
+    for func in (df_requests, df_requests_page, count_requests, request_status_counts,
+                 df_deleted_requests_page, _get_over_planned_requests):
+        try:
+            func.clear()
+        except Exception:
+            pass
+
 def clear_all_caches():
     """Clear all caches and force refresh - USE WITH CAUTION as it can cause ForwardMsg MISS errors"""
     try:
         # Only clear if absolutely necessary - avoid during active requests
         # This can cause "Cached ForwardMsg MISS" errors if called at the wrong time
         st.cache_data.clear()
+        clear_caches()
+        clear_frames()
         if hasattr(st, 'cache_resource'):
             st.cache_resource.clear()
     except Exception as e:
@@ -2638,6 +2225,12 @@ def delete_project_site(name):
                 )
             """), {"name": name})
             requests_deleted = result5.rowcount
+            rebuild_ledger(conn)
+            rebuild_id_pool(conn)
+            rebuild_summary(conn)
+            refresh_site_rollup(conn, name)
+            bump_versions(conn, "items", [name])
+            bump_versions(conn, "requests", [name])
             
             # 6. Delete the project site record itself
             result6 = conn.execute(text("DELETE FROM project_sites WHERE name = :name"), {"name": name})
@@ -2696,6 +2289,10 @@ def update_project_site_name(old_name, new_name):
             result2 = conn.execute(text("UPDATE items SET project_site = :new_name WHERE project_site = :old_name"), 
                         {"new_name": new_name, "old_name": old_name})
             print(f"Updated items: {result2.rowcount} rows")
+            refresh_site_rollup(conn, old_name)
+            refresh_site_rollup(conn, new_name)
+            bump_versions(conn, "items", [old_name, new_name])
+            bump_versions(conn, "requests", [old_name, new_name])
             
             # Update project_site_access_codes table
             result3 = conn.execute(text("UPDATE project_site_access_codes SET project_site = :new_name WHERE project_site = :old_name"), 
@@ -2715,9 +2312,6 @@ def update_project_site_name(old_name, new_name):
             conn.commit()
             print(f"✅ Updated project site name from '{old_name}' to '{new_name}' in all tables")
             
-            # Clear cache to ensure changes are reflected immediately
-            clear_cache()
-            
             return True
     except Exception as e:
 
@@ -2826,8 +2420,9 @@ def initialize_default_project_site():
 DEFAULT_ADMIN_ACCESS_CODE = "admin2024"
 DEFAULT_USER_ACCESS_CODE = "user2024"
 
-@st.cache_data(ttl=300)
-def get_access_codes():
+@versioned("access_codes")
+@bounded_cache("get_access_codes", ttl=300, max_entries=4)
+def get_access_codes(data_version=None):
     """Get current access codes from Streamlit secrets or database fallback"""
     try:
 
@@ -2938,8 +2533,10 @@ def log_access(access_code, success=True, user_name="Unknown", role=None):
         print(f"❌ Failed to log access: {e}")
         return None
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes for better performance
-def df_items_cached(project_site=None):
+@profile_call("df_items_cached", cached=True)
+@versioned("items")
+@shared_frame("df_items_cached")  # One snapshot per site shared by all sessions, not a pickled copy per caller
+def df_items_cached(project_site=None, data_version=None):
     """Cached version of df_items for better performance - shows items from current project site only"""
     if project_site is None:
         # Use project site account's project site (the project site is the account identity), fallback to session state
@@ -2958,21 +2555,14 @@ def df_items_cached(project_site=None):
         except:
             return pd.DataFrame()
     
-    q = text("""
-        SELECT id, code, name, category, unit, qty, unit_cost, budget, section, grp, building_type, project_site 
-        FROM items 
-        WHERE project_site = :ps
-        ORDER BY budget, section, grp, building_type, name
-    """)
-    
     try:
-        engine = get_engine()
-        return pd.read_sql_query(q, engine, params={"ps": project_site})
+        return refresh_frame("df_items_cached", ITEM_FRAME, version=data_version, project_site=project_site)
     except Exception as e:
         # Log error but don't print to stdout to avoid BrokenPipeError
         return pd.DataFrame()
-@st.cache_data(ttl=600)  # Cache for 10 minutes - budget options don't change frequently
-def get_budget_options(project_site=None):
+@versioned("items")
+@bounded_cache("get_budget_options", ttl=600, max_entries=32, max_bytes=4 * 2**20)  # Budget options don't change frequently
+def get_budget_options(project_site=None, data_version=None):
     """Generate budget options based on actual database content"""
     budget_options = ["All"]  # Always include "All" option
     
@@ -3076,25 +2666,15 @@ def get_base_budget_options(project_site=None):
 
         with engine.connect() as conn:
 
+            # Base budgets (e.g., "Budget 1 - Flats") straight from the parsed columns
             result = conn.execute(text("""
-                SELECT DISTINCT budget 
+                SELECT DISTINCT budget_num, budget_building_type
                 FROM items 
-                WHERE project_site = :project_site AND budget IS NOT NULL AND budget != ''
-                ORDER BY budget
+                WHERE project_site = :project_site AND budget_num IS NOT NULL AND budget_building_type IS NOT NULL
+                ORDER BY budget_num, budget_building_type
             """), {"project_site": project_site})
             
-            db_budgets = [row[0] for row in result.fetchall()]
-            
-            # Extract base budgets (e.g., "Budget 1 - Flats" from "Budget 1 - Flats (General Materials)")
-            base_budgets = set()
-            for budget in db_budgets:
-
-                # Extract base budget by removing subgroup info
-                if " - " in budget:
-
-                    # Find the base budget part (e.g., "Budget 1 - Flats" from "Budget 1 - Flats (General Materials)")
-                    base_part = budget.split(" (")[0]  # Remove subgroup
-                    base_budgets.add(base_part)
+            base_budgets = [budget_label(budget_num, building_type) for budget_num, building_type in result.fetchall()]
             
             # Add any additional base budgets found in database that aren't already in our generated list
             for base_budget in base_budgets:
@@ -3111,8 +2691,9 @@ def get_base_budget_options(project_site=None):
     
     return budget_options
 
-@st.cache_data(ttl=600)  # Cache for 10 minutes - section options don't change frequently
-def get_section_options(project_site=None):
+@versioned("items")
+@bounded_cache("get_section_options", ttl=600, max_entries=32, max_bytes=4 * 2**20)  # Section options don't change frequently
+def get_section_options(project_site=None, data_version=None):
     """Generate section options based on actual database content"""
     section_options = ["All"]  # Always include "All" option
     
@@ -3150,50 +2731,54 @@ def get_section_options(project_site=None):
     
     return section_options
 
-def get_summary_data():
-    """Cache summary data generation - optimized"""
+def summary_project_site():
+    """Project site the Budget Summary shows"""
     # For project site accounts, use their project site (the project site IS the account), for admins use current_project_site
     user_type = st.session_state.get('user_type', 'project_site')
     if user_type == 'admin':
 
-        project_site = st.session_state.get('current_project_site', None)
-    else:
+        return st.session_state.get('current_project_site', None)
+    # Project site accounts use their own project site (the project site is the account identity)
+    return st.session_state.get('project_site', st.session_state.get('current_project_site', None))
 
-        # Project site accounts use their own project site (the project site is the account identity)
-        project_site = st.session_state.get('project_site', st.session_state.get('current_project_site', None))
+def get_summary_data():
+    """Budget rollup rows and the per-budget summary table for the current project site"""
+    project_site = summary_project_site()
     
-    all_items = df_items_cached(project_site)
-    if all_items.empty:
+    # Planned totals come from the budget_rollup table (one GROUP BY per item write), not from the items
+    rollup = get_budget_rollup(project_site)
+    if rollup.empty:
 
-        return pd.DataFrame(), []
+        return rollup, []
     
-    all_items["Amount"] = (all_items["qty"].fillna(0) * all_items["unit_cost"].fillna(0)).round(2)
-    
-    # Create summary by budget and building type (optimized)
+    # Summary by budget and building type - every budget with data, one pivot
     summary_data = []
+    totals = budget_totals(rollup)
+    for budget_num, building_totals in totals.iterrows():
+        summary_data.append({
+            "Budget": f"Budget {budget_num}",
+            "Flats (Per Unit)": f"₦{building_totals.get('Flats', 0):,.2f}",
+            "Terraces (Per Unit)": f"₦{building_totals.get('Terraces', 0):,.2f}",
+            "Semi-detached (Per Unit)": f"₦{building_totals.get('Semi-detached', 0):,.2f}",
+            "Fully-detached (Per Unit)": f"₦{building_totals.get('Fully-detached', 0):,.2f}",
+            "Total (Per Unit)": f"₦{building_totals['Total']:,.2f}"
+        })
     
-    # Only process budgets that actually have data - limit to first 10 for performance
-    existing_budgets = all_items["budget"].str.extract(r"Budget (\d+)", expand=False).dropna().astype(int).unique()
-    
-    for budget_num in existing_budgets[:10]:  # Limit to first 10 budgets with data
-        budget_items = all_items[all_items["budget"].str.contains(f"Budget {budget_num}", case=False, na=False, regex=False)]
-        if not budget_items.empty:
+    return rollup, summary_data
 
-            budget_total = float(budget_items["Amount"].sum())
-            
-            # Get totals by building type for this budget (optimized)
-            building_totals = budget_items.groupby("building_type")["Amount"].sum().to_dict()
-            
-            summary_data.append({
-                "Budget": f"Budget {budget_num}",
-                "Flats (Per Unit)": f"₦{building_totals.get('Flats', 0):,.2f}",
-                "Terraces (Per Unit)": f"₦{building_totals.get('Terraces', 0):,.2f}",
-                "Semi-detached (Per Unit)": f"₦{building_totals.get('Semi-detached', 0):,.2f}",
-                "Fully-detached (Per Unit)": f"₦{building_totals.get('Fully-detached', 0):,.2f}",
-                "Total (Per Unit)": f"₦{budget_total:,.2f}"
-            })
-    
-    return all_items, summary_data
+def get_recent_items(project_site=None, limit=5):
+    """Most recently added items with their planned amount"""
+    where = " WHERE project_site = :project_site" if project_site else ""
+    q = text(f"""
+        SELECT name, budget, building_type, COALESCE(qty, 0) * COALESCE(unit_cost, 0) AS "Amount"
+        FROM items{where}
+        ORDER BY id DESC
+        LIMIT :limit
+    """)
+    params = {"limit": int(limit)}
+    if project_site:
+        params["project_site"] = project_site
+    return pd.read_sql_query(q, get_engine(), params=params).round({"Amount": 2})
 
 def df_items(filters=None):
     """Get items with optional filtering - optimized with database queries"""
@@ -3210,7 +2795,8 @@ def df_items(filters=None):
     # Start with base query
     if current_project_site:
         q = text("""
-            SELECT id, code, name, category, unit, qty, unit_cost, budget, section, grp, building_type 
+            SELECT id, code, name, category, unit, qty, unit_cost, budget, section, grp, building_type,
+                   budget_num, budget_building_type, budget_category, budget_subcategory
             FROM items 
             WHERE project_site = :ps
         """)
@@ -3218,7 +2804,8 @@ def df_items(filters=None):
     else:
 
         q = text("""
-            SELECT id, code, name, category, unit, qty, unit_cost, budget, section, grp, building_type 
+            SELECT id, code, name, category, unit, qty, unit_cost, budget, section, grp, building_type,
+                   budget_num, budget_building_type, budget_category, budget_subcategory
             FROM items 
         """)
         params = {}
@@ -3229,17 +2816,19 @@ def df_items(filters=None):
         if v is not None and v != "":
 
             if k == "budget":
-                if "(" in str(v) and ")" in str(v):
-
-                    # Specific subgroup search
-                    q = text(str(q) + " AND budget LIKE :budget")
-                    params["budget"] = f"%{v}%"
+                wanted = parse_budget(v)
+                if wanted["budget_num"] is not None:
+
+                    # Equality on the parsed columns - a base budget ("Budget 1 - Flats") matches all its categories
+                    for column, value in wanted.items():
+                        if value is not None:
+                            q = text(str(q) + f" AND {column} = :{column}")
+                            params[column] = value
                 else:
 
-                    # General search - use base budget
-                    base_budget = str(v).split("(")[0].strip()
+                    # Not a "Budget N" label - plain text search
                     q = text(str(q) + " AND budget LIKE :budget")
-                    params["budget"] = f"%{base_budget}%"
+                    params["budget"] = f"%{v}%"
             elif k == "section":
                 q = text(str(q) + " AND section LIKE :section")
                 params["section"] = f"%{v}%"
@@ -3290,112 +2879,52 @@ def calc_subtotal(filters=None) -> float:
     return float(total or 0.0)
 
 def upsert_items(df, category_guess=None, budget=None, section=None, grp=None, building_type=None, project_site=None):
+    """
+    Insert or update the items in df (see modules/item_upsert.py for the column aliases and keys).
+    Returns {"inserted": n, "updated": n}.
+    """
+    project_site = project_site or st.session_state.get('current_project_site', None) or "Default Project"
+    rows = normalize_items(df, category_guess=category_guess, budget=budget, section=section, grp=grp,
+                           building_type=building_type, project_site=project_site)
     with engine.begin() as conn:
 
-        for _, r in df.iterrows():
-
-            code = str(r.get("code") or r.get("item_id") or r.get("labour_id") or "").strip() or None
-            name = str(r.get("name") or r.get("item") or r.get("role") or "").strip()
-            if not name:
-
-                continue
-            unit = str(r.get("unit") or r.get("uom") or r.get("units") or "").strip() or None
-            unit_cost = r.get("unit_cost")
-            try:
-
-                unit_cost = float(unit_cost) if unit_cost not in (None, "") else None
-            except:
-                unit_cost = None
-            qty = r.get("qty")
-            if qty is None:
-
-                qty = r.get("quantity") or r.get("available_slots") or 0
-            try:
-
-                qty = float(qty) if qty not in (None, "") else 0.0
-            except:
-                qty = 0.0
-            category = (r.get("category") or category_guess or "").strip().lower()
-            if category not in ("materials","labour"):
-
-                category = "labour" if ("role" in r.index or "available_slots" in r.index) else "materials"
-            # context
-            b = r.get("budget") or budget
-            s = r.get("section") or section
-            g = r.get("grp") or grp
-            bt = r.get("building_type") or building_type
-            ps = r.get("project_site") or project_site or st.session_state.get('current_project_site', None)
-            
-            # Use default project site if none selected
-            if ps is None:
-
-                ps = "Default Project"
-            
-            # Upsert priority: code else name+category+context
-            if code:
-
-                result = conn.execute(text("SELECT id FROM items WHERE code = :code"), {"code": code})
-                row = result.fetchone()
-                if row:
-
-                    conn.execute(text("""
-                        UPDATE items SET name=:name, category=:category, unit=:unit, qty=:qty, unit_cost=:unit_cost, 
-                        budget=:budget, section=:section, grp=:grp, building_type=:building_type, project_site=:project_site 
-                        WHERE id=:id
-                    """), {
-                        "name": name, "category": category, "unit": unit, "qty": qty, "unit_cost": unit_cost,
-                        "budget": b, "section": s, "grp": g, "building_type": bt, "project_site": ps, "id": row[0]
-                    })
-                else:
-
-                    conn.execute(text("""
-                        INSERT INTO items(code,name,category,unit,qty,unit_cost,budget,section,grp,building_type,project_site) 
-                        VALUES(:code,:name,:category,:unit,:qty,:unit_cost,:budget,:section,:grp,:building_type,:project_site)
-                    """), {
-                        "code": code, "name": name, "category": category, "unit": unit, "qty": qty, "unit_cost": unit_cost,
-                        "budget": b, "section": s, "grp": g, "building_type": bt, "project_site": ps
-                    })
-            else:
-
-                # Use COALESCE instead of IFNULL for PostgreSQL
-                result = conn.execute(text("""
-                    SELECT id FROM items WHERE name=:name AND category=:category 
-                    AND COALESCE(budget,'')=COALESCE(:budget,'') AND COALESCE(section,'')=COALESCE(:section,'') 
-                    AND COALESCE(grp,'')=COALESCE(:grp,'') AND COALESCE(building_type,'')=COALESCE(:building_type,'') 
-                    AND project_site=:project_site
-                """), {
-                    "name": name, "category": category, "budget": b, "section": s, 
-                    "grp": g, "building_type": bt, "project_site": ps
-                })
-                row = result.fetchone()
-                if row:
-
-                    conn.execute(text("""
-                        UPDATE items SET unit=:unit, qty=:qty, unit_cost=:unit_cost, budget=:budget, 
-                        section=:section, grp=:grp, building_type=:building_type, project_site=:project_site 
-                        WHERE id=:id
-                    """), {
-                        "unit": unit, "qty": qty, "unit_cost": unit_cost, "budget": b, "section": s, 
-                        "grp": g, "building_type": bt, "project_site": ps, "id": row[0]
-                    })
-                else:
+        summary = upsert_item_rows(conn, rows)
+        written_sites = sorted(rows["project_site"].dropna().unique())
+        for written_site in written_sites:
+            refresh_site_rollup(conn, written_site)
+        # New cache keys for the written sites' readers only
+        bump_versions(conn, "items", written_sites)
+    # Backed up in the background (modules/backup_log.py)
+    request_backup()
+    return summary
+
+def import_boq_file(source, filename, category_guess=None, budget=None, section=None, grp=None,
+                    building_type=None, project_site=None, progress=None, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Stream an Excel/CSV BOQ into the items of a project site, committing one chunk at a time
+    (see modules/boq_import.py). Returns the import report with its rejected rows. If the import
+    fails part way, the chunks already committed still get the rollup refresh and the backup.
+    """
+    project_site = project_site or st.session_state.get('current_project_site', None) or "Default Project"
+    committed = []
 
-                    conn.execute(text("""
-                        INSERT INTO items(code,name,category,unit,qty,unit_cost,budget,section,grp,building_type,project_site) 
-                        VALUES(:code,:name,:category,:unit,:qty,:unit_cost,:budget,:section,:grp,:building_type,:project_site)
-                    """), {
-                        "code": None, "name": name, "category": category, "unit": unit, "qty": qty, "unit_cost": unit_cost,
-                        "budget": b, "section": s, "grp": g, "building_type": bt, "project_site": ps
-                    })
-        
-        # Clear cache when items are updated
-        clear_cache()
-        # Automatically backup data for persistence
-        try:
+    def write_chunk(chunk):
+        rows = normalize_items(chunk, category_guess=category_guess, budget=budget, section=section, grp=grp,
+                               building_type=building_type, project_site=project_site)
+        with engine.begin() as conn:
+            written = upsert_item_rows(conn, rows)
+            bump_versions(conn, "items", [project_site])
+        if written["inserted"] or written["updated"]:
+            committed.append(written)
+        return written
 
-            auto_backup_data()
-        except:
-            pass  # Silently fail if backup doesn't work
+    try:
+        return import_boq(source, filename, write_chunk, chunk_rows=chunk_rows, progress=progress)
+    finally:
+        if committed:
+            with engine.begin() as conn:
+                refresh_site_rollup(conn, project_site)
+            request_backup()
 
 def update_item_qty(item_id: int, new_qty: float):
     from db import get_engine
@@ -3403,12 +2932,9 @@ def update_item_qty(item_id: int, new_qty: float):
     with engine.begin() as conn:
 
         conn.execute(text("UPDATE items SET qty=:qty WHERE id=:id"), {"qty": float(new_qty), "id": int(item_id)})
-        # Automatically backup data for persistence
-        try:
-
-            auto_backup_data()
-        except:
-            pass
+        refresh_item_rollups(conn, [item_id])
+        bump_item_versions(conn, "items", [item_id])
+    request_backup()
 
 def update_item_rate(item_id: int, new_rate: float):
     from db import get_engine
@@ -3416,12 +2942,9 @@ def update_item_rate(item_id: int, new_rate: float):
     with engine.begin() as conn:
 
         conn.execute(text("UPDATE items SET unit_cost=:unit_cost WHERE id=:id"), {"unit_cost": float(new_rate), "id": int(item_id)})
-        # Automatically backup data for persistence
-        try:
-
-            auto_backup_data()
-        except:
-            pass
+        refresh_item_rollups(conn, [item_id])
+        bump_item_versions(conn, "items", [item_id])
+    request_backup()
 
 def add_request(section, item_id, qty, requested_by, note, current_price=None, building_subtype=None):
     """Add a new request with proper validation"""
@@ -3467,16 +2990,9 @@ def add_request(section, item_id, qty, requested_by, note, current_price=None, b
             # Get planned price (unit_cost) for price comparison
             planned_price = float(item[7]) if item and len(item) > 7 and item[7] is not None else 0.0
             
-            # Calculate cumulative requested quantity across all pending/approved requests for this item
-            # This ensures we check if the TOTAL of all requests exceeds planned quantity
-            cumulative_result = conn.execute(text("""
-                SELECT COALESCE(SUM(qty), 0) 
-                FROM requests 
-                WHERE item_id = :item_id 
-                AND status IN ('Pending', 'Approved')
-                AND COALESCE(building_subtype, '') = :subtype_norm
-            """), {"item_id": item_id, "subtype_norm": subtype_norm})
-            cumulative_requested = float(cumulative_result.fetchone()[0] or 0)
+            # Cumulative requested quantity across all pending/approved requests for this item and block
+            # This ensures we check if the TOTAL of all requests exceeds planned quantity (ledger point lookup)
+            cumulative_requested = get_requested_qty(conn, item_id, subtype_norm)
             
             # Calculate new cumulative total after adding this request
             new_cumulative_requested = cumulative_requested + float(qty)
@@ -3485,81 +3001,44 @@ def add_request(section, item_id, qty, requested_by, note, current_price=None, b
             wat_timezone = pytz.timezone('Africa/Lagos')
             current_time = datetime.now(wat_timezone)
             
-            # Find the lowest unused ID (reuse deleted IDs)
-            # First, check if there are any requests
-            count_result = conn.execute(text("SELECT COUNT(*) FROM requests"))
-            request_count = count_result.fetchone()[0]
-            
-            if request_count == 0:
-                # No requests exist, start from ID 1
-                next_id = 1
-            else:
-                # Find the first gap in IDs, or use max + 1 if no gaps
-                # Get all existing IDs
-                id_result = conn.execute(text("SELECT id FROM requests ORDER BY id"))
-                existing_ids = [row[0] for row in id_result.fetchall()]
-                
-                # Find the first gap (starting from 1)
-                next_id = None
-                for i in range(1, len(existing_ids) + 2):
-                    if i not in existing_ids:
-                        next_id = i
-                        break
-                
-                # If no gap found, use max + 1 (shouldn't happen, but safety check)
-                if next_id is None:
-                    next_id = max(existing_ids) + 1 if existing_ids else 1
-            
-            # Update the sequence to be at least next_id + 1 (for PostgreSQL)
-            # This ensures the sequence doesn't interfere with reused IDs
-            try:
-                conn.execute(text(f"SELECT setval('requests_id_seq', GREATEST({next_id}, (SELECT COALESCE(MAX(id), 0) FROM requests)))"))
-            except:
-                # If sequence doesn't exist or error, continue anyway
-                pass
+            # Reuse the lowest id freed by a deleted request, or let the database assign the next one
+            next_id = allocate_request_id(conn)
             
-            # Insert request with the determined ID (store current_price if provided)
+            # Insert request (store current_price if provided)
+            columns = ["ts", "section", "item_id", "qty", "requested_by", "note", "building_subtype", "status"]
+            params = {
+                "ts": current_time.isoformat(timespec="seconds"),
+                "section": section,
+                "item_id": item_id,
+                "qty": float(qty),
+                "requested_by": requested_by.strip(),
+                "note": note or "",
+                "building_subtype": building_subtype,
+                "status": "Pending"
+            }
             if current_price is not None:
-                result = conn.execute(text("""
-                    INSERT INTO requests(id, ts, section, item_id, qty, requested_by, note, building_subtype, status, current_price) 
-                    VALUES (:id, :ts, :section, :item_id, :qty, :requested_by, :note, :building_subtype, 'Pending', :current_price)
-                    RETURNING id
-                """), {
-                    "id": next_id,
-                    "ts": current_time.isoformat(timespec="seconds"),
-                    "section": section,
-                    "item_id": item_id,
-                    "qty": float(qty),
-                    "requested_by": requested_by.strip(),
-                    "note": note or "",
-                    "building_subtype": building_subtype,
-                    "current_price": float(current_price)
-                })
-            else:
-                result = conn.execute(text("""
-                    INSERT INTO requests(id, ts, section, item_id, qty, requested_by, note, building_subtype, status) 
-                    VALUES (:id, :ts, :section, :item_id, :qty, :requested_by, :note, :building_subtype, 'Pending')
-                    RETURNING id
-                """), {
-                    "id": next_id,
-                    "ts": current_time.isoformat(timespec="seconds"),
-                    "section": section,
-                    "item_id": item_id,
-                    "qty": float(qty),
-                    "requested_by": requested_by.strip(),
-                    "note": note or "",
-                    "building_subtype": building_subtype
-                })
-        
-        # Get the request ID for notification
-        row = result.fetchone()
-        request_id = row[0] if row else None
-        
-        # Create notifications
-        try:
-            # Get requester name and project site for notification
+                columns.append("current_price")
+                params["current_price"] = float(current_price)
+            if next_id is not None:
+                columns.insert(0, "id")
+                params["id"] = next_id
+            result = conn.execute(text(f"""
+                INSERT INTO requests({', '.join(columns)}) 
+                VALUES ({', '.join(':' + col for col in columns)})
+                RETURNING id
+            """), params)
+            
+            # Get the request ID for notification
+            row = result.fetchone()
+            request_id = row[0] if row else None
+            
+            # Keep the requested-quantity ledger in step with the new request
+            apply_ledger_delta(conn, item_id, subtype_norm, 'Pending', qty)
+            
+            # Notifications are written in the same commit, from the item row we already have
             requester_name = requested_by.strip()
-            project_site = item[5] if item and len(item) > 5 and item[5] else st.session_state.get('current_project_site', 'Unknown Project')
+            item_site = item[5] if item and len(item) > 5 and item[5] else None
+            project_site = item_site or st.session_state.get('current_project_site', 'Unknown Project')
             item_name = item[1]
             
             # Prefer item context; fall back to session
@@ -3568,52 +3047,196 @@ def add_request(section, item_id, qty, requested_by, note, current_price=None, b
             block_display = f"{building_type} / {building_subtype}" if building_subtype else building_type
             section_display = section.title()  # Convert materials/labour to Materials/Labour
             
-            # Create admin notification with detailed information
-            create_notification(
+            outbox = []
+            # Admin notification with detailed information
+            queue_notification(
+                outbox,
                 notification_type="new_request",
                 title=f"🔔 New Request from {requester_name}",
                 message=f"{requester_name} from {project_site} submitted a request for {qty} units of {item_name} ({section_display} - {block_display} - {budget})",
-                user_id=None,  # Admin notification
                 request_id=request_id
             )
-            
-            # Create project site account notification for confirmation
-            create_notification(
+            # Project site account confirmation
+            queue_notification(
+                outbox,
                 notification_type="request_submitted",
                 title="Request Submitted Successfully",
                 message=f"Your request for {qty} units of {item_name} ({section_display} - {block_display} - {budget}) from {project_site} has been submitted and is pending review",
-                user_id=-1,  # Project site account
-                request_id=request_id
+                request_id=request_id,
+                project_site=item_site
             )
-            
-            # Create admin notification if cumulative requested quantity exceeds planned quantity
-            # Check if the NEW cumulative total (after adding this request) exceeds planned
+            # Admin notification if the NEW cumulative total (after adding this request) exceeds planned quantity
             if new_cumulative_requested > planned_qty:
                 excess = new_cumulative_requested - planned_qty
-                # Show previous cumulative and new request details
                 previous_requests = cumulative_requested
-                create_notification(
+                queue_notification(
+                    outbox,
                     notification_type="over_planned",
                     title=f"⚠️ Over-Planned Request #{request_id}",
                     message=f"{requester_name} requested {qty} units of {item_name} ({block_display}). "
                            f"Previous requests: {previous_requests} units. "
                            f"Total requested: {new_cumulative_requested} units, but only {planned_qty} units are planned (excess: {excess})",
-                    user_id=None,  # Admin notification
                     request_id=request_id
                 )
-            
             # Note: Price difference is shown in red in the request table, no separate notification needed
-        except Exception as e:
-            print(f"Notification creation failed: {e}")
-        
-        # Clear cache to ensure statistics are refreshed
-        clear_cache()
+            flush_notifications(conn, outbox, get_nigerian_time_iso())
+            bump_versions(conn, "requests", [item_site])
         
         return request_id
             
     except Exception as e:
         st.error(f"Failed to add request: {e}")
         return None
+
+def add_requests_batch(lines, requested_by, note):
+    """
+    Submit several request lines (a cart) in one transaction.
+
+    lines: dicts with section, item_id, qty and optional current_price / building_subtype.
+    All lines are validated together: one items lookup, one ledger query for the cumulative
+    quantities (lines for the same item and block count towards each other in order), one
+    multi-row INSERT, summed ledger deltas, one consolidated admin notification plus one
+    confirmation per project site, and an over-planned notification per line that exceeds plan.
+
+    Returns {"request_ids": [...], "over_planned": [...]} or None (errors are shown with st.error
+    and nothing is written).
+    """
+    from sqlalchemy import text, bindparam
+    from db import get_engine
+    
+    if not lines:
+        st.error("The request cart is empty")
+        return None
+    if not requested_by or not requested_by.strip():
+        st.error("Requester name is required")
+        return None
+    for number, line in enumerate(lines, start=1):
+        if line.get('section') not in ['materials', 'labour']:
+            st.error(f"Line {number}: invalid section. Must be 'materials' or 'labour'")
+            return None
+        if not line.get('item_id') or int(line['item_id']) <= 0:
+            st.error(f"Line {number}: invalid item ID")
+            return None
+        if not line.get('qty') or float(line['qty']) <= 0:
+            st.error(f"Line {number}: quantity must be greater than 0")
+            return None
+    requester_name = requested_by.strip()
+    
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            item_ids = sorted({int(line['item_id']) for line in lines})
+            items = {
+                row[0]: row for row in conn.execute(text("""
+                    SELECT id, name, building_type, budget, grp, project_site, qty, unit_cost
+                    FROM items WHERE id IN :ids
+                """).bindparams(bindparam("ids", expanding=True)), {"ids": item_ids}).fetchall()
+            }
+            
+            prepared = []
+            for number, line in enumerate(lines, start=1):
+                item = items.get(int(line['item_id']))
+                if not item:
+                    st.error(f"Line {number}: item not found")
+                    return None
+                subtype = line.get('building_subtype')
+                subtype = subtype.strip() if isinstance(subtype, str) and subtype.strip() else None
+                if item[2] in BUILDING_SUBTYPE_OPTIONS and not subtype:
+                    st.error(f"Line {number} ({item[1]}): building subtype is required for this building type.")
+                    return None
+                prepared.append((line, item, subtype))
+            
+            # Cumulative requested quantity per (item, block) for every line in one ledger query
+            ledger = {
+                (row[0], row[1]): float(row[2] or 0) for row in conn.execute(text("""
+                    SELECT item_id, building_subtype, requested_qty FROM request_ledger WHERE item_id IN :ids
+                """).bindparams(bindparam("ids", expanding=True)), {"ids": item_ids}).fetchall()
+            }
+            
+            request_ids = reserve_request_ids(conn, len(prepared))
+            ts = datetime.now(pytz.timezone('Africa/Lagos')).isoformat(timespec="seconds")
+            columns = ["id", "ts", "section", "item_id", "qty", "requested_by", "note", "building_subtype", "status", "current_price"]
+            rows, params, over_planned, deltas = [], {}, [], {}
+            for index, ((line, item, subtype), request_id) in enumerate(zip(prepared, request_ids)):
+                qty = float(line['qty'])
+                key = (item[0], subtype or "")
+                previous = ledger.get(key, 0.0)
+                ledger[key] = previous + qty
+                planned_qty = float(item[6]) if item[6] is not None else 0.0
+                if ledger[key] > planned_qty:
+                    over_planned.append({
+                        "request_id": request_id, "item": item[1], "building_subtype": subtype,
+                        "requested": qty, "previous": previous, "cumulative": ledger[key],
+                        "planned": planned_qty, "excess": ledger[key] - planned_qty
+                    })
+                delta = deltas.setdefault(key, [0.0, 0])
+                delta[0] += qty
+                delta[1] += 1
+                
+                current_price = line.get('current_price')
+                values = {
+                    "id": request_id, "ts": ts, "section": line['section'], "item_id": item[0], "qty": qty,
+                    "requested_by": requester_name, "note": note or "", "building_subtype": subtype,
+                    "status": "Pending", "current_price": float(current_price) if current_price is not None else None
+                }
+                rows.append("(" + ", ".join(f":{column}_{index}" for column in columns) + ")")
+                params.update({f"{column}_{index}": values[column] for column in columns})
+            
+            conn.execute(text(f"""
+                INSERT INTO requests ({', '.join(columns)})
+                VALUES {', '.join(rows)}
+            """), params)
+            for (item_id, subtype_norm), (qty, count) in deltas.items():
+                apply_ledger_delta(conn, item_id, subtype_norm, 'Pending', qty, count=count)
+            
+            # One admin notification for the batch, one confirmation per project site
+            outbox = []
+            by_site = {}
+            for (line, item, subtype), request_id in zip(prepared, request_ids):
+                by_site.setdefault(item[5], []).append((request_id, line, item, subtype))
+            sites_display = ", ".join(site or st.session_state.get('current_project_site', 'Unknown Project') for site in by_site)
+            summary_lines = "; ".join(
+                f"{float(line['qty']):g} x {item[1]}" + (f" ({subtype})" if subtype else "")
+                for line, item, subtype in prepared[:10]
+            ) + (f"; and {len(prepared) - 10} more" if len(prepared) > 10 else "")
+            queue_notification(
+                outbox,
+                notification_type="new_request",
+                title=f"🔔 {len(prepared)} New Requests from {requester_name}",
+                message=f"{requester_name} from {sites_display} submitted {len(prepared)} requests "
+                        f"({format_request_ids(request_ids)}): {summary_lines}",
+                request_id=request_ids[0]
+            )
+            for site, site_lines in by_site.items():
+                site_ids = [entry[0] for entry in site_lines]
+                queue_notification(
+                    outbox,
+                    notification_type="request_submitted",
+                    title="Requests Submitted Successfully",
+                    message=f"Your {len(site_lines)} request(s) from {site or 'Unknown Project'} "
+                            f"({format_request_ids(site_ids)}) have been submitted and are pending review",
+                    request_id=site_ids[0],
+                    project_site=site
+                )
+            for warning in over_planned:
+                block = f" ({warning['building_subtype']})" if warning['building_subtype'] else ""
+                queue_notification(
+                    outbox,
+                    notification_type="over_planned",
+                    title=f"⚠️ Over-Planned Request #{warning['request_id']}",
+                    message=f"{requester_name} requested {warning['requested']} units of {warning['item']}{block}. "
+                            f"Previous requests: {warning['previous']} units. "
+                            f"Total requested: {warning['cumulative']} units, but only {warning['planned']} units are planned (excess: {warning['excess']})",
+                    request_id=warning['request_id']
+                )
+            flush_notifications(conn, outbox, get_nigerian_time_iso())
+            bump_item_versions(conn, "requests", item_ids)
+        
+        return {"request_ids": request_ids, "over_planned": over_planned}
+    except Exception as e:
+        st.error(f"Failed to add requests: {e}")
+        return None
+
 def set_request_status(req_id, status, approved_by=None, note=None):
     """Update request status with retry logic for Render maintenance"""
     # Input validation
@@ -3640,13 +3263,20 @@ def set_request_status(req_id, status, approved_by=None, note=None):
             
             # Proceed with operation (connection testing removed for performance)
             with engine.begin() as conn:
-                # Check if request exists
-                result = conn.execute(text("SELECT item_id, qty, section, status, building_subtype FROM requests WHERE id=:req_id"), {"req_id": req_id})
+                # Request plus the item context the actual record and notification need - one lookup
+                result = conn.execute(text("""
+                    SELECT r.item_id, r.qty, r.section, r.status, r.building_subtype, r.requested_by,
+                           i.name, i.project_site, COALESCE(r.current_price, i.unit_cost) AS price_per_unit
+                    FROM requests r
+                    LEFT JOIN items i ON r.item_id = i.id
+                    WHERE r.id = :req_id
+                """), {"req_id": req_id})
                 r = result.fetchone()
                 if not r:
                     return "Request not found"
                 
-                item_id, qty, section, old_status, request_building_subtype = r
+                (item_id, qty, section, old_status, request_building_subtype, requester_name,
+                 item_name, item_site, price_per_unit) = r
                 subtype_norm = (request_building_subtype.strip() if isinstance(request_building_subtype, str) else request_building_subtype) or ""
                 if old_status == status:
                     return None  # No change needed
@@ -3657,10 +3287,8 @@ def set_request_status(req_id, status, approved_by=None, note=None):
                     
                     # Automatically create actual record when request is approved
                     try:
-                        # Get project site from the item, not from session state
-                        result = conn.execute(text("SELECT i.project_site FROM items i WHERE i.id=:item_id"), {"item_id": item_id})
-                        project_site_result = result.fetchone()
-                        project_site = project_site_result[0] if project_site_result else 'Lifecamp Kafe'
+                        # Project site comes from the item, not from session state
+                        project_site = item_site or 'Lifecamp Kafe'
                         print(f"🔔 DEBUG: Using project site from item: {project_site}")
                         
                         # Get current date
@@ -3670,15 +3298,7 @@ def set_request_status(req_id, status, approved_by=None, note=None):
                         actual_date = current_time.date().isoformat()
                         
                         # Use current_price from request for actual cost calculation (fallback to unit_cost if current_price is NULL)
-                        result = conn.execute(text("""
-                            SELECT COALESCE(r.current_price, i.unit_cost) as price_per_unit, i.unit_cost
-                            FROM requests r
-                            JOIN items i ON r.item_id = i.id
-                            WHERE r.id = :req_id
-                        """), {"req_id": req_id})
-                        price_result = result.fetchone()
-                        price_per_unit = price_result[0] if price_result[0] else 0
-                        actual_cost = price_per_unit * qty
+                        actual_cost = (price_per_unit or 0) * qty
                         
                         # Create actual record
                         print(f"🔔 DEBUG: Creating actual record for approved request #{req_id}")
@@ -3697,9 +3317,6 @@ def set_request_status(req_id, status, approved_by=None, note=None):
                         })
                         print(f"🔔 DEBUG: Actual record created successfully")
                         
-                        # Clear cache to ensure actuals tab updates (without rerun)
-                        clear_cache()
-                        
                     except Exception as e:
                         # Don't fail the approval if actual creation fails, but log the error
                         print(f"❌ DEBUG: Failed to create actual record: {e}")
@@ -3724,9 +3341,6 @@ def set_request_status(req_id, status, approved_by=None, note=None):
                             "subtype_norm": subtype_norm
                         })
                         
-                        # Clear cache to ensure actuals tab updates (without rerun)
-                        clear_cache()
-                        
                     except Exception as e:
                         # Don't fail the rejection if actual deletion fails
                         pass
@@ -3740,72 +3354,50 @@ def set_request_status(req_id, status, approved_by=None, note=None):
                     conn.execute(text("UPDATE requests SET status=:status, approved_by=:approved_by, updated_at=:updated_at WHERE id=:req_id"), 
                                 {"status": status, "approved_by": approved_by, "updated_at": get_nigerian_time_iso(), "req_id": req_id})
                 
-                # Clear cache to ensure data refreshes immediately
-                clear_cache()
+                # Move the request's quantity between ledger buckets in the same transaction
+                apply_ledger_transition(conn, item_id, subtype_norm, old_status, status, qty)
+                bump_versions(conn, "requests", [item_site])
                 
                 # Log the request status change
                 current_user = st.session_state.get('full_name', st.session_state.get('current_user_name', 'Unknown'))
-                log_request_activity(req_id, status, approved_by or current_user)
+                log_request_activity(req_id, status, approved_by or current_user, conn=conn)
                 
-                # Create notification for the user when request is approved/rejected - SIMPLIFIED
+                # Notify project site accounts when request is approved/rejected - same commit as the status change
                 if status in ["Approved", "Rejected"]:
-                    # Get requester name, item name, and project site - SIMPLIFIED
-                    result = conn.execute(text("SELECT requested_by FROM requests WHERE id=:req_id"), {"req_id": req_id})
-                    requester_result = result.fetchone()
-                    requester_name = requester_result[0] if requester_result else "Unknown User"
-                    
-                    result = conn.execute(text("SELECT name, project_site FROM items WHERE id=:item_id"), {"item_id": item_id})
-                    item_result = result.fetchone()
-                    item_name = item_result[0] if item_result else "Unknown Item"
+                    requester_name = requester_name or "Unknown User"
+                    item_name = item_name or "Unknown Item"
+                    # Project site from the item itself (more reliable than session state)
+                    project_site = item_site or st.session_state.get('current_project_site', 'Unknown Project')
                     
-                    # Get project site from the item itself (more reliable than session state)
-                    project_site = item_result[1] if item_result and len(item_result) > 1 and item_result[1] else st.session_state.get('current_project_site', 'Unknown Project')
-                    
-                    # Email notifications removed for better performance
-                    # Create notification for project site accounts (simplified approach)
-                    print(f"🔔 DEBUG: Creating {status} notification for project site accounts")
                     # Build detailed message including approver/rejector name
                     actor = approved_by or 'Admin'
-                    action_text = 'approved' if status == 'Approved' else 'rejected' if status == 'Rejected' else status.lower()
+                    action_text = 'approved' if status == 'Approved' else 'rejected'
                     detailed_message = (
                         f"Your request for {qty} units of {item_name} from {project_site} has been {action_text} by {actor}"
                     )
-                    notification_success = create_notification(
+                    outbox = []
+                    queue_notification(
+                        outbox,
                         notification_type="request_approved" if status == "Approved" else "request_rejected",
                         title="Request Approved" if status == "Approved" else "Request Rejected",
                         message=detailed_message,
-                        user_id=-1,  # Send to all project site accounts
-                        request_id=req_id
+                        request_id=req_id,
+                        project_site=item_site
                     )
-                    print(f"🔔 DEBUG: Notification creation result: {notification_success}")
-                        
+                    flush_notifications(conn, outbox, get_nigerian_time_iso())
+                    print(f"✅ Notification queued for {requester_name}")
+                    
                     # Trigger JavaScript notification for project site account
-                    if notification_success:
-                        print(f"✅ Notification created for {requester_name}")
-                        # Trigger JavaScript notification for project site account
-                        notification_flag = "request_approved_notification" if status == "Approved" else "request_rejected_notification"
-                        st.markdown(f"""
-                        <script>
-                        localStorage.setItem('{notification_flag}', 'true');
-                        console.log('Notification flag set for project site account: {notification_flag}');
-                        </script>
-                        """, unsafe_allow_html=True)
-                    else:
-                        print(f"❌ Failed to create notification for {requester_name}")
-                        # Still trigger JavaScript notification even if database notification fails
-                        notification_flag = "request_approved_notification" if status == "Approved" else "request_rejected_notification"
-                        st.markdown(f"""
-                        <script>
-                        localStorage.setItem('{notification_flag}', 'true');
-                        console.log('Notification flag set for project site account: {notification_flag}');
-                        </script>
-                        """, unsafe_allow_html=True)
+                    notification_flag = "request_approved_notification" if status == "Approved" else "request_rejected_notification"
+                    st.markdown(f"""
+                    <script>
+                    localStorage.setItem('{notification_flag}', 'true');
+                    console.log('Notification flag set for project site account: {notification_flag}');
+                    </script>
+                    """, unsafe_allow_html=True)
                     
                     # Admin notification removed - admins don't need notifications about their own actions
                 
-                # Clear cache to ensure statistics are refreshed
-                clear_cache()
-                
                 return None  # Success
                 
         except Exception as e:
@@ -3820,6 +3412,118 @@ def set_request_status(req_id, status, approved_by=None, note=None):
     
     return f"Failed to update request status after {max_retries} attempts"
 
+def set_requests_status_bulk(ids, status, approved_by, note=None):
+    """
+    Apply one status transition to many requests in a single transaction.
+
+    One SELECT reads the requests that actually change, then one UPDATE, one INSERT...SELECT into
+    actuals (on approval), one DELETE of auto-generated actuals (when leaving Approved), one audit
+    INSERT of a row per request (naming it) and one multi-row notification INSERT; ledger deltas are summed per (item, subtype).
+    The requests data version is bumped once for the changed sites, which invalidates the cached
+    request views. Returns (updated_ids, error) - error is None on success.
+    """
+    from sqlalchemy import text, bindparam
+    from db import get_engine
+    
+    if status not in ['Pending', 'Approved', 'Rejected']:
+        return [], "Invalid status. Must be Pending, Approved, or Rejected"
+    if not approved_by or not approved_by.strip():
+        return [], "Approver name is required"
+    req_ids = sorted({int(req_id) for req_id in ids if req_id and int(req_id) > 0})
+    if not req_ids:
+        return [], "No requests selected"
+    
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            rows = conn.execute(text("""
+                SELECT r.id, r.item_id, r.qty, r.status, r.building_subtype, r.requested_by, i.name, i.project_site
+                FROM requests r
+                LEFT JOIN items i ON r.item_id = i.id
+                WHERE r.id IN :ids AND r.status <> :status
+                ORDER BY r.id
+            """).bindparams(bindparam("ids", expanding=True)), {"ids": req_ids, "status": status}).fetchall()
+            if not rows:
+                return [], None  # Nothing to change
+            changed_ids = [row[0] for row in rows]
+            now_iso = get_nigerian_time_iso()
+            
+            if status == "Approved":
+                # Actual records for every newly approved request, priced like set_request_status
+                conn.execute(text("""
+                    INSERT INTO actuals (item_id, actual_qty, actual_cost, actual_date, recorded_by, notes, building_subtype, project_site)
+                    SELECT r.item_id, r.qty, COALESCE(r.current_price, i.unit_cost, 0) * r.qty, :actual_date, :recorded_by,
+                           'Auto-generated from approved request #' || CAST(r.id AS TEXT), r.building_subtype,
+                           COALESCE(i.project_site, 'Lifecamp Kafe')
+                    FROM requests r
+                    LEFT JOIN items i ON r.item_id = i.id
+                    WHERE r.id IN :ids
+                """).bindparams(bindparam("ids", expanding=True)), {
+                    "ids": changed_ids,
+                    "actual_date": datetime.now(pytz.timezone('Africa/Lagos')).date().isoformat(),
+                    "recorded_by": approved_by
+                })
+            
+            previously_approved = [row[0] for row in rows if row[3] == "Approved"]
+            if previously_approved:
+                # Remove the auto-generated actual records of requests leaving Approved
+                conn.execute(text("""
+                    DELETE FROM actuals WHERE recorded_by = :recorded_by AND notes IN :notes
+                """).bindparams(bindparam("notes", expanding=True)), {
+                    "recorded_by": approved_by,
+                    "notes": [f"Auto-generated from approved request #{req_id}" for req_id in previously_approved]
+                })
+            
+            note_clause = ", note = :note" if note and note.strip() else ""
+            conn.execute(text(f"""
+                UPDATE requests SET status = :status, approved_by = :approved_by, updated_at = :updated_at{note_clause}
+                WHERE id IN :ids
+            """).bindparams(bindparam("ids", expanding=True)), {
+                "status": status, "approved_by": approved_by, "updated_at": now_iso,
+                "note": note.strip() if note_clause else None, "ids": changed_ids
+            })
+            
+            # Ledger: one transition per (item, subtype, old status) with the summed quantity
+            transitions = {}
+            for _, item_id, qty, old_status, subtype, _, _, _ in rows:
+                key = (item_id, (subtype.strip() if isinstance(subtype, str) else subtype) or "", old_status)
+                total = transitions.setdefault(key, [0.0, 0])
+                total[0] += float(qty or 0)
+                total[1] += 1
+            for (item_id, subtype_norm, old_status), (qty, count) in transitions.items():
+                apply_ledger_transition(conn, item_id, subtype_norm, old_status, status, qty, count=count)
+            
+            # Audit trail - one row per request naming it, same message as log_request_activity
+            role = st.session_state.get('user_type', 'project_site')
+            conn.execute(text("""
+                INSERT INTO access_logs (access_code, user_name, access_time, success, role, details)
+                VALUES ('REQUEST_SYSTEM', :actor, :access_time, 1, :role, :details)
+            """), [{
+                "actor": approved_by, "access_time": now_iso, "role": role,
+                "details": f"Request #{req_id}: {status} by {approved_by} - {requested_by} requested {qty} units of {item_name} from {item_site}"
+            } for req_id, _, qty, _, _, requested_by, item_name, item_site in rows])
+            
+            if status in ["Approved", "Rejected"]:
+                action_text = 'approved' if status == 'Approved' else 'rejected'
+                outbox = []
+                for req_id, _, qty, _, _, _, item_name, item_site in rows:
+                    project_site = item_site or st.session_state.get('current_project_site', 'Unknown Project')
+                    queue_notification(
+                        outbox,
+                        notification_type="request_approved" if status == "Approved" else "request_rejected",
+                        title="Request Approved" if status == "Approved" else "Request Rejected",
+                        message=f"Your request for {qty} units of {item_name or 'Unknown Item'} from {project_site} has been {action_text} by {approved_by}",
+                        request_id=req_id,
+                        project_site=item_site
+                    )
+                flush_notifications(conn, outbox, now_iso)
+            bump_versions(conn, "requests", [row[7] for row in rows])
+        
+        log_info(f"Bulk status change: {len(changed_ids)} request(s) set to {status} by {approved_by}")
+        return changed_ids, None
+    except Exception as e:
+        return [], f"Failed to update request statuses: {e}"
+
 def delete_request(req_id):
     """Delete a request from the database and log the deletion"""
     try:
@@ -3831,7 +3535,7 @@ def delete_request(req_id):
             # Get request details before deletion for logging (including note, approved_by, current_price, and planned_price)
             result = conn.execute(text("""
                 SELECT r.status, r.item_id, r.requested_by, r.qty, i.name, i.project_site, r.building_subtype, r.note, r.approved_by,
-                       COALESCE(r.current_price, i.unit_cost) as current_price, i.unit_cost as planned_price
+                       COALESCE(r.current_price, i.unit_cost) as current_price, i.unit_cost as planned_price, r.ts
                 FROM requests r
                 LEFT JOIN items i ON r.item_id = i.id
                 WHERE r.id = :req_id
@@ -3843,7 +3547,7 @@ def delete_request(req_id):
             
                 return False
                 
-            status, item_id, requested_by, quantity, item_name, project_site, building_subtype, note, approved_by, current_price, planned_price = request_data
+            status, item_id, requested_by, quantity, item_name, project_site, building_subtype, note, approved_by, current_price, planned_price, request_ts = request_data
             
             # Log the deletion
             current_user = st.session_state.get('full_name', st.session_state.get('current_user_name', 'Unknown'))
@@ -3888,17 +3592,21 @@ def delete_request(req_id):
             # Note: PostgreSQL doesn't support PRAGMA - foreign key constraints are handled differently
             
             # First delete any associated notifications
-            conn.execute(text("DELETE FROM notifications WHERE request_id = :req_id"), {"req_id": req_id})
+            delete_notifications(conn, [row[0] for row in conn.execute(
+                text("SELECT id FROM notifications WHERE request_id = :req_id"), {"req_id": req_id})])
             
             # Then delete the request
             conn.execute(text("DELETE FROM requests WHERE id = :req_id"), {"req_id": req_id})
+            apply_ledger_delta(conn, item_id, building_subtype, status, quantity, sign=-1)
+            release_request_id(conn, req_id)
             
             # Log the deleted request to deleted_requests table (including note, approved_by, current_price, and planned_price)
             conn.execute(text("""
-                INSERT INTO deleted_requests (req_id, item_name, qty, requested_by, status, deleted_at, deleted_by, building_subtype, note, approved_by, current_price, planned_price)
-                VALUES (:req_id, :item_name, :qty, :requested_by, :status, :deleted_at, :deleted_by, :building_subtype, :note, :approved_by, :current_price, :planned_price)
+                INSERT INTO deleted_requests (req_id, ts, item_name, qty, requested_by, status, deleted_at, deleted_by, building_subtype, note, approved_by, current_price, planned_price)
+                VALUES (:req_id, :ts, :item_name, :qty, :requested_by, :status, :deleted_at, :deleted_by, :building_subtype, :note, :approved_by, :current_price, :planned_price)
             """), {
                 "req_id": req_id,
+                "ts": request_ts,
                 "item_name": item_name,
                 "qty": quantity,
                 "requested_by": requested_by,
@@ -3916,8 +3624,7 @@ def delete_request(req_id):
             
             # Note: PostgreSQL doesn't use sqlite_sequence - sequences are handled automatically
             
-            # Clear cache to ensure actuals tab updates (without rerun)
-            clear_cache()
+            bump_versions(conn, "requests", [project_site])
             
             return True
     except Exception as e:
@@ -3952,7 +3659,7 @@ def get_user_requests(user_name, status_filter="All"):
             query = text(str(query) + " AND r.status = :status")
             params["status"] = status_filter
         
-        query = text(str(query) + " ORDER BY r.id DESC")
+        query = text(str(query) + " ORDER BY r.ts DESC, r.id DESC")
         
         engine = get_engine()
         result = pd.read_sql_query(query, engine, params=params)
@@ -3964,11 +3671,10 @@ def get_user_requests(user_name, status_filter="All"):
         # Debug print removed for better performance
         return pd.DataFrame()
 
-@st.cache_data(ttl=60)  # Cache for 1 minute - requests change frequently but not every second
-def df_requests(status=None, user_type=None, project_site=None):
-    from sqlalchemy import text
-    from db import get_engine
-    
+@profile_call("df_requests", cached=True)
+@versioned("requests", "items")
+@shared_frame("df_requests")
+def df_requests(status=None, user_type=None, project_site=None, data_version=None):
     # CRITICAL: Get user type and project site from parameters or session state
     # These MUST be set before querying to ensure correct cache keys
     if user_type is None:
@@ -3978,44 +3684,264 @@ def df_requests(status=None, user_type=None, project_site=None):
     
     # IMPORTANT: The cache key includes (status, user_type, project_site) parameters
     # This ensures admins and project site users get different cached results
-    
-    if user_type == 'admin':
-
-    
+    filters = {}
+    if user_type != 'admin':
+        # Project site accounts see only requests from their own project site (the project site is the account identity)
         # Admin sees ALL requests from ALL project sites
-        q = text("""
-            SELECT r.id, r.ts, r.section, i.name as item, r.qty, r.requested_by, r.note, r.building_subtype, r.status, r.approved_by,
-                   i.budget, i.building_type, i.grp, i.project_site, i.unit_cost, COALESCE(r.current_price, i.unit_cost) as current_price,
-                   i.qty as planned_qty, r.updated_at
-           FROM requests r 
-            JOIN items i ON r.item_id=i.id
-        """)
-        params = {}
-        if status and status != "All":
+        filters["project_site"] = project_site
+    if status and status != "All":
+        filters["status"] = status
+    return refresh_frame("df_requests", REQUEST_FRAME, version=data_version, **filters)
+
+# Rows per page in the Review & History views - older rows load with "Load older"
+REQUEST_PAGE_SIZE = 50
+
+REQUEST_PAGE_COLUMNS = """
+    r.id, r.ts, r.section, i.name as item, r.qty, r.requested_by, r.note, r.building_subtype, r.status, r.approved_by,
+    i.budget, i.building_type, i.grp, i.project_site, i.unit_cost, COALESCE(r.current_price, i.unit_cost) as current_price,
+    i.qty as planned_qty, r.updated_at
+"""
+
+def next_day_iso(day):
+    """ISO date of the day after `day` (a date or 'YYYY-MM-DD') - exclusive upper bound for date filters"""
+    if isinstance(day, str):
+        day = datetime.fromisoformat(day[:10]).date()
+    return (day + timedelta(days=1)).isoformat()
+
+def request_filter_clause(status=None, project_site=None, date_from=None, date_to=None,
+                          requested_by=None, building_type=None, budget=None):
+    """
+    WHERE clause and params for the server-side request filters over `requests r JOIN items i`.
+    Dates are inclusive 'YYYY-MM-DD' strings compared against the ISO timestamp text in r.ts;
+    requester and budget match case-insensitively anywhere in the value.
+    """
+    conditions = []
+    params = {}
+    if status and status != "All":
+        conditions.append("r.status = :status")
+        params["status"] = status
+    if project_site and project_site != "All":
+        conditions.append("i.project_site = :project_site")
+        params["project_site"] = project_site
+    if date_from:
+        conditions.append("r.ts >= :date_from")
+        params["date_from"] = str(date_from)[:10]
+    if date_to:
+        conditions.append("r.ts < :date_before")
+        params["date_before"] = next_day_iso(date_to)
+    if requested_by:
+        conditions.append("LOWER(r.requested_by) LIKE :requested_by")
+        params["requested_by"] = f"%{requested_by.strip().lower()}%"
+    if building_type and building_type != "All":
+        conditions.append("i.building_type = :building_type")
+        params["building_type"] = building_type
+    if budget:
+        conditions.append("LOWER(i.budget) LIKE :budget")
+        params["budget"] = f"%{budget.strip().lower()}%"
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, params
+
+@versioned("requests", "items")
+@bounded_cache("count_requests", ttl=60, max_entries=256, max_bytes=2**20)
+def count_requests(data_version=None, **filters):
+    """Number of requests matching the filters (see request_filter_clause)"""
+    from sqlalchemy import text
+    from db import get_engine
 
-            q = text(str(q) + " WHERE r.status=:status")
-            params["status"] = status
-        q = text(str(q) + " ORDER BY r.id DESC")
-    else:
+    where, params = request_filter_clause(**filters)
+    with get_engine().connect() as conn:
+        return int(conn.execute(text(f"""
+            SELECT COUNT(*) FROM requests r JOIN items i ON r.item_id = i.id{where}
+        """), params).scalar() or 0)
+
+@profile_call("df_requests_page", cached=True)
+@versioned("requests", "items")
+@bounded_cache("df_requests_page", ttl=60, max_entries=128, max_bytes=64 * 2**20)
+@profile_miss("df_requests_page")
+def df_requests_page(before=None, limit=REQUEST_PAGE_SIZE, data_version=None, **filters):
+    """
+    One page of requests, newest first, plus the total number of matching requests.
+
+    Keyset pagination on (ts, id) - ids are reused, so they don't order requests in time: pass
+    the (ts, id) of the previous page's last row as before to get the next older page. Filters (status, project_site, date_from, date_to, requested_by,
+    building_type, budget) are applied in SQL. Returns (page DataFrame, total count).
+    """
+    from sqlalchemy import text
+    from db import get_engine
+
+    where, params = request_filter_clause(**filters)
+    if before is not None:
+        where += (" AND " if where else " WHERE ") + \
+            "(r.ts < :before_ts OR (r.ts = :before_ts AND r.id < :before_id))"
+        params["before_ts"], params["before_id"] = str(before[0]), int(before[1])
+    params["limit"] = int(limit)
+    q = text(f"""
+        SELECT {REQUEST_PAGE_COLUMNS}
+        FROM requests r
+        JOIN items i ON r.item_id = i.id{where}
+        ORDER BY r.ts DESC, r.id DESC
+        LIMIT :limit
+    """)
+    page = pd.read_sql_query(q, get_engine(), params=params)
+    return page, count_requests(**filters)
+
+@versioned("requests", "items")
+@bounded_cache("request_status_counts", ttl=60, max_entries=64, max_bytes=2**20)
+def request_status_counts(project_site=None, data_version=None):
+    """Requests per status (plus 'Total') in one grouped query, optionally for one project site"""
+    from sqlalchemy import text
+    from db import get_engine
+
+    where, params = request_filter_clause(project_site=project_site)
+    with get_engine().connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT r.status, COUNT(*) FROM requests r JOIN items i ON r.item_id = i.id{where}
+            GROUP BY r.status
+        """), params).fetchall()
+    counts = {"Pending": 0, "Approved": 0, "Rejected": 0}
+    counts.update({status: int(count) for status, count in rows})
+    counts["Total"] = sum(int(count) for _, count in rows)
+    return counts
 
-        # Project site accounts see only requests from their own project site (the project site is the account identity)
-        q = text("""
-            SELECT r.id, r.ts, r.section, i.name as item, r.qty, r.requested_by, r.note, r.building_subtype, r.status, r.approved_by,
-                   i.budget, i.building_type, i.grp, i.project_site, i.unit_cost, COALESCE(r.current_price, i.unit_cost) as current_price,
-                   i.qty as planned_qty, r.updated_at
-            FROM requests r 
-            JOIN items i ON r.item_id=i.id
-            WHERE i.project_site = :project_site
-        """)
-        params = {"project_site": project_site}
-        if status and status != "All":
 
-            q = text(str(q) + " AND r.status=:status")
-            params["status"] = status
-        q = text(str(q) + " ORDER BY r.id DESC")
+def get_request_cumulative_quantities(request_ids):
+    """
+    Cumulative requested qty and over-planned flag for a set of requests in a single query.
+
+    The running total is taken over Pending/Approved requests per (item, block) in time order
+    (ts, then id - ids are reused from the free-id pool, so they alone are not time order),
+    with blocks keyed like the request ledger (trimmed, NULL as ''),
+    matching the per-row calculation the Review & History tables used to do one request at a
+    time. Returns a DataFrame indexed by request id with cumulative_qty, planned_qty and
+    exceeds_planned (True only for the request whose cumulative total first crossed planned).
+    """
+    from sqlalchemy import text, bindparam
+    from db import get_engine
+    
+    columns = ['cumulative_qty', 'planned_qty', 'exceeds_planned']
+    ids = sorted({int(req_id) for req_id in request_ids if pd.notna(req_id)})
+    if not ids:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name='id'))
+    
+    # Window functions need SQLite 3.25+ / any supported PostgreSQL.
+    # Partitions are restricted to the items in the result set, but each partition
+    # still covers every request for that item so earlier rows count towards the total.
+    q = text("""
+        WITH running AS (
+            SELECT r.id, r.item_id,
+                   SUM(CASE WHEN r.status IN ('Pending', 'Approved') THEN r.qty ELSE 0 END) OVER (
+                       PARTITION BY r.item_id, COALESCE(TRIM(r.building_subtype), '')
+                       ORDER BY r.ts, r.id
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                   ) AS cumulative_qty,
+                   SUM(CASE WHEN r.status IN ('Pending', 'Approved') THEN r.qty ELSE 0 END) OVER (
+                       PARTITION BY r.item_id, COALESCE(TRIM(r.building_subtype), '')
+                       ORDER BY r.ts, r.id
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ) AS prev_cumulative_qty
+            FROM requests r
+            WHERE r.item_id IN (SELECT item_id FROM requests WHERE id IN :ids)
+        )
+        SELECT rn.id, rn.cumulative_qty, COALESCE(rn.prev_cumulative_qty, 0) AS prev_cumulative_qty,
+               i.qty AS planned_qty
+        FROM running rn
+        JOIN items i ON rn.item_id = i.id
+        WHERE rn.id IN :ids
+    """).bindparams(bindparam("ids", expanding=True))
     
     engine = get_engine()
-    return pd.read_sql_query(q, engine, params=params)
+    df = pd.read_sql_query(q, engine, params={"ids": ids}).set_index('id')
+    cumulative = pd.to_numeric(df['cumulative_qty'], errors='coerce').fillna(0)
+    prev_cumulative = pd.to_numeric(df['prev_cumulative_qty'], errors='coerce').fillna(0)
+    planned = pd.to_numeric(df['planned_qty'], errors='coerce').fillna(0)
+    
+    return pd.DataFrame({
+        'cumulative_qty': cumulative,
+        'planned_qty': planned,
+        'exceeds_planned': (planned != 0) & (cumulative > planned) & (prev_cumulative <= planned),
+    })
+
+
+def get_deleted_request_cumulative_quantities(deleted_ids=None):
+    """
+    Item metadata and cumulative requested qty for every deleted request in a single query
+    (or only the deleted_requests rows in deleted_ids, e.g. the page on screen).
+
+    Deleted requests only keep the item name, so each one is matched to the first item with
+    that name. The cumulative total is the sum of live Pending/Approved requests and other
+    deleted requests for the same item made before it (by ts, then request id), plus the row's
+    own qty. Rows logged before deleted_requests kept the request's ts are placed at the time
+    they were deleted, or after everything when that isn't known either (ids are reused, so
+    they can't place a request in time). Returns a DataFrame indexed by deleted_requests.id.
+    """
+    from sqlalchemy import text, bindparam
+    from db import get_engine
+    
+    q = text("""
+        WITH named_items AS (
+            SELECT name, MIN(id) AS item_id
+            FROM items
+            GROUP BY name
+        ),
+        deleted AS (
+            SELECT dr.id AS deleted_id, dr.req_id, COALESCE(dr.qty, 0) AS qty, ni.item_id,
+                   COALESCE(dr.ts, CAST(dr.deleted_at AS TEXT)) AS ts
+            FROM deleted_requests dr
+            JOIN named_items ni ON ni.name = dr.item_name
+            WHERE dr.req_id IS NOT NULL
+        ),
+        events AS (
+            SELECT r.item_id, r.ts, r.id AS seq, r.qty, NULL AS deleted_id
+            FROM requests r
+            WHERE r.status IN ('Pending', 'Approved')
+              AND r.item_id IN (SELECT item_id FROM deleted)
+            UNION ALL
+            SELECT item_id, ts, req_id AS seq, qty, deleted_id
+            FROM deleted
+        ),
+        running AS (
+            SELECT deleted_id,
+                   SUM(qty) OVER (
+                       PARTITION BY item_id
+                       ORDER BY CASE WHEN ts IS NULL THEN 1 ELSE 0 END, ts, seq
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ) AS prior_qty
+            FROM events
+        )
+        SELECT dr.id, dr.req_id, COALESCE(dr.qty, 0) AS qty,
+               ni.item_id, i.project_site, i.building_type, i.budget, i.qty AS planned_qty,
+               COALESCE(rn.prior_qty, 0) AS prior_qty
+        FROM deleted_requests dr
+        LEFT JOIN named_items ni ON ni.name = dr.item_name
+        LEFT JOIN items i ON i.id = ni.item_id
+        LEFT JOIN running rn ON rn.deleted_id = dr.id
+    """)
+    params = {}
+    if deleted_ids is not None:
+        q = text(str(q) + " WHERE dr.id IN :deleted_ids").bindparams(bindparam("deleted_ids", expanding=True))
+        params["deleted_ids"] = sorted({int(i) for i in deleted_ids}) or [0]
+    
+    engine = get_engine()
+    df = pd.read_sql_query(q, engine, params=params).set_index('id')
+    
+    qty = pd.to_numeric(df['qty'], errors='coerce').fillna(0)
+    prior = pd.to_numeric(df['prior_qty'], errors='coerce').fillna(0)
+    planned = pd.to_numeric(df['planned_qty'], errors='coerce').fillna(0)
+    has_item = df['item_id'].notna()
+    has_req_id = df['req_id'].notna() & (df['req_id'] != 0)
+    
+    # Unknown item: the row counts on its own; no request id: nothing to accumulate
+    cumulative = (prior + qty).where(has_item, qty).where(has_req_id, 0)
+    
+    return pd.DataFrame({
+        'project_site': df['project_site'].where(has_item & df['project_site'].notna() & (df['project_site'] != ''), 'Unknown'),
+        'building_type': df['building_type'].fillna(''),
+        'budget': df['budget'].fillna(''),
+        'planned_qty': planned.where(has_req_id, 0),
+        'cumulative_qty': cumulative,
+        'exceeds_planned': has_item & has_req_id & (planned > 0) & (cumulative > planned) & (prior <= planned),
+    })
+
 
 def all_items_by_section(section):
     from sqlalchemy import text
@@ -4040,7 +3966,7 @@ def delete_item(item_id: int):
 
         
             # Check if item exists first
-            result = conn.execute(text("SELECT id, name FROM items WHERE id = :item_id"), {"item_id": item_id})
+            result = conn.execute(text("SELECT id, name, project_site FROM items WHERE id = :item_id"), {"item_id": item_id})
             row = result.fetchone()
             if not row:
 
@@ -4057,9 +3983,8 @@ def delete_item(item_id: int):
             
             # Delete the item
             conn.execute(text("DELETE FROM items WHERE id = :item_id"), {"item_id": item_id})
-            
-            # Clear cache after deletion
-            clear_cache()
+            refresh_site_rollup(conn, row[2])
+            bump_versions(conn, "items", [row[2]])
             
             print(f"✅ Successfully deleted item: {item_name} (ID: {item_id})")
             
@@ -4082,6 +4007,56 @@ def df_deleted_requests():
     engine = get_engine()
     return pd.read_sql_query(q, engine)
 
+@profile_call("df_deleted_requests_page", cached=True)
+@versioned("requests")
+@bounded_cache("df_deleted_requests_page", ttl=60, max_entries=64, max_bytes=32 * 2**20)
+@profile_miss("df_deleted_requests_page")
+def df_deleted_requests_page(before_id=None, limit=REQUEST_PAGE_SIZE, project_site=None,
+                             date_from=None, date_to=None, requested_by=None, data_version=None):
+    """
+    One page of the deleted requests log, newest first, plus the total number of matching rows.
+
+    Keyset pagination on id like df_requests_page. The project site of a deleted request is
+    that of the first item with its name (the log only keeps the item name); dates filter on
+    deleted_at. Returns (page DataFrame, total count).
+    """
+    from sqlalchemy import text
+    from db import get_engine
+
+    conditions = []
+    params = {}
+    if project_site and project_site != "All":
+        conditions.append("""dr.item_name IN (
+            SELECT name FROM items WHERE id IN (SELECT MIN(id) FROM items GROUP BY name)
+              AND project_site = :project_site
+        )""")
+        params["project_site"] = project_site
+    if date_from:
+        conditions.append("dr.deleted_at >= :date_from")
+        params["date_from"] = str(date_from)[:10]
+    if date_to:
+        conditions.append("dr.deleted_at < :date_before")
+        params["date_before"] = next_day_iso(date_to)
+    if requested_by:
+        conditions.append("LOWER(dr.requested_by) LIKE :requested_by")
+        params["requested_by"] = f"%{requested_by.strip().lower()}%"
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    page_where = where
+    page_params = dict(params, limit=int(limit))
+    if before_id is not None:
+        page_where += (" AND " if where else " WHERE ") + "dr.id < :before_id"
+        page_params["before_id"] = int(before_id)
+
+    engine = get_engine()
+    with engine.connect() as conn:
+        total = int(conn.execute(text(f"SELECT COUNT(*) FROM deleted_requests dr{where}"), params).scalar() or 0)
+        page = pd.read_sql_query(text(f"""
+            SELECT dr.* FROM deleted_requests dr{page_where}
+            ORDER BY dr.id DESC
+            LIMIT :limit
+        """), conn, params=page_params)
+    return page, total
+
 # ---------- NEW: clear all deleted logs (for testing) ----------
 def clear_deleted_requests():
     from db import get_engine
@@ -4089,6 +4064,7 @@ def clear_deleted_requests():
     with engine.begin() as conn:
 
         conn.execute(text("DELETE FROM deleted_requests"))
+        bump_versions(conn, "requests")
 
 
 # Actuals functions
@@ -4122,6 +4098,7 @@ def add_actual(item_id, actual_qty, actual_cost, actual_date, recorded_by, notes
 
         st.error(f"Failed to add actual: {str(e)}")
         return False
+@profile_call("get_actuals")
 def get_actuals(project_site=None):
     """Get actuals for current or specified project site"""
     from sqlalchemy import text
@@ -4142,7 +4119,8 @@ def get_actuals(project_site=None):
     """)
     
     engine = get_engine()
-    result = pd.read_sql_query(query, engine, params={"project_site": project_site})
+    with engine.connect() as conn:
+        result = read_frame(query, conn, "actuals", params={"project_site": project_site})
     print(f"🔔 DEBUG: Retrieved {len(result)} actuals for project site: {project_site}")
     return result
 
@@ -4291,18 +4269,20 @@ def clear_inventory(include_logs: bool = False):
 
         # Remove dependent rows first due to FK constraints
         conn.execute(text("DELETE FROM requests"))
+        rebuild_ledger(conn)
+        rebuild_id_pool(conn)
+        rebuild_summary(conn)
         if include_logs:
 
             conn.execute(text("DELETE FROM deleted_requests"))
         conn.execute(text("DELETE FROM items"))
+        rebuild_rollup(conn)
+        bump_versions(conn, "items")
+        bump_versions(conn, "requests")
 
 
 # --------------- Import helpers ---------------
-KEYS_NAME = ["name", "item", "description", "material", "role"]
-KEYS_QTY = ["qty", "quantity", "stock", "available", "available_slots", "balance"]
-KEYS_UNIT = ["unit", "uom", "units"]
-KEYS_CODE = ["code", "id", "item_id", "sku", "ref"]
-KEYS_COST = ["unit_cost", "cost", "price", "rate"]
+# KEYS_*, auto_pick and to_number live in modules/boq_import.py with the streaming importer
 
 # Supported property/building types
 PROPERTY_TYPES = [
@@ -4355,33 +4335,6 @@ BUILDING_SUBTYPE_LABELS = {
 MATERIAL_GROUPS = ["MATERIAL(WOODS)", "MATERIAL(PLUMBINGS)", "MATERIAL(IRONS)"]
 
 
-def auto_pick(cols, keys):
-    cols_low = [c.lower() for c in cols]
-    for k in keys:
-
-        for i, c in enumerate(cols_low):
-            if k in c:
-
-                return cols[i]
-    return None
-
-def to_number(val):
-    if pd.isna(val):
-
-        return None
-    if isinstance(val, (int, float)):
-
-        return val
-    s = str(val)
-    s = re.sub(r"[₦$,]", "", s)
-    s = s.replace("'", "").replace(" ", "").replace("\xa0","")
-    s = s.replace(".", "") if s.count(",")==1 and s.endswith(",00") else s
-    s = s.replace(",", "")
-    try:
-
-        return float(s)
-    except:
-        return None
 # --------------- UI ---------------
 # Page config is already set at the top of the file - removing duplicate
 # Initialize database on startup
@@ -4413,7 +4366,7 @@ if False:  # Disable old auth functions - now in modules/auth.py
             if key not in st.session_state:
                 st.session_state[key] = default_value
 
-    @st.cache_data(ttl=600)  # Cache for 10 minutes for better performance
+    @bounded_cache("admin_access_codes", ttl=600, max_entries=1)  # Cache for 10 minutes for better performance
     def get_all_access_codes():
         """Get all access codes with caching to reduce database queries"""
         try:
@@ -5338,7 +5291,6 @@ else:
 # Old sidebar section removed - now using professional sidebar below
 
 # init_db()  # DISABLED: Using database_config.py instead
-# ensure_indexes()  # DISABLED: Using database_config.py instead
 
 # Initialize persistent data file if it doesn't exist
 # def init_persistent_data()  # DISABLED FOR PRODUCTION:
@@ -5404,6 +5356,7 @@ def auto_restore_data():
                         "updated_at": datetime.now(pytz.timezone('Africa/Lagos')).isoformat(), 
                         "updated_by": 'AUTO_RESTORE'
                     })
+                    bump_versions(conn, "access_codes", [])
                     conn.commit()
                     
                     st.success("**Access codes restored from previous deployment!**")
@@ -5472,6 +5425,13 @@ def auto_restore_data():
                                 "approved_by": request.get('approved_by')
                             })
                     
+                    rebuild_ledger(conn)
+                    rebuild_id_pool(conn)
+                    rebuild_summary(conn)
+                    refresh_budget_columns(conn)
+                    rebuild_rollup(conn)
+                    bump_versions(conn, "items")
+                    bump_versions(conn, "requests")
                     conn.commit()
                     st.success("**Data restored successfully!** All your items and settings are back.")
                     # Don't use st.rerun() - let the page refresh naturally
@@ -5480,85 +5440,6 @@ def auto_restore_data():
         # Silently fail if secrets not available (local development)
         pass
 
-def auto_backup_data():
-    """Automatically backup data for persistence - works seamlessly in background"""
-    # PRODUCTION PROTECTION - Don't run backup operations in production
-    if os.getenv('PRODUCTION_MODE') == 'true' or os.getenv('DISABLE_MIGRATION') == 'true':
-
-        return False
-    try:
-
-        from db import get_engine
-        engine = get_engine()
-        with engine.connect() as conn:
-
-            # Get ALL data - items, requests, and access codes
-            items_df = pd.read_sql_query("SELECT * FROM items", conn)
-            requests_df = pd.read_sql_query("SELECT * FROM requests", conn)
-            
-            # Get access codes
-            result = conn.execute(text("SELECT admin_code, user_code FROM access_codes ORDER BY id DESC LIMIT 1"))
-            access_result = result.fetchone()
-            access_codes = {
-                "admin_code": access_result[0] if access_result else DEFAULT_ADMIN_ACCESS_CODE,
-                "user_code": access_result[1] if access_result else DEFAULT_USER_ACCESS_CODE
-            }
-            
-            # Create backup data
-            try:
-
-                backup_timestamp = datetime.now(pytz.timezone('Africa/Lagos')).isoformat()
-            except:
-                backup_timestamp = get_nigerian_time_iso()
-            
-            backup_data = {
-                "items": items_df.to_dict('records'),
-                "requests": requests_df.to_dict('records'),
-                "access_codes": access_codes,
-                "backup_timestamp": backup_timestamp
-            }
-            
-            # Save to multiple locations for maximum reliability
-            success = False
-            
-            # Primary: persistent_data.json (tracked by git)
-            try:
-
-                with open("persistent_data.json", 'w') as f:
-
-                    json.dump(backup_data, f, default=str, indent=2)
-                success = True
-            except:
-                pass
-            
-            # Secondary: backup_data.json (backup copy)
-            try:
-
-                with open("backup_data.json", 'w') as f:
-
-                    json.dump(backup_data, f, default=str, indent=2)
-                success = True
-            except:
-                pass
-            
-            # Tertiary: Streamlit Cloud secrets (if available)
-            try:
-
-                if hasattr(st, 'secrets') and st.secrets:
-
-                    st.secrets["PERSISTENT_DATA"] = backup_data
-                    st.secrets["ACCESS_CODES"] = access_codes
-                    success = True
-            except:
-                pass
-            
-            return success
-    except Exception as e:
-
-        # Silently fail - don't show errors to users
-        return False
-
-
 # Auto-restore on startup - DISABLED FOR PRODUCTION
 # auto_restore_data()  # DISABLED: This was causing data loss on production
 
@@ -5587,33 +5468,6 @@ if os.getenv('PRODUCTION_MODE') == 'true' or os.getenv('DISABLE_MIGRATION') == '
     def clear_inventory(include_logs=False):
         print("🚫 clear_inventory() BLOCKED - PRODUCTION MODE")
         return False
-# ADDITIONAL PROTECTION - Check if database has data and prevent any operations
-try:
-
-    from db import get_engine
-    engine = get_engine()
-    with engine.connect() as conn:
-
-        # Check if database already has data
-        result = conn.execute(text("SELECT COUNT(*) FROM users"))
-        user_count = result.fetchone()[0]
-        
-        result = conn.execute(text("SELECT COUNT(*) FROM items"))
-        item_count = result.fetchone()[0]
-        
-        # If database has data, set a flag to prevent any operations
-        if user_count > 0 or item_count > 0:
-
-            print("🚫 DATABASE HAS EXISTING DATA - ALL OPERATIONS BLOCKED")
-            print("🚫 YOUR USERS AND DATA ARE PROTECTED")
-            
-            # Set environment variable to block all operations
-            os.environ['DATABASE_HAS_DATA'] = 'true'
-            
-except:
-    # If database doesn't exist or can't connect, continue normally
-    pass
-
 # Initialize session state for performance
 if "data_loaded" not in st.session_state:
 
@@ -5704,11 +5558,12 @@ def update_admin_access_code(new_admin_code, updated_by="Admin"):
                 "updated_at": current_time.isoformat(),
                 "updated_by": updated_by
             })
+            bump_versions(conn, "access_codes", [])
             
-        # Automatically backup data for persistence
+        # Back up in the background (modules/backup_log.py)
         try:
 
-            if auto_backup_data():
+            if request_backup():
 
                 st.success("Admin access code updated and automatically saved!")
             else:
@@ -5750,11 +5605,12 @@ def update_access_codes(new_admin_code, new_user_code, updated_by="Admin"):
                 "updated_at": current_time.isoformat(),
                 "updated_by": updated_by
             })
+            bump_versions(conn, "access_codes", [])
             
-        # Automatically backup data for persistence
+        # Back up in the background (modules/backup_log.py)
         try:
 
-            if auto_backup_data():
+            if request_backup():
 
                 st.success("Access codes updated and automatically saved!")
             else:
@@ -5989,9 +5845,7 @@ def show_notification_popups():
                                         
                                         if existing:
                                             # Update existing notification to read
-                                            conn.execute(text(
-                                                "UPDATE notifications SET is_read = 1 WHERE id = :notif_id"
-                                            ), {"notif_id": existing[0]})
+                                            mark_notifications_read(conn, [existing[0]])
                                         else:
                                             # Create new notification record marked as read
                                             notif_type_val = notification.get('type', 'request_approved')
@@ -6014,9 +5868,10 @@ def show_notification_popups():
                                             except:
                                                 created_at_iso = get_nigerian_time_iso()
                                             
-                                            conn.execute(text('''
+                                            inserted = conn.execute(text('''
                                                 INSERT INTO notifications (notification_type, title, message, user_id, request_id, created_at, is_read)
                                                 VALUES (:notification_type, :title, :message, -1, :request_id, :created_at, 1)
+                                                RETURNING id
                                             '''), {
                                                 "notification_type": notif_type_val,
                                                 "title": title_val,
@@ -6024,10 +5879,11 @@ def show_notification_popups():
                                                 "request_id": request_id_val,
                                                 "created_at": created_at_iso
                                             })
+                                            add_notifications_to_summary(conn, [inserted.scalar()])
                                         dismissed_count += 1
                                 else:
                                     # Real notification - update database
-                                    conn.execute(text("UPDATE notifications SET is_read = 1 WHERE id = :notif_id"), {"notif_id": notif_id_val})
+                                    mark_notifications_read(conn, [notif_id_val])
                                     dismissed_count += 1
                             except Exception as e:
                                 print(f"Error marking notification as read: {e}")
@@ -6098,84 +5954,65 @@ def show_admin_notification_popups():
 show_admin_notification_popups()
 
 # Function to check and show over-planned quantity notifications
-@st.cache_data(ttl=120)  # Cache for 2 minutes - reduces database queries
-def _get_over_planned_requests(user_type=None, project_site=None):
+@profile_call("_get_over_planned_requests", cached=True)
+@versioned("requests", "items")
+@bounded_cache("_get_over_planned_requests", ttl=120, max_entries=32, max_bytes=64 * 2**20)  # Reduces database queries
+@profile_miss("_get_over_planned_requests")
+def _get_over_planned_requests(user_type=None, project_site=None, data_version=None):
     """Get over-planned requests based on cumulative requested quantities (internal cached function)"""
     from sqlalchemy import text
     from db import get_engine
     
     if user_type is None:
         user_type = st.session_state.get('user_type', 'project_site')
-    if project_site is None:
+    if project_site is None and user_type != 'admin':
         project_site = st.session_state.get('project_site', st.session_state.get('current_project_site', 'Lifecamp Kafe'))
     
     # Get items where cumulative requested quantity (pending + approved) exceeds planned quantity
     try:
         engine = get_engine()
         with engine.connect() as conn:
-            # Query to get items where cumulative requested quantity (pending + approved) exceeds planned qty
-            # This checks the SUM of all pending/approved requests for each item
-            # Get the latest request ID for each item that has over-planned cumulative quantity
+            # Item totals come from the requested-quantity ledger (summed over building subtypes),
+            # so only items that are actually over planned need their latest request looked up
+            site_filter = "WHERE i.project_site = :project_site" if user_type != 'admin' else ""
+            query = text(f"""
+                WITH item_totals AS (
+                    SELECT l.item_id,
+                           SUM(l.requested_qty) AS cumulative_requested_qty,
+                           SUM(l.request_count) AS request_count
+                    FROM request_ledger l
+                    JOIN items i ON i.id = l.item_id
+                    {site_filter}
+                    GROUP BY l.item_id
+                    HAVING SUM(l.request_count) > 0
+                ),
+                over_planned AS (
+                    SELECT t.item_id, t.cumulative_requested_qty, t.request_count,
+                           i.qty AS planned_qty, i.name AS item_name, i.project_site, i.unit_cost,
+                           (SELECT r.id FROM requests r
+                            WHERE r.item_id = t.item_id AND r.status IN ('Pending', 'Approved')
+                            ORDER BY r.ts DESC, r.id DESC LIMIT 1) AS latest_request_id
+                    FROM item_totals t
+                    JOIN items i ON i.id = t.item_id
+                    WHERE t.cumulative_requested_qty > COALESCE(i.qty, 0)
+                )
+                SELECT 
+                    COALESCE(op.latest_request_id, 0) as latest_request_id,
+                    op.cumulative_requested_qty,
+                    op.planned_qty,
+                    op.item_name,
+                    COALESCE(r.requested_by, 'Unknown') as requested_by,
+                    op.project_site,
+                    op.request_count,
+                    COALESCE(r.current_price, op.unit_cost, 0) as current_price,
+                    COALESCE(op.unit_cost, 0) as planned_price
+                FROM over_planned op
+                LEFT JOIN requests r ON r.id = op.latest_request_id
+                ORDER BY r.ts DESC, latest_request_id DESC
+            """)
             if user_type != 'admin':
-                query = text("""
-                    WITH cumulative_requests AS (
-                        SELECT 
-                            r.item_id,
-                            SUM(r.qty) as cumulative_requested_qty,
-                            i.qty as planned_qty,
-                            i.name as item_name,
-                            i.project_site,
-                            COUNT(r.id) as request_count
-                        FROM requests r
-                        JOIN items i ON r.item_id = i.id
-                        WHERE r.status IN ('Pending', 'Approved')
-                          AND i.project_site = :project_site
-                        GROUP BY r.item_id, i.qty, i.name, i.project_site
-                        HAVING SUM(r.qty) > COALESCE(i.qty, 0)
-                    )
-                    SELECT 
-                        COALESCE((SELECT MAX(r2.id) FROM requests r2 WHERE r2.item_id = cr.item_id AND r2.status IN ('Pending', 'Approved')), 0) as latest_request_id,
-                        cr.cumulative_requested_qty,
-                        cr.planned_qty,
-                        cr.item_name,
-                        COALESCE((SELECT r3.requested_by FROM requests r3 WHERE r3.item_id = cr.item_id AND r3.status IN ('Pending', 'Approved') ORDER BY r3.id DESC LIMIT 1), 'Unknown') as requested_by,
-                        cr.project_site,
-                        cr.request_count,
-                        COALESCE((SELECT COALESCE(r4.current_price, i2.unit_cost) FROM requests r4 JOIN items i2 ON r4.item_id = i2.id WHERE r4.id = (SELECT MAX(r5.id) FROM requests r5 WHERE r5.item_id = cr.item_id AND r5.status IN ('Pending', 'Approved'))), 0) as current_price,
-                        COALESCE((SELECT i3.unit_cost FROM items i3 WHERE i3.id = cr.item_id), 0) as planned_price
-                    FROM cumulative_requests cr
-                    ORDER BY latest_request_id DESC
-                """)
                 result = conn.execute(query, {"project_site": project_site})
             else:
-                query = text("""
-                    WITH cumulative_requests AS (
-                        SELECT 
-                            r.item_id,
-                            SUM(r.qty) as cumulative_requested_qty,
-                            i.qty as planned_qty,
-                            i.name as item_name,
-                            i.project_site,
-                            COUNT(r.id) as request_count
-                        FROM requests r
-                        JOIN items i ON r.item_id = i.id
-                        WHERE r.status IN ('Pending', 'Approved')
-                        GROUP BY r.item_id, i.qty, i.name, i.project_site
-                        HAVING SUM(r.qty) > COALESCE(i.qty, 0)
-                    )
-                    SELECT 
-                        COALESCE((SELECT MAX(r2.id) FROM requests r2 WHERE r2.item_id = cr.item_id AND r2.status IN ('Pending', 'Approved')), 0) as latest_request_id,
-                        cr.cumulative_requested_qty,
-                        cr.planned_qty,
-                        cr.item_name,
-                        COALESCE((SELECT r3.requested_by FROM requests r3 WHERE r3.item_id = cr.item_id AND r3.status IN ('Pending', 'Approved') ORDER BY r3.id DESC LIMIT 1), 'Unknown') as requested_by,
-                        cr.project_site,
-                        cr.request_count,
-                        COALESCE((SELECT COALESCE(r4.current_price, i2.unit_cost) FROM requests r4 JOIN items i2 ON r4.item_id = i2.id WHERE r4.id = (SELECT MAX(r5.id) FROM requests r5 WHERE r5.item_id = cr.item_id AND r5.status IN ('Pending', 'Approved'))), 0) as current_price,
-                        COALESCE((SELECT i3.unit_cost FROM items i3 WHERE i3.id = cr.item_id), 0) as planned_price
-                    FROM cumulative_requests cr
-                    ORDER BY latest_request_id DESC
-                """)
                 result = conn.execute(query)
             
             return result.fetchall()
@@ -6226,13 +6063,13 @@ def dismiss_over_planned_alert(request_id, item_name=None, full_details=None):
                      FROM requests r2 
                      WHERE r2.item_id = r.item_id 
                      AND r2.status IN ('Pending', 'Approved')
-                     AND COALESCE(r2.building_subtype, '') = COALESCE(r.building_subtype, '')
+                     AND COALESCE(TRIM(r2.building_subtype), '') = COALESCE(TRIM(r.building_subtype), '')
                     ) as cumulative_requested,
                     (SELECT COUNT(*) 
                      FROM requests r2 
                      WHERE r2.item_id = r.item_id 
                      AND r2.status IN ('Pending', 'Approved')
-                     AND COALESCE(r2.building_subtype, '') = COALESCE(r.building_subtype, '')
+                     AND COALESCE(TRIM(r2.building_subtype), '') = COALESCE(TRIM(r.building_subtype), '')
                     ) as request_count
                 FROM requests r
                 JOIN items i ON r.item_id = i.id
@@ -6329,7 +6166,9 @@ def show_over_planned_notifications():
             return
         
         user_type = st.session_state.get('user_type', 'project_site')
-        project_site = st.session_state.get('project_site', st.session_state.get('current_project_site', 'Lifecamp Kafe'))
+        # Admins see every site, so the cache follows the all-sites data version
+        project_site = None if user_type == 'admin' else \
+            st.session_state.get('project_site', st.session_state.get('current_project_site', 'Lifecamp Kafe'))
         
         over_planned = _get_over_planned_requests(user_type=user_type, project_site=project_site)
         
@@ -6447,6 +6286,34 @@ def set_active_tab_index(tab_index):
     # Only update session state - don't modify query params as it causes reruns
     st.session_state.active_tab_index = tab_index
 
+def on_tab_selected():
+    """Persist the section picked in the navigation bar (session state, plus ?tab= for refresh/deep links)"""
+    tab_index = st.session_state.tab_selector
+    set_active_tab_index(tab_index)
+    st.query_params['tab'] = str(tab_index)
+
+def render_tab_navigation(tab_names):
+    """
+    Section navigation used instead of st.tabs. st.tabs runs every tab body on each rerun;
+    this returns the active index so the caller only runs that section.
+    """
+    current_tab = get_active_tab_index()
+    if current_tab >= len(tab_names):
+        current_tab = 0
+    # Keep the widget in sync when the index was changed elsewhere (deep link, set_active_tab_index)
+    if st.session_state.get('tab_selector') != current_tab:
+        st.session_state.tab_selector = current_tab
+    st.radio(
+        "Section",
+        options=list(range(len(tab_names))),
+        format_func=lambda i: tab_names[i],
+        key='tab_selector',
+        horizontal=True,
+        label_visibility='collapsed',
+        on_change=on_tab_selected
+    )
+    return current_tab
+
 def preserve_current_tab():
     """
     Helper function to preserve the current tab after form submissions or actions.
@@ -6455,6 +6322,13 @@ def preserve_current_tab():
     current_tab = st.session_state.get('active_tab_index', 0)
     set_active_tab_index(current_tab)
 
+def rerun_fragment():
+    """Rerun only the calling fragment; falls back to a full rerun when the action ran during a full-page run"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
 # Enhanced notification banner with sound and animation
 def show_notification_banner():
     """Show a prominent banner for project site accounts with unread notifications"""
@@ -6463,8 +6337,13 @@ def show_notification_banner():
         # Only show banner for project site accounts (not admins)
         if st.session_state.get('user_type') != 'admin':
 
-            user_notifications = get_project_site_notifications()
-            unread_count = len([n for n in user_notifications if not n.get('is_read', False)])
+            # One primary-key lookup; the full list is only needed for sites without notification rows
+            summary = get_notification_summary(current_notification_site())
+            if summary and summary['latest_id']:
+                unread_count = summary['unread_count']
+            else:
+                user_notifications = get_project_site_notifications()
+                unread_count = len([n for n in user_notifications if not n.get('is_read', False)])
             
             if unread_count > 0:
 
@@ -7131,7 +7010,7 @@ def debug_actuals_issue():
                 FROM requests r 
                 JOIN items i ON r.item_id = i.id
                 WHERE r.status = 'Approved'
-                ORDER BY r.id DESC
+                ORDER BY r.ts DESC, r.id DESC
                 LIMIT 5
             """))
             approved_requests = result.fetchall()
@@ -7367,334 +7246,94 @@ if st.session_state.get('authenticated', False):
             else:
                 st.error("❌ Account synchronization test failed!")
             
-            st.markdown("""
-            <script>
-            localStorage.setItem('new_request_notification', 'true');
-            console.log('Manual notification test triggered');
-            </script>
-            """, unsafe_allow_html=True)
-            st.success("Notification test triggered! Check for popup and sound.")
-    
-    # Check notifications for project site accounts
-    elif user_type == 'project_site':
-        try:
-            # Test notification button for project site accounts
-            if st.button("🔔 Test Project Site Notifications", help="Click to test if notifications work for project site accounts"):
-                st.markdown("""
-                <script>
-                localStorage.setItem('request_approved_notification', 'true');
-                console.log('Project site notification test triggered');
-                </script>
-                """, unsafe_allow_html=True)
-                st.success("Project site notification test triggered! Check for popup and sound.")
-            
-            # Get notifications for project site accounts
-            user_notifications = get_project_site_notifications()
-            notif_count = len(user_notifications) if user_notifications else 0
-            if notif_count:
-                st.info(f"🔔 You have {notif_count} notifications")
-                
-                # Notify via popup if new notifications arrived (mirror admin experience)
-                # Popup with actual messages for any new notifications since last visit
-                latest_ids_js_array = '[' + ','.join(str(n.get('id')) for n in user_notifications[:5]) + ']'
-                latest_msgs_js_array = '[' + ','.join(('`'+(n.get('message') or '').replace('`','\\`')+'`') for n in user_notifications[:5]) + ']'
-                st.markdown(f"""
-                <script>
-                try {{
-                  const idKey = 'ps_last_seen_notif_id';
-                  const prevId = parseInt(localStorage.getItem(idKey) || '0');
-                  const latestIds = {latest_ids_js_array};
-                  const latestMsgs = {latest_msgs_js_array};
-                  let maxId = prevId;
-                  for (let i = 0; i < latestIds.length; i++) {{
-                    const nid = latestIds[i];
-                    const msg = latestMsgs[i] || 'You have a new notification';
-                    if (nid > prevId) {{
-                      if (typeof showNotificationToast === 'function') {{
-                        showNotificationToast(msg);
-                      }} else {{
-                        const el = document.createElement('div');
-                        el.style.cssText = 'position:fixed;top:80px;right:20px;background:#1d4ed8;color:#fff;padding:10px 14px;border-radius:8px;z-index:9000;box-shadow:0 4px 12px rgba(0,0,0,.15)';
-                        el.textContent = msg;
-                        document.body.appendChild(el);
-                        setTimeout(()=>el.remove(), 3000);
-                      }}
-                      if (nid > maxId) maxId = nid;
-                    }}
-                  localStorage.setItem(idKey, String(maxId));
-                }} catch (e) {{ console.log('ps popup skipped', e); }}
-                </script>
-                """, unsafe_allow_html=True)
-                
-                # Show recent notifications
-                with st.expander("📬 Recent Notifications", expanded=False):
-                    for notification in user_notifications[:5]:  # Show last 5 notifications
-                        title = notification.get('title') if isinstance(notification, dict) else str(notification)
-                        created = notification.get('created_at') if isinstance(notification, dict) else ''
-                        message = notification.get('message') if isinstance(notification, dict) else ''
-                        status_icon = "🔔" if (isinstance(notification, dict) and not notification.get('is_read', False)) else "✅"
-                        st.write(f"{status_icon} **{title}** - {created}")
-                        if message:
-                            st.caption(f"*{message}*")
-            else:
-                st.info("📬 No notifications at the moment")
-        except Exception as e:
-            st.error(f"Error loading notifications: {e}")
-            print(f"❌ Notification display error: {e}")
-
-
-# Ultra-aggressive JavaScript for tab persistence - runs immediately and continuously
-st.markdown("""
-<script>
-// Ultra-aggressive tab persistence that runs immediately and continuously
-(function() {
-    let currentTabIndex = null;
-    let isRestoring = false;
-    let lastRestoredTab = null;
-    
-    function updateTabInURL(tabIndex) {
-        try {
-            const url = new URL(window.location);
-            const currentTab = url.searchParams.get('tab');
-            if (currentTab !== tabIndex.toString()) {
-                url.searchParams.set('tab', tabIndex.toString());
-                window.history.replaceState({}, '', url);
-            }
-            localStorage.setItem('istrom_last_tab', tabIndex.toString());
-            currentTabIndex = tabIndex;
-            lastRestoredTab = tabIndex;
-        } catch (e) {
-            // Silently fail
-        }
-    }
-    
-    function getDesiredTabIndex() {
-        // Priority 1: URL parameter
-        try {
-            const url = new URL(window.location);
-            const urlTab = url.searchParams.get('tab');
-            if (urlTab !== null) {
-                const tabIndex = parseInt(urlTab, 10);
-                if (!Number.isNaN(tabIndex) && tabIndex >= 0) {
-                    return tabIndex;
-                }
-            }
-        } catch (e) {
-            // Ignore
-        }
-        
-        // Priority 2: localStorage
-        try {
-            const stored = localStorage.getItem('istrom_last_tab');
-            if (stored !== null) {
-                const tabIndex = parseInt(stored, 10);
-                if (!Number.isNaN(tabIndex) && tabIndex >= 0) {
-                    return tabIndex;
-                }
-            }
-        } catch (e) {
-            // Ignore
-        }
-        
-        return null;
-    }
-    
-    function restoreTab() {
-        if (isRestoring) {
-            return false; // Prevent concurrent restorations
-        }
-        
-        const tabContainer = document.querySelector('[data-testid="stTabs"]');
-        if (!tabContainer) {
-            return false;
-        }
-        
-        const tabs = tabContainer.querySelectorAll('button[role="tab"]');
-        if (tabs.length === 0) {
-            return false;
-        }
-        
-        const desiredTab = getDesiredTabIndex();
-        if (desiredTab === null || desiredTab < 0 || desiredTab >= tabs.length) {
-            return false;
-        }
-        
-        // If we already restored this tab, don't do it again
-        if (lastRestoredTab === desiredTab) {
-            const desiredTabButton = tabs[desiredTab];
-            if (desiredTabButton && desiredTabButton.getAttribute('aria-selected') === 'true') {
-                return true; // Already restored and selected
-            }
-        }
-        
-        const desiredTabButton = tabs[desiredTab];
-        if (!desiredTabButton) {
-            return false;
-        }
-        
-        const isSelected = desiredTabButton.getAttribute('aria-selected') === 'true';
-        if (isSelected) {
-            updateTabInURL(desiredTab);
-            return true;
-        }
-        
-        // Force restore the tab
-        isRestoring = true;
-        try {
-            // Use multiple methods to ensure tab is clicked
-            desiredTabButton.focus();
-            desiredTabButton.click();
-            
-            // Also try dispatching events
-            const clickEvent = new MouseEvent('click', {
-                bubbles: true,
-                cancelable: true,
-                view: window
-            });
-            desiredTabButton.dispatchEvent(clickEvent);
-            
-            updateTabInURL(desiredTab);
-            
-            // Verify it worked
-            setTimeout(function() {
-                isRestoring = false;
-                const stillSelected = desiredTabButton.getAttribute('aria-selected') === 'true';
-                if (!stillSelected) {
-                    // Retry if it didn't work
-                    setTimeout(restoreTab, 50);
-                }
-            }, 50);
-            
-            return true;
-        } catch (e) {
-            isRestoring = false;
-            return false;
-        }
-    }
-    
-    function trackTabs() {
-        const tabContainer = document.querySelector('[data-testid="stTabs"]');
-        if (!tabContainer) {
-            return;
-        }
-        
-        const tabs = tabContainer.querySelectorAll('button[role="tab"]');
-        if (tabs.length === 0) {
-            return;
-        }
-        
-        // Track tab clicks - don't clone, just add listeners
-        tabs.forEach(function(tab, index) {
-            // Only add listener if not already tracked
-            if (!tab.hasAttribute('data-tab-tracked-v2')) {
-                tab.setAttribute('data-tab-tracked-v2', 'true');
-                tab.addEventListener('click', function(e) {
-                    updateTabInURL(index);
-                    lastRestoredTab = index;
-                }, true); // Use capture phase for immediate execution
-            }
-        });
-        
-        // Immediately try to restore
-        restoreTab();
-    }
-    
-    // Continuous monitoring function
-    function continuousMonitor() {
-        const tabContainer = document.querySelector('[data-testid="stTabs"]');
-        if (tabContainer) {
-            const tabs = tabContainer.querySelectorAll('button[role="tab"]');
-            if (tabs.length > 0) {
-                const desiredTab = getDesiredTabIndex();
-                if (desiredTab !== null && desiredTab >= 0 && desiredTab < tabs.length) {
-                    const desiredTabButton = tabs[desiredTab];
-                    if (desiredTabButton) {
-                        const isSelected = desiredTabButton.getAttribute('aria-selected') === 'true';
-                        if (!isSelected) {
-                            restoreTab();
-                        }
-                    }
-                }
-            }
-        }
-    }
-    
-    // Ultra-aggressive MutationObserver that watches everything
-    const observer = new MutationObserver(function(mutations) {
-        // Immediately check and restore tabs
-        continuousMonitor();
-        trackTabs();
-    });
-    
-    // Start observing immediately
-    if (document.body) {
-        observer.observe(document.body, {
-            childList: true,
-            subtree: true,
-            attributes: true,
-            attributeFilter: ['aria-selected']
-        });
-    }
-    
-    // Use requestAnimationFrame for immediate execution
-    function immediateRestore() {
-        requestAnimationFrame(function() {
-            trackTabs();
-            restoreTab();
-            continuousMonitor();
-        });
-    }
-    
-    // Run immediately
-    if (document.readyState === 'loading') {
-        document.addEventListener('DOMContentLoaded', immediateRestore);
-    } else {
-        immediateRestore();
-    }
-    
-    // Also run on every frame for a short period after load (reduced frequency)
-    let frameCount = 0;
-    const maxFrames = 30; // Check for 0.5 seconds (30 frames at 60fps) instead of 1 second
-    function frameCheck() {
-        if (frameCount < maxFrames) {
-            frameCount++;
-            // Only check every 2 frames to reduce load
-            if (frameCount % 2 === 0) {
-                continuousMonitor();
-            }
-            requestAnimationFrame(frameCheck);
-        }
-    }
-    requestAnimationFrame(frameCheck);
-    
-    // Also set up periodic checks (reduced frequency to prevent excessive reruns)
-    setInterval(continuousMonitor, 1000); // Check every 1000ms (1 second) instead of 100ms
+            st.markdown("""
+            <script>
+            localStorage.setItem('new_request_notification', 'true');
+            console.log('Manual notification test triggered');
+            </script>
+            """, unsafe_allow_html=True)
+            st.success("Notification test triggered! Check for popup and sound.")
     
-    // Intercept Streamlit's internal tab handling if possible (reduced calls)
-    window.addEventListener('load', function() {
-        setTimeout(immediateRestore, 0);
-        setTimeout(immediateRestore, 100);
-        setTimeout(immediateRestore, 500);
-    });
-})();
-</script>
-""", unsafe_allow_html=True)
+    # Check notifications for project site accounts
+    elif user_type == 'project_site':
+        try:
+            # Test notification button for project site accounts
+            if st.button("🔔 Test Project Site Notifications", help="Click to test if notifications work for project site accounts"):
+                st.markdown("""
+                <script>
+                localStorage.setItem('request_approved_notification', 'true');
+                console.log('Project site notification test triggered');
+                </script>
+                """, unsafe_allow_html=True)
+                st.success("Project site notification test triggered! Check for popup and sound.")
+            
+            # Get notifications for project site accounts
+            user_notifications = get_project_site_notifications()
+            notif_count = len(user_notifications) if user_notifications else 0
+            if notif_count:
+                st.info(f"🔔 You have {notif_count} notifications")
+                
+                # Notify via popup if new notifications arrived (mirror admin experience)
+                # Popup with actual messages for any new notifications since last visit
+                latest_ids_js_array = '[' + ','.join(str(n.get('id')) for n in user_notifications[:5]) + ']'
+                latest_msgs_js_array = '[' + ','.join(('`'+(n.get('message') or '').replace('`','\\`')+'`') for n in user_notifications[:5]) + ']'
+                st.markdown(f"""
+                <script>
+                try {{
+                  const idKey = 'ps_last_seen_notif_id';
+                  const prevId = parseInt(localStorage.getItem(idKey) || '0');
+                  const latestIds = {latest_ids_js_array};
+                  const latestMsgs = {latest_msgs_js_array};
+                  let maxId = prevId;
+                  for (let i = 0; i < latestIds.length; i++) {{
+                    const nid = latestIds[i];
+                    const msg = latestMsgs[i] || 'You have a new notification';
+                    if (nid > prevId) {{
+                      if (typeof showNotificationToast === 'function') {{
+                        showNotificationToast(msg);
+                      }} else {{
+                        const el = document.createElement('div');
+                        el.style.cssText = 'position:fixed;top:80px;right:20px;background:#1d4ed8;color:#fff;padding:10px 14px;border-radius:8px;z-index:9000;box-shadow:0 4px 12px rgba(0,0,0,.15)';
+                        el.textContent = msg;
+                        document.body.appendChild(el);
+                        setTimeout(()=>el.remove(), 3000);
+                      }}
+                      if (nid > maxId) maxId = nid;
+                    }}
+                  localStorage.setItem(idKey, String(maxId));
+                }} catch (e) {{ console.log('ps popup skipped', e); }}
+                </script>
+                """, unsafe_allow_html=True)
+                
+                # Show recent notifications
+                with st.expander("📬 Recent Notifications", expanded=False):
+                    for notification in user_notifications[:5]:  # Show last 5 notifications
+                        title = notification.get('title') if isinstance(notification, dict) else str(notification)
+                        created = notification.get('created_at') if isinstance(notification, dict) else ''
+                        message = notification.get('message') if isinstance(notification, dict) else ''
+                        status_icon = "🔔" if (isinstance(notification, dict) and not notification.get('is_read', False)) else "✅"
+                        st.write(f"{status_icon} **{title}** - {created}")
+                        if message:
+                            st.caption(f"*{message}*")
+            else:
+                st.info("📬 No notifications at the moment")
+        except Exception as e:
+            st.error(f"Error loading notifications: {e}")
+            print(f"❌ Notification display error: {e}")
 
-# Get current active tab (will be used to highlight/preserve)
-current_active_tab = get_active_tab_index()
 
-# Create tabs based on user type
+# Sections based on user type
 if st.session_state.get('user_type') == 'admin':
     tab_names = ["Manual Entry (Budget Builder)", "Inventory", "Make Request", "Review & History", "Budget Summary", "Actuals", "Admin Settings"]
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(tab_names)
 else:
     # Project site accounts have a Notifications tab to see approvals/rejections
     tab_names = ["Manual Entry (Budget Builder)", "Inventory", "Make Request", "Review & History", "Budget Summary", "Actuals", "Notifications"]
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(tab_names)
-# Don't modify query params here - let JavaScript handle it to avoid reruns
-# Query params will be set by JavaScript when user clicks tabs
+
+# Only the active section runs: its queries, caches and widgets. The others cost nothing on this rerun.
+current_active_tab = render_tab_navigation(tab_names)
+checkpoint(f"tab: {tab_names[current_active_tab]}")
 # -------------------------------- Tab 1: Manual Entry (Budget Builder) --------------------------------
-with tab1:
+if current_active_tab == 0:
 
     st.subheader("Manual Entry - Budget Builder")
     st.caption("Add items with proper categorization and context")
@@ -7813,46 +7452,22 @@ with tab1:
             # Remove "All" from the list for filtering (we'll add it back later)
             budget_options_to_filter = [opt for opt in all_budget_options if opt != "All"]
             
-            # Filter out budgets with subcategories appended (e.g., "Budget 5 - Terraces(General Materials - BLOCKWORK ABOVE ROOF BEAM)")
-            # These have " - " inside the parentheses, indicating a subcategory was appended
-            filtered_budgets = []
-            for opt in budget_options_to_filter:
-                try:
-                    if "(" in opt and ")" in opt:
-                        # Extract the part inside parentheses
-                        paren_parts = opt.split("(")
-                        if len(paren_parts) > 1:
-                            paren_content = paren_parts[1].split(")")[0]
-                            # If there's " - " inside parentheses, it means a subcategory was appended - skip it
-                            if " - " not in paren_content:
-                                filtered_budgets.append(opt)
-                        else:
-                            # Malformed budget string - skip it
-                            continue
-                    else:
-                        # Budgets without parentheses are fine
-                        filtered_budgets.append(opt)
-                except Exception:
-                    # Skip malformed budget strings
-                    continue
-            budget_options_to_filter = filtered_budgets
+            # Parsed parts of every option; budgets with a subcategory appended
+            # (e.g., "Budget 5 - Terraces(General Materials - BLOCKWORK ABOVE ROOF BEAM)") are left out
+            option_parts = with_budget_columns(pd.DataFrame({"budget": budget_options_to_filter}))
+            if not option_parts.empty:
+                option_parts = option_parts[option_parts["budget_subcategory"].isna()]
+                budget_options_to_filter = option_parts["budget"].tolist()
             
-            # Filter budgets based on budget number FIRST (if not "All")
+            # Filter budgets by budget number FIRST (if not "All")
+            budget_options = budget_options_to_filter
             if manual_budget_number and manual_budget_number != "All":
-                # Extract the budget number (e.g., "Budget 1" -> "1")
-                budget_num = manual_budget_number.replace("Budget ", "").strip()
-                # Use word boundary to ensure exact match (e.g., Budget 1 doesn't match Budget 10)
-                pattern = rf"^Budget {budget_num}\b\s+-"
-                budget_options = [opt for opt in budget_options_to_filter if re.match(pattern, opt)]
-            else:
-                # If "All" is selected for budget number, use all budgets
-                budget_options = budget_options_to_filter
+                option_parts = option_parts[budget_mask(option_parts, budget_num=manual_budget_number)]
+                budget_options = option_parts["budget"].tolist()
             
             # Filter budgets that match the selected building type SECOND (skip if "All" is selected)
             if building_type and building_type != "All":
-                # Filter budgets that contain the building type
-                # The format is: "Budget X - BuildingType(Category)"
-                budget_options = [opt for opt in budget_options if f" - {building_type}(" in opt]
+                budget_options = option_parts.loc[budget_mask(option_parts, building_type=building_type), "budget"].tolist()
                 
                 # If no matching budgets found, show all budgets
                 if not budget_options:
@@ -8112,59 +7727,51 @@ with tab1:
                         
                         # Preserve tab after action
                         preserve_current_tab()
-# -------------------------------- Tab 2: Inventory --------------------------------
-with tab2:
-
-    st.subheader("📦 Current Inventory")
-    st.caption("View, edit, and manage all inventory items")
-    
-    # Check permissions for inventory management
-    if not is_admin():
-
-        st.warning("**Read-Only Access**: You can view inventory but cannot modify items.")
-        st.info("Contact an administrator if you need to make changes to the inventory.")
-    
-    # Load all items first with progress indicator (optimized)
-    with st.spinner("Loading inventory..."):
 
-        items = df_items_cached(st.session_state.get('current_project_site'))
-    
-    # Show loading status - clean interface
-    if items.empty:
+    # Bulk import - rows without their own budget/section/building type get the Project Context above
+    if is_admin():
+        with st.expander("📥 Import BOQ from Excel / CSV"):
+            st.caption("Columns are matched by name (item/description, qty, unit, rate/cost, code). "
+                       "Large workbooks are read sheet by sheet in chunks.")
+            boq_file = st.file_uploader("BOQ file", type=["xlsx", "xlsm", "csv"], key="boq_import_file")
+            boq_category = st.selectbox("Category for rows without one", ["materials", "labour"], key="boq_import_category")
+            if boq_file is not None and st.button("Import BOQ", type="primary", key="boq_import_button"):
+                progress_bar = st.progress(0.0, text="Reading workbook...")
+
+                def show_import_progress(sheet, row, total):
+                    fraction = min(row / total, 1.0) if total else 0.0
+                    progress_bar.progress(fraction, text=f"{sheet}: row {row:,}" + (f" of {total:,}" if total else ""))
 
-        st.info("📦 **No items found yet.** Add some items in the Manual Entry tab to get started.")
-        st.stop()
-    
-    # Calculate amounts
+                try:
+                    report = import_boq_file(
+                        boq_file, boq_file.name, category_guess=boq_category,
+                        budget=budget if budget and budget != "All" else None,
+                        section=section if section and section != "All" else None,
+                        building_type=building_type if building_type and building_type != "All" else None,
+                        project_site=st.session_state.get('current_project_site'),
+                        progress=show_import_progress,
+                    )
+                except Exception as e:
+                    st.error(f"❌ Import failed: {e}")
+                else:
+                    progress_bar.progress(1.0, text="Import complete")
+                    log_current_session()
+                    st.success(f"✅ {report['inserted']:,} items added, {report['updated']:,} updated "
+                               f"from {report['rows']:,} rows ({', '.join(report['sheets']) or 'no sheets'})")
+                    if report["skipped_sheets"]:
+                        st.info(f"Skipped sheets without an item column: {', '.join(report['skipped_sheets'])}")
+                    rejects = report["rejects"]
+                    if not rejects.empty:
+                        st.warning(f"{len(rejects):,} rows were not imported")
+                        st.dataframe(rejects.head(200), use_container_width=True, hide_index=True)
+                        st.download_button("📥 Download Reject Report", rejects.to_csv(index=False),
+                                           "boq_import_rejects.csv", "text/csv", key="boq_import_rejects")
+# -------------------------------- Tab 2: Inventory --------------------------------
+@st.fragment
+def render_inventory_filtered_views():
+    """Inventory filters with the table, bulk delete and item editor they drive - reruns on its own when a filter changes"""
+    items = df_items_cached(st.session_state.get('current_project_site'))
     items["Amount"] = (items["qty"].fillna(0) * items["unit_cost"].fillna(0)).round(2)
-
-    # Quick stats (optimized)
-    total_items = len(items)
-    # Calculate total value with proper NaN handling
-    total_value = items["Amount"].sum()
-    if pd.notna(total_value):
-
-        total_value = float(total_value)
-    else:
-
-        total_value = 0.0
-    
-    # Professional Dashboard Metrics
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-
-        st.metric("Total Items", f"{total_items:,}", help="Total inventory items")
-    with col2:
-
-        st.metric("Total Value", f"₦{total_value:,.2f}", help="Total inventory value")
-    with col3:
-
-        materials_count = (items['category'] == 'materials').sum()
-        st.metric("Materials", f"{materials_count:,}", help="Material items count")
-    with col4:
-
-        labour_count = (items['category'] == 'labour').sum()
-        st.metric("Labour", f"{labour_count:,}", help="Labour items count")
     
     # Professional Filters - Improved order: Building Type, Budget Number, Budget, Section
     st.markdown("### Filters")
@@ -8203,24 +7810,12 @@ with tab2:
         # Remove "All" from the list for filtering (we'll add it back later)
         budget_options_to_filter = [opt for opt in all_budget_options if opt != "All"]
         
-        # Filter budgets based on building type (if not "All")
-        if f_building_type and f_building_type != "All":
-            # Filter budgets that contain the building type
-            # The format is: "Budget X - BuildingType(Category)"
-            budget_options = [opt for opt in budget_options_to_filter if f" - {f_building_type}(" in opt]
-        else:
-            # If "All" is selected for building type, use all budgets
-            budget_options = budget_options_to_filter
-        
-        # Filter budgets based on budget number (if not "All")
-        if f_budget_number and f_budget_number != "All":
-            # Extract the budget number (e.g., "Budget 1" -> "1")
-            budget_num = f_budget_number.replace("Budget ", "").strip()
-            # Filter budgets that match the exact budget number
-            # Use pattern "Budget X -" where X is the exact number (not "Budget 10" when looking for "Budget 1")
-            # Use word boundary \b after the number to ensure "1" doesn't match "10", "11", etc.
-            pattern = rf"^Budget {budget_num}\b\s+-"
-            budget_options = [opt for opt in budget_options if re.match(pattern, opt)]
+        # Filter budgets by building type and budget number using their parsed parts
+        budget_options = budget_options_to_filter
+        if (f_building_type and f_building_type != "All") or (f_budget_number and f_budget_number != "All"):
+            option_parts = pd.DataFrame({"budget": budget_options_to_filter})
+            option_mask = budget_mask(option_parts, budget_num=f_budget_number, building_type=f_building_type)
+            budget_options = option_parts.loc[option_mask, "budget"].tolist()
         
         # If no matching budgets found after filtering, show all budgets as fallback
         if not budget_options:
@@ -8248,12 +7843,7 @@ with tab2:
         
         # Apply budget number filter
         if f_budget_number and f_budget_number != "All":
-            # Extract the budget number (e.g., "Budget 1" -> "1")
-            budget_num = f_budget_number.replace("Budget ", "").strip()
-            # Match exact budget number using regex pattern "Budget X -" where X is the exact number
-            # Use word boundary \b after the number to ensure "1" doesn't match "10", "11", etc.
-            pattern = rf"^Budget {budget_num}\b\s+-"
-            temp_filtered = temp_filtered[temp_filtered["budget"].str.match(pattern, na=False)]
+            temp_filtered = temp_filtered[budget_mask(temp_filtered, budget_num=f_budget_number)]
         
         # Get unique sections from filtered items
         if not temp_filtered.empty:
@@ -8288,49 +7878,14 @@ with tab2:
         building_type_matches = filtered_items["building_type"] == f_building_type
         filtered_items = filtered_items[building_type_matches]
     
-    # Budget number filter (applied second)
+    # Budget number filter (applied second) - equality on the parsed budget_num column
     if f_budget_number and f_budget_number != "All":
-        # Extract the budget number (e.g., "Budget 1" -> "1")
-        budget_num = f_budget_number.replace("Budget ", "").strip()
-        # Match exact budget number using regex pattern "Budget X -" where X is the exact number
-        # Use word boundary \b after the number to ensure "1" doesn't match "10", "11", etc.
-        pattern = rf"^Budget {budget_num}\b\s+-"
-        budget_number_matches = filtered_items["budget"].str.match(pattern, na=False)
-        filtered_items = filtered_items[budget_number_matches]
-    
-    # Budget filter with flexible matching (space and case insensitive) - applied third
+        filtered_items = filtered_items[budget_mask(filtered_items, budget_num=f_budget_number)]
+    
+    # Budget filter (applied third) - a subgroup matches its number, type and category;
+    # a base budget like "Budget 1 - Terraces" matches all of its subgroups
     if f_budget and f_budget != "All":
-        def normalize_budget_string(budget_str):
-            """Normalize budget string for comparison - remove extra spaces, convert to lowercase"""
-            if pd.isna(budget_str):
-                return ""
-            # Convert to string, strip whitespace, convert to lowercase
-            normalized = str(budget_str).strip().lower()
-            # Remove extra spaces and normalize spacing around parentheses
-            normalized = normalized.replace("  ", " ")  # Remove double spaces
-            normalized = normalized.replace(" (", "(")   # Remove space before opening parenthesis
-            normalized = normalized.replace("( ", "(")   # Remove space after opening parenthesis
-            normalized = normalized.replace(" )", ")")   # Remove space before closing parenthesis
-            # Handle "Iron" vs "Irons" difference
-            normalized = normalized.replace("(iron)", "(irons)")
-            return normalized
-        
-        # Normalize the filter budget
-        normalized_filter = normalize_budget_string(f_budget)
-        
-        if "(" in f_budget and ")" in f_budget:
-            # Specific subgroup - flexible exact match
-            budget_matches = filtered_items["budget"].apply(
-                lambda x: normalize_budget_string(x) == normalized_filter
-            )
-        else:
-            # Hierarchical - show all items that contain this budget
-            # e.g., "Budget 1 - Terraces" shows "Budget 1 - Terraces", "Budget 1 - Terraces(Plumbings)", etc.
-            budget_matches = filtered_items["budget"].apply(
-                lambda x: normalized_filter in normalize_budget_string(x)
-            )
-        
-        filtered_items = filtered_items[budget_matches]
+        filtered_items = filtered_items[budget_mask(filtered_items, budget=f_budget)]
     
     # Section filter (applied fourth)
     if f_section and f_section != "All":
@@ -8343,20 +7898,12 @@ with tab2:
     # Show filter results summary
     if len(items) != initial_count:
         st.info(f"📊 Showing {len(items):,} of {initial_count:,} items")
-    current_project = st.session_state.get('current_project_site', 'Not set')
-    try:
-
-        total_items_in_project = len(df_items_cached(st.session_state.get('current_project_site')))
-    except Exception as e:
-
-        # Could not load items during startup
-        total_items_in_project = 0
     # Cache refresh button removed
 
     st.markdown("### Inventory Items")
     
-    # Remove code and project_site columns from display
-    display_items = items.drop(columns=['code', 'project_site'], errors='ignore')
+    # Remove code, project_site and the parsed budget columns from display
+    display_items = items.drop(columns=['code', 'project_site', *BUDGET_COLUMNS], errors='ignore')
     
     # Add pagination for large datasets
     page_size = 100  # Items per page (showing 1-100 format)
@@ -8411,7 +7958,7 @@ with tab2:
     st.download_button("📥 Download Inventory CSV", csv_inv, "inventory_view.csv", "text/csv")
 
     st.markdown("### Item Management")
-    require_confirm = st.checkbox("Require confirmation for deletes", value=True, key="inv_confirm")
+    st.checkbox("Require confirmation for deletes", value=True, key="inv_confirm")
     
     # Simple item selection for deletion
     st.markdown("####  Select Items to Delete")
@@ -8512,11 +8059,6 @@ with tab2:
 
                             st.error(error)
                     
-                if deleted_count > 0 or errors:
-
-                    
-                    # Clear cache to refresh data without page reload
-                    clear_cache()
             
             if clear_submitted:
 
@@ -8632,6 +8174,8 @@ with tab2:
                                     "unit_cost": new_cost,
                                     "id": selected_item['id']
                                 })
+                                refresh_item_rollups(conn, [selected_item['id']])
+                                bump_item_versions(conn, "items", [selected_item['id']])
                             
                             st.success(f"Successfully updated item: {selected_item['name']}")
                             
@@ -8640,7 +8184,6 @@ with tab2:
                             localStorage.setItem('item_updated_notification', 'true');
                             </script>
                             """, unsafe_allow_html=True)
-                            clear_cache()
                         except Exception as e:
                             st.error(f"Error updating item: {e}")
         else:
@@ -8648,6 +8191,62 @@ with tab2:
     else:
 
         st.info("Admin privileges required to edit items.")
+
+if current_active_tab == 1:
+
+    st.subheader("📦 Current Inventory")
+    st.caption("View, edit, and manage all inventory items")
+    
+    # Check permissions for inventory management
+    if not is_admin():
+
+        st.warning("**Read-Only Access**: You can view inventory but cannot modify items.")
+        st.info("Contact an administrator if you need to make changes to the inventory.")
+    
+    # Load all items first with progress indicator (optimized)
+    with st.spinner("Loading inventory..."):
+
+        items = df_items_cached(st.session_state.get('current_project_site'))
+    
+    # Show loading status - clean interface
+    if items.empty:
+
+        st.info("📦 **No items found yet.** Add some items in the Manual Entry tab to get started.")
+        st.stop()
+    
+    # Calculate amounts
+    items["Amount"] = (items["qty"].fillna(0) * items["unit_cost"].fillna(0)).round(2)
+
+    # Quick stats (optimized)
+    total_items = len(items)
+    # Calculate total value with proper NaN handling
+    total_value = items["Amount"].sum()
+    if pd.notna(total_value):
+
+        total_value = float(total_value)
+    else:
+
+        total_value = 0.0
+    
+    # Professional Dashboard Metrics
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+
+        st.metric("Total Items", f"{total_items:,}", help="Total inventory items")
+    with col2:
+
+        st.metric("Total Value", f"₦{total_value:,.2f}", help="Total inventory value")
+    with col3:
+
+        materials_count = (items['category'] == 'materials').sum()
+        st.metric("Materials", f"{materials_count:,}", help="Material items count")
+    with col4:
+
+        labour_count = (items['category'] == 'labour').sum()
+        st.metric("Labour", f"{labour_count:,}", help="Labour items count")
+    
+    # Filters and everything they drive rerun as a fragment, not the whole page
+    render_inventory_filtered_views()
     
     st.divider()
     st.markdown("### Danger Zone")
@@ -8679,7 +8278,7 @@ with tab2:
             st.button(" Delete ALL inventory and requests", type="secondary", key="delete_all_button", disabled=True, help="Admin privileges required")
     st.caption("Tip: Use Manual Entry / Import to populate budgets; use Make Request to deduct stock later.")
 # -------------------------------- Tab 5: Budget Summary --------------------------------
-with tab5:
+if current_active_tab == 4:
 
     st.subheader("Budget Summary by Building Type")
     print("DEBUG: Budget Summary tab loaded")
@@ -8698,18 +8297,18 @@ with tab5:
             current_project = st.session_state.get('current_project_site', 'Not set')
             user_project = st.session_state.get('project_site', 'Not set')
             user_type = st.session_state.get('user_type', 'Not set')
-            all_items_summary, summary_data = get_summary_data()
+            budget_rollup, summary_data = get_summary_data()
             project_for_actuals = current_project if current_project and current_project != 'Not set' else None
             actuals_summary = get_actuals(project_for_actuals)
         except Exception as e:
 
             print(f"DEBUG: Error getting summary data: {e}")
-            all_items_summary = pd.DataFrame()
+            budget_rollup = pd.DataFrame()
             summary_data = {}
             actuals_summary = pd.DataFrame()
     
     # Always show content, even if no items
-    if all_items_summary.empty:
+    if budget_rollup.empty:
 
         st.info("📦 **No items found yet.** Add items in the Manual Entry tab to see budget summaries.")
         st.markdown("#### Quick Overview")
@@ -8729,20 +8328,20 @@ with tab5:
         
         st.stop()  # Stop here if no items
     
-    if not all_items_summary.empty:
+    if not budget_rollup.empty:
 
     
-        # Quick overview metrics
+        # Quick overview metrics - straight from the rollup rows
         st.markdown("#### Quick Overview")
         col1, col2, col3, col4 = st.columns(4)
         with col1:
 
-            total_items = len(all_items_summary)
+            total_items = int(budget_rollup["item_count"].sum())
             st.metric("Total Items", total_items)
         with col2:
 
             # Calculate total amount with proper NaN handling
-            total_amount = all_items_summary["Amount"].sum()
+            total_amount = budget_rollup["amount"].sum()
             if pd.notna(total_amount):
 
                 total_amount = float(total_amount)
@@ -8752,16 +8351,17 @@ with tab5:
             st.metric("Total Amount", f"₦{total_amount:,.2f}")
         with col3:
 
-            unique_budgets = all_items_summary["budget"].nunique()
+            # One rollup row per budget number / building type / category
+            unique_budgets = int(budget_rollup["budget_num"].notna().sum())
             st.metric("Active Budgets", unique_budgets)
         with col4:
 
-            unique_building_types = all_items_summary["building_type"].nunique()
+            unique_building_types = budget_rollup["building_type"].nunique()
             st.metric("Building Types", unique_building_types)
         
         # Show recent items added
         st.markdown("#### Recent Items Added")
-        recent_items = all_items_summary.tail(5)[["name", "budget", "building_type", "Amount"]]
+        recent_items = get_recent_items(summary_project_site())
         st.dataframe(recent_items, use_container_width=True)
         
         # Use cached summary data
@@ -8835,6 +8435,9 @@ with tab5:
     tabs_to_create = list(range(1, max_budget + 1))  # Budgets 1 to 20 (or current max)
     budget_tabs = st.tabs([f"Budget {i}" for i in tabs_to_create])
     
+    # Amount per budget number and building type for every tab, from the rollup
+    budget_amounts = budget_totals(budget_rollup) if not budget_rollup.empty else pd.DataFrame(columns=["Total"])
+    
     for i, tab in enumerate(budget_tabs):
 
     
@@ -8844,13 +8447,13 @@ with tab5:
             st.markdown(f"### Budget {budget_num} Summary")
             
             # Get items for this budget
-            if not all_items_summary.empty:
+            if not budget_rollup.empty:
 
-                budget_items = all_items_summary[all_items_summary["budget"].str.contains(f"Budget {budget_num}", case=False, na=False, regex=False)]
-                if not budget_items.empty:
+                if budget_num in budget_amounts.index:
 
+                    building_type_amounts = budget_amounts.loc[budget_num]
                     # Calculate budget total with proper NaN handling
-                    budget_total = budget_items["Amount"].sum()
+                    budget_total = building_type_amounts["Total"]
                     if pd.notna(budget_total):
 
                         budget_total = float(budget_total)
@@ -8881,8 +8484,7 @@ with tab5:
                         cols = st.columns(2)
                         for idx, building_type in enumerate(valid_building_types):
                             with cols[idx % 2]:
-                                bt_items = budget_items[budget_items["building_type"] == building_type]
-                                planned_per_block = bt_items["Amount"].sum() if not bt_items.empty else 0.0
+                                planned_per_block = building_type_amounts.get(building_type, 0.0)
                                 if pd.notna(planned_per_block):
                                     planned_per_block = float(planned_per_block)
                                 else:
@@ -8958,7 +8560,7 @@ with tab5:
                     st.info(f"No items found for Budget {budget_num}")
             
 # -------------------------------- Tab 6: Actuals --------------------------------
-with tab6:
+if current_active_tab == 5:
 
     st.subheader("Actuals")
     print("DEBUG: Actuals tab loaded")
@@ -8974,7 +8576,6 @@ with tab6:
     if not project_site or project_site == 'Not set':
         # Try to get project site from items
         try:
-            from sqlalchemy import text
             from db import get_engine
             engine = get_engine()
             with engine.begin() as conn:
@@ -9045,18 +8646,9 @@ with tab6:
         # Filter items based on selections
         budget_items = items_df.copy()
         
-        # Apply budget number filter
-        if selected_budget_number and selected_budget_number != "All":
-            budget_num = selected_budget_number.replace("Budget ", "").strip()
-            # Use word boundary to ensure exact match (e.g., Budget 1 doesn't match Budget 10)
-            pattern = rf"^Budget {budget_num}\b\s+-"
-            budget_items = budget_items[budget_items["budget"].str.match(pattern, na=False)]
-        
-        # Apply building type filter
-        if selected_building_type and selected_building_type != "All":
-            # Filter budgets that contain the building type
-            # The format is: "Budget X - BuildingType(Category)"
-            budget_items = budget_items[budget_items["budget"].str.contains(f" - {selected_building_type}(", na=False, case=False, regex=False)]
+        # Apply budget number and building type filters on the parsed budget columns
+        budget_items = budget_items[budget_mask(budget_items, budget_num=selected_budget_number,
+                                                building_type=selected_building_type)]
         
         # Get the selected budget display name for the header
         if selected_budget_number != "All" and selected_building_type != "All":
@@ -9343,7 +8935,9 @@ with tab6:
         # Simple message
         st.info("💡 Add items, create requests, and approve them to see actuals here.")
 # -------------------------------- Tab 3: Make Request --------------------------------
-with tab3:
+@st.fragment
+def render_make_request_form():
+    """Request context, item picker and submit form - reruns on its own instead of the whole page"""
 
     st.subheader("Make a Request")
     st.caption("Request items for specific building types and budgets")
@@ -9398,32 +8992,18 @@ with tab3:
         # Remove "All" from the list for filtering (we'll add it back later)
         budget_options_to_filter = [opt for opt in all_budget_options if opt != "All"]
         
-        # Filter budgets based on budget number FIRST (if not "All")
-        if budget_number and budget_number != "All":
-            # Extract the budget number (e.g., "Budget 1" -> "1")
-            budget_num = budget_number.replace("Budget ", "").strip()
-            # Use word boundary to ensure exact match (e.g., Budget 1 doesn't match Budget 10)
-            pattern = rf"^Budget {budget_num}\b\s+-"
-            budget_options = [opt for opt in budget_options_to_filter if re.match(pattern, opt)]
-        else:
-            # If "All" is selected for budget number, use all budgets
-            budget_options = budget_options_to_filter
-        
-        # Filter budgets based on building type SECOND (if not "All")
-        if building_type and building_type != "All":
-            # Filter budgets that contain the building type
-            # The format is: "Budget X - BuildingType(Category)"
-            budget_options = [opt for opt in budget_options if f" - {building_type}(" in opt]
-        
-        # Filter budgets based on section (materials/labour) THIRD
-        if section and section in ["materials", "labour"]:
+        # Filter budgets by budget number and building type using their parsed parts
+        option_parts = with_budget_columns(pd.DataFrame({"budget": budget_options_to_filter}))
+        if not option_parts.empty:
+            option_parts = option_parts[budget_mask(option_parts, budget_num=budget_number, building_type=building_type)]
+            
+            # Then by section (materials/labour): labour budgets are the (Labour) category,
+            # materials are every other category - General Materials, Woods, Plumbings, Irons, Electrical, Mechanical
             if section == "labour":
-                # Only show budgets with "(Labour)" category
-                budget_options = [opt for opt in budget_options if "(Labour)" in opt]
-            else:  # section == "materials"
-                # Only show budgets with materials categories (exclude Labour)
-                # Materials categories: (General Materials), (Woods), (Plumbings), (Irons), (Electrical), (Mechanical)
-                budget_options = [opt for opt in budget_options if "(Labour)" not in opt]
+                option_parts = option_parts[option_parts["budget_category"].eq("Labour").fillna(False).astype(bool)]
+            elif section == "materials":
+                option_parts = option_parts[option_parts["budget_category"].ne("Labour").fillna(True).astype(bool)]
+        budget_options = option_parts["budget"].tolist() if not option_parts.empty else []
         
         # If no matching budgets found after filtering, show all budgets as fallback
         if not budget_options:
@@ -9453,52 +9033,9 @@ with tab3:
 
         items_df = items_df[items_df["building_type"] == building_type]
     
-    # Filter by budget number (skip if "All" is selected)
-    if budget_number and budget_number != "All":
-        # Extract the budget number (e.g., "Budget 1" -> "1")
-        budget_num = budget_number.replace("Budget ", "").strip()
-        # Use word boundary to ensure exact match (e.g., Budget 1 doesn't match Budget 10)
-        pattern = rf"^Budget {budget_num}\b\s+-"
-        items_df = items_df[items_df["budget"].str.match(pattern, na=False)]
-    
-    # Filter by budget (flexible matching - space and case insensitive, skip if "All" is selected)
-    if budget and budget != "All":
-
-        def normalize_budget_string(budget_str):
-            """Normalize budget string for comparison - remove extra spaces, convert to lowercase"""
-            if pd.isna(budget_str):
-
-                return ""
-            # Convert to string, strip whitespace, convert to lowercase
-            normalized = str(budget_str).strip().lower()
-            # Remove extra spaces and normalize spacing around parentheses
-            normalized = normalized.replace("  ", " ")  # Remove double spaces
-            normalized = normalized.replace(" (", "(")   # Remove space before opening parenthesis
-            normalized = normalized.replace("( ", "(")   # Remove space after opening parenthesis
-            normalized = normalized.replace(" )", ")")   # Remove space before closing parenthesis
-            # Handle "Iron" vs "Irons" difference
-            normalized = normalized.replace("(iron)", "(irons)")
-            return normalized
-        
-        # Normalize the selected budget
-        normalized_selected = normalize_budget_string(budget)
-        
-        # Create flexible matching logic
-        if "(" in budget and ")" in budget:
-
-            # Specific subgroup - flexible exact match
-            budget_matches = items_df["budget"].apply(
-                lambda x: normalize_budget_string(x) == normalized_selected
-            )
-        else:
-
-            # Hierarchical matching - show all items that contain this budget
-            # e.g., "Budget 1 - Terraces" shows "Budget 1 - Terraces", "Budget 1 - Terraces(Plumbings)", etc.
-            budget_matches = items_df["budget"].apply(
-                lambda x: normalized_selected in normalize_budget_string(x)
-            )
-        
-        items_df = items_df[budget_matches]
+    # Filter by budget number and budget (skip "All") - equality on the parsed budget columns;
+    # a base budget like "Budget 1 - Terraces" matches all of its subgroups
+    items_df = items_df[budget_mask(items_df, budget_num=budget_number, budget=budget)]
     
     # If still no items found, try showing all items for the building type (fallback)
     if items_df.empty and building_type:
@@ -9597,8 +9134,28 @@ with tab3:
                     key="request_note_input"
                 )
             
-            # Submit request button (inside form)
+            # Submit request button (inside form) - or collect the line in the cart and submit several at once
             submitted = st.form_submit_button("Submit Request", type="primary", use_container_width=True)
+            add_to_cart = st.form_submit_button("🛒 Add to Cart", use_container_width=True)
+            
+            if add_to_cart:
+                if not selected_item or not selected_item.get('id'):
+                    st.error("❌ Please select an item from the list.")
+                elif qty is None or qty <= 0:
+                    st.error("❌ Please enter a valid quantity (greater than 0).")
+                elif (building_type in BUILDING_SUBTYPE_OPTIONS or selected_item.get('building_type') in BUILDING_SUBTYPE_OPTIONS) and not building_subtype:
+                    st.error("❌ Please select a block or unit for the chosen building type.")
+                else:
+                    st.session_state.setdefault('request_cart', []).append({
+                        'section': section,
+                        'item_id': int(selected_item['id']),
+                        'item_name': selected_item.get('name', 'Unknown Item'),
+                        'unit': selected_item.get('unit') or '',
+                        'qty': float(qty),
+                        'current_price': float(current_price) if pd.notna(current_price) else None,
+                        'building_subtype': building_subtype,
+                    })
+                    st.success(f"Added {qty:g} x {selected_item.get('name')} to the cart")
             
             # Handle form submission inside form (variables are available here)
             if submitted:
@@ -9686,16 +9243,297 @@ with tab3:
                                 localStorage.setItem('new_request_notification', 'true');
                                 </script>
                                 """, unsafe_allow_html=True)
-                                
-                                # Clear caches to ensure data consistency
-                                clear_cache()
                             else:
                                 st.error("Failed to submit request. Please try again.")
                         except Exception as e:
                             st.error(f"Failed to submit request: {str(e)}")
                             st.info("Please try again or contact an administrator if the issue persists.")
+
+        render_request_cart()
+
+def render_request_cart():
+    """Cart lines collected with "Add to Cart", submitted together through add_requests_batch"""
+    cart = st.session_state.get('request_cart', [])
+    last_batch = st.session_state.pop('request_cart_result', None)
+    if last_batch:
+        ids = last_batch['request_ids']
+        st.success(f"✅ {len(ids)} requests submitted ({format_request_ids(ids)})")
+        for warning in last_batch['over_planned']:
+            st.warning(
+                f"⚠️ Request #{warning['request_id']} ({warning['item']}): cumulative {warning['cumulative']:g} "
+                f"exceeds planned {warning['planned']:g} by {warning['excess']:g}"
+            )
+    if not cart:
+        return
+
+    st.markdown(f"### 🛒 Request Cart ({len(cart)} items)")
+    cart_df = pd.DataFrame(cart)
+    cart_df['Total'] = cart_df['qty'] * cart_df['current_price'].fillna(0)
+    st.dataframe(
+        cart_df[['item_name', 'section', 'building_subtype', 'qty', 'unit', 'current_price', 'Total']].rename(columns={
+            'item_name': 'Item', 'section': 'Section', 'building_subtype': 'Block/Unit', 'qty': 'Quantity',
+            'unit': 'Unit', 'current_price': 'Current Price'
+        }),
+        use_container_width=True, hide_index=True
+    )
+    st.caption(f"Cart total: ₦{cart_df['Total'].sum():,.2f} - uses the name and notes entered above")
+
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        remove_index = st.selectbox("Remove line", range(len(cart)), format_func=lambda i: f"{i + 1}. {cart[i]['item_name']} ({cart[i]['qty']:g})", key="request_cart_remove_select")
+        if st.button("Remove", key="request_cart_remove"):
+            cart.pop(remove_index)
+            rerun_fragment()
+    with col2:
+        if st.button(f"Submit {len(cart)} Requests", type="primary", key="request_cart_submit", use_container_width=True):
+            requested_by = st.session_state.get('request_name_input', '')
+            note = st.session_state.get('request_note_input', '')
+            if not requested_by or not requested_by.strip():
+                st.error("❌ Please enter your name above. This field is required.")
+            elif not note or not note.strip():
+                st.error("❌ Please provide notes explaining your requests above. This field is required.")
+            else:
+                preserve_current_tab()
+                with st.spinner(f"Submitting {len(cart)} requests..."):
+                    result = add_requests_batch(cart, requested_by, note)
+                if result:
+                    st.session_state['request_cart'] = []
+                    st.session_state['request_cart_result'] = result
+                    st.markdown("""
+                    <script>
+                    localStorage.setItem('request_submitted_notification', 'true');
+                    localStorage.setItem('new_request_notification', 'true');
+                    </script>
+                    """, unsafe_allow_html=True)
+                    rerun_fragment()
+    with col3:
+        if st.button("Clear Cart", key="request_cart_clear", use_container_width=True):
+            st.session_state['request_cart'] = []
+            rerun_fragment()
+
+
+if current_active_tab == 2:
+    render_make_request_form()
 # -------------------------------- Tab 4: Review & History --------------------------------
-with tab4:
+def render_request_filters(key, request_fields=True):
+    """
+    Filter bar for a paged request view. Returns only the filters that are set, as plain
+    keyword arguments (ISO date strings) so they hash into stable cache keys.
+    """
+    with st.expander("🔎 Filters", expanded=False):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            date_from = st.date_input("From", value=None, key=f"{key}_date_from")
+            date_to = st.date_input("To", value=None, key=f"{key}_date_to")
+        with col2:
+            requested_by = st.text_input("Requested by", key=f"{key}_requested_by")
+            project_site = None
+            if is_admin():
+                project_site = st.selectbox("Project Site", ["All"] + get_project_sites(), key=f"{key}_project_site")
+        building_type = budget = None
+        if request_fields:
+            with col3:
+                building_type = st.selectbox("Building Type", ["All"] + PROPERTY_TYPES[1:], key=f"{key}_building_type")
+                budget = st.text_input("Budget contains", key=f"{key}_budget")
+    filters = {
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "requested_by": requested_by.strip() if requested_by else None,
+        "project_site": project_site,
+        "building_type": building_type,
+        "budget": budget.strip() if budget else None,
+    }
+    return {name: value for name, value in filters.items() if value and value != "All"}
+
+def request_page_cursor(page):
+    """Keyset cursor for the page after a requests page: its last row's (ts, id)"""
+    last = page.iloc[-1]
+    return {"before": (str(last['ts']), int(last['id']))}
+
+def deleted_page_cursor(page):
+    """Keyset cursor for the page after a deleted-requests page: its smallest log id"""
+    return {"before_id": int(page['id'].min())}
+
+def load_request_pages(key, fetch, filters, cursor=request_page_cursor):
+    """
+    Rows of a paged view: the newest page plus every older page asked for with "Load older".
+
+    Only the number of pages is kept in session state; each page's cursor comes from the page
+    before it as fetched now, so new rows at the top can't open a gap between pages.
+    Returns (rows, total matching).
+    """
+    state_key = f"{key}_pages"
+    state = st.session_state.get(state_key)
+    if not state or state.get("filters") != filters:
+        state = {"filters": filters, "pages": 1}
+        st.session_state[state_key] = state
+    pages = []
+    total = 0
+    after = {}
+    for _ in range(state["pages"]):
+        page, total = fetch(**after, **filters)
+        pages.append(page)
+        if len(page) < REQUEST_PAGE_SIZE:
+            break
+        after = cursor(page)
+    rows = pd.concat(pages, ignore_index=True) if len(pages) > 1 else pages[0]
+    return rows, total
+
+def _load_older_page(key):
+    state = st.session_state.get(f"{key}_pages")
+    if state:
+        state["pages"] += 1
+
+def render_load_more(key, rows, total):
+    """'Showing X of Y' and a button that appends the next older page"""
+    if not total:
+        return
+    st.caption(f"Showing {len(rows)} of {total}")
+    if len(rows) < total:
+        st.button("Load older", key=f"{key}_load_more", on_click=_load_older_page, args=(key,))
+
+@st.fragment
+def render_approve_reject_panel():
+    """Approve/reject by request ID - reruns on its own so an approval doesn't rebuild the whole page"""
+    st.write("Approve/Reject a request by ID:")
+    
+    # Result of the last action - the panel reran on its own, the request lists refresh on the next page rerun
+    last_result = st.session_state.pop('approve_reject_result', None)
+    if last_result:
+        res_col, refresh_col = st.columns([4, 1])
+        with res_col:
+            st.success(f"Request {last_result[0]} set to {last_result[1]}.")
+        with refresh_col:
+            if st.button("Refresh lists", key="approve_reject_refresh"):
+                st.rerun()
+
+    # Get current action from session state (initialize if not set)
+    if 'approve_reject_action' not in st.session_state:
+        st.session_state['approve_reject_action'] = 'Approve'
+
+    # Use regular widgets (not form) so rejection reason field can appear/disappear dynamically
+    colA, colB, colC = st.columns(3)
+    with colA:
+        req_id = st.number_input("Request ID", min_value=1, step=1, key="req_id_input")
+    with colB:
+        action = st.selectbox("Action", ["Approve","Reject","Set Pending"], 
+                             key="action_select",
+                             index=0 if st.session_state.get('approve_reject_action') == 'Approve' 
+                                   else (1 if st.session_state.get('approve_reject_action') == 'Reject' else 2))
+        # Update session state when action changes
+        if st.session_state.get('action_select') != st.session_state.get('approve_reject_action'):
+            st.session_state['approve_reject_action'] = st.session_state.get('action_select', 'Approve')
+    with colC:
+        approved_by = st.text_input("Approved/Rejected by:", key="approved_by_input")
+
+    # Show rejection reason field only when "Reject" is selected
+    current_action = st.session_state.get('approve_reject_action', 'Approve')
+    if current_action == "Reject":
+        # Read back from session state (rejection_reason_input) when the form is applied
+        st.text_area("Reason for Rejection", key="rejection_reason_input",
+                     help="This reason will be visible to the project site account",
+                     placeholder="Enter the reason for rejecting this request...")
+
+    # Submit button
+    if st.button("Apply", type="primary", key="approve_reject_submit"):
+        # Update session state with current action
+        st.session_state['approve_reject_action'] = action
+
+        # Preserve current tab before processing
+        current_tab_idx = st.session_state.get('active_tab_index', 3)  # Default to Review & History (tab 3)
+        set_active_tab_index(current_tab_idx)
+
+        # Get rejection reason from session state if Reject was selected
+        rejection_reason_value = st.session_state.get('rejection_reason_input', '') if action == "Reject" else ""
+
+        # Validate request ID
+        if req_id <= 0:
+            st.error("❌ Request ID must be greater than 0")
+        elif not approved_by or not approved_by.strip():
+            st.error("❌ Please enter the name of the person approving/rejecting")
+        elif action == "Reject" and not rejection_reason_value.strip():
+            st.error("❌ Please provide a reason for rejection")
+        else:
+            target_status = "Approved" if action=="Approve" else ("Rejected" if action=="Reject" else "Pending")
+            note_value = rejection_reason_value.strip() if action == "Reject" and rejection_reason_value.strip() else None
+            err = set_request_status(int(req_id), target_status, approved_by=approved_by or None, note=note_value)
+            if err:
+                st.error(err)
+            else:
+                # Show notification popup for admin
+                notification_flag = "request_approved_notification" if target_status == "Approved" else "request_rejected_notification"
+                st.markdown(f"""
+                <script>
+                localStorage.setItem('{notification_flag}', 'true');
+                </script>
+                """, unsafe_allow_html=True)
+
+                # Preserve tab after action
+                preserve_current_tab()
+
+                # Reset action to default after successful submission
+                st.session_state['approve_reject_action'] = 'Approve'
+                st.session_state['approve_reject_result'] = (req_id, target_status)
+                # Only this panel reruns; set_request_status bumped the requests data version, so
+                # the cached request views reload on their next read
+                rerun_fragment()
+
+@st.fragment
+def render_bulk_review_panel():
+    """Approve/reject several pending requests at once with set_requests_status_bulk"""
+    st.write("Approve/Reject several pending requests:")
+
+    last_result = st.session_state.pop('bulk_review_result', None)
+    if last_result:
+        res_col, refresh_col = st.columns([4, 1])
+        with res_col:
+            st.success(f"{len(last_result[0])} request(s) set to {last_result[1]}: {', '.join(f'#{i}' for i in last_result[0])}")
+        with refresh_col:
+            if st.button("Refresh lists", key="bulk_review_refresh"):
+                st.rerun()
+
+    pending = df_requests(status="Pending", user_type='admin', project_site=None)
+    if pending.empty:
+        st.info("No pending requests.")
+        return
+
+    labels = {
+        int(row['id']): f"#{int(row['id'])} - {row.get('item', '')} ({row.get('qty', '')}) - {row.get('project_site', '')}"
+        for _, row in pending.iterrows()
+    }
+    select_all = st.checkbox(f"Select all {len(labels)} pending", key="bulk_review_select_all")
+    selected_ids = st.multiselect(
+        "Pending requests", options=list(labels), format_func=labels.get,
+        default=list(labels) if select_all else None, key=f"bulk_review_ids_{select_all}"
+    )
+
+    col_action, col_by = st.columns(2)
+    with col_action:
+        action = st.selectbox("Action", ["Approve", "Reject"], key="bulk_review_action")
+    with col_by:
+        approved_by = st.text_input("Approved/Rejected by:", key="bulk_review_approved_by")
+    reason = ""
+    if action == "Reject":
+        reason = st.text_area("Reason for Rejection", key="bulk_review_reason",
+                              help="Applied to every selected request and visible to the project site account")
+
+    if st.button(f"Apply to {len(selected_ids)} selected", type="primary", key="bulk_review_submit",
+                 disabled=not selected_ids):
+        if not approved_by or not approved_by.strip():
+            st.error("❌ Please enter the name of the person approving/rejecting")
+        elif action == "Reject" and not reason.strip():
+            st.error("❌ Please provide a reason for rejection")
+        else:
+            target_status = "Approved" if action == "Approve" else "Rejected"
+            updated_ids, err = set_requests_status_bulk(selected_ids, target_status, approved_by.strip(),
+                                                        note=reason if action == "Reject" else None)
+            if err:
+                st.error(err)
+            else:
+                st.session_state['bulk_review_result'] = (updated_ids, target_status)
+                rerun_fragment()
+
+if current_active_tab == 3:
 
     st.subheader("Pending Requests")
     print("DEBUG: Review & History tab loaded")
@@ -9738,22 +9576,14 @@ with tab4:
         st.info(f"**Your Requests**: Viewing requests for {current_user} in {current_project}")
         st.caption("**Note**: Only administrators can approve or reject requests.")
     
-    # Get all requests for statistics
+    # Request statistics come from one grouped COUNT; only the rows on screen are fetched
+    site_filter = {} if user_type == 'admin' else {"project_site": st.session_state.get('current_project_site', 'Lifecamp Kafe')}
     try:
-        if user_type == 'admin':
-            # Admins see all requests - explicitly pass user_type for correct cache key
-            all_reqs = df_requests(status=None, user_type='admin', project_site=None)
-            print(f"🔍 DEBUG: Admin view - got {len(all_reqs)} requests")
-        else:
-            # Project site accounts: show stats for the entire current project site
-            # Explicitly pass user_type and project_site for correct cache key
-            current_project = st.session_state.get('current_project_site', 'Lifecamp Kafe')
-            all_reqs = df_requests(status=None, user_type='project_site', project_site=current_project)
-            print(f"🔍 DEBUG: Project site view - got {len(all_reqs)} requests for current project site")
+        status_counts = request_status_counts(**site_filter)
     except Exception as e:
 
-        print(f"DEBUG: Error getting requests: {e}")
-        all_reqs = pd.DataFrame()  # Empty DataFrame if error
+        print(f"DEBUG: Error counting requests: {e}")
+        status_counts = {"Pending": 0, "Approved": 0, "Rejected": 0, "Total": 0}
     
     # Show statistics for project site users
     if user_type != 'admin':
@@ -9761,10 +9591,10 @@ with tab4:
         st.markdown("### Request Statistics")
         
         # Calculate statistics
-        total_requests = len(all_reqs)
-        pending_requests = len(all_reqs[all_reqs['status'] == 'Pending']) if not all_reqs.empty else 0
-        approved_requests = len(all_reqs[all_reqs['status'] == 'Approved']) if not all_reqs.empty else 0
-        rejected_requests = len(all_reqs[all_reqs['status'] == 'Rejected']) if not all_reqs.empty else 0
+        total_requests = status_counts["Total"]
+        pending_requests = status_counts["Pending"]
+        approved_requests = status_counts["Approved"]
+        rejected_requests = status_counts["Rejected"]
         
         # Display metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -9782,10 +9612,10 @@ with tab4:
             st.metric("Rejected", rejected_requests)
         
         # Show recent requests
-        if not all_reqs.empty:
+        recent_reqs, _ = df_requests_page(limit=10, **site_filter)  # Show last 10 requests
+        if not recent_reqs.empty:
 
             st.markdown("### Recent Requests")
-            recent_reqs = all_reqs.head(10)  # Show last 10 requests
             
             # Format for display
             display_reqs = recent_reqs.copy()
@@ -9836,61 +9666,10 @@ with tab4:
             
             # Initialize Cumulative Requested column early to ensure it always exists
             display_reqs['Cumulative Requested'] = 0
-            
-            # Get item_id for each request and calculate cumulative quantities
-            from sqlalchemy import text
-            from db import get_engine
-            engine = get_engine()
-            request_ids = display_reqs['id'].tolist()
-            exceeds_planned_request_ids = set()
-            cumulative_qty_dict = {}  # Store cumulative quantities for each request
-            
-            if request_ids:
-                with engine.connect() as conn:
-                    # Get item_id for each request and calculate which requests first exceeded planned
-                    for req_id in request_ids:
-                        result = conn.execute(text("""
-                            SELECT r.item_id, r.qty, i.qty as planned_qty, r.building_subtype,
-                                   (SELECT COALESCE(SUM(r2.qty), 0) 
-                                    FROM requests r2 
-                                    WHERE r2.item_id = r.item_id 
-                                    AND r2.id <= r.id 
-                                    AND r2.status IN ('Pending', 'Approved')
-                                    AND COALESCE(r2.building_subtype, '') = COALESCE(r.building_subtype, '')
-                                   ) as cumulative_qty
-                            FROM requests r
-                            JOIN items i ON r.item_id = i.id
-                            WHERE r.id = :req_id
-                        """), {"req_id": req_id})
-                        row = result.fetchone()
-                        if row:
-                            item_id, req_qty, planned_qty, req_subtype, cumulative_qty = row
-                            subtype_norm = (req_subtype.strip() if isinstance(req_subtype, str) else req_subtype) or ""
-                            cumulative_qty_val = float(cumulative_qty) if cumulative_qty else 0
-                            planned_qty_val = float(planned_qty) if planned_qty else 0
-                            
-                            # Store cumulative quantity for ALL requests (not just when exceeding planned)
-                            cumulative_qty_dict[req_id] = cumulative_qty_val
-                            
-                            if planned_qty and cumulative_qty and float(cumulative_qty) > float(planned_qty):
-                                # Check if previous cumulative was <= planned (this is the first request that exceeded)
-                                prev_result = conn.execute(text("""
-                                    SELECT COALESCE(SUM(r2.qty), 0) 
-                                    FROM requests r2 
-                                    WHERE r2.item_id = :item_id 
-                                    AND r2.id < :req_id 
-                                    AND r2.status IN ('Pending', 'Approved')
-                                    AND COALESCE(r2.building_subtype, '') = :subtype_norm
-                                """), {"item_id": item_id, "req_id": req_id, "subtype_norm": subtype_norm})
-                                prev_cumulative = float(prev_result.fetchone()[0] or 0)
-                                if prev_cumulative <= float(planned_qty):
-                                    exceeds_planned_request_ids.add(req_id)
-            
-            # Update cumulative quantity column with calculated values
-            # Column was already initialized above, now populate with actual values
-            display_reqs['Cumulative Requested'] = display_reqs.apply(
-                lambda row: cumulative_qty_dict.get(row['id'], 0) if row['id'] in cumulative_qty_dict else 0, axis=1
-            )
+            # Cumulative requested qty and first-over-planned flag for every row in one query
+            cumulative = get_request_cumulative_quantities(display_reqs['id'].tolist())
+            exceeds_planned_request_ids = set(cumulative.index[cumulative['exceeds_planned']])
+            display_reqs['Cumulative Requested'] = display_reqs['id'].map(cumulative['cumulative_qty']).fillna(0)
             
             # Format approval/rejection timestamp - show only for approved/rejected requests
             def format_action_time(row):
@@ -10011,18 +9790,12 @@ with tab4:
 
         # Admin view - keep existing functionality
         # Always show Pending requests since Approved/Rejected have separate tabs
+        pending_filters = dict(render_request_filters("pending_review"), status="Pending", **site_filter)
         try:
-            # Explicitly pass user_type and project_site for correct cache keys
-            current_user_type = user_type
-            current_project_site = st.session_state.get('current_project_site', 'Lifecamp Kafe')
-            reqs = df_requests(
-                status="Pending",
-                user_type=current_user_type,
-                project_site=current_project_site if current_user_type != 'admin' else None
-            )
+            reqs, pending_total = load_request_pages("pending_review", df_requests_page, pending_filters)
         except Exception as e:
             print(f"DEBUG: Error getting requests: {e}")
-            reqs = pd.DataFrame()  # Empty DataFrame if error
+            reqs, pending_total = pd.DataFrame(), 0  # Empty DataFrame if error
         
         # Display requests - always show content
         if not reqs.empty:
@@ -10078,60 +9851,10 @@ with tab4:
             # Initialize Cumulative Requested column early to ensure it always exists
             display_reqs['Cumulative Requested'] = 0
             
-            # Get item_id for each request and calculate cumulative quantities
-            from sqlalchemy import text
-            from db import get_engine
-            engine = get_engine()
-            request_ids = display_reqs['id'].tolist()
-            exceeds_planned_request_ids = set()
-            cumulative_qty_dict = {}  # Store cumulative quantities for each request
-            
-            if request_ids:
-                with engine.connect() as conn:
-                    # Get item_id for each request and calculate which requests first exceeded planned
-                    for req_id in request_ids:
-                        result = conn.execute(text("""
-                            SELECT r.item_id, r.qty, i.qty as planned_qty, r.building_subtype,
-                                   (SELECT COALESCE(SUM(r2.qty), 0) 
-                                    FROM requests r2 
-                                    WHERE r2.item_id = r.item_id 
-                                    AND r2.id <= r.id 
-                                    AND r2.status IN ('Pending', 'Approved')
-                                    AND COALESCE(r2.building_subtype, '') = COALESCE(r.building_subtype, '')
-                                   ) as cumulative_qty
-                            FROM requests r
-                            JOIN items i ON r.item_id = i.id
-                            WHERE r.id = :req_id
-                        """), {"req_id": req_id})
-                        row = result.fetchone()
-                        if row:
-                            item_id, req_qty, planned_qty, req_subtype, cumulative_qty = row
-                            subtype_norm = (req_subtype.strip() if isinstance(req_subtype, str) else req_subtype) or ""
-                            cumulative_qty_val = float(cumulative_qty) if cumulative_qty else 0
-                            planned_qty_val = float(planned_qty) if planned_qty else 0
-                            
-                            # Store cumulative quantity for ALL requests (not just when exceeding planned)
-                            cumulative_qty_dict[req_id] = cumulative_qty_val
-                            
-                            if planned_qty and cumulative_qty and float(cumulative_qty) > float(planned_qty):
-                                # Check if previous cumulative was <= planned (this is the first request that exceeded)
-                                prev_result = conn.execute(text("""
-                                    SELECT COALESCE(SUM(r2.qty), 0) 
-                                    FROM requests r2 
-                                    WHERE r2.item_id = :item_id 
-                                    AND r2.id < :req_id 
-                                    AND r2.status IN ('Pending', 'Approved')
-                                    AND COALESCE(r2.building_subtype, '') = :subtype_norm
-                                """), {"item_id": item_id, "req_id": req_id, "subtype_norm": subtype_norm})
-                                prev_cumulative = float(prev_result.fetchone()[0] or 0)
-                                if prev_cumulative <= float(planned_qty):
-                                    exceeds_planned_request_ids.add(req_id)
-            
-            # Update cumulative quantity column with calculated values
-            # Column was already initialized above, now populate with actual values
-            display_reqs['Cumulative Requested'] = display_reqs.apply(
-                lambda row: cumulative_qty_dict.get(row['id'], 0) if row['id'] in cumulative_qty_dict else 0, axis=1
-            )
+            # Cumulative requested qty and first-over-planned flag for every row in one query
+            cumulative = get_request_cumulative_quantities(display_reqs['id'].tolist())
+            exceeds_planned_request_ids = set(cumulative.index[cumulative['exceeds_planned']])
+            display_reqs['Cumulative Requested'] = display_reqs['id'].map(cumulative['cumulative_qty']).fillna(0)
             
             # Select and rename columns for admin view
             display_columns = ['id', 'ts', 'item', 'Planned Qty', 'Requested Qty', 'Cumulative Requested', 'Planned Price', 'Current Price', 'Total Price', 'requested_by', 'project_site', 'Context', 'building_subtype', 'status', 'approved_by', 'note']
@@ -10212,20 +9935,18 @@ with tab4:
             )
             st.dataframe(styled_admin, use_container_width=True)
             
-            # Show request statistics - calculate from all_reqs (all requests), not filtered reqs (pending only)
+            render_load_more("pending_review", reqs, pending_total)
+            
+            # Show request statistics for all requests, not just the pending page on screen
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                pending_count = len(all_reqs[all_reqs['status'] == 'Pending']) if not all_reqs.empty else 0
-                st.metric("Pending", pending_count)
+                st.metric("Pending", status_counts["Pending"])
             with col2:
-                approved_count = len(all_reqs[all_reqs['status'] == 'Approved']) if not all_reqs.empty else 0
-                st.metric("Approved", approved_count)
+                st.metric("Approved", status_counts["Approved"])
             with col3:
-                rejected_count = len(all_reqs[all_reqs['status'] == 'Rejected']) if not all_reqs.empty else 0
-                st.metric("Rejected", rejected_count)
+                st.metric("Rejected", status_counts["Rejected"])
             with col4:
-                total_count = len(all_reqs)
-                st.metric("Total", total_count)
+                st.metric("Total", status_counts["Total"])
             
             # Add delete buttons as a separate section with table-like layout (Admin only)
             if not display_reqs.empty:
@@ -10290,81 +10011,9 @@ with tab4:
 
     # Only show approve/reject section for admins
     if is_admin():
-        st.write("Approve/Reject a request by ID:")
-        
-        # Get current action from session state (initialize if not set)
-        if 'approve_reject_action' not in st.session_state:
-            st.session_state['approve_reject_action'] = 'Approve'
-        
-        # Use regular widgets (not form) so rejection reason field can appear/disappear dynamically
-        colA, colB, colC = st.columns(3)
-        with colA:
-            req_id = st.number_input("Request ID", min_value=1, step=1, key="req_id_input")
-        with colB:
-            action = st.selectbox("Action", ["Approve","Reject","Set Pending"], 
-                                 key="action_select",
-                                 index=0 if st.session_state.get('approve_reject_action') == 'Approve' 
-                                       else (1 if st.session_state.get('approve_reject_action') == 'Reject' else 2))
-            # Update session state when action changes
-            if st.session_state.get('action_select') != st.session_state.get('approve_reject_action'):
-                st.session_state['approve_reject_action'] = st.session_state.get('action_select', 'Approve')
-        with colC:
-            approved_by = st.text_input("Approved/Rejected by:", key="approved_by_input")
-        
-        # Show rejection reason field only when "Reject" is selected
-        current_action = st.session_state.get('approve_reject_action', 'Approve')
-        rejection_reason = ""
-        if current_action == "Reject":
-            rejection_reason = st.text_area("Reason for Rejection", key="rejection_reason_input", 
-                                            help="This reason will be visible to the project site account", 
-                                            placeholder="Enter the reason for rejecting this request...")
-        
-        # Submit button
-        if st.button("Apply", type="primary", key="approve_reject_submit"):
-            # Update session state with current action
-            st.session_state['approve_reject_action'] = action
-            
-            # Preserve current tab before processing
-            current_tab_idx = st.session_state.get('active_tab_index', 3)  # Default to Review & History (tab 3)
-            set_active_tab_index(current_tab_idx)
-            
-            # Get rejection reason from session state if Reject was selected
-            rejection_reason_value = st.session_state.get('rejection_reason_input', '') if action == "Reject" else ""
-            
-            # Validate request ID
-            if req_id <= 0:
-                st.error("❌ Request ID must be greater than 0")
-            elif not approved_by or not approved_by.strip():
-                st.error("❌ Please enter the name of the person approving/rejecting")
-            elif action == "Reject" and not rejection_reason_value.strip():
-                st.error("❌ Please provide a reason for rejection")
-            else:
-                target_status = "Approved" if action=="Approve" else ("Rejected" if action=="Reject" else "Pending")
-                note_value = rejection_reason_value.strip() if action == "Reject" and rejection_reason_value.strip() else None
-                err = set_request_status(int(req_id), target_status, approved_by=approved_by or None, note=note_value)
-                if err:
-                    st.error(err)
-                else:
-                    st.success(f"Request {req_id} set to {target_status}.")
-                    
-                    # Show notification popup for admin
-                    notification_flag = "request_approved_notification" if target_status == "Approved" else "request_rejected_notification"
-                    st.markdown(f"""
-                    <script>
-                    localStorage.setItem('{notification_flag}', 'true');
-                    </script>
-                    """, unsafe_allow_html=True)
-                    
-                    # Clear cache to refresh data
-                    clear_cache()
-                    
-                    # Preserve tab after action
-                    preserve_current_tab()
-                    
-                    # Reset action to default after successful submission
-                    st.session_state['approve_reject_action'] = 'Approve'
-                    # Use preserve_current_tab before rerun to maintain tab state
-                    st.rerun()
+        render_approve_reject_panel()
+        with st.expander("Bulk Approve/Reject", expanded=False):
+            render_bulk_review_panel()
 
     st.divider()
     st.subheader("Complete Request Management")
@@ -10552,12 +10201,9 @@ with tab4:
     
     with hist_tab1:
         st.markdown("#### Approved Requests")
+        approved_filters = dict(render_request_filters("approved_history"), status='Approved', **site_filter)
         try:
-            if user_type == 'admin':
-                approved_reqs = df_requests(status='Approved', user_type='admin', project_site=None)
-            else:
-                current_project = st.session_state.get('current_project_site', 'Lifecamp Kafe')
-                approved_reqs = df_requests(status='Approved', user_type='project_site', project_site=current_project)
+            approved_reqs, approved_total = load_request_pages("approved_history", df_requests_page, approved_filters)
             
             if not approved_reqs.empty:
                 # Prepare data for hierarchical display
@@ -10617,55 +10263,10 @@ with tab4:
                 if 'approved_by' in display_approved.columns:
                     display_approved_render['Approved By'] = display_approved['approved_by'].fillna('')
                 
-                # Calculate cumulative quantities and exceeds_planned_request_ids
-                from sqlalchemy import text
-                from db import get_engine
-                engine = get_engine()
-                request_ids = display_approved_render['ID'].tolist()
-                exceeds_planned_request_ids = set()
-                cumulative_qty_dict = {}
-                
-                if request_ids:
-                    with engine.connect() as conn:
-                        for req_id in request_ids:
-                            result = conn.execute(text("""
-                                SELECT r.item_id, r.qty, i.qty as planned_qty, r.building_subtype,
-                                       (SELECT COALESCE(SUM(r2.qty), 0) 
-                                        FROM requests r2 
-                                        WHERE r2.item_id = r.item_id 
-                                        AND r2.id <= r.id 
-                                        AND r2.status IN ('Pending', 'Approved')
-                                        AND COALESCE(r2.building_subtype, '') = COALESCE(r.building_subtype, '')
-                                       ) as cumulative_qty
-                                FROM requests r
-                                JOIN items i ON r.item_id = i.id
-                                WHERE r.id = :req_id
-                            """), {"req_id": req_id})
-                            row = result.fetchone()
-                            if row:
-                                item_id, req_qty, planned_qty, req_subtype, cumulative_qty = row
-                                subtype_norm = (req_subtype.strip() if isinstance(req_subtype, str) else req_subtype) or ""
-                                cumulative_qty_val = float(cumulative_qty) if cumulative_qty else 0
-                                planned_qty_val = float(planned_qty) if planned_qty else 0
-                                
-                                cumulative_qty_dict[req_id] = cumulative_qty_val
-                                
-                                if planned_qty and cumulative_qty and float(cumulative_qty) > float(planned_qty):
-                                    prev_result = conn.execute(text("""
-                                        SELECT COALESCE(SUM(r2.qty), 0) 
-                                        FROM requests r2 
-                                        WHERE r2.item_id = :item_id 
-                                        AND r2.id < :req_id 
-                                        AND r2.status IN ('Pending', 'Approved')
-                                        AND COALESCE(r2.building_subtype, '') = :subtype_norm
-                                    """), {"item_id": item_id, "req_id": req_id, "subtype_norm": subtype_norm})
-                                    prev_cumulative = float(prev_result.fetchone()[0] or 0)
-                                    if prev_cumulative <= float(planned_qty):
-                                        exceeds_planned_request_ids.add(req_id)
-                
-                display_approved_render['Cumulative Requested'] = display_approved_render['ID'].apply(
-                    lambda req_id: cumulative_qty_dict.get(req_id, 0)
-                )
+                # Cumulative requested qty and first-over-planned flag for every row in one query
+                cumulative = get_request_cumulative_quantities(display_approved_render['ID'].tolist())
+                exceeds_planned_request_ids = set(cumulative.index[cumulative['exceeds_planned']])
+                display_approved_render['Cumulative Requested'] = display_approved_render['ID'].map(cumulative['cumulative_qty']).fillna(0)
                 
                 # Add Building Type & Budget (Context) column
                 display_approved_render['Building Type & Budget'] = display_approved.apply(format_request_context, axis=1)
@@ -10764,6 +10365,7 @@ with tab4:
                         render_hierarchical_requests(display_approved_render, "approved_global", highlight_approved, show_delete_buttons=True)
                 else:
                     render_hierarchical_requests(display_approved_render, "approved_user", highlight_approved, show_delete_buttons=True)
+                render_load_more("approved_history", approved_reqs, approved_total)
             else:
                 st.info("No approved requests found.")
         except Exception as e:
@@ -10772,12 +10374,9 @@ with tab4:
     
     with hist_tab2:
         st.markdown("#### Rejected Requests")
+        rejected_filters = dict(render_request_filters("rejected_history"), status='Rejected', **site_filter)
         try:
-            if user_type == 'admin':
-                rejected_reqs = df_requests(status='Rejected', user_type='admin', project_site=None)
-            else:
-                current_project = st.session_state.get('current_project_site', 'Lifecamp Kafe')
-                rejected_reqs = df_requests(status='Rejected', user_type='project_site', project_site=current_project)
+            rejected_reqs, rejected_total = load_request_pages("rejected_history", df_requests_page, rejected_filters)
             
             if not rejected_reqs.empty:
                 # Prepare data for hierarchical display
@@ -10837,55 +10436,10 @@ with tab4:
                 if 'approved_by' in display_rejected.columns:
                     display_rejected_render['Approved By'] = display_rejected['approved_by'].fillna('')
                 
-                # Calculate cumulative quantities and exceeds_planned_request_ids
-                from sqlalchemy import text
-                from db import get_engine
-                engine = get_engine()
-                request_ids = display_rejected_render['ID'].tolist()
-                exceeds_planned_request_ids = set()
-                cumulative_qty_dict = {}
-                
-                if request_ids:
-                    with engine.connect() as conn:
-                        for req_id in request_ids:
-                            result = conn.execute(text("""
-                                SELECT r.item_id, r.qty, i.qty as planned_qty, r.building_subtype,
-                                       (SELECT COALESCE(SUM(r2.qty), 0) 
-                                        FROM requests r2 
-                                        WHERE r2.item_id = r.item_id 
-                                        AND r2.id <= r.id 
-                                        AND r2.status IN ('Pending', 'Approved')
-                                        AND COALESCE(r2.building_subtype, '') = COALESCE(r.building_subtype, '')
-                                       ) as cumulative_qty
-                                FROM requests r
-                                JOIN items i ON r.item_id = i.id
-                                WHERE r.id = :req_id
-                            """), {"req_id": req_id})
-                            row = result.fetchone()
-                            if row:
-                                item_id, req_qty, planned_qty, req_subtype, cumulative_qty = row
-                                subtype_norm = (req_subtype.strip() if isinstance(req_subtype, str) else req_subtype) or ""
-                                cumulative_qty_val = float(cumulative_qty) if cumulative_qty else 0
-                                planned_qty_val = float(planned_qty) if planned_qty else 0
-                                
-                                cumulative_qty_dict[req_id] = cumulative_qty_val
-                                
-                                if planned_qty and cumulative_qty and float(cumulative_qty) > float(planned_qty):
-                                    prev_result = conn.execute(text("""
-                                        SELECT COALESCE(SUM(r2.qty), 0) 
-                                        FROM requests r2 
-                                        WHERE r2.item_id = :item_id 
-                                        AND r2.id < :req_id 
-                                        AND r2.status IN ('Pending', 'Approved')
-                                        AND COALESCE(r2.building_subtype, '') = :subtype_norm
-                                    """), {"item_id": item_id, "req_id": req_id, "subtype_norm": subtype_norm})
-                                    prev_cumulative = float(prev_result.fetchone()[0] or 0)
-                                    if prev_cumulative <= float(planned_qty):
-                                        exceeds_planned_request_ids.add(req_id)
-                
-                display_rejected_render['Cumulative Requested'] = display_rejected_render['ID'].apply(
-                    lambda req_id: cumulative_qty_dict.get(req_id, 0)
-                )
+                # Cumulative requested qty and first-over-planned flag for every row in one query
+                cumulative = get_request_cumulative_quantities(display_rejected_render['ID'].tolist())
+                exceeds_planned_request_ids = set(cumulative.index[cumulative['exceeds_planned']])
+                display_rejected_render['Cumulative Requested'] = display_rejected_render['ID'].map(cumulative['cumulative_qty']).fillna(0)
                 
                 # Add Building Type & Budget (Context) column
                 display_rejected_render['Building Type & Budget'] = display_rejected.apply(format_request_context, axis=1)
@@ -10984,6 +10538,7 @@ with tab4:
                         render_hierarchical_requests(display_rejected_render, "rejected_global", highlight_rejected, show_delete_buttons=True)
                 else:
                     render_hierarchical_requests(display_rejected_render, "rejected_user", highlight_rejected, show_delete_buttons=True)
+                render_load_more("rejected_history", rejected_reqs, rejected_total)
             else:
                 st.info("No rejected requests found.")
         except Exception as e:
@@ -10994,133 +10549,23 @@ with tab4:
 
 
         st.markdown("####  Deleted Requests History")
-        deleted_log = df_deleted_requests()
+        deleted_filters = render_request_filters("deleted_history", request_fields=False)
+        deleted_log, deleted_total = load_request_pages("deleted_history", df_deleted_requests_page, deleted_filters,
+                                                          cursor=deleted_page_cursor)
         if not deleted_log.empty:
             # Enhance deleted requests display with cumulative quantities and highlighting
             display_deleted = deleted_log.copy()
             
-            # Get item_id and project_site for each deleted request to calculate cumulative and group by project site
-            from sqlalchemy import text
-            from db import get_engine
-            engine = get_engine()
-            cumulative_qty_dict = {}
-            exceeds_planned_request_ids = set()
-            planned_qty_dict = {}
-            
-            # Add project_site, building_type, and budget columns by looking up from items table
-            if 'item_name' in display_deleted.columns:
-                deleted_item_meta = {}
-                with engine.connect() as conn:
-                    for idx, row in display_deleted.iterrows():
-                        item_name = row.get('item_name', '')
-                        metadata = {
-                            "project_site": 'Unknown',
-                            "building_type": '',
-                            "budget": ''
-                        }
-                        if item_name:
-                            try:
-                                result = conn.execute(text("""
-                                    SELECT project_site, building_type, budget
-                                    FROM items 
-                                    WHERE name = :item_name 
-                                    LIMIT 1
-                                """), {"item_name": item_name})
-                                item_row = result.fetchone()
-                                if item_row:
-                                    metadata["project_site"] = item_row[0] if item_row[0] else 'Unknown'
-                                    metadata["building_type"] = item_row[1] if item_row[1] else ''
-                                    metadata["budget"] = item_row[2] if item_row[2] else ''
-                            except Exception:
-                                pass
-                        deleted_item_meta[idx] = metadata
-                
-                display_deleted['project_site'] = display_deleted.index.map(lambda idx: deleted_item_meta.get(idx, {}).get('project_site', 'Unknown'))
-                display_deleted['building_type'] = display_deleted.index.map(lambda idx: deleted_item_meta.get(idx, {}).get('building_type', ''))
-                display_deleted['budget'] = display_deleted.index.map(lambda idx: deleted_item_meta.get(idx, {}).get('budget', ''))
-            
-            # Calculate cumulative quantities for deleted requests
-            if 'req_id' in display_deleted.columns:
-                with engine.connect() as conn:
-                    for idx, row in display_deleted.iterrows():
-                        req_id = row.get('req_id')
-                        item_name = row.get('item_name', '')
-                        deleted_qty = float(row.get('qty', 0)) if pd.notna(row.get('qty')) else 0
-                        
-                        if pd.notna(req_id) and req_id and item_name:
-                            try:
-                                # First, try to find item by name to get item_id and planned_qty
-                                item_result = conn.execute(text("""
-                                    SELECT id, qty as planned_qty
-                                    FROM items
-                                    WHERE name = :item_name
-                                    LIMIT 1
-                                """), {"item_name": item_name})
-                                item_row = item_result.fetchone()
-                                
-                                if item_row:
-                                    item_id, planned_qty = item_row
-                                    planned_qty_val = float(planned_qty) if planned_qty is not None else 0
-                                    planned_qty_dict[idx] = planned_qty_val
-                                    
-                                    # Calculate cumulative: sum of all requests (including deleted ones in deleted_requests)
-                                    # that have id <= req_id, plus any requests that still exist with id <= req_id
-                                    # Since deleted requests are removed from requests table, we need to:
-                                    # 1. Sum all existing requests with id < req_id
-                                    # 2. Add the deleted request's qty (this row)
-                                    # 3. Also check if there are other deleted requests with same item and id <= req_id
-                                    
-                                    # First, get cumulative from existing requests (id < req_id)
-                                    existing_result = conn.execute(text("""
-                                        SELECT COALESCE(SUM(r2.qty), 0) 
-                                        FROM requests r2 
-                                        WHERE r2.item_id = :item_id 
-                                        AND r2.id < :req_id
-                                        AND r2.status IN ('Pending', 'Approved')
-                                    """), {"item_id": item_id, "req_id": int(req_id)})
-                                    existing_row = existing_result.fetchone()
-                                    existing_cumulative = float(existing_row[0] or 0) if existing_row else 0
-                                    
-                                    # Add cumulative from deleted requests with same item and req_id < current req_id
-                                    # Note: We need to match by item_name since deleted_requests doesn't have item_id
-                                    deleted_result = conn.execute(text("""
-                                        SELECT COALESCE(SUM(dr.qty), 0)
-                                        FROM deleted_requests dr
-                                        WHERE dr.item_name = :item_name
-                                        AND dr.req_id < :req_id
-                                    """), {"item_name": item_name, "req_id": int(req_id)})
-                                    deleted_row = deleted_result.fetchone()
-                                    deleted_cumulative = float(deleted_row[0] or 0) if deleted_row else 0
-                                    
-                                    # Total cumulative = existing + deleted (before this) + this deleted request
-                                    cumulative_qty_val = existing_cumulative + deleted_cumulative + deleted_qty
-                                    
-                                    cumulative_qty_dict[idx] = cumulative_qty_val
-                                    
-                                    # Check if this request exceeded planned
-                                    if planned_qty_val > 0 and cumulative_qty_val > planned_qty_val:
-                                        # Check if previous cumulative (before this request) was <= planned
-                                        prev_cumulative = existing_cumulative + deleted_cumulative
-                                        if prev_cumulative <= planned_qty_val:
-                                            exceeds_planned_request_ids.add(idx)
-                                else:
-                                    # Item not found - set defaults
-                                    planned_qty_dict[idx] = 0
-                                    cumulative_qty_dict[idx] = deleted_qty
-                            except Exception as e:
-                                print(f"Error calculating cumulative for deleted request {req_id}: {e}")
-                                # Set defaults on error
-                                planned_qty_dict[idx] = 0
-                                cumulative_qty_dict[idx] = deleted_qty
-                                continue
-            
-            # Add cumulative and planned qty columns
-            display_deleted['Cumulative Requested'] = display_deleted.apply(
-                lambda row: cumulative_qty_dict.get(row.name, 0), axis=1
-            )
-            display_deleted['Planned Qty'] = display_deleted.apply(
-                lambda row: planned_qty_dict.get(row.name, 0), axis=1
-            )
+            # Site/type/budget, planned qty and cumulative requested qty for the rows on screen in one query
+            deleted_cumulative = get_deleted_request_cumulative_quantities(display_deleted['id'])
+            deleted_ids = display_deleted['id']
+            display_deleted['project_site'] = deleted_ids.map(deleted_cumulative['project_site']).fillna('Unknown')
+            display_deleted['building_type'] = deleted_ids.map(deleted_cumulative['building_type']).fillna('')
+            display_deleted['budget'] = deleted_ids.map(deleted_cumulative['budget']).fillna('')
+            display_deleted['Cumulative Requested'] = deleted_ids.map(deleted_cumulative['cumulative_qty']).fillna(0)
+            display_deleted['Planned Qty'] = deleted_ids.map(deleted_cumulative['planned_qty']).fillna(0)
+            exceeds_flags = deleted_ids.map(deleted_cumulative['exceeds_planned']).fillna(False).astype(bool)
+            exceeds_planned_request_ids = set(display_deleted.index[exceeds_flags])
             
             # Format deleted_at timestamp
             def format_deleted_time(ts):
@@ -11365,6 +10810,7 @@ with tab4:
                     render_hierarchical_requests(display_deleted_render, "deleted_global", highlight_deleted, show_delete_buttons=False)
             else:
                 render_hierarchical_requests(display_deleted_render, "deleted_user", highlight_deleted, show_delete_buttons=False)
+            render_load_more("deleted_history", deleted_log, deleted_total)
             
             st.caption("All deleted requests are logged here - includes previously Pending, Approved, and Rejected requests that were deleted.")
             
@@ -11392,9 +10838,178 @@ with tab4:
         else:
 
             st.info("No deleted requests found in history.")
+
+# -------------------------------- Tab 7: Admin Settings --------------------------------
+@st.fragment
+def render_admin_notifications_panel():
+    """Admin notification list and log - mark-read/delete rerun only this panel"""
+    # Display unread notifications
+    notifications = get_admin_notifications()
+    if notifications:
+
+        st.markdown("#### New Notifications")
+        st.caption(f"Found {len(notifications)} unread notifications")
+        for notification in notifications:
+
+            with st.container():
+
+
+                st.write(f"**{notification['title']}** - {notification['created_at']}")
+                st.write(f"*{notification['message']}*")
+
+                col1, col2, col3 = st.columns([1, 1, 1])
+                with col1:
+
+                    if st.button("Mark as Read", key=f"mark_read_{notification['id']}"):
+
+                        if mark_notification_read(notification['id']):
+                            # Only this panel reruns to show the updated list
+                            rerun_fragment()
+                with col2:
+
+                    if notification['request_id']:
+
+                        if st.button("View Request", key=f"view_request_{notification['id']}"):
+                            st.info("Navigate to Review & History tab to view the request")
+                with col3:
+
+                    if st.button("Delete", key=f"delete_notification_{notification['id']}", type="secondary"):
+
+                        if delete_notification(notification['id']):
+                            # Only this panel reruns to show the updated list
+                            rerun_fragment()
+                        else:
+                            st.error("Failed to delete notification")
+        st.divider()
+    else:
+        st.info("No new notifications")
+
+    # Notification Log - All notifications (read and unread) in its own expander
+    with st.expander("📋 Notification Log", expanded=False):
+        all_notifications = get_all_notifications()
+        if all_notifications:
+            for notification in all_notifications[:10]:  # Show last 10 notifications
+                status_icon = "🔔" if notification['is_read'] == 0 else "✅"
+
+                # Parse message to extract building type and budget information
+                message = notification['message']
+                building_type = "Unknown"
+                budget = "Unknown"
+
+                # Extract building type and budget from message if available
+                if "(" in message and ")" in message:
+                    # Look for pattern like "(Materials - Building Type - Budget)"
+                    parts = message.split("(")
+                    if len(parts) > 1:
+                        details = parts[1].split(")")[0]
+                        detail_parts = details.split(" - ")
+                        if len(detail_parts) >= 3:
+                            building_type = detail_parts[1] if len(detail_parts) > 1 else "Unknown"
+                            budget = detail_parts[2] if len(detail_parts) > 2 else "Unknown"
+
+                # Display notification with enhanced formatting
+                with st.container():
+                    st.markdown(f"**{status_icon} {notification['title']}** - *{notification['created_at']} (Nigerian Time)*")
+
+                    # Show building type and budget prominently
+                    col1, col2, col3 = st.columns([2, 1, 1])
+                    with col1:
+                        st.write(f"*{message}*")
+                    with col2:
+                        st.info(f"**Building:** {building_type}")
+                    with col3:
+                        st.info(f"**Budget:** {budget}")
+
+                    # Add delete button for each notification in log
+                    col1, col2 = st.columns([3, 1])
+                    with col2:
+                        if st.button("Delete", key=f"delete_log_notification_{notification['id']}", type="secondary"):
+                            if delete_notification(notification['id']):
+                                # Only this panel reruns to show the updated list
+                                rerun_fragment()
+                            else:
+                                st.error("Failed to delete notification")
+
+                    st.divider()
+        else:
+            st.info("No notifications in log")
+
+def render_performance_profiler_panel():
+    """Cache limits and counters, then the slowest sections, queries per rerun and cache hit rate of the last recorded reruns"""
+    from modules import profiler
+
+    enabled = st.toggle("Record reruns", value=profiler.profiler_enabled(), key="profiler_enabled_toggle",
+                        help="Times sections, data functions and SQL queries of every rerun in this server process")
+    if enabled != profiler.profiler_enabled():
+        profiler.set_profiler_enabled(enabled)
+
+    # Cache counters are kept whether or not reruns are recorded
+    st.markdown("#### Caches")
+    st.caption("Since this server process started. Coalesced calls waited for another session's computation.")
+    st.dataframe(pd.DataFrame(cache_stats()), use_container_width=True, hide_index=True)
+
+    reruns = profiler.get_recent_reruns()
+    if not reruns:
+        st.info("No reruns recorded yet. Turn recording on (or set PERF_PROFILER=1) and use the app.")
+        return
+
+    summary = profiler.summarize_reruns(reruns)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Reruns", summary["reruns"])
+    with col2:
+        st.metric("Avg Rerun", f"{summary['avg_rerun_ms']:.0f} ms")
+    with col3:
+        st.metric("Queries / Rerun", summary["queries_per_rerun"], help=f"{summary['query_ms_per_rerun']:.0f} ms of SQL per rerun")
+    with col4:
+        hit_rate = summary["cache_hit_rate"]
+        st.metric("Cache Hit Rate", f"{hit_rate:.0%}" if hit_rate is not None else "n/a")
+
+    st.markdown("#### Slowest Sections")
+    st.dataframe(pd.DataFrame(summary["sections"]), use_container_width=True, hide_index=True)
+    st.markdown("#### Data Functions")
+    st.dataframe(pd.DataFrame(summary["functions"]), use_container_width=True, hide_index=True)
+    st.markdown("#### Recent Reruns")
+    recent = pd.DataFrame([
+        {"started_at": rerun["started_at"], "section": rerun["label"], "total_ms": rerun["total_ms"],
+         "queries": rerun["queries"], "query_ms": rerun["query_ms"]}
+        for rerun in reversed(reruns)
+    ])
+    st.dataframe(recent, use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("📥 Export Profile JSON", profiler.export_json(), "rerun_profile.json", "application/json")
+    with col2:
+        if st.button("Clear History", key="profiler_clear_history"):
+            profiler.clear_history()
+
+def render_maintenance_panel():
+    """Last run of each background housekeeping job, on any server process"""
+    st.caption("Retention purges, planner statistics and compaction run in the background on one server "
+               "process at a time. Times are local (WAT).")
+    try:
+        runs = get_maintenance_runs()
+    except Exception as e:
+        st.error(f"Error loading maintenance runs: {e}")
+        return
+    st.dataframe(pd.DataFrame(runs), use_container_width=True, hide_index=True)
+    if st.button("Run All Jobs Now", key="maintenance_run_now",
+                 help="Runs every job on this request (skipped while another server process is running them)"):
+        with st.spinner("Running maintenance jobs..."):
+            runs = run_due_jobs(force=True)
+        if runs:
+            failed = [run["job"] for run in runs if run["status"] != "ok"]
+            if failed:
+                st.error(f"Failed: {', '.join(failed)}")
+            else:
+                st.success(f"Ran {len(runs)} jobs")
+        else:
+            st.info("Another server process is running maintenance right now")
+
 if st.session_state.get('user_type') == 'admin':
 
-    with tab7:
+    if current_active_tab == 6:
 
 
         st.subheader("System Administration")
@@ -11796,7 +11411,7 @@ if st.session_state.get('user_type') == 'admin':
             
                 # Build query with proper parameterized filters
                 query = text("""
-                    SELECT access_code, user_name, access_time, success, role
+                    SELECT access_code, user_name, access_time, success, role, details
                     FROM access_logs 
                     WHERE access_time >= :cutoff_date
                 """)
@@ -11837,9 +11452,10 @@ if st.session_state.get('user_type') == 'admin':
                     logs_df['User'] = logs_df['user_name']
                     logs_df['Role'] = logs_df['role'].str.title()
                     logs_df['Access Code'] = logs_df['access_code']
+                    logs_df['Details'] = logs_df['details'].fillna('')
                     
-                    display_logs = logs_df[['User', 'Role', 'Access Code', 'Access DateTime', 'Status']].copy()
-                    display_logs.columns = ['User', 'Role', 'Access Code', 'Date & Time', 'Status']
+                    display_logs = logs_df[['User', 'Role', 'Access Code', 'Access DateTime', 'Status', 'Details']].copy()
+                    display_logs.columns = ['User', 'Role', 'Access Code', 'Date & Time', 'Status', 'Details']
                 
                     # Display access logs
                     st.markdown("#### Access Log Details")
@@ -11919,329 +11535,257 @@ if st.session_state.get('user_type') == 'admin':
                 st.info("Access logs are temporarily unavailable. Please try again later.")
         # Notifications Management - Dropdown
         with st.expander("Notifications", expanded=False):
+            render_admin_notifications_panel()
 
-            # Display unread notifications
-            notifications = get_admin_notifications()
-            if notifications:
+        # Rerun profiler - opt-in, keeps the last PERF_PROFILER_HISTORY reruns in memory
+        with st.expander("Performance Profiler", expanded=False):
+            render_performance_profiler_panel()
 
-                st.markdown("#### New Notifications")
-                st.caption(f"Found {len(notifications)} unread notifications")
-                for notification in notifications:
+        # Background housekeeping jobs (modules/maintenance.py)
+        with st.expander("Maintenance", expanded=False):
+            render_maintenance_panel()
 
-                    with st.container():
+# -------------------------------- Project Site Notifications Tab --------------------------------
+@st.fragment
+def render_project_site_notifications_panel():
+    """Notifications for a project site account - mark-read reruns only this panel"""
+    st.subheader("Your Notifications")
+    st.caption("View all notifications about your requests - approvals, rejections, and submissions")
 
+    # Initialize session state for tracking dismissed synthetic notifications
+    if 'dismissed_synthetic_notifs' not in st.session_state:
+        st.session_state.dismissed_synthetic_notifs = set()
 
-                        st.write(f"**{notification['title']}** - {notification['created_at']}")
-                        st.write(f"*{notification['message']}*")
-                        
-                        col1, col2, col3 = st.columns([1, 1, 1])
-                        with col1:
+    try:
+        # Get notifications for this project site
+        ps_notifications = get_project_site_notifications()
 
-                            if st.button("Mark as Read", key=f"mark_read_{notification['id']}"):
+        # Filter out dismissed synthetic notifications (negative IDs)
+        ps_notifications = [
+            n for n in ps_notifications 
+            if n.get('id', 0) >= 0 or n.get('id', 0) not in st.session_state.dismissed_synthetic_notifs
+        ]
 
-                                if mark_notification_read(notification['id']):
-                                    st.success("Notification marked as read!")
-                                    # Don't use st.rerun() - let the page refresh naturally
-                        with col2:
+        # Debug output
+        if ps_notifications:
+            st.caption(f"Found {len(ps_notifications)} notifications")
 
-                            if notification['request_id']:
+        if ps_notifications:
+            # Professional summary metrics
+            total_count = len(ps_notifications)
+            unread_count = len([n for n in ps_notifications if not n.get('is_read')])
+            read_count = total_count - unread_count
 
-                                if st.button("View Request", key=f"view_request_{notification['id']}"):
-                                    st.info("Navigate to Review & History tab to view the request")
-                        with col3:
+            st.markdown("### Notification Summary")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Total", total_count)
+            with col2:
+                st.metric("Unread", unread_count, delta=None)
+            with col3:
+                st.metric("Read", read_count)
+            with col4:
+                completion_pct = round((read_count / total_count * 100) if total_count > 0 else 0, 1)
+                st.metric("Completion", f"{completion_pct}%")
 
-                            if st.button("Delete", key=f"delete_notification_{notification['id']}", type="secondary"):
+            st.markdown("---")
 
-                                if delete_notification(notification['id']):
-                                    st.success("Notification deleted!")
-                                    # Don't use st.rerun() - let the page refresh naturally
-                                else:
-                                    st.error("Failed to delete notification")
-                st.divider()
-            else:
-                st.info("No new notifications")
-            
-            # Notification Log - All notifications (read and unread) in its own expander
-            with st.expander("📋 Notification Log", expanded=False):
-                all_notifications = get_all_notifications()
-                if all_notifications:
-                    for notification in all_notifications[:10]:  # Show last 10 notifications
-                        status_icon = "🔔" if notification['is_read'] == 0 else "✅"
-                        
-                        # Parse message to extract building type and budget information
-                        message = notification['message']
-                        building_type = "Unknown"
-                        budget = "Unknown"
-                        
-                        # Extract building type and budget from message if available
-                        if "(" in message and ")" in message:
-                            # Look for pattern like "(Materials - Building Type - Budget)"
-                            parts = message.split("(")
-                            if len(parts) > 1:
-                                details = parts[1].split(")")[0]
-                                detail_parts = details.split(" - ")
-                                if len(detail_parts) >= 3:
-                                    building_type = detail_parts[1] if len(detail_parts) > 1 else "Unknown"
-                                    budget = detail_parts[2] if len(detail_parts) > 2 else "Unknown"
-                        
-                        # Display notification with enhanced formatting
+            # Split notifications into unread and read groups
+            unread_notifications = [n for n in ps_notifications if not n.get('is_read', False)]
+            read_notifications = [n for n in ps_notifications if n.get('is_read', False)]
+
+            # Show unread notifications in an expander
+            if unread_notifications:
+                with st.expander(f"🔔 Unread Notifications ({len(unread_notifications)})", expanded=True):
+                    for idx, notification in enumerate(unread_notifications):
+                        notif_id = notification.get('id')
+                        notif_type = notification.get('type', '')
+                        title = notification.get('title', '')
+                        message = notification.get('message', '')
+                        request_id = notification.get('request_id')
+                        created_at = notification.get('created_at', '')
+                        approved_by = notification.get('approved_by')
+
+                        # Escape HTML in message and title to prevent HTML code from showing
+                        import html
+                        message_escaped = html.escape(message)
+                        title_escaped = html.escape(title)
+
+                        # Professional color scheme
+                        if notif_type == 'request_approved':
+                            bg_color = "#f0fdf4"  # green-50
+                            border_color = "#22c55e"  # green-500
+                            status_badge = "Approved"
+                            badge_color = "#16a34a"
+                        elif notif_type == 'request_rejected':
+                            bg_color = "#fef2f2"  # red-50
+                            border_color = "#ef4444"  # red-500
+                            status_badge = "Rejected"
+                            badge_color = "#dc2626"
+                        else:
+                            bg_color = "#eff6ff"  # blue-50
+                            border_color = "#3b82f6"  # blue-500
+                            status_badge = "Submitted"
+                            badge_color = "#2563eb"
+
+                        # Build approved_by HTML
+                        approved_by_html = ""
+                        if approved_by and notif_type in ['request_approved', 'request_rejected']:
+                            approved_by_html = f'<div style="font-size: 0.7rem; color: #9ca3af; margin-top: 0.25rem;">Approved by: {approved_by or "Admin"}</div>'
+
+                        # Professional card design
                         with st.container():
-                            st.markdown(f"**{status_icon} {notification['title']}** - *{notification['created_at']} (Nigerian Time)*")
-                            
-                            # Show building type and budget prominently
-                            col1, col2, col3 = st.columns([2, 1, 1])
+                            # Build HTML string to avoid f-string parsing issues
+                            html_content = f'<div style="border: 1px solid {border_color}; border-left: 4px solid {border_color}; background: {bg_color}; padding: 1rem; margin: 0.75rem 0; border-radius: 6px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);"><div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 0.5rem;"><div style="flex: 1;"><span style="background: {badge_color}; color: white; padding: 0.25rem 0.75rem; border-radius: 4px; font-size: 0.75rem; font-weight: 600; text-transform: uppercase;">{status_badge}</span><h4 style="margin: 0.5rem 0 0.25rem 0; font-size: 1rem; font-weight: 600; color: #1f2937;">{title_escaped}</h4></div><div style="text-align: right;"><div style="font-size: 0.75rem; color: #6b7280; font-weight: 500;">{created_at}</div>{approved_by_html}</div></div><p style="margin: 0.5rem 0 0; font-size: 0.9rem; color: #374151; line-height: 1.5;">{message_escaped}</p><div style="margin-top: 0.75rem; font-size: 0.75rem; color: #6b7280;">Request ID: <strong>#{request_id}</strong></div></div>'
+                            st.markdown(html_content, unsafe_allow_html=True)
+
+                            # Action buttons
+                            col1, col2, col3 = st.columns([2, 2, 6])
                             with col1:
-                                st.write(f"*{message}*")
-                            with col2:
-                                st.info(f"**Building:** {building_type}")
-                            with col3:
-                                st.info(f"**Budget:** {budget}")
-                            
-                            # Add delete button for each notification in log
-                            col1, col2 = st.columns([3, 1])
+                                if st.button("Mark as Read", key=f"mark_read_{notif_id}", type="secondary", use_container_width=True):
+                                    try:
+                                        notif_id_val = notif_id
+                                        request_id_val = request_id
+
+                                        from sqlalchemy import text
+                                        from db import get_engine
+                                        engine = get_engine()
+
+                                        with engine.begin() as conn:
+                                            if notif_id_val < 0:
+                                                # Synthetic notification - create actual notification record in DB marked as read
+                                                if request_id_val:
+                                                    # Check if notification already exists
+                                                    existing = conn.execute(text(
+                                                        "SELECT id FROM notifications WHERE request_id = :req_id AND notification_type IN ('request_approved', 'request_rejected')"
+                                                    ), {"req_id": request_id_val}).fetchone()
+
+                                                    if existing:
+                                                        # Update existing notification to read
+                                                        mark_notifications_read(conn, [existing[0]])
+                                                    else:
+                                                        # Create new notification record marked as read
+                                                        notif_type_val = notif_type
+                                                        title_val = title
+                                                        message_val = message
+                                                        created_at_val = created_at
+
+                                                        # Convert Nigerian time back to ISO if needed
+                                                        from datetime import datetime
+                                                        import pytz
+                                                        try:
+                                                            if isinstance(created_at_val, str) and 'WAT' in created_at_val:
+                                                                dt_str = created_at_val.replace(' WAT', '')
+                                                                dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
+                                                                lagos_tz = pytz.timezone('Africa/Lagos')
+                                                                dt = lagos_tz.localize(dt)
+                                                                created_at_iso = dt.isoformat()
+                                                            else:
+                                                                created_at_iso = get_nigerian_time_iso()
+                                                        except:
+                                                            created_at_iso = get_nigerian_time_iso()
+
+                                                        inserted = conn.execute(text('''
+                                                            INSERT INTO notifications (notification_type, title, message, user_id, request_id, created_at, is_read)
+                                                            VALUES (:notification_type, :title, :message, NULL, :request_id, :created_at, 1)
+                                                            RETURNING id
+                                                        '''), {
+                                                            "notification_type": notif_type_val,
+                                                            "title": title_val,
+                                                            "message": message_val,
+                                                            "request_id": request_id_val,
+                                                            "created_at": created_at_iso
+                                                        })
+                                                        add_notifications_to_summary(conn, [inserted.scalar()])
+                                            else:
+                                                # Real notification - update database
+                                                mark_notifications_read(conn, [notif_id_val])
+
+                                        # Notifications aren't cached - rerun only this panel to move the card to "read"
+                                        rerun_fragment()
+                                    except Exception as e:
+                                        st.error(f"Error: {e}")
                             with col2:
-                                if st.button("Delete", key=f"delete_log_notification_{notification['id']}", type="secondary"):
-                                    if delete_notification(notification['id']):
-                                        st.success("Notification deleted!")
-                                        # Don't use st.rerun() - let the page refresh naturally
-                                    else:
-                                        st.error("Failed to delete notification")
-                            
-                            st.divider()
-                else:
-                    st.info("No notifications in log")
+                                if request_id:
+                                    if st.button("View Details", key=f"view_req_{notif_id}", use_container_width=True):
+                                        st.info(f"Request ID: {request_id} - View in 'Review & History' tab")
+
+                            if idx < len(unread_notifications) - 1:
+                                st.markdown("<div style='margin: 0.5rem 0;'></div>", unsafe_allow_html=True)
+
+            # Always show read notifications expander if there are any
+            if read_notifications:
+                st.markdown("---")
+                with st.expander(f"Read Notifications ({len(read_notifications)})", expanded=False):
+                    for idx, notification in enumerate(read_notifications):
+                        notif_id = notification.get('id')
+                        notif_type = notification.get('type', '')
+                        title = notification.get('title', '')
+                        message = notification.get('message', '')
+                        request_id = notification.get('request_id')
+                        created_at = notification.get('created_at', '')
+                        approved_by = notification.get('approved_by')
+
+                        # Escape HTML in message and title to prevent HTML code from showing
+                        import html
+                        message_escaped = html.escape(message)
+                        title_escaped = html.escape(title)
+
+                        # Professional color scheme (muted for read)
+                        if notif_type == 'request_approved':
+                            bg_color = "#f0fdf4"  # green-50
+                            border_color = "#86efac"  # lighter green
+                            status_badge = "Approved"
+                            badge_color = "#22c55e"
+                        elif notif_type == 'request_rejected':
+                            bg_color = "#fef2f2"  # red-50
+                            border_color = "#fca5a5"  # lighter red
+                            status_badge = "Rejected"
+                            badge_color = "#ef4444"
+                        else:
+                            bg_color = "#eff6ff"  # blue-50
+                            border_color = "#93c5fd"  # lighter blue
+                            status_badge = "Submitted"
+                            badge_color = "#3b82f6"
+
+                        # Build approved_by HTML
+                        approved_by_html = ""
+                        if approved_by and notif_type in ['request_approved', 'request_rejected']:
+                            approved_by_html = f'<div style="font-size: 0.7rem; color: #9ca3af; margin-top: 0.25rem;">Approved by: {approved_by or "Admin"}</div>'
+
+                        # Professional card design (muted for read)
+                        # Build HTML string to avoid f-string parsing issues
+                        html_content = f'<div style="border: 1px solid {border_color}; border-left: 4px solid {border_color}; background: {bg_color}; padding: 1rem; margin: 0.75rem 0; border-radius: 6px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); opacity: 0.85;"><div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 0.5rem;"><div style="flex: 1;"><span style="background: {badge_color}; color: white; padding: 0.25rem 0.75rem; border-radius: 4px; font-size: 0.75rem; font-weight: 600; text-transform: uppercase;">{status_badge}</span><h4 style="margin: 0.5rem 0 0.25rem 0; font-size: 1rem; font-weight: 600; color: #1f2937;">{title_escaped}</h4></div><div style="text-align: right;"><div style="font-size: 0.75rem; color: #6b7280; font-weight: 500;">{created_at}</div>{approved_by_html}</div></div><p style="margin: 0.5rem 0 0; font-size: 0.9rem; color: #374151; line-height: 1.5;">{message_escaped}</p><div style="margin-top: 0.75rem; font-size: 0.75rem; color: #6b7280;">Request ID: <strong>#{request_id}</strong></div></div>'
+                        st.markdown(html_content, unsafe_allow_html=True)
+
+                        if request_id:
+                            if st.button("View Details", key=f"view_read_all_{notif_id}", use_container_width=True):
+                                st.info(f"Request ID: {request_id} - View in 'Review & History' tab")
+
+                        if idx < len(read_notifications) - 1:
+                            st.markdown("<div style='margin: 0.5rem 0;'></div>", unsafe_allow_html=True)
+        else:
+            st.info("No notifications yet")
+            st.caption("You'll receive notifications here when your requests are approved or rejected by an admin.")
+            st.markdown("""
+            **What you'll see:**
+            - Approval notifications when an admin approves your request
+            - Rejection notifications when an admin rejects your request  
+            - Submission confirmations when you submit a new request
+            """)
+
+    except Exception as e:
+        st.error(f"Error loading notifications: {e}")
+        print(f"❌ Project site notifications error: {e}")
+
 
-# -------------------------------- Project Site Notifications Tab --------------------------------
 # Only show for project site accounts (not admins)
 if st.session_state.get('user_type') != 'admin':
-    with tab7:  # Notifications tab for project site accounts
-        st.subheader("Your Notifications")
-        st.caption("View all notifications about your requests - approvals, rejections, and submissions")
-        
-        # Initialize session state for tracking dismissed synthetic notifications
-        if 'dismissed_synthetic_notifs' not in st.session_state:
-            st.session_state.dismissed_synthetic_notifs = set()
-        
-        try:
-            # Get notifications for this project site
-            ps_notifications = get_project_site_notifications()
-            
-            # Filter out dismissed synthetic notifications (negative IDs)
-            ps_notifications = [
-                n for n in ps_notifications 
-                if n.get('id', 0) >= 0 or n.get('id', 0) not in st.session_state.dismissed_synthetic_notifs
-            ]
-            
-            # Debug output
-            if ps_notifications:
-                st.caption(f"Found {len(ps_notifications)} notifications")
-            
-            if ps_notifications:
-                # Professional summary metrics
-                total_count = len(ps_notifications)
-                unread_count = len([n for n in ps_notifications if not n.get('is_read')])
-                read_count = total_count - unread_count
-                
-                st.markdown("### Notification Summary")
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Total", total_count)
-                with col2:
-                    st.metric("Unread", unread_count, delta=None)
-                with col3:
-                    st.metric("Read", read_count)
-                with col4:
-                    completion_pct = round((read_count / total_count * 100) if total_count > 0 else 0, 1)
-                    st.metric("Completion", f"{completion_pct}%")
-                
-                st.markdown("---")
-                
-                # Split notifications into unread and read groups
-                unread_notifications = [n for n in ps_notifications if not n.get('is_read', False)]
-                read_notifications = [n for n in ps_notifications if n.get('is_read', False)]
-                
-                # Show unread notifications in an expander
-                if unread_notifications:
-                    with st.expander(f"🔔 Unread Notifications ({len(unread_notifications)})", expanded=True):
-                        for idx, notification in enumerate(unread_notifications):
-                            notif_id = notification.get('id')
-                            notif_type = notification.get('type', '')
-                            title = notification.get('title', '')
-                            message = notification.get('message', '')
-                            request_id = notification.get('request_id')
-                            created_at = notification.get('created_at', '')
-                            is_read = notification.get('is_read', False)
-                            approved_by = notification.get('approved_by')
-                            
-                            # Escape HTML in message and title to prevent HTML code from showing
-                            import html
-                            message_escaped = html.escape(message)
-                            title_escaped = html.escape(title)
-                            
-                            # Professional color scheme
-                            if notif_type == 'request_approved':
-                                bg_color = "#f0fdf4"  # green-50
-                                border_color = "#22c55e"  # green-500
-                                status_badge = "Approved"
-                                badge_color = "#16a34a"
-                            elif notif_type == 'request_rejected':
-                                bg_color = "#fef2f2"  # red-50
-                                border_color = "#ef4444"  # red-500
-                                status_badge = "Rejected"
-                                badge_color = "#dc2626"
-                            else:
-                                bg_color = "#eff6ff"  # blue-50
-                                border_color = "#3b82f6"  # blue-500
-                                status_badge = "Submitted"
-                                badge_color = "#2563eb"
-                            
-                            # Build approved_by HTML
-                            approved_by_html = ""
-                            if approved_by and notif_type in ['request_approved', 'request_rejected']:
-                                approved_by_html = f'<div style="font-size: 0.7rem; color: #9ca3af; margin-top: 0.25rem;">Approved by: {approved_by or "Admin"}</div>'
-                            
-                            # Professional card design
-                            with st.container():
-                                # Build HTML string to avoid f-string parsing issues
-                                html_content = f'<div style="border: 1px solid {border_color}; border-left: 4px solid {border_color}; background: {bg_color}; padding: 1rem; margin: 0.75rem 0; border-radius: 6px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);"><div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 0.5rem;"><div style="flex: 1;"><span style="background: {badge_color}; color: white; padding: 0.25rem 0.75rem; border-radius: 4px; font-size: 0.75rem; font-weight: 600; text-transform: uppercase;">{status_badge}</span><h4 style="margin: 0.5rem 0 0.25rem 0; font-size: 1rem; font-weight: 600; color: #1f2937;">{title_escaped}</h4></div><div style="text-align: right;"><div style="font-size: 0.75rem; color: #6b7280; font-weight: 500;">{created_at}</div>{approved_by_html}</div></div><p style="margin: 0.5rem 0 0; font-size: 0.9rem; color: #374151; line-height: 1.5;">{message_escaped}</p><div style="margin-top: 0.75rem; font-size: 0.75rem; color: #6b7280;">Request ID: <strong>#{request_id}</strong></div></div>'
-                                st.markdown(html_content, unsafe_allow_html=True)
-                                
-                                # Action buttons
-                                col1, col2, col3 = st.columns([2, 2, 6])
-                                with col1:
-                                    if st.button("Mark as Read", key=f"mark_read_{notif_id}", type="secondary", use_container_width=True):
-                                        try:
-                                            notif_id_val = notif_id
-                                            request_id_val = request_id
-                                            
-                                            from sqlalchemy import text
-                                            from db import get_engine
-                                            engine = get_engine()
-                                            
-                                            with engine.begin() as conn:
-                                                if notif_id_val < 0:
-                                                    # Synthetic notification - create actual notification record in DB marked as read
-                                                    if request_id_val:
-                                                        # Check if notification already exists
-                                                        existing = conn.execute(text(
-                                                            "SELECT id FROM notifications WHERE request_id = :req_id AND notification_type IN ('request_approved', 'request_rejected')"
-                                                        ), {"req_id": request_id_val}).fetchone()
-                                                        
-                                                        if existing:
-                                                            # Update existing notification to read
-                                                            conn.execute(text(
-                                                                "UPDATE notifications SET is_read = 1 WHERE id = :notif_id"
-                                                            ), {"notif_id": existing[0]})
-                                                        else:
-                                                            # Create new notification record marked as read
-                                                            notif_type_val = notif_type
-                                                            title_val = title
-                                                            message_val = message
-                                                            created_at_val = created_at
-                                                            
-                                                            # Convert Nigerian time back to ISO if needed
-                                                            from datetime import datetime
-                                                            import pytz
-                                                            try:
-                                                                if isinstance(created_at_val, str) and 'WAT' in created_at_val:
-                                                                    dt_str = created_at_val.replace(' WAT', '')
-                                                                    dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
-                                                                    lagos_tz = pytz.timezone('Africa/Lagos')
-                                                                    dt = lagos_tz.localize(dt)
-                                                                    created_at_iso = dt.isoformat()
-                                                                else:
-                                                                    created_at_iso = get_nigerian_time_iso()
-                                                            except:
-                                                                created_at_iso = get_nigerian_time_iso()
-                                                            
-                                                            conn.execute(text('''
-                                                                INSERT INTO notifications (notification_type, title, message, user_id, request_id, created_at, is_read)
-                                                                VALUES (:notification_type, :title, :message, NULL, :request_id, :created_at, 1)
-                                                            '''), {
-                                                                "notification_type": notif_type_val,
-                                                                "title": title_val,
-                                                                "message": message_val,
-                                                                "request_id": request_id_val,
-                                                                "created_at": created_at_iso
-                                                            })
-                                                else:
-                                                    # Real notification - update database
-                                                    conn.execute(text("UPDATE notifications SET is_read = 1 WHERE id = :notif_id"), {"notif_id": notif_id_val})
-                                            
-                                            clear_cache()
-                                            st.success("Marked as read!")
-                                            # Don't rerun - let user continue their work, changes will show on next interaction
-                                        except Exception as e:
-                                            st.error(f"Error: {e}")
-                                with col2:
-                                    if request_id:
-                                        if st.button("View Details", key=f"view_req_{notif_id}", use_container_width=True):
-                                            st.info(f"Request ID: {request_id} - View in 'Review & History' tab")
-                                
-                                if idx < len(unread_notifications) - 1:
-                                    st.markdown("<div style='margin: 0.5rem 0;'></div>", unsafe_allow_html=True)
-                    
-                # Always show read notifications expander if there are any
-                if read_notifications:
-                    st.markdown("---")
-                    with st.expander(f"Read Notifications ({len(read_notifications)})", expanded=False):
-                        for idx, notification in enumerate(read_notifications):
-                            notif_id = notification.get('id')
-                            notif_type = notification.get('type', '')
-                            title = notification.get('title', '')
-                            message = notification.get('message', '')
-                            request_id = notification.get('request_id')
-                            created_at = notification.get('created_at', '')
-                            approved_by = notification.get('approved_by')
-                            
-                            # Escape HTML in message and title to prevent HTML code from showing
-                            import html
-                            message_escaped = html.escape(message)
-                            title_escaped = html.escape(title)
-                            
-                            # Professional color scheme (muted for read)
-                            if notif_type == 'request_approved':
-                                bg_color = "#f0fdf4"  # green-50
-                                border_color = "#86efac"  # lighter green
-                                status_badge = "Approved"
-                                badge_color = "#22c55e"
-                            elif notif_type == 'request_rejected':
-                                bg_color = "#fef2f2"  # red-50
-                                border_color = "#fca5a5"  # lighter red
-                                status_badge = "Rejected"
-                                badge_color = "#ef4444"
-                            else:
-                                bg_color = "#eff6ff"  # blue-50
-                                border_color = "#93c5fd"  # lighter blue
-                                status_badge = "Submitted"
-                                badge_color = "#3b82f6"
-                            
-                            # Build approved_by HTML
-                            approved_by_html = ""
-                            if approved_by and notif_type in ['request_approved', 'request_rejected']:
-                                approved_by_html = f'<div style="font-size: 0.7rem; color: #9ca3af; margin-top: 0.25rem;">Approved by: {approved_by or "Admin"}</div>'
-                            
-                            # Professional card design (muted for read)
-                            # Build HTML string to avoid f-string parsing issues
-                            html_content = f'<div style="border: 1px solid {border_color}; border-left: 4px solid {border_color}; background: {bg_color}; padding: 1rem; margin: 0.75rem 0; border-radius: 6px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); opacity: 0.85;"><div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 0.5rem;"><div style="flex: 1;"><span style="background: {badge_color}; color: white; padding: 0.25rem 0.75rem; border-radius: 4px; font-size: 0.75rem; font-weight: 600; text-transform: uppercase;">{status_badge}</span><h4 style="margin: 0.5rem 0 0.25rem 0; font-size: 1rem; font-weight: 600; color: #1f2937;">{title_escaped}</h4></div><div style="text-align: right;"><div style="font-size: 0.75rem; color: #6b7280; font-weight: 500;">{created_at}</div>{approved_by_html}</div></div><p style="margin: 0.5rem 0 0; font-size: 0.9rem; color: #374151; line-height: 1.5;">{message_escaped}</p><div style="margin-top: 0.75rem; font-size: 0.75rem; color: #6b7280;">Request ID: <strong>#{request_id}</strong></div></div>'
-                            st.markdown(html_content, unsafe_allow_html=True)
-                            
-                            if request_id:
-                                if st.button("View Details", key=f"view_read_all_{notif_id}", use_container_width=True):
-                                    st.info(f"Request ID: {request_id} - View in 'Review & History' tab")
-                            
-                            if idx < len(read_notifications) - 1:
-                                st.markdown("<div style='margin: 0.5rem 0;'></div>", unsafe_allow_html=True)
-            else:
-                st.info("No notifications yet")
-                st.caption("You'll receive notifications here when your requests are approved or rejected by an admin.")
-                st.markdown("""
-                **What you'll see:**
-                - Approval notifications when an admin approves your request
-                - Rejection notifications when an admin rejects your request  
-                - Submission confirmations when you submit a new request
-                """)
-                
-        except Exception as e:
-            st.error(f"Error loading notifications: {e}")
-            print(f"❌ Project site notifications error: {e}")
\ No newline at end of file
+    if current_active_tab == 6:  # Notifications tab for project site accounts
+        render_project_site_notifications_panel()
+
+# Per-rerun timing - only the active section ran, so this is the cost of viewing it
+rerun_ms = (time.perf_counter() - rerun_started_at) * 1000
+st.session_state.last_rerun_ms = round(rerun_ms, 1)
+finish_rerun(tab_names[current_active_tab])
+log_debug(f"Rerun of '{tab_names[current_active_tab]}' finished in {rerun_ms:.0f} ms")
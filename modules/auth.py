@@ -10,6 +10,7 @@ import pytz
 from sqlalchemy import text
 from db import get_engine
 from logger import log_info, log_warning, log_error, log_debug
+from modules.bounded_cache import bounded_cache
 
 # Import utility functions from main file (will be moved to utils module later)
 # For now, we'll import them to avoid circular dependencies
@@ -107,7 +108,7 @@ def initialize_session():
             st.session_state[key] = default_value
 
 
-@st.cache_data(ttl=600)  # Cache for 10 minutes for better performance
+@bounded_cache("get_all_access_codes", ttl=600, max_entries=1)  # Cache for 10 minutes for better performance
 def get_all_access_codes():
     """Get all access codes with caching to reduce database queries"""
     try:
@@ -0,0 +1,286 @@
+"""
+Backup Log Module
+Incremental background backups of items, requests and actuals. Writes only queue a backup
+(request_backup); a worker thread waits for the burst of writes to settle, then appends the
+rows changed since the last backup - found by their updated_at stamps and tombstones (see
+modules/delta_frames.py) - to a gzip-compressed, append-only change log. When the log outgrows
+BACKUP_COMPACT_BYTES it is compacted into a full snapshot. read_backup() replays both.
+
+Both files are JSON lines: a header line per snapshot/batch, then one line per row or delete:
+    {"snapshot"|"batch": mark, "access_codes": {...}}
+    {"t": table, "row": {...}}        {"t": table, "deleted": id}
+Each batch is its own gzip member, so appending never rewrites what is already on disk.
+"""
+import os
+import gzip
+import json
+import time
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import text, bindparam
+from db import get_engine
+from logger import log_info, log_error
+from modules.delta_frames import change_clock, DELTA_OVERLAP_SECONDS, TOMBSTONE_RETENTION_DAYS, FULL_RELOAD
+
+try:
+    import fcntl  # POSIX file locks for SQLite deployments
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+BACKUP_LOG_DIR = Path(os.getenv("BACKUP_LOG_DIR") or "backups")
+SNAPSHOT_FILE = "snapshot.jsonl.gz"
+CHANGE_LOG_FILE = "changes.jsonl.gz"
+STATE_FILE = "backup_state.json"
+BACKUP_TABLES = ("items", "requests", "actuals")
+
+# BACKUP_WORKER=0 turns queued backups off (run_backup can still be called directly)
+BACKUP_WORKER_ENABLED = (os.getenv("BACKUP_WORKER") or "1").strip().lower() not in ("0", "false", "no", "off")
+# A backup runs once writes have paused this long, and at most this long after the first queued write
+BACKUP_DEBOUNCE_SECONDS = 5
+BACKUP_MAX_DELAY_SECONDS = 60
+# Past this size the change log is folded into a new snapshot
+BACKUP_COMPACT_BYTES = 8 * 2**20
+READ_BATCH_ROWS = 5000
+
+_wake = threading.Condition()
+_pending = {"first": None, "last": None}
+_thread = None
+_last_report = {}
+
+
+def _backups_disabled():
+    # Same switches that kept the old JSON dumps out of production deployments
+    return os.getenv('PRODUCTION_MODE') == 'true' or os.getenv('DISABLE_MIGRATION') == 'true' or not BACKUP_WORKER_ENABLED
+
+
+def backups_enabled():
+    """Whether change-log backups run in this deployment (queued or scheduled)"""
+    return not _backups_disabled()
+
+
+def request_backup():
+    """Queue a backup of the latest writes and return at once; False when backups are turned off"""
+    global _thread
+    if _backups_disabled():
+        return False
+    now = time.monotonic()
+    with _wake:
+        if _pending["first"] is None:
+            _pending["first"] = now
+        _pending["last"] = now
+        if _thread is None:
+            _thread = threading.Thread(target=_worker, name="backup-log", daemon=True)
+            _thread.start()
+        _wake.notify()
+    return True
+
+
+def _worker():
+    while True:
+        with _wake:
+            while _pending["first"] is None:
+                _wake.wait()
+            while True:
+                due = min(_pending["last"] + BACKUP_DEBOUNCE_SECONDS, _pending["first"] + BACKUP_MAX_DELAY_SECONDS)
+                now = time.monotonic()
+                if now >= due:
+                    break
+                _wake.wait(due - now)
+            _pending["first"] = _pending["last"] = None
+        try:
+            run_backup()
+        except Exception as e:
+            log_error(f"Background backup failed: {e}")
+
+
+@contextmanager
+def _directory_lock(directory):
+    """One backup at a time per backup directory, across server processes"""
+    if fcntl is None:
+        yield
+        return
+    with open(directory / "backup.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_state(directory):
+    try:
+        with open(directory / STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(directory, state):
+    path = directory / STATE_FILE
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _line(record):
+    return json.dumps(record, default=str, separators=(",", ":")) + "\n"
+
+
+def _access_codes(conn):
+    row = conn.execute(text("SELECT admin_code, user_code FROM access_codes ORDER BY id DESC LIMIT 1")).fetchone()
+    return {"admin_code": row[0], "user_code": row[1]} if row else None
+
+
+def _write_rows(out, table, result):
+    """Stream a result's rows into out READ_BATCH_ROWS at a time; returns the count"""
+    written = 0
+    while True:
+        rows = result.fetchmany(READ_BATCH_ROWS)
+        if not rows:
+            return written
+        out.write("".join(_line({"t": table, "row": dict(row)}) for row in rows))
+        written += len(rows)
+
+
+def _write_snapshot(conn, directory, mark):
+    """Replace the snapshot with every row, then start an empty change log"""
+    path = directory / SNAPSHOT_FILE
+    rows = 0
+    with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as out:
+        out.write(_line({"snapshot": mark.isoformat(timespec="microseconds"), "access_codes": _access_codes(conn)}))
+        for table in BACKUP_TABLES:
+            rows += _write_rows(out, table, conn.execution_options(stream_results=True).execute(
+                text(f"SELECT * FROM {table} ORDER BY id")).mappings())
+    os.replace(f"{path}.tmp", path)
+    # Batches older than the snapshot would be skipped on replay anyway
+    open(directory / CHANGE_LOG_FILE, "wb").close()
+    return {"kind": "snapshot", "rows": rows, "deleted": 0}
+
+
+def _drop_torn_batch(log_path, log_bytes):
+    """Cut off a batch that was being appended when the process died (past the last recorded size)"""
+    if log_bytes is not None and log_path.stat().st_size > log_bytes:
+        with open(log_path, "r+b") as f:
+            f.truncate(log_bytes)
+
+
+def _append_changes(conn, directory, mark, since):
+    """
+    Append one batch with the rows written and deleted since `since` to the change log.
+    Nothing is appended when nothing changed.
+    """
+    deleted = conn.execute(text("""
+        SELECT table_name, row_id FROM tombstones WHERE deleted_at > :since AND table_name IN :tables
+        ORDER BY id
+    """).bindparams(bindparam("tables", expanding=True)), {"since": since, "tables": list(BACKUP_TABLES)}).fetchall()
+    changed = deleted or any(
+        conn.execute(text(f"SELECT 1 FROM {table} WHERE updated_at > :since LIMIT 1"), {"since": since}).first()
+        for table in BACKUP_TABLES)
+    if not changed:
+        return {"kind": "changes", "rows": 0, "deleted": 0}
+    rows = 0
+    with gzip.open(directory / CHANGE_LOG_FILE, "at", encoding="utf-8") as out:
+        out.write(_line({"batch": mark.isoformat(timespec="microseconds"), "access_codes": _access_codes(conn)}))
+        # Deletes first: a row deleted and inserted again since the last batch is re-read below
+        out.write("".join(_line({"t": table, "deleted": row_id}) for table, row_id in deleted))
+        for table in BACKUP_TABLES:
+            rows += _write_rows(out, table, conn.execution_options(stream_results=True).execute(
+                text(f"SELECT * FROM {table} WHERE updated_at > :since ORDER BY id"), {"since": since}).mappings())
+    return {"kind": "changes", "rows": rows, "deleted": len(deleted)}
+
+
+def _restored_since(conn, last_mark):
+    """Whether the database was restored from a full backup after last_mark (no stamps or tombstones to follow)"""
+    return conn.execute(text("SELECT 1 FROM tombstones WHERE table_name = :table AND deleted_at > :since LIMIT 1"),
+                        {"table": FULL_RELOAD, "since": last_mark.isoformat(timespec="microseconds")}).first() is not None
+
+
+def run_backup(directory=None, compact=False):
+    """
+    Back up the rows changed since the last backup (a full snapshot the first time, with
+    compact, when the change log is too big or older than the tombstones). Returns a report.
+    """
+    directory = Path(directory or BACKUP_LOG_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    with _directory_lock(directory):
+        state = _read_state(directory)
+        log_path = directory / CHANGE_LOG_FILE
+        with get_engine().connect() as conn:
+            # Read before the rows, so anything stamped after this is in the next batch
+            mark = change_clock(conn)
+            last_mark = datetime.fromisoformat(state["mark"]) if state.get("mark") else None
+            if (compact or last_mark is None or not (directory / SNAPSHOT_FILE).exists()
+                    or not log_path.exists() or log_path.stat().st_size > BACKUP_COMPACT_BYTES
+                    or mark - last_mark >= timedelta(days=TOMBSTONE_RETENTION_DAYS)
+                    or _restored_since(conn, last_mark)):
+                report = _write_snapshot(conn, directory, mark)
+            else:
+                _drop_torn_batch(log_path, state.get("log_bytes"))
+                since = (last_mark - timedelta(seconds=DELTA_OVERLAP_SECONDS)).isoformat(timespec="microseconds")
+                report = _append_changes(conn, directory, mark, since)
+        report["bytes"] = log_path.stat().st_size if report["kind"] == "changes" else (directory / SNAPSHOT_FILE).stat().st_size
+        _write_state(directory, {"mark": mark.isoformat(timespec="microseconds"), "kind": report["kind"],
+                                 "log_bytes": log_path.stat().st_size})
+    report["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    report["mark"] = mark.isoformat(timespec="microseconds")
+    _last_report.update(report)
+    log_info(f"Backup ({report['kind']}): {report['rows']} rows, {report['deleted']} deletes "
+             f"in {report['ms']:.0f} ms ({report['bytes'] / 1024:.0f} KB on disk)")
+    return report
+
+
+def _records(path):
+    """JSON records of a backup file; a torn last batch (crash while appending) ends it"""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    return
+                yield json.loads(line)
+    except FileNotFoundError:
+        return
+    except (EOFError, gzip.BadGzipFile, zlib.error):
+        return
+
+
+def read_backup(directory=None):
+    """
+    Tables as of the last backup: the snapshot with the change log replayed over it.
+    Returns {"items": [...], "requests": [...], "actuals": [...], "access_codes": {...}, "backup_timestamp": mark}
+    """
+    directory = Path(directory or BACKUP_LOG_DIR)
+    tables = {table: {} for table in BACKUP_TABLES}
+    backup = {"access_codes": None, "backup_timestamp": None}
+    snapshot_mark = None
+    for record in _records(directory / SNAPSHOT_FILE):
+        if "snapshot" in record:
+            snapshot_mark = record["snapshot"]
+            backup.update(access_codes=record["access_codes"], backup_timestamp=snapshot_mark)
+        else:
+            tables[record["t"]][record["row"]["id"]] = record["row"]
+    if snapshot_mark is None:
+        return None
+    applying = False
+    for record in _records(directory / CHANGE_LOG_FILE):
+        if "batch" in record:
+            # Batches from before the snapshot (left by a crash while compacting) are already in it
+            applying = record["batch"] > snapshot_mark
+            if applying:
+                backup.update(access_codes=record["access_codes"], backup_timestamp=record["batch"])
+        elif not applying:
+            continue
+        elif "deleted" in record:
+            tables[record["t"]].pop(record["deleted"], None)
+        else:
+            tables[record["t"]][record["row"]["id"]] = record["row"]
+    backup.update({table: list(rows.values()) for table, rows in tables.items()})
+    return backup
+
+
+def last_backup_report():
+    """Report of this process's last backup (empty before the first)"""
+    return dict(_last_report)
@@ -0,0 +1,147 @@
+"""
+Startup Bootstrap Module
+Runs schema migrations, one-off data steps and startup checks once per server process
+instead of on every Streamlit rerun
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from sqlalchemy import text
+from db import get_engine
+from logger import log_info, log_error
+from modules.schema import apply_schema, ensure_schema_version_table, get_applied_versions, record_version
+
+try:
+    import fcntl  # POSIX file locks for SQLite deployments
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+# Arbitrary application-wide key for pg_advisory_lock
+BOOTSTRAP_LOCK_KEY = 72650431
+
+# Module state survives reruns: Streamlit re-executes the app script, not imported modules
+_bootstrap_lock = threading.Lock()
+_bootstrap_done = False
+_bootstrap_report = {}
+
+
+class BootstrapError(RuntimeError):
+    """One or more bootstrap steps failed; .failed maps their versions to the errors"""
+
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__("Bootstrap steps failed: " + "; ".join(f"{version}: {error}" for version, error in failed.items()))
+
+
+@contextmanager
+def cross_process_lock(engine):
+    """
+    Serialize bootstrap across server processes/replicas.
+    PostgreSQL: session advisory lock. SQLite: exclusive flock on a file next to the database.
+    """
+    backend = engine.url.get_backend_name()
+    if backend == "postgresql":
+        with engine.connect() as lock_conn:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+            try:
+                yield
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+        return
+
+    database = engine.url.database
+    if backend != "sqlite" or not database or database == ":memory:" or fcntl is None:
+        yield
+        return
+    with open(f"{os.path.abspath(database)}.bootstrap.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_bootstrap(steps, checks=()):
+    """
+    Run startup work once per server process.
+
+    The declarative schema (modules/schema.py) is brought up to date first; it costs one catalog
+    query when nothing is missing.
+
+    steps:  ordered (version, callable) pairs - one-off data work (backfills, seeding). A step that
+            returns is recorded in schema_version, so a fresh process skips it entirely; one that
+            raises is not, and the steps after it still run.
+    checks: (name, callable) pairs that run once in every process (connection checks, flags).
+
+    Returns a report dict with per-step timings. Failures (a migration or any step) are raised
+    once every step has had its turn, so the caller can stop the app; the failed work is then
+    retried on the next rerun.
+    """
+    global _bootstrap_done, _bootstrap_report
+    if _bootstrap_done:
+        return _bootstrap_report
+
+    with _bootstrap_lock:
+        if _bootstrap_done:
+            return _bootstrap_report
+
+        started = time.perf_counter()
+        engine = get_engine()
+        report = {"applied": {}, "skipped": [], "checks": {}, "migrations": []}
+
+        with cross_process_lock(engine):
+            schema_started = time.perf_counter()
+            report["migrations"] = apply_schema(engine)
+            report["schema_ms"] = round((time.perf_counter() - schema_started) * 1000, 1)
+            with engine.begin() as conn:
+                ensure_schema_version_table(conn)
+                applied = get_applied_versions(conn)
+
+            failed = {}
+            for version, step in steps:
+                if version in applied:
+                    report["skipped"].append(version)
+                    continue
+                step_started = time.perf_counter()
+                try:
+                    step()
+                except Exception as e:
+                    log_error(f"Bootstrap step {version} failed (retried on the next run): {e}")
+                    failed[version] = e
+                    continue
+                duration_ms = (time.perf_counter() - step_started) * 1000
+                with engine.begin() as conn:
+                    record_version(conn, version, duration_ms)
+                report["applied"][version] = round(duration_ms, 1)
+                log_info(f"Bootstrap step {version} applied in {duration_ms:.0f} ms")
+            if failed:
+                raise BootstrapError(failed)
+
+        for name, check in checks:
+            check_started = time.perf_counter()
+            check()
+            report["checks"][name] = round((time.perf_counter() - check_started) * 1000, 1)
+
+        report["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        log_info(
+            f"Startup bootstrap finished in {report['total_ms']:.0f} ms "
+            f"({len(report['migrations'])} migrations, {len(report['applied'])} steps applied, {len(report['skipped'])} already recorded, "
+            f"{len(report['checks'])} checks)"
+        )
+        _bootstrap_report = report
+        _bootstrap_done = True
+        return report
+
+
+def get_bootstrap_report():
+    """Timings from this process's bootstrap (empty until it has run)"""
+    return dict(_bootstrap_report)
+
+
+def reset_bootstrap():
+    """Forget that this process has bootstrapped (tests, or after switching databases)"""
+    global _bootstrap_done, _bootstrap_report
+    with _bootstrap_lock:
+        _bootstrap_done = False
+        _bootstrap_report = {}
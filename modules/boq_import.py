@@ -0,0 +1,213 @@
+"""
+BOQ Import Module
+Streams Excel (.xlsx) and CSV bills of quantities sheet by sheet, maps their columns with
+auto_pick and hands fixed-size chunks to a writer, so a large workbook is never held in
+memory as a whole. Rows that can't be imported are collected into a reject report.
+"""
+import csv
+import io
+import re
+
+import openpyxl
+from openpyxl.utils import range_boundaries
+import pandas as pd
+
+KEYS_NAME = ["name", "item", "description", "material", "role"]
+KEYS_QTY = ["qty", "quantity", "stock", "available", "available_slots", "balance"]
+KEYS_UNIT = ["unit", "uom", "units"]
+KEYS_CODE = ["code", "id", "item_id", "sku", "ref"]
+KEYS_COST = ["unit_cost", "cost", "price", "rate"]
+
+# Picked in this order from the columns still free, so "Unit Cost" is taken as the cost
+# before the unit is looked for
+FIELD_KEYS = (("name", KEYS_NAME), ("qty", KEYS_QTY), ("unit_cost", KEYS_COST),
+              ("unit", KEYS_UNIT), ("code", KEYS_CODE))
+# Optional item context, matched on the exact header ("Building Type" -> building_type)
+CONTEXT_FIELDS = ("category", "budget", "section", "grp", "building_type")
+
+IMPORT_CHUNK_ROWS = 1000
+# Title blocks above the header row are skipped; a sheet without a name column in its
+# first rows isn't a BOQ sheet
+HEADER_SCAN_ROWS = 20
+REJECT_COLUMNS = ["sheet", "row", "reason", "name", "qty", "unit_cost"]
+
+NUMBER_NOISE_RE = r"[₦$,' \xa0]"
+
+
+def auto_pick(cols, keys):
+    cols_low = [c.lower() for c in cols]
+    for k in keys:
+
+        for i, c in enumerate(cols_low):
+            if k in c:
+
+                return cols[i]
+    return None
+
+def to_number(val):
+    if pd.isna(val):
+
+        return None
+    if isinstance(val, (int, float)):
+
+        return val
+    s = str(val)
+    s = re.sub(r"[₦$,]", "", s)
+    s = s.replace("'", "").replace(" ", "").replace("\xa0","")
+    s = s.replace(".", "") if s.count(",")==1 and s.endswith(",00") else s
+    s = s.replace(",", "")
+    try:
+
+        return float(s)
+    except:
+        return None
+
+
+def to_numbers(values):
+    """
+    to_number over a whole Series at once - the same numbers, NaN where to_number gives None.
+    Text is stripped of NUMBER_NOISE_RE (what to_number strips) in bulk; what pandas still can't
+    read goes through to_number itself, since float() takes more ("1_000", non-ASCII digits).
+    """
+    values = pd.Series(values, dtype=object)
+    numbers = pd.to_numeric(values, errors="coerce")
+    text_values = numbers.isna() & values.notna()
+    if text_values.any():
+        cleaned = values[text_values].astype(str).str.replace(NUMBER_NOISE_RE, "", regex=True)
+        parsed = pd.to_numeric(cleaned, errors="coerce")
+        leftover = parsed.isna() & (cleaned.str.len() > 0)
+        if leftover.any():
+            rest = values[text_values][leftover]
+            parsed[leftover] = pd.Series([to_number(value) for value in rest], index=rest.index, dtype=float)
+        numbers[text_values] = parsed
+    return numbers.astype(float)
+
+
+def map_columns(header):
+    """Header position per item field, or None when the header has no name column"""
+    labels = [str(value).strip() if value is not None else "" for value in header]
+    free = [label for label in labels if label]
+    positions = {}
+    for field, keys in FIELD_KEYS:
+        label = auto_pick(free, keys)
+        if label is not None:
+            positions[field] = labels.index(label)
+            free.remove(label)
+    if "name" not in positions:
+        return None
+    for field in CONTEXT_FIELDS:
+        label = next((label for label in free if re.sub(r"\s+", "_", label.lower()) == field), None)
+        if label is not None:
+            positions[field] = labels.index(label)
+    return positions
+
+
+def _sheets(source, filename):
+    """(sheet name, row tuples, row count or None) per sheet, read lazily"""
+    if filename.lower().endswith(".csv"):
+        if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+            with open(source, newline="", encoding="utf-8-sig") as handle:
+                yield filename, csv.reader(handle), None
+        else:
+            yield filename, csv.reader(io.TextIOWrapper(source, encoding="utf-8-sig", newline="")), None
+        return
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield sheet.title, sheet.iter_rows(values_only=True), _declared_rows(sheet)
+    finally:
+        workbook.close()
+
+
+def _declared_rows(sheet):
+    """Row count from the sheet's stored dimension; None when the file doesn't record one
+    (sheet.max_row would parse the whole sheet to find out)"""
+    try:
+        return range_boundaries(sheet.calculate_dimension())[3]
+    except (ValueError, TypeError):
+        return None
+
+
+def iter_chunks(source, filename, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Yield (sheet, frame, total_rows) with at most chunk_rows rows per frame. Frames hold the
+    mapped fields indexed by spreadsheet row number; a sheet without a header yields frame None.
+    """
+    for sheet, rows, total in _sheets(source, filename):
+        positions, buffer, numbers = None, [], []
+        for row_number, row in enumerate(rows, start=1):
+            if positions is None:
+                if row_number > HEADER_SCAN_ROWS:
+                    break
+                positions = map_columns(row)
+                continue
+            if all(value is None or str(value).strip() == "" for value in row):
+                continue
+            buffer.append(row)
+            numbers.append(row_number)
+            if len(buffer) == chunk_rows:
+                yield sheet, _frame(buffer, numbers, positions), total
+                buffer, numbers = [], []
+        if positions is None:
+            yield sheet, None, total
+        elif buffer:
+            yield sheet, _frame(buffer, numbers, positions), total
+
+
+def _frame(rows, numbers, positions):
+    return pd.DataFrame({field: [row[i] if i < len(row) else None for row in rows]
+                         for field, i in positions.items()}, index=numbers, dtype=object)
+
+
+def clean_chunk(sheet, frame):
+    """
+    Split a chunk into importable rows (numbers converted) and reject report rows: rows
+    without a name, and rows whose quantity or unit cost is filled in but isn't a number.
+    """
+    items = frame.copy()
+    reason = pd.Series("", index=frame.index)
+    for field, label in (("qty", "quantity"), ("unit_cost", "unit cost")):
+        if field in frame.columns:
+            items[field] = to_numbers(frame[field])
+            filled = frame[field].notna() & frame[field].astype(str).str.strip().ne("")
+            reason = reason.mask(reason.eq("") & filled & items[field].isna(), f"{label} is not a number")
+    named = frame["name"].notna() & frame["name"].astype(str).str.strip().ne("")
+    reason = reason.mask(~named, "missing name")
+
+    rejected = frame[reason.ne("")]
+    rejects = pd.DataFrame({
+        "sheet": sheet,
+        "row": rejected.index,
+        "reason": reason[reason.ne("")].values,
+        **{column: rejected[column].values if column in rejected.columns else None
+           for column in ("name", "qty", "unit_cost")},
+    }, columns=REJECT_COLUMNS)
+    return items[reason.eq("")], rejects
+
+
+def import_boq(source, filename, write_chunk, chunk_rows=IMPORT_CHUNK_ROWS, progress=None):
+    """
+    Stream a workbook or CSV into write_chunk(items) -> {"inserted": n, "updated": n}, one
+    chunk at a time. progress(sheet, row, total_rows) is called after each chunk.
+    Returns a report dict with per-file counts and the rejects as a DataFrame.
+    """
+    report = {"sheets": [], "skipped_sheets": [], "rows": 0, "inserted": 0, "updated": 0}
+    rejects = []
+    for sheet, frame, total in iter_chunks(source, filename, chunk_rows):
+        if frame is None:
+            report["skipped_sheets"].append(sheet)
+            continue
+        if sheet not in report["sheets"]:
+            report["sheets"].append(sheet)
+        items, rejected = clean_chunk(sheet, frame)
+        if not items.empty:
+            written = write_chunk(items)
+            report["inserted"] += written["inserted"]
+            report["updated"] += written["updated"]
+        report["rows"] += len(frame)
+        if not rejected.empty:
+            rejects.append(rejected)
+        if progress:
+            progress(sheet, int(frame.index[-1]), total)
+    report["rejects"] = pd.concat(rejects, ignore_index=True) if rejects else pd.DataFrame(columns=REJECT_COLUMNS)
+    return report
@@ -0,0 +1,234 @@
+"""
+Bounded Cache Module
+In-process cache for the data functions, used in place of @st.cache_data: each function gets
+its own entry and byte limits with least-recently-used eviction and a TTL. Misses are
+single-flight - callers that miss on a key while it is being computed wait for that one
+computation instead of each running the same query (the stampede after clear_cache()).
+Hit/miss/eviction counters per cache are kept for the Admin tab.
+"""
+import os
+import copy
+import time
+import pickle
+import sys
+import threading
+import functools
+from collections import OrderedDict
+
+import pandas as pd
+
+# Byte limit of a cache that doesn't set one; CACHE_MAX_MB overrides it
+DEFAULT_MAX_BYTES = int(float(os.getenv("CACHE_MAX_MB") or 64) * 2**20)
+DEFAULT_MAX_ENTRIES = 64
+
+# Before pandas 3 a shallow copy shares cell data with the cached frame unless Copy-on-Write was turned on
+_COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+
+_registry_lock = threading.Lock()
+_caches = {}
+
+
+def handout(value):
+    """
+    What a caller gets of a cached value: frames as shallow views (writes to them stay private
+    with Copy-on-Write), everything else as a deep copy, like st.cache_data's unpickled copies
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=not _COPY_ON_WRITE)
+    if isinstance(value, tuple):
+        return tuple(handout(item) for item in value)
+    return copy.deepcopy(value)
+
+
+def value_size(value):
+    """Approximate bytes held by a cached value"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, tuple):
+        return sum(value_size(item) for item in value)
+    if isinstance(value, dict) and any(isinstance(item, pd.DataFrame) for item in value.values()):
+        return sum(value_size(item) for item in value.values())
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _Flight:
+    """One computation in progress; callers missing on the same key wait for it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.finished = False
+
+
+class BoundedCache:
+    """LRU cache with entry and byte limits, an optional TTL and single-flight misses"""
+
+    def __init__(self, name, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, expires)
+        self._flights = {}
+        self._bytes = 0
+        # Bumped by clear(): a computation started before it doesn't store its (possibly stale) result
+        self._generation = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.coalesced = 0
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] is not None and entry[2] <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def peek(self, key):
+        """The value held for key (None when there is none), without counting a hit or miss"""
+        with self._lock:
+            entry = self._lookup(key)
+            return entry[0] if entry is not None else None
+
+    def put(self, key, value):
+        """Hold value for key, evicting least recently used entries past the limits"""
+        size = value_size(value)
+        with self._lock:
+            self._put(key, value, size)
+
+    def _put(self, key, value, size):
+        if key in self._entries:
+            self._drop(key)
+        if size > self.max_bytes:
+            # Would evict everything else and still not fit
+            self.evictions += 1
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (value, size, expires)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute, valid=None):
+        """
+        The value held for key, or compute(held) - run once however many callers miss on key
+        together. valid(value) can reject a held value (compute gets it, to update it from);
+        a caller whose wait ends with a value it rejects computes again.
+        """
+        while True:
+            with self._lock:
+                entry = self._lookup(key)
+                held = entry[0] if entry is not None else None
+                if entry is not None and (valid is None or valid(held)):
+                    self.hits += 1
+                    return held
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    generation = self._generation
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            flight.done.wait()
+            if flight.finished:
+                if flight.error is not None:
+                    raise flight.error
+                if valid is None or valid(flight.value):
+                    return flight.value
+            # Otherwise the computing caller was interrupted (Streamlit stopping its rerun) or
+            # computed something this caller rejects: look again
+
+        try:
+            value = compute(held)
+        except Exception as error:
+            flight.error = error
+            flight.finished = True
+            raise
+        else:
+            flight.value = value
+            flight.finished = True
+            size = value_size(value)
+            with self._lock:
+                if generation == self._generation:
+                    self._put(key, value, size)
+            return value
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def clear(self, keep=None):
+        """Drop every entry (those for which keep(key) is false when keep is given)"""
+        with self._lock:
+            for key in [key for key in self._entries if keep is None or not keep(key)]:
+                self._drop(key)
+            self._flights.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cache": self.name, "entries": len(self._entries), "max_entries": self.max_entries,
+                "mb": round(self._bytes / 2**20, 2), "max_mb": round(self.max_bytes / 2**20, 1),
+                "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                "evictions": self.evictions, "expirations": self.expirations,
+            }
+
+
+def get_cache(name, **limits):
+    """The process-wide cache called name, created with limits on first use"""
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = BoundedCache(name, **limits)
+        return cache
+
+
+def bounded_cache(name, ttl=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Use in place of @st.cache_data(ttl=...): caches the function's results per argument values
+    (they must be hashable) in the cache called name. Keeps .clear() like st.cache_data.
+    """
+    cache = get_cache(name, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return handout(cache.get_or_compute(key, lambda held: func(*args, **kwargs)))
+        wrapper.clear = cache.clear
+        return wrapper
+    return decorator
+
+
+def clear_caches():
+    """Empty every bounded cache of the process"""
+    with _registry_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.clear()
+
+
+def cache_stats():
+    """Counters and sizes of every bounded cache, by name"""
+    with _registry_lock:
+        caches = sorted(_caches.values(), key=lambda cache: cache.name)
+    return [cache.stats() for cache in caches]
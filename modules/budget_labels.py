@@ -0,0 +1,154 @@
+"""
+Budget Labels Module
+Parses free-text budget labels ("Budget 3 - Flats(General Materials - BLOCKWORK)") into the
+structured items columns budget_num, budget_building_type, budget_category and
+budget_subcategory, so filters and groupings compare indexed values instead of strings
+"""
+import re
+
+import pandas as pd
+from sqlalchemy import text
+from db import get_engine
+from logger import log_info
+
+BUDGET_COLUMNS = ("budget_num", "budget_building_type", "budget_category", "budget_subcategory")
+
+# "Budget N", then an optional " - Type", then an optional "(Category)" / "(Category - Sub)"
+BUDGET_LABEL_RE = re.compile(
+    r"^\s*budget\s*(?P<num>\d+)\b\s*(?:-\s*(?P<type>[^(]*?))?\s*(?:\(\s*(?P<inner>[^)]*?)\s*\)?)?\s*$",
+    re.IGNORECASE,
+)
+
+# Spelling variants seen in real labels, keyed by lowercase text without spaces or hyphens
+BUILDING_TYPES = {
+    "flats": "Flats", "flat": "Flats",
+    "terraces": "Terraces", "terrace": "Terraces",
+    "semidetached": "Semi-detached",
+    "fullydetached": "Fully-detached",
+}
+CATEGORIES = {
+    "generalmaterials": "General Materials", "generalmaterial": "General Materials",
+    "woods": "Woods", "wood": "Woods",
+    "plumbings": "Plumbings", "plumbing": "Plumbings",
+    "irons": "Irons", "iron": "Irons",
+    "labour": "Labour", "labor": "Labour",
+    "electrical": "Electrical", "electricals": "Electrical",
+    "mechanical": "Mechanical", "mechanicals": "Mechanical",
+}
+
+
+def _canonical(value, known):
+    """Known spelling for a label part, or the part itself with its spacing tidied"""
+    if not value or not value.strip():
+        return None
+    tidy = " ".join(value.split())
+    return known.get(re.sub(r"[\s\-]+", "", tidy.lower()), tidy)
+
+
+def parse_budget(label):
+    """
+    Structured parts of one budget label as a dict keyed by BUDGET_COLUMNS.
+    Anything that isn't a "Budget N ..." label parses to all None.
+    """
+    parts = dict.fromkeys(BUDGET_COLUMNS)
+    if label is None or (not isinstance(label, str) and pd.isna(label)):
+        return parts
+    match = BUDGET_LABEL_RE.match(str(label))
+    if not match:
+        return parts
+    parts["budget_num"] = int(match.group("num"))
+    parts["budget_building_type"] = _canonical(match.group("type"), BUILDING_TYPES)
+    inner = match.group("inner")
+    if inner:
+        # Category names never contain a hyphen, so the first one starts the subcategory
+        category, _, subcategory = inner.partition("-")
+        parts["budget_category"] = _canonical(category, CATEGORIES)
+        parts["budget_subcategory"] = " ".join(subcategory.split()) or None
+    return parts
+
+
+def parse_budget_labels(labels):
+    """Parsed columns for a Series of labels - each distinct label is parsed once"""
+    labels = pd.Series(labels)
+    parsed = {label: parse_budget(label) for label in labels.dropna().unique()}
+    frame = pd.DataFrame([parsed.get(label, dict.fromkeys(BUDGET_COLUMNS)) if pd.notna(label)
+                          else dict.fromkeys(BUDGET_COLUMNS) for label in labels],
+                         columns=list(BUDGET_COLUMNS), index=labels.index)
+    frame["budget_num"] = frame["budget_num"].astype("Int64")
+    return frame
+
+
+def budget_label(budget_num, building_type=None, category=None, subcategory=None):
+    """Label in the stored format: "Budget N - Type(Category - Sub)" """
+    label = f"Budget {int(budget_num)}"
+    if building_type:
+        label += f" - {building_type}"
+    if category:
+        label += f"({category} - {subcategory})" if subcategory else f"({category})"
+    return label
+
+
+def with_budget_columns(df):
+    """df with the parsed columns, computed from df['budget'] only where they're missing"""
+    if df.empty or all(column in df.columns for column in BUDGET_COLUMNS):
+        return df
+    df = df.copy()
+    parsed = parse_budget_labels(df["budget"] if "budget" in df.columns else pd.Series(index=df.index, dtype=object))
+    for column in BUDGET_COLUMNS:
+        df[column] = parsed[column]
+    return df
+
+
+def budget_mask(df, budget_num=None, building_type=None, budget=None):
+    """
+    Boolean mask over an items frame using the structured columns.
+
+    budget_num and building_type are exact matches ("All"/None skip them). budget is a label:
+    its number, type and category must match, plus the subcategory when the label has one,
+    so "Budget 1 - Terraces" selects every Budget 1 Terraces category.
+    """
+    df = with_budget_columns(df)
+    mask = pd.Series(True, index=df.index)
+    if budget_num not in (None, "", "All"):
+        number = int(re.sub(r"\D", "", str(budget_num)) or 0)
+        mask &= df["budget_num"].eq(number).fillna(False).astype(bool)
+    if building_type not in (None, "", "All"):
+        mask &= df["budget_building_type"].eq(_canonical(building_type, BUILDING_TYPES)).fillna(False).astype(bool)
+    if budget not in (None, "", "All"):
+        wanted = parse_budget(budget)
+        if wanted["budget_num"] is None:
+            return mask & df["budget"].eq(budget).fillna(False).astype(bool)
+        for column in BUDGET_COLUMNS:
+            if wanted[column] is not None:
+                mask &= df[column].eq(wanted[column]).fillna(False).astype(bool)
+    return mask
+
+
+def refresh_budget_columns(conn, labels=None):
+    """
+    Write the parsed columns for items carrying the given labels (every label when None), on
+    the caller's connection so they commit with the items write. Returns the labels updated.
+    """
+    if labels is None:
+        labels = [row[0] for row in conn.execute(text("SELECT DISTINCT budget FROM items WHERE budget IS NOT NULL"))]
+    # Items whose budget was cleared lose their parsed values too
+    conn.execute(text("""
+        UPDATE items SET budget_num = NULL, budget_building_type = NULL,
+                         budget_category = NULL, budget_subcategory = NULL
+        WHERE (budget IS NULL OR budget = '') AND budget_num IS NOT NULL
+    """))
+    rows = [dict(parse_budget(label), budget=label) for label in sorted({label for label in labels if label})]
+    if rows:
+        conn.execute(text("""
+            UPDATE items SET budget_num = :budget_num, budget_building_type = :budget_building_type,
+                             budget_category = :budget_category, budget_subcategory = :budget_subcategory
+            WHERE budget = :budget
+        """), rows)
+    return len(rows)
+
+
+def init_budget_columns():
+    """Backfill the parsed budget columns for existing items (bootstrap step; errors propagate)"""
+    with get_engine().begin() as conn:
+        labels = refresh_budget_columns(conn)
+    log_info(f"Backfilled structured budget columns for {labels} budget labels")
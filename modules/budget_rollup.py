@@ -0,0 +1,113 @@
+"""
+Budget Rollup Module
+Keeps planned totals per (project site, budget number, building type, category) in the
+budget_rollup table. A site's rows are recomputed with one GROUP BY in the same transaction
+as its item writes, so the Budget Summary tab reads a handful of rows instead of every item
+"""
+import pandas as pd
+from sqlalchemy import text, bindparam
+from db import get_engine
+from logger import log_info, log_warning
+from modules.schema import create_table
+
+ROLLUP_COLUMNS = ("project_site", "budget_num", "building_type", "category", "item_count", "amount")
+
+# Amounts are rounded per item (like the per-row Amount column), then summed
+ROLLUP_AGGREGATE_SQL = """
+    SELECT project_site, budget_num, building_type, budget_category,
+           COUNT(*),
+           COALESCE(SUM(ROUND(CAST(COALESCE(qty, 0) * COALESCE(unit_cost, 0) AS NUMERIC), 2)), 0)
+    FROM items
+"""
+ROLLUP_GROUP_BY = " GROUP BY project_site, budget_num, building_type, budget_category"
+
+
+def ensure_rollup_table(conn):
+    """Create the budget_rollup table if it doesn't exist (declared in modules/schema.py)"""
+    create_table(conn, "budget_rollup")
+
+
+def refresh_site_rollup(conn, project_site):
+    """
+    Recompute one site's rollup rows on the caller's connection, after its items changed.
+    A site with no items is left with no rows.
+    """
+    if not project_site:
+        return
+    if conn.engine.url.get_backend_name() != "sqlite":
+        # Serialize refreshes of the same site so concurrent writers can't both insert its rows
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:project_site))"), {"project_site": project_site})
+    conn.execute(text("DELETE FROM budget_rollup WHERE project_site = :project_site"), {"project_site": project_site})
+    conn.execute(text(f"""
+        INSERT INTO budget_rollup ({', '.join(ROLLUP_COLUMNS)})
+        {ROLLUP_AGGREGATE_SQL} WHERE project_site = :project_site {ROLLUP_GROUP_BY}
+    """), {"project_site": project_site})
+
+
+def refresh_item_rollups(conn, item_ids):
+    """Recompute the rollup of every site that owns one of item_ids"""
+    ids = sorted({int(item_id) for item_id in item_ids})
+    if not ids:
+        return
+    sites = conn.execute(
+        text("SELECT DISTINCT project_site FROM items WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids},
+    ).fetchall()
+    for (project_site,) in sites:
+        refresh_site_rollup(conn, project_site)
+
+
+def rebuild_rollup(conn):
+    """Recompute every site inside the caller's transaction (after imports, restores, bulk deletes)"""
+    ensure_rollup_table(conn)
+    conn.execute(text("DELETE FROM budget_rollup"))
+    result = conn.execute(text(f"""
+        INSERT INTO budget_rollup ({', '.join(ROLLUP_COLUMNS)})
+        {ROLLUP_AGGREGATE_SQL} {ROLLUP_GROUP_BY}
+    """))
+    return result.rowcount
+
+
+def get_budget_rollup(project_site=None):
+    """
+    Rollup rows as a DataFrame (budget_num, building_type, category, item_count, amount) for
+    one site, or summed over all sites when project_site is None.
+    """
+    where = " WHERE project_site = :project_site" if project_site else ""
+    try:
+        with get_engine().connect() as conn:
+            rollup = pd.read_sql_query(text(f"""
+                SELECT budget_num, building_type, category,
+                       SUM(item_count) AS item_count, SUM(amount) AS amount
+                FROM budget_rollup{where}
+                GROUP BY budget_num, building_type, category
+            """), conn, params={"project_site": project_site} if project_site else {})
+    except Exception as e:
+        log_warning(f"Budget rollup lookup failed for {project_site}: {e}")
+        rollup = pd.DataFrame(columns=["budget_num", "building_type", "category", "item_count", "amount"])
+    rollup["budget_num"] = pd.to_numeric(rollup["budget_num"], errors="coerce").astype("Int64")
+    rollup["item_count"] = pd.to_numeric(rollup["item_count"], errors="coerce").fillna(0).astype(int)
+    rollup["amount"] = pd.to_numeric(rollup["amount"], errors="coerce").fillna(0.0).astype(float)
+    return rollup
+
+
+def budget_totals(rollup):
+    """
+    Amount per budget number (rows) and building type (columns) for every budget, plus a
+    'Total' column that also counts items without a building type
+    """
+    numbered = rollup[rollup["budget_num"].notna()]
+    if numbered.empty:
+        return pd.DataFrame(columns=["Total"])
+    totals = numbered.pivot_table(index="budget_num", columns="building_type", values="amount",
+                                  aggfunc="sum", fill_value=0.0)
+    totals["Total"] = numbered.groupby("budget_num")["amount"].sum()
+    return totals.sort_index()
+
+
+def init_budget_rollup():
+    """Create the rollup table on startup and build it from existing items (bootstrap step; errors propagate)"""
+    with get_engine().begin() as conn:
+        rows = rebuild_rollup(conn)
+    log_info(f"Built budget_rollup ({rows} rows)")
+
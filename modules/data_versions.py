@@ -0,0 +1,132 @@
+"""
+Data Versions Module
+A version counter per (project site, dataset), bumped in the same transaction as every write.
+Cached readers get the current versions as an argument, so a write at one site only changes
+the cache keys of that site's readers, and other server processes pick the write up on their
+next version check instead of waiting out a TTL
+"""
+import functools
+import inspect
+import threading
+import time
+
+from sqlalchemy import bindparam, event, text
+from db import get_engine
+from logger import log_warning
+
+DATASETS = ("items", "requests", "access_codes")
+# Bumped by every write; readers that span all sites (or have no site) are keyed on it
+ALL_SITES = "*"
+# Bumped by writes that can touch any site; added to every site's version
+RESET = "*reset*"
+# How long a process trusts its copy of the table before re-reading it
+VERSION_CHECK_SECONDS = 2.0
+
+_lock = threading.Lock()
+_memo = {"checked": 0.0, "versions": {}}
+
+
+def expire_versions():
+    """Make the next data_version() call re-read the table"""
+    _memo["checked"] = 0.0
+
+
+def _forget_versions(conn):
+    """Commit hook for connections that bumped a version"""
+    if conn.info.pop("data_versions_bumped", False):
+        expire_versions()
+
+
+def bump_versions(conn, dataset, sites=None):
+    """
+    Bump dataset's version for sites, plus the all-sites row, on the caller's transaction.
+    sites=None (restores, imports, writes whose sites aren't known) bumps the reset row,
+    which is part of every site's version.
+    """
+    if not event.contains(conn.engine, "commit", _forget_versions):
+        event.listen(conn.engine, "commit", _forget_versions)
+    conn.info["data_versions_bumped"] = True
+    sites = [RESET] if sites is None else sorted({site for site in sites if site})
+    conn.execute(text("""
+        INSERT INTO data_versions (project_site, dataset, version) VALUES (:project_site, :dataset, 1)
+        ON CONFLICT (project_site, dataset) DO UPDATE SET version = data_versions.version + 1
+    """), [{"project_site": site, "dataset": dataset} for site in sites + [ALL_SITES]])
+
+
+def restart_versions(conn, previous):
+    """
+    After data_versions itself was restored from a backup: move every version past all of
+    `previous` (the table's rows before the restore), so no earlier cache key can match again
+    """
+    if not event.contains(conn.engine, "commit", _forget_versions):
+        event.listen(conn.engine, "commit", _forget_versions)
+    conn.info["data_versions_bumped"] = True
+    # Larger than any earlier version, and than any earlier site + reset sum
+    offset = sum(previous.values()) + 1
+    conn.execute(text("UPDATE data_versions SET version = version + :offset"), {"offset": offset})
+    conn.execute(text("""
+        INSERT INTO data_versions (project_site, dataset, version) VALUES (:project_site, :dataset, :offset)
+        ON CONFLICT (project_site, dataset) DO NOTHING
+    """), [{"project_site": site, "dataset": dataset, "offset": offset}
+           for dataset in DATASETS for site in (RESET, ALL_SITES)])
+
+
+def bump_item_versions(conn, dataset, item_ids):
+    """Bump dataset for the sites owning item_ids (call before deleting the items)"""
+    ids = sorted({int(item_id) for item_id in item_ids if item_id is not None})
+    if not ids:
+        return
+    sites = [row[0] for row in conn.execute(
+        text("SELECT DISTINCT project_site FROM items WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids},
+    )]
+    bump_versions(conn, dataset, sites)
+
+
+def current_versions():
+    """{(project_site, dataset): version}, re-read at most every VERSION_CHECK_SECONDS"""
+    now = time.monotonic()
+    if now - _memo["checked"] < VERSION_CHECK_SECONDS:
+        return _memo["versions"]
+    with _lock:
+        if time.monotonic() - _memo["checked"] >= VERSION_CHECK_SECONDS:
+            try:
+                with get_engine().connect() as conn:
+                    rows = conn.execute(text("SELECT project_site, dataset, version FROM data_versions"))
+                    _memo["versions"] = {(site, dataset): int(version) for site, dataset, version in rows}
+            except Exception as e:
+                log_warning(f"Data version check failed (serving cached versions): {e}")
+            _memo["checked"] = time.monotonic()
+    return _memo["versions"]
+
+
+def data_version(dataset, project_site=None):
+    """
+    Current version of one dataset for a site (the all-sites row when project_site is None).
+    Both counters only go up, so their sum changes whenever either does.
+    """
+    versions = current_versions()
+    if not project_site:
+        return versions.get((ALL_SITES, dataset), 0)
+    return versions.get((project_site, dataset), 0) + versions.get((RESET, dataset), 0)
+
+
+def versioned(*datasets):
+    """
+    Put between @profile_call and @bounded_cache. Passes the current versions of datasets for
+    the call's project_site argument as data_version, which makes them part of the cache key.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs).arguments
+            project_site = bound.get("project_site", bound.get("filters", {}).get("project_site"))
+            kwargs["data_version"] = tuple(data_version(dataset, project_site) for dataset in datasets)
+            return func(*args, **kwargs)
+        if hasattr(func, "clear"):
+            wrapper.clear = func.clear
+        return wrapper
+    return decorator
+
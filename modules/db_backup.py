@@ -0,0 +1,279 @@
+"""
+Database Backup Module
+Consistent full backups of the whole database while the app keeps writing, one directory per
+backup (istrominventory_backup_<timestamp>/) with a manifest.json written last:
+    SQLite      the online backup API copies BACKUP_PAGES_PER_STEP pages at a time into
+                database.db, releasing the database between steps so writers aren't blocked
+                (under a steady stream of writes it finishes in one step, see BACKUP_MAX_RESTARTS)
+    PostgreSQL  one COPY ... TO STDOUT per table into <table>.csv.gz, all inside a single
+                read-only REPEATABLE READ transaction, so every table is from the same snapshot
+The manifest lists each file with its row count and sha256. Restores check the checksums, then
+stream the files back the same way. Backups are built under a .partial name and renamed when
+complete, so list_backups() never sees a half-written one.
+"""
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+import pytz
+from sqlalchemy import text
+from logger import log_info
+from modules.schema import TABLES, dialect_of, apply_schema
+from modules.data_versions import restart_versions
+from modules.delta_frames import mark_full_reload
+
+BACKUP_PREFIX = "istrominventory_backup_"
+MANIFEST_FILE = "manifest.json"
+SQLITE_FILE = "database.db"
+MANIFEST_FORMAT = 1
+# SQLite pages copied per backup step (4 MB at the default page size); the lock is released between steps
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP") or 1024)
+# A write from another connection between steps restarts the copy; after this many restarts the
+# rest is copied in one step, holding off writers for that long instead of never finishing
+BACKUP_MAX_RESTARTS = 3
+COPY_COMPRESS_LEVEL = 6
+HASH_CHUNK_BYTES = 2**20
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _backup_name(directory):
+    """istrominventory_backup_<WAT timestamp>, suffixed when a backup already has that second"""
+    stamp = datetime.now(pytz.timezone("Africa/Lagos")).strftime("%Y%m%d_%H%M%S")
+    name, n = f"{BACKUP_PREFIX}{stamp}", 1
+    while (directory / name).exists() or (directory / f"{name}.partial").exists():
+        name, n = f"{BACKUP_PREFIX}{stamp}_{n}", n + 1
+    return name
+
+
+def _table_order(tables):
+    """Declared tables in creation order (parents before the tables referencing them), then any others"""
+    return [table for table in TABLES if table in tables] + sorted(set(tables) - set(TABLES))
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _copy_pages(source, dest):
+    """sqlite3 online backup of source into dest, BACKUP_PAGES_PER_STEP pages per step"""
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        # Pages left only go down, unless the copy started over
+        if state["remaining"] is not None and remaining >= state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state["remaining"] = remaining
+
+    try:
+        source.backup(dest, pages=BACKUP_PAGES_PER_STEP, progress=progress)
+    except _TooManyRestarts:
+        source.backup(dest, pages=-1)
+
+
+def _sqlite_backup(engine, target):
+    """Online backup of the live database into target/database.db; returns the manifest's table entries"""
+    path = target / SQLITE_FILE
+    raw = engine.raw_connection()
+    try:
+        dest = sqlite3.connect(path)
+        try:
+            # A write from another connection between steps restarts the copy, so what lands in the
+            # file is always one consistent state of the database
+            _copy_pages(raw.driver_connection, dest)
+            check = dest.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise RuntimeError(f"Backup failed its integrity check: {check}")
+            names = [row[0] for row in dest.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            rows = {name: dest.execute(f"SELECT COUNT(*) FROM {_quote(name)}").fetchone()[0] for name in names}
+        finally:
+            dest.close()
+    finally:
+        raw.close()
+    return [{"table": name, "file": SQLITE_FILE, "rows": rows[name]} for name in _table_order(rows)]
+
+
+def _pg_columns(conn):
+    rows = conn.execute(text("""
+        SELECT c.table_name, c.column_name FROM information_schema.columns c
+        JOIN information_schema.tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+        WHERE c.table_schema = current_schema() AND t.table_type = 'BASE TABLE'
+        ORDER BY c.table_name, c.ordinal_position
+    """)).fetchall()
+    columns = {}
+    for table, column in rows:
+        columns.setdefault(table, []).append(column)
+    return columns
+
+
+def _pg_backup(engine, target):
+    """COPY every table to target/<table>.csv.gz from one snapshot; returns the manifest's table entries"""
+    entries = []
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+        with conn.begin():
+            # The snapshot is taken by the first query; every COPY below reads from it
+            columns = _pg_columns(conn)
+            cursor = conn.connection.driver_connection.cursor()
+            for table in _table_order(columns):
+                file = f"{table}.csv.gz"
+                column_list = ", ".join(_quote(column) for column in columns[table])
+                with gzip.open(target / file, "wb", compresslevel=COPY_COMPRESS_LEVEL) as out:
+                    cursor.copy_expert(f"COPY {_quote(table)} ({column_list}) TO STDOUT WITH (FORMAT csv, HEADER true)", out)
+                entries.append({"table": table, "file": file, "rows": cursor.rowcount, "columns": columns[table]})
+    return entries
+
+
+def backup_database(engine, directory):
+    """
+    Take a consistent backup of the whole database into a new directory under `directory`.
+    Returns its manifest (with "path" added).
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    dialect = "sqlite" if engine.url.get_backend_name() == "sqlite" else "postgresql"
+    name = _backup_name(directory)
+    partial = directory / f"{name}.partial"
+    partial.mkdir()
+    started = time.perf_counter()
+    try:
+        tables = _sqlite_backup(engine, partial) if dialect == "sqlite" else _pg_backup(engine, partial)
+        files = {}
+        for entry in tables:
+            if entry["file"] not in files:
+                files[entry["file"]] = {"bytes": (partial / entry["file"]).stat().st_size,
+                                        "sha256": _sha256(partial / entry["file"])}
+        manifest = {
+            "format": MANIFEST_FORMAT,
+            "dialect": dialect,
+            "created_at": datetime.now(pytz.timezone("Africa/Lagos")).isoformat(timespec="seconds"),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "tables": tables,
+            "files": files,
+        }
+        with open(partial / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=1)
+        partial.rename(directory / name)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    total_bytes = sum(file["bytes"] for file in files.values())
+    log_info(f"Database backup {name} ({dialect}): {sum(entry['rows'] for entry in tables)} rows in "
+             f"{len(tables)} tables, {total_bytes / 2**20:.1f} MB in {manifest['duration_ms']:.0f} ms")
+    return {**manifest, "path": str(directory / name)}
+
+
+def read_manifest(path):
+    """A backup's manifest; legacy single-file backups (plain copies of the SQLite file) get a minimal one"""
+    path = Path(path)
+    if path.is_file():
+        return {"format": 0, "dialect": "sqlite", "tables": [], "files": {}}
+    with open(path / MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def list_backups(directory):
+    """Complete backups in directory, newest first: backup directories and legacy .db copies"""
+    directory = Path(directory)
+    backups = [path for path in directory.glob(f"{BACKUP_PREFIX}*")
+               if (path.is_dir() and (path / MANIFEST_FILE).exists()) or (path.is_file() and path.suffix == ".db")]
+    return sorted(backups, key=lambda path: path.stat().st_mtime, reverse=True)
+
+
+def remove_backup(path):
+    """Delete one backup (directory or legacy file)"""
+    path = Path(path)
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def verify_backup(path):
+    """Raise ValueError unless every file of the backup matches the manifest's checksum"""
+    path = Path(path)
+    manifest = read_manifest(path)
+    for file, expected in manifest["files"].items():
+        if not (path / file).exists():
+            raise ValueError(f"Backup {path.name} is missing {file}")
+        if _sha256(path / file) != expected["sha256"]:
+            raise ValueError(f"Backup {path.name}: {file} does not match its checksum")
+    return manifest
+
+
+def _sqlite_restore(engine, source_path):
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    raw = engine.raw_connection()
+    try:
+        # Pages go straight into the live file under SQLite's own locking, so open connections
+        # see the restored database instead of a file swapped out from under them
+        _copy_pages(source, raw.driver_connection)
+    finally:
+        raw.close()
+        source.close()
+    # Backups from before later migrations get the missing tables, columns and triggers
+    apply_schema(engine)
+
+
+def _pg_restore(engine, path, manifest):
+    entries = manifest["tables"]
+    with engine.begin() as conn:
+        live = _pg_columns(conn)
+        missing = [entry["table"] for entry in entries if entry["table"] not in live]
+        if missing:
+            raise ValueError(f"Backup has tables this database doesn't: {', '.join(missing)}")
+        conn.execute(text("TRUNCATE " + ", ".join(_quote(entry["table"]) for entry in entries) + " RESTART IDENTITY CASCADE"))
+        cursor = conn.connection.driver_connection.cursor()
+        for entry in entries:
+            column_list = ", ".join(_quote(column) for column in entry["columns"])
+            with gzip.open(path / entry["file"], "rb") as data:
+                cursor.copy_expert(f"COPY {_quote(entry['table'])} ({column_list}) FROM STDIN WITH (FORMAT csv, HEADER true)", data)
+            if "id" in entry["columns"]:
+                # Serial columns carry on after the restored ids (setval of a NULL sequence is a no-op)
+                conn.execute(text(f"""
+                    SELECT setval(pg_get_serial_sequence(:table, 'id'), COALESCE((SELECT MAX(id) FROM {_quote(entry['table'])}), 0) + 1, false)
+                """), {"table": entry["table"]})
+
+
+def restore_database(engine, path):
+    """
+    Replace the database's contents with a backup (checked against its manifest first).
+    Cached data is invalidated in every process: data versions move past all earlier values
+    and the next delta-frame refresh re-reads in full. Returns the manifest.
+    """
+    path = Path(path)
+    manifest = verify_backup(path)
+    with engine.connect() as conn:
+        dialect = dialect_of(conn)
+        previous = {(site, dataset): int(version) for site, dataset, version in
+                    conn.execute(text("SELECT project_site, dataset, version FROM data_versions"))}
+    if manifest["dialect"] != dialect:
+        raise ValueError(f"Backup {path.name} is a {manifest['dialect']} backup; this database is {dialect}")
+    started = time.perf_counter()
+    if dialect == "sqlite":
+        _sqlite_restore(engine, path if path.is_file() else path / SQLITE_FILE)
+    else:
+        _pg_restore(engine, path, manifest)
+    with engine.begin() as conn:
+        restart_versions(conn, previous)
+        mark_full_reload(conn)
+    log_info(f"Database restored from {path.name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return manifest
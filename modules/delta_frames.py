@@ -0,0 +1,199 @@
+"""
+Delta Frames Module
+Keeps the last result of a cached reader per process and refreshes it incrementally: only rows
+whose updated_at (stamped by the database, see TRIGGERS in modules/schema.py) moved past the
+frame's high-water mark are re-read, tombstoned rows are dropped, and the result is merged into
+the held DataFrame. A refresh costs a query over the changed rows instead of the whole table.
+
+Held frames are snapshots shared by every session of the process: they are never modified after
+they are stored, their columns are typed by modules/frame_schema.py, and callers get a shallow view instead
+of the pickled copy st.cache_data would hand each of them. With Copy-on-Write (always on from
+pandas 3) a caller adding or overwriting columns on its view leaves the snapshot untouched.
+They are held in a bounded cache (modules/bounded_cache.py): least recently used frames go first
+past DELTA_FRAME_SLOTS or DELTA_FRAME_MAX_MB, and sessions refreshing the same frame together
+wait for one refresh.
+
+A frame spec is a dict:
+    select          SELECT ... FROM ... without WHERE/ORDER BY
+    id_column       SQL expression of the row id (the frame's "id" column)
+    changed_ids     SQL selecting the ids of rows changed since :since
+    tombstones      tracked table whose tombstones remove frame rows
+    reload_on       tracked tables whose deletes force a full re-read (rows joined from them)
+    filters         frame column -> SQL expression, for the filters a caller may pass
+    order_by        (frame columns, ascending) - the order of the full query
+    schema          dataset in FRAME_SCHEMAS the frame's columns are typed by
+"""
+import os
+import functools
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+from db import get_engine
+from modules.schema import CHANGE_CLOCK_SQL, dialect_of
+from modules.profiler import count_miss
+from modules.frame_schema import apply_frame_schema, read_frame
+from modules.bounded_cache import get_cache, handout
+
+# Re-read this far behind the high-water mark: covers transactions that stamped rows before the
+# mark but committed after it, and small clock differences between app servers and the database
+DELTA_OVERLAP_SECONDS = 10
+# Frames older than this re-read in full, so tombstones only need keeping this long
+TOMBSTONE_RETENTION_DAYS = 7
+# Frames held per process (one per reader/site/filter combination), and the memory they may take
+DELTA_FRAME_SLOTS = 32
+DELTA_FRAME_MAX_MB = float(os.getenv("DELTA_FRAME_MAX_MB") or 256)
+# Tombstone table_name that makes every frame re-read in full (left by database restores)
+FULL_RELOAD = "*"
+
+# Site item list, refreshed incrementally from the rows changed since the last read
+ITEM_FRAME = {
+    "select": """
+        SELECT id, code, name, category, unit, qty, unit_cost, budget, section, grp, building_type, project_site,
+               budget_num, budget_building_type, budget_category, budget_subcategory
+        FROM items
+    """,
+    "id_column": "id",
+    "changed_ids": "SELECT id FROM items WHERE updated_at > :since",
+    "tombstones": "items",
+    "filters": {"project_site": "project_site"},
+    "order_by": (("budget", "section", "grp", "building_type", "name"), True),
+    "schema": "items",
+}
+
+# Request list with its item columns, refreshed incrementally. A request counts as changed when it or
+# its item was written; an item delete re-reads the list (its requests drop out of the join)
+REQUEST_FRAME = {
+    "select": """
+        SELECT r.id, r.ts, r.section, i.name as item, r.qty, r.requested_by, r.note, r.building_subtype, r.status, r.approved_by,
+               i.budget, i.building_type, i.grp, i.project_site, i.unit_cost, COALESCE(r.current_price, i.unit_cost) as current_price,
+               i.qty as planned_qty, r.updated_at
+        FROM requests r
+        JOIN items i ON r.item_id=i.id
+    """,
+    "id_column": "r.id",
+    "changed_ids": """
+        SELECT id FROM requests WHERE updated_at > :since
+        UNION SELECT id FROM requests WHERE item_id IN (SELECT id FROM items WHERE updated_at > :since)
+    """,
+    "tombstones": "requests",
+    "reload_on": ("items",),
+    "filters": {"project_site": "i.project_site", "status": "r.status"},
+    "order_by": (("ts", "id"), False),
+    "schema": "requests",
+}
+
+_frames = get_cache("delta_frames", max_entries=DELTA_FRAME_SLOTS, max_bytes=int(DELTA_FRAME_MAX_MB * 2**20))
+
+
+def clear_frames(name=None):
+    """Drop the held frames of one reader (all readers when name is None); they re-read in full"""
+    _frames.clear(keep=None if name is None else lambda key: key[0] != name)
+
+
+def shared_frame(name):
+    """
+    Use in place of @bounded_cache on a reader that returns refresh_frame(name, ...):
+    gives it the .clear() that clear_cache() and the refresh buttons call
+    """
+    def decorator(func):
+        func.clear = functools.partial(clear_frames, name)
+        return func
+    return decorator
+
+
+def change_clock(conn):
+    """Database time as a naive Africa/Lagos datetime (the updated_at clock)"""
+    value = conn.execute(text(f"SELECT {CHANGE_CLOCK_SQL[dialect_of(conn)]}")).scalar()
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=None)
+
+
+def _where(spec, filters):
+    conditions = [f"{spec['filters'][column]} = :{column}" for column in filters]
+    return (" WHERE " + " AND ".join(conditions)) if conditions else ""
+
+
+def _sorted(frame, spec, dialect):
+    columns, ascending = spec["order_by"]
+    # SQLite sorts NULLs first in ascending order, PostgreSQL last
+    na_position = "first" if (dialect == "sqlite") == ascending else "last"
+    return frame.sort_values(list(columns), ascending=ascending, na_position=na_position,
+                             kind="stable").reset_index(drop=True)
+
+
+def _full_read(conn, spec, filters):
+    return read_frame(text(spec["select"] + _where(spec, filters)), conn, spec["schema"], params=filters)
+
+
+def _merge(conn, spec, filters, frame, since):
+    """frame with the changes since `since` applied, or None when it has to be re-read in full"""
+    reload_on = spec.get("reload_on", ())
+    deleted = conn.execute(text("""
+        SELECT table_name, row_id FROM tombstones
+        WHERE deleted_at > :since AND table_name IN :tables
+    """).bindparams(bindparam("tables", expanding=True)),
+        {"since": since, "tables": [spec["tombstones"], *reload_on, FULL_RELOAD]}).fetchall()
+    if any(table in reload_on or table == FULL_RELOAD for table, _ in deleted):
+        return None
+    # Tombstoned ids are read back too: a row deleted and inserted again (restores) is still there
+    changed = pd.read_sql_query(text(f"""
+        {spec["select"]} WHERE {spec["id_column"]} IN (
+            {spec["changed_ids"]}
+            UNION SELECT row_id FROM tombstones WHERE table_name = :table AND deleted_at > :since
+        )
+    """), conn, params={"since": since, "table": spec["tombstones"]})
+    stale = set(changed["id"]) | {row_id for _, row_id in deleted}
+    # Changed rows that no longer match the filters (moved to another site, new status) just leave
+    for column, value in filters.items():
+        changed = changed[changed[column] == value]
+    kept = frame[~frame["id"].isin(stale)]
+    if changed.empty:
+        return kept
+    changed = apply_frame_schema(changed, spec["schema"])
+    if kept.empty:
+        return changed
+    # Categoricals with different categories concatenate to plain text; the schema re-encodes them
+    return pd.concat([kept, changed], ignore_index=True)
+
+
+def refresh_frame(name, spec, version=None, **filters):
+    """
+    Current rows of spec (narrowed by filters) as a view of the shared snapshot. name identifies
+    the reader; each filter combination is held separately. A snapshot taken at the same data
+    version (modules/data_versions.py) is returned without touching the database; otherwise it
+    is refreshed from the rows changed since it was taken, once for all callers waiting on it.
+    """
+    key = (name, tuple(sorted(filters.items())))
+
+    def refresh(held):
+        count_miss(name)
+        with get_engine().connect() as conn:
+            dialect = dialect_of(conn)
+            # Read before the rows, so anything stamped after this is past the next refresh's mark
+            mark = change_clock(conn)
+            frame = None
+            if held is not None and mark - held["mark"] < timedelta(days=TOMBSTONE_RETENTION_DAYS):
+                since = (held["mark"] - timedelta(seconds=DELTA_OVERLAP_SECONDS)).isoformat(timespec="microseconds")
+                frame = _merge(conn, spec, filters, held["frame"], since)
+            if frame is None:
+                frame = _full_read(conn, spec, filters)
+            frame = apply_frame_schema(_sorted(frame, spec, dialect), spec["schema"])
+        return {"frame": frame, "mark": mark, "version": version}
+
+    held = _frames.get_or_compute(key, refresh,
+                                  valid=lambda held: version is not None and held["version"] == version)
+    return handout(held["frame"])
+
+
+def mark_full_reload(conn):
+    """Make every process re-read its frames in full on their next refresh (rows were replaced wholesale)"""
+    conn.execute(text(f"INSERT INTO tombstones (table_name, row_id, deleted_at) VALUES (:table, 0, {CHANGE_CLOCK_SQL[dialect_of(conn)]})"),
+                 {"table": FULL_RELOAD})
+
+
+def purge_tombstones(conn):
+    """Delete tombstones older than any frame still refreshed from them; returns the count"""
+    cutoff = (change_clock(conn) - timedelta(days=TOMBSTONE_RETENTION_DAYS)).isoformat(timespec="microseconds")
+    return conn.execute(text("DELETE FROM tombstones WHERE deleted_at < :cutoff"), {"cutoff": cutoff}).rowcount
@@ -0,0 +1,127 @@
+"""
+Frame Schema Module
+One typed schema per dataset frame (items, requests, actuals), applied once when the frame is
+read: repetitive text as categoricals, numbers as float64/Int64, timestamps parsed. Readers
+hand out frames that need no further type fixing (fix_dataframe_types skips typed columns).
+read_frame types the rows chunk by chunk, so the untyped rows of a large table are never all
+in memory at once.
+"""
+import pandas as pd
+
+# Values without an offset are app-local time (get_nigerian_time), like the ones with +01:00
+LOCAL_TIMEZONE = "Africa/Lagos"
+DATETIME = "datetime"
+READ_CHUNK_ROWS = 20000
+
+FRAME_SCHEMAS = {
+    "items": {
+        "id": "int64",
+        "category": "category",
+        "unit": "category",
+        "qty": "float64",
+        "unit_cost": "float64",
+        "budget": "category",
+        "section": "category",
+        "grp": "category",
+        "building_type": "category",
+        "project_site": "category",
+        "budget_num": "Int64",
+        "budget_building_type": "category",
+        "budget_category": "category",
+        "budget_subcategory": "category",
+    },
+    "requests": {
+        "id": "int64",
+        "ts": DATETIME,
+        "section": "category",
+        "qty": "float64",
+        "requested_by": "category",
+        "status": "category",
+        "approved_by": "category",
+        "budget": "category",
+        "building_type": "category",
+        "grp": "category",
+        "project_site": "category",
+        "unit_cost": "float64",
+        "current_price": "float64",
+        "planned_qty": "float64",
+        "updated_at": DATETIME,
+    },
+    "actuals": {
+        "id": "int64",
+        "item_id": "int64",
+        "actual_qty": "float64",
+        "actual_cost": "float64",
+        "actual_date": DATETIME,
+        "recorded_by": "category",
+        "created_at": DATETIME,
+        "project_site": "category",
+        "budget": "category",
+        "building_type": "category",
+        "unit": "category",
+        "category": "category",
+        "section": "category",
+        "grp": "category",
+    },
+}
+
+
+def local_datetimes(values):
+    """Timestamps as naive local datetime64 - ISO text with or without an offset, or datetimes"""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if getattr(values.dt, "tz", None) is not None:
+            return values.dt.tz_convert(LOCAL_TIMEZONE).dt.tz_localize(None)
+        return values
+    text = values.astype("string").str.strip()
+    aware = text.str.contains(r"(?:[+-]\d\d:?\d\d|Z)$", na=False)
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    if aware.any():
+        stamps = pd.to_datetime(text[aware], format="ISO8601", utc=True, errors="coerce")
+        parsed[aware] = stamps.dt.tz_convert(LOCAL_TIMEZONE).dt.tz_localize(None)
+    if (~aware).any():
+        parsed[~aware] = pd.to_datetime(text[~aware], format="ISO8601", errors="coerce")
+    return parsed
+
+
+def _converted(series, dtype):
+    if dtype == DATETIME:
+        return series if pd.api.types.is_datetime64_dtype(series) else local_datetimes(series)
+    if str(series.dtype) == dtype:
+        return series
+    if dtype in ("float64", "Int64"):
+        series = pd.to_numeric(series, errors="coerce")
+    return series.astype(dtype)
+
+
+def apply_frame_schema(frame, dataset):
+    """frame with its dataset's columns typed (columns the frame doesn't have are skipped)"""
+    schema = FRAME_SCHEMAS[dataset]
+    typed = frame.assign(**{column: _converted(frame[column], dtype)
+                            for column, dtype in schema.items() if column in frame.columns})
+    typed.attrs["frame_schema"] = dataset
+    return typed
+
+
+def typed_columns(frame):
+    """Columns of frame typed by its dataset schema when it was read"""
+    return set(FRAME_SCHEMAS.get(frame.attrs.get("frame_schema"), {})) & set(frame.columns)
+
+
+def read_frame(sql, conn, dataset, params=None, chunk_rows=READ_CHUNK_ROWS):
+    """Typed result of a query, read and typed chunk_rows rows at a time"""
+    # Server-side cursor on PostgreSQL, so the driver doesn't buffer every row either
+    conn = conn.execution_options(stream_results=True)
+    chunks = [apply_frame_schema(chunk, dataset)
+              for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunk_rows)]
+    if len(chunks) == 1:
+        return chunks[0]
+    # Give each categorical column the same categories in every chunk so they concatenate as categoricals
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals([chunk[column] for chunk in chunks], sort_categories=True).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    frame = pd.concat(chunks, ignore_index=True)
+    frame.attrs["frame_schema"] = dataset
+    return frame
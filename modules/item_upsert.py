@@ -0,0 +1,191 @@
+"""
+Item Upsert Module
+Normalizes an uploaded or hand-entered items frame column-wise and writes it with chunked
+multi-row INSERT ... ON CONFLICT DO UPDATE statements. Items with a code are keyed on
+(project_site, code); items without one on their natural key (site, name, category, context).
+"""
+import pandas as pd
+from sqlalchemy import text
+from db import get_engine
+from logger import log_info
+from modules.budget_labels import BUDGET_COLUMNS, parse_budget_labels
+from modules.budget_rollup import rebuild_rollup
+from modules.request_ledger import rebuild_ledger
+from modules.schema import NATURAL_KEY_SQL, dialect_of, rebuild_sqlite_table
+
+ITEM_COLUMNS = ("code", "name", "category", "unit", "qty", "unit_cost",
+                "budget", "section", "grp", "building_type", "project_site") + BUDGET_COLUMNS
+CONTEXT_COLUMNS = ("budget", "section", "grp", "building_type")
+
+# 500 rows x 15 columns stays well under the bind parameter limits of SQLite and PostgreSQL
+UPSERT_CHUNK_ROWS = 500
+
+# Source column aliases, in priority order
+NAME_COLUMNS = ("name", "item", "role")
+UNIT_COLUMNS = ("unit", "uom", "units")
+CODE_COLUMNS = ("code", "item_id", "labour_id")
+QTY_COLUMNS = ("qty", "quantity", "available_slots")
+
+
+def _first_text(df, columns):
+    """Per row, the first non-blank value among columns as stripped text (None when all are blank)"""
+    result = pd.Series(pd.NA, index=df.index, dtype="string")
+    for column in columns:
+        if column in df.columns:
+            values = df[column].astype("string").str.strip()
+            result = result.fillna(values.mask(values == ""))
+    return result
+
+
+def _first_number(df, columns):
+    """Per row, the first numeric value among columns (NaN when none parses)"""
+    result = pd.Series(float("nan"), index=df.index)
+    for column in columns:
+        if column in df.columns:
+            result = result.fillna(pd.to_numeric(df[column], errors="coerce"))
+    return result
+
+
+def normalize_items(df, category_guess=None, budget=None, section=None, grp=None, building_type=None,
+                    project_site="Default Project"):
+    """
+    Items frame with ITEM_COLUMNS built from a raw frame in a few column operations.
+    Keyword arguments fill context the rows don't carry. Rows without a name are dropped, and
+    rows repeating a key keep their last occurrence, like applying them one after another would.
+    """
+    frame = pd.DataFrame(index=df.index)
+    frame["code"] = _first_text(df, CODE_COLUMNS)
+    frame["name"] = _first_text(df, NAME_COLUMNS)
+    frame["unit"] = _first_text(df, UNIT_COLUMNS)
+    frame["qty"] = _first_number(df, QTY_COLUMNS).fillna(0.0)
+    frame["unit_cost"] = _first_number(df, ("unit_cost",))
+
+    fallback = "labour" if ("role" in df.columns or "available_slots" in df.columns) else "materials"
+    category = _first_text(df, ("category",)).fillna((category_guess or "").strip()).str.lower()
+    frame["category"] = category.where(category.isin(["materials", "labour"]), fallback)
+
+    defaults = {"budget": budget, "section": section, "grp": grp, "building_type": building_type,
+                "project_site": project_site}
+    for column, default in defaults.items():
+        frame[column] = _first_text(df, (column,))
+        if default:
+            frame[column] = frame[column].fillna(default)
+
+    frame = frame[frame["name"].notna()]
+    key = frame[["project_site", "code", "name", "category", *CONTEXT_COLUMNS]].fillna("")
+    key.loc[frame["code"].notna(), ["name", "category", *CONTEXT_COLUMNS]] = ""
+    frame = frame[~key.duplicated(keep="last")]
+
+    frame = pd.concat([frame, parse_budget_labels(frame["budget"].astype(object))], axis=1)
+    return frame[list(ITEM_COLUMNS)].reset_index(drop=True)
+
+
+def _records(frame):
+    """Frame rows as tuples in ITEM_COLUMNS order, with None for missing values"""
+    frame = frame[list(ITEM_COLUMNS)]
+    return list(frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None))
+
+
+def _upsert_chunk(conn, rows, conflict, updates):
+    """
+    One multi-row INSERT ... ON CONFLICT DO UPDATE; returns the ids written. Sent with the
+    driver's own placeholders - compiling thousands of named text() binds costs more than the write.
+    """
+    placeholder = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+    row_sql = "(" + ", ".join([placeholder] * len(ITEM_COLUMNS)) + ")"
+    params = tuple(value for row in rows for value in row)
+    result = conn.exec_driver_sql(f"""
+        INSERT INTO items ({', '.join(ITEM_COLUMNS)})
+        VALUES {', '.join([row_sql] * len(rows))}
+        ON CONFLICT {conflict} DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in updates)}
+        RETURNING id
+    """, params)
+    return [row[0] for row in result]
+
+
+def upsert_item_rows(conn, frame, chunk_rows=UPSERT_CHUNK_ROWS):
+    """
+    Write a normalize_items frame on the caller's connection. Coded rows update every column
+    of the matching (project_site, code) item; codeless rows update unit, qty and unit cost of
+    their natural-key match. Returns {"inserted": n, "updated": n}.
+    """
+    if frame.empty:
+        return {"inserted": 0, "updated": 0}
+    # Ids only grow, so anything above the current maximum was inserted by this call
+    max_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM items")).scalar()
+    coded = frame["code"].notna()
+    batches = [
+        (frame[coded], "(project_site, code)",
+         [column for column in ITEM_COLUMNS if column not in ("code", "project_site")]),
+        (frame[~coded], f"({NATURAL_KEY_SQL}) WHERE code IS NULL", ["unit", "qty", "unit_cost"]),
+    ]
+    written = []
+    for rows, conflict, updates in batches:
+        records = _records(rows)
+        for start in range(0, len(records), chunk_rows):
+            written += _upsert_chunk(conn, records[start:start + chunk_rows], conflict, updates)
+    inserted = sum(1 for item_id in written if item_id > max_id)
+    return {"inserted": inserted, "updated": len(written) - inserted}
+
+
+def merge_duplicate_items(conn):
+    """
+    Make the item keys unique, so idx_items_site_code and idx_items_natural_key can be created.
+    Items repeating an older item's code and natural key (or, without a code, its natural key)
+    are the same item: they fold into the oldest, moving their requests and actuals across.
+    Coded items sharing only a site and code with an older, different item are kept under
+    "<code>#<id>" instead. Returns the number of items merged or recoded.
+    """
+    moves = [dict(row) for row in conn.execute(text(f"""
+        SELECT id, keep_id FROM (
+            SELECT id, MIN(id) OVER (PARTITION BY code IS NULL, COALESCE(code, ''), {NATURAL_KEY_SQL}) AS keep_id
+            FROM items
+        ) keyed
+        WHERE id <> keep_id
+    """)).mappings()]
+    if moves:
+        for table in ("requests", "actuals"):
+            conn.execute(text(f"UPDATE {table} SET item_id = :keep_id WHERE item_id = :id"), moves)
+        conn.execute(text("DELETE FROM items WHERE id = :id"), moves)
+        rebuild_ledger(conn)
+        rebuild_rollup(conn)
+    recoded = conn.execute(text("""
+        UPDATE items SET code = code || '#' || id WHERE id IN (
+            SELECT id FROM (
+                SELECT id, MIN(id) OVER (PARTITION BY project_site, code) AS keep_id
+                FROM items WHERE code IS NOT NULL
+            ) keyed
+            WHERE id <> keep_id
+        )
+    """)).rowcount
+    return len(moves) + recoded
+
+
+def drop_global_code_unique(conn):
+    """
+    Older databases declared items.code globally unique; it is unique per project site now
+    (idx_items_site_code). Returns whether a constraint was dropped.
+    """
+    if dialect_of(conn) != "sqlite":
+        found = conn.execute(text("""
+            SELECT 1 FROM pg_constraint WHERE conname = 'items_code_key' AND conrelid = 'items'::regclass
+        """)).first()
+        if found:
+            conn.execute(text("ALTER TABLE items DROP CONSTRAINT items_code_key"))
+        return found is not None
+    # SQLite keeps a column UNIQUE constraint as an automatic index on that column alone
+    for index in conn.execute(text("PRAGMA index_list(items)")).mappings().fetchall():
+        if index["unique"] and index["origin"] == "u":
+            columns = [row[2] for row in conn.execute(text(f"PRAGMA index_info('{index['name']}')"))]
+            if columns == ["code"]:
+                rebuild_sqlite_table(conn, "items")
+                return True
+    return False
+
+
+def init_item_keys():
+    """Drop the global unique constraint on items.code left by older databases (bootstrap step; errors propagate)"""
+    with get_engine().begin() as conn:
+        dropped = drop_global_code_unique(conn)
+    if dropped:
+        log_info("Dropped the global unique constraint on items.code (unique per project site now)")
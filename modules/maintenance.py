@@ -0,0 +1,263 @@
+"""
+Maintenance Module
+Background housekeeping off the request path: retention purges in small batches, planner
+statistics and SQLite compaction. One daemon thread per server process checks for due jobs;
+a cross-process lock and the maintenance_runs table make each job run on one replica per
+interval. Durations and row counts are logged and recorded for the Admin tab.
+"""
+import os
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import text
+from db import get_engine
+from logger import log_info, log_error
+from modules.schema import dialect_of
+from modules.delta_frames import purge_tombstones
+from modules.notification_summary import rebuild_summary
+
+try:
+    import fcntl  # POSIX file locks for SQLite deployments
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+# MAINTENANCE_SCHEDULER=0 turns the background thread off (jobs can still be run from the Admin tab)
+MAINTENANCE_ENABLED = (os.getenv("MAINTENANCE_SCHEDULER") or "1").strip().lower() not in ("0", "false", "no", "off")
+# First check this long after startup, so it doesn't compete with the first page loads
+MAINTENANCE_START_DELAY_SECONDS = 60
+MAINTENANCE_TICK_SECONDS = 300
+# Rows deleted per transaction, and the pause between batches that lets app writes in
+PURGE_BATCH_ROWS = 500
+PURGE_BATCH_PAUSE_SECONDS = 0.05
+
+ACCESS_LOG_RETENTION_DAYS = int(os.getenv("ACCESS_LOG_RETENTION_DAYS") or 90)
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS") or 90)
+DELETED_REQUEST_RETENTION_DAYS = int(os.getenv("DELETED_REQUEST_RETENTION_DAYS") or 365)
+# SQLite is rebuilt by VACUUM only when at least this share of its pages is free
+VACUUM_FREE_FRACTION = 0.2
+
+# Arbitrary application-wide key for pg_try_advisory_lock (BOOTSTRAP_LOCK_KEY + 1)
+MAINTENANCE_LOCK_KEY = 72650432
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+_scheduler_lock = threading.Lock()
+_thread = None
+_jobs = []
+_stop = threading.Event()
+
+
+def _now():
+    """App-local (Africa/Lagos) time, naive - the clock retention cutoffs are compared against"""
+    return datetime.now(pytz.timezone("Africa/Lagos")).replace(tzinfo=None)
+
+
+def _cutoff(days):
+    return (_now() - timedelta(days=days)).isoformat(timespec="seconds")
+
+
+def purge_in_batches(engine, table, condition, params):
+    """Delete rows of table matching condition, PURGE_BATCH_ROWS per transaction; returns the count"""
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            count = conn.execute(text(f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} WHERE {condition} ORDER BY id LIMIT :batch_rows
+                )
+            """), {**params, "batch_rows": PURGE_BATCH_ROWS}).rowcount
+        deleted += count
+        if count < PURGE_BATCH_ROWS:
+            return deleted
+        time.sleep(PURGE_BATCH_PAUSE_SECONDS)
+
+
+def purge_access_logs(engine):
+    """Access log entries older than ACCESS_LOG_RETENTION_DAYS"""
+    return purge_in_batches(engine, "access_logs", "access_time < :cutoff",
+                            {"cutoff": _cutoff(ACCESS_LOG_RETENTION_DAYS)})
+
+
+def purge_notifications(engine):
+    """Read notifications older than NOTIFICATION_RETENTION_DAYS (unread ones are kept)"""
+    deleted = purge_in_batches(engine, "notifications", "is_read = 1 AND created_at < :cutoff",
+                               {"cutoff": _cutoff(NOTIFICATION_RETENTION_DAYS)})
+    if deleted:
+        # latest_id may have pointed at a purged row
+        with engine.begin() as conn:
+            rebuild_summary(conn)
+    return deleted
+
+
+def purge_deleted_requests(engine):
+    """Deleted-request log entries older than DELETED_REQUEST_RETENTION_DAYS"""
+    return purge_in_batches(engine, "deleted_requests", "deleted_at < :cutoff",
+                            {"cutoff": _cutoff(DELETED_REQUEST_RETENTION_DAYS)})
+
+
+def purge_old_tombstones(engine):
+    """Tombstones no cached frame is refreshed from any more"""
+    with engine.begin() as conn:
+        return purge_tombstones(conn)
+
+
+def analyze_tables(engine):
+    """Refresh the query planner's statistics"""
+    with engine.begin() as conn:
+        if dialect_of(conn) == "sqlite":
+            # Samples at most ~1000 rows per index, so it stays quick on large tables
+            conn.execute(text("PRAGMA analysis_limit = 1000"))
+        conn.execute(text("ANALYZE"))
+    return None
+
+
+def vacuum_database(engine):
+    """
+    SQLite: rebuild the file when enough of it is free pages (returns the pages freed).
+    PostgreSQL: plain VACUUM of the purged tables (autovacuum covers the rest).
+    """
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        if dialect_of(conn) != "sqlite":
+            conn.execute(text("VACUUM (ANALYZE) access_logs, notifications, deleted_requests, tombstones"))
+            return None
+        pages = conn.execute(text("PRAGMA page_count")).scalar() or 0
+        free = conn.execute(text("PRAGMA freelist_count")).scalar() or 0
+        if not pages or free / pages < VACUUM_FREE_FRACTION:
+            return 0
+        conn.execute(text("VACUUM"))
+        return free
+
+
+# (name, interval in seconds, job(engine) -> rows affected or None)
+MAINTENANCE_JOBS = [
+    ("purge_access_logs", HOUR, purge_access_logs),
+    ("purge_notifications", HOUR, purge_notifications),
+    ("purge_deleted_requests", DAY, purge_deleted_requests),
+    ("purge_tombstones", HOUR, purge_old_tombstones),
+    ("analyze", DAY, analyze_tables),
+    ("vacuum", 7 * DAY, vacuum_database),
+]
+
+
+@contextmanager
+def maintenance_lock(engine):
+    """
+    Yields whether this process may run maintenance now - without waiting for another replica.
+    PostgreSQL: session advisory lock. SQLite: non-blocking flock on a file next to the database.
+    """
+    backend = engine.url.get_backend_name()
+    if backend == "postgresql":
+        with engine.connect() as lock_conn:
+            acquired = lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}).scalar()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+        return
+
+    database = engine.url.database
+    if backend != "sqlite" or not database or database == ":memory:" or fcntl is None:
+        yield True
+        return
+    with open(f"{os.path.abspath(database)}.maintenance.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _last_started(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT job, started_at FROM maintenance_runs")).fetchall()
+    return {job: datetime.fromisoformat(started_at) for job, started_at in rows}
+
+
+def _run_job(engine, name, job):
+    started_at = _now()
+    started = time.perf_counter()
+    rows = error = None
+    try:
+        rows = job(engine)
+        status = "ok"
+    except Exception as e:
+        status, error = "error", str(e)[:500]
+        log_error(f"Maintenance job {name} failed: {e}")
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    run = {"job": name, "started_at": started_at.isoformat(timespec="seconds"), "duration_ms": duration_ms,
+           "row_count": rows, "status": status, "error": error, "host": f"{socket.gethostname()}:{os.getpid()}"}
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO maintenance_runs (job, started_at, duration_ms, row_count, status, error, host)
+            VALUES (:job, :started_at, :duration_ms, :row_count, :status, :error, :host)
+            ON CONFLICT (job) DO UPDATE SET
+                started_at = excluded.started_at, duration_ms = excluded.duration_ms, row_count = excluded.row_count,
+                status = excluded.status, error = excluded.error, host = excluded.host
+        """), run)
+    if status == "ok":
+        log_info(f"Maintenance job {name}: {rows if rows is not None else '-'} rows in {duration_ms:.0f} ms")
+    return run
+
+
+def run_due_jobs(jobs=None, force=False):
+    """
+    Run the jobs whose interval has passed since their last run on any replica (all of them
+    with force). Returns the runs made - none while another process holds the lock.
+    """
+    jobs = _jobs if jobs is None else jobs
+    engine = get_engine()
+    with maintenance_lock(engine) as acquired:
+        if not acquired:
+            return []
+        # Read under the lock, so a job another replica just finished isn't run again
+        last = _last_started(engine)
+        now = _now()
+        return [_run_job(engine, name, job) for name, interval, job in jobs
+                if force or name not in last or now - last[name] >= timedelta(seconds=interval)]
+
+
+def _loop():
+    _stop.wait(MAINTENANCE_START_DELAY_SECONDS)
+    while not _stop.is_set():
+        try:
+            run_due_jobs()
+        except Exception as e:
+            log_error(f"Maintenance check failed: {e}")
+        _stop.wait(MAINTENANCE_TICK_SECONDS)
+
+
+def start_maintenance(jobs):
+    """Start the maintenance thread once per server process; later calls only update the job list"""
+    global _thread, _jobs
+    with _scheduler_lock:
+        _jobs = list(jobs)
+        if _thread is None and MAINTENANCE_ENABLED:
+            _thread = threading.Thread(target=_loop, name="maintenance", daemon=True)
+            _thread.start()
+
+
+def get_maintenance_runs():
+    """Last run of every job as dicts (any replica's), with the job's interval and next due time"""
+    intervals = {name: interval for name, interval, _ in _jobs}
+    with get_engine().connect() as conn:
+        rows = conn.execute(text("""
+            SELECT job, started_at, duration_ms, row_count, status, error, host FROM maintenance_runs ORDER BY job
+        """)).mappings().fetchall()
+    runs = {row["job"]: dict(row) for row in rows}
+    for name, interval in intervals.items():
+        run = runs.setdefault(name, {"job": name, "started_at": None, "duration_ms": None, "row_count": None,
+                                     "status": "not run yet", "error": None, "host": None})
+        run["every_hours"] = round(interval / HOUR, 1)
+        run["next_due"] = ((datetime.fromisoformat(run["started_at"]) + timedelta(seconds=interval))
+                           .isoformat(timespec="seconds") if run["started_at"] else "next check")
+    return sorted(runs.values(), key=lambda run: run["job"])
@@ -0,0 +1,64 @@
+"""
+Notification Outbox Module
+Queues notifications during a request transaction and writes them with one multi-row INSERT
+in the same commit, using ids and project sites the caller already has
+"""
+from sqlalchemy import text
+from modules.notification_summary import SITE_NOTIFICATION_TYPES, add_to_site_summary
+
+NOTIFICATION_COLUMNS = ("notification_type", "title", "message", "user_id", "request_id", "is_read", "created_at")
+
+
+def queue_notification(outbox, notification_type, title, message, request_id=None, user_id=None,
+                       project_site=None, is_read=0):
+    """
+    Add a notification to an outbox (a plain list).
+
+    user_id:      a users.id the caller already knows, or None for admin / project site notifications
+                  (-1, the legacy "all project site accounts" marker, is stored as NULL as well)
+    project_site: the request's site, for keeping notification_summary in step without a lookup
+    """
+    outbox.append({
+        "notification_type": notification_type,
+        "title": title,
+        "message": message,
+        "user_id": user_id if isinstance(user_id, int) and user_id > 0 else None,
+        "request_id": request_id if request_id and request_id > 0 else None,
+        "is_read": 1 if is_read else 0,
+        "project_site": project_site,
+    })
+
+
+def flush_notifications(conn, outbox, created_at):
+    """
+    Insert every queued notification with a single statement on the caller's connection, then
+    count them into the summary rows of their sites. Empties the outbox; returns the number written.
+    """
+    if not outbox:
+        return 0
+    rows = []
+    params = {}
+    for index, notification in enumerate(outbox):
+        rows.append("(" + ", ".join(f":{column}_{index}" for column in NOTIFICATION_COLUMNS) + ")")
+        for column in NOTIFICATION_COLUMNS:
+            params[f"{column}_{index}"] = created_at if column == "created_at" else notification[column]
+    inserted = conn.execute(text(f"""
+        INSERT INTO notifications ({', '.join(NOTIFICATION_COLUMNS)})
+        VALUES {', '.join(rows)}
+        RETURNING id, notification_type, request_id, is_read
+    """), params).fetchall()
+
+    # Site rows move by what was inserted; the queued sites save looking them up
+    site_of = {(n["notification_type"], n["request_id"]): n["project_site"] for n in outbox}
+    by_site = {}
+    for notification_id, notification_type, request_id, is_read in inserted:
+        project_site = site_of.get((notification_type, request_id))
+        if notification_type in SITE_NOTIFICATION_TYPES and request_id and project_site:
+            unread, latest_id = by_site.get(project_site, (0, notification_id))
+            by_site[project_site] = (unread + (0 if is_read else 1), max(latest_id, notification_id))
+    for project_site, (unread, latest_id) in sorted(by_site.items()):
+        add_to_site_summary(conn, project_site, unread, latest_id)
+
+    written = len(outbox)
+    outbox.clear()
+    return written
@@ -0,0 +1,190 @@
+"""
+Notification Summary Module
+Keeps one row per project site with its unread count, latest notification id and a version
+counter, so the banner and popups can check a primary-key row instead of re-running the
+notifications/requests/items join on every rerun. Writes adjust the rows by what they changed
+(looked up by notification id); only rebuild_summary recounts from the notifications table.
+"""
+from sqlalchemy import text, bindparam
+from db import get_engine
+from logger import log_info, log_warning, log_error
+from modules.schema import create_table
+
+# Notification types a project site account sees (linked to its requests through items.project_site)
+SITE_NOTIFICATION_TYPES = ('request_submitted', 'request_approved', 'request_rejected')
+
+# Summary rows aggregated straight from the notifications table - narrowed to the notifications
+# a write touched for the incremental updates, over everything for refresh and rebuild
+SUMMARY_AGGREGATE_SQL = """
+    SELECT i.project_site AS project_site,
+           COALESCE(SUM(CASE WHEN COALESCE(n.is_read, 0) = 0 THEN 1 ELSE 0 END), 0) AS unread_count,
+           MAX(n.id) AS latest_id
+    FROM notifications n
+    JOIN requests r ON n.request_id = r.id
+    JOIN items i ON r.item_id = i.id
+    WHERE n.notification_type IN ('request_submitted', 'request_approved', 'request_rejected')
+      AND i.project_site IS NOT NULL
+"""
+
+
+def ensure_summary_table(conn):
+    """Create the notification_summary table if it doesn't exist (declared in modules/schema.py)"""
+    create_table(conn, "notification_summary")
+
+
+def _counts_by_site(conn, notification_ids):
+    """(project_site, unread, latest id) per site over the given notifications of the summary's types"""
+    ids = sorted({int(notification_id) for notification_id in notification_ids if notification_id})
+    if not ids:
+        return []
+    return conn.execute(text(f"""
+        {SUMMARY_AGGREGATE_SQL} AND n.id IN :ids
+        GROUP BY i.project_site
+    """).bindparams(bindparam("ids", expanding=True)), {"ids": ids}).fetchall()
+
+
+def add_to_site_summary(conn, project_site, unread, latest_id):
+    """
+    Count new notifications into a site's row: unread_count goes up by unread, latest_id up to
+    latest_id, version up by one. Same transaction as the INSERT.
+    """
+    if project_site:
+        conn.execute(text("""
+            INSERT INTO notification_summary (project_site, unread_count, latest_id, version)
+            VALUES (:project_site, :unread, :latest_id, 1)
+            ON CONFLICT (project_site) DO UPDATE SET
+                unread_count = notification_summary.unread_count + excluded.unread_count,
+                latest_id = CASE WHEN notification_summary.latest_id IS NULL
+                                   OR notification_summary.latest_id < excluded.latest_id
+                                 THEN excluded.latest_id ELSE notification_summary.latest_id END,
+                version = notification_summary.version + 1
+        """), {"project_site": project_site, "unread": int(unread or 0), "latest_id": latest_id})
+
+
+def add_notifications_to_summary(conn, notification_ids):
+    """add_to_site_summary for newly inserted notifications, their sites looked up by id"""
+    for project_site, unread, latest_id in _counts_by_site(conn, notification_ids):
+        add_to_site_summary(conn, project_site, unread, latest_id)
+
+
+def _take_unread(conn, project_site, unread):
+    conn.execute(text("""
+        UPDATE notification_summary
+        SET unread_count = CASE WHEN unread_count > :unread THEN unread_count - :unread ELSE 0 END,
+            version = version + 1
+        WHERE project_site = :project_site
+    """), {"project_site": project_site, "unread": int(unread or 0)})
+
+
+def mark_notifications_read(conn, notification_ids):
+    """Mark notifications read, taking the ones that were unread off their sites' unread counts"""
+    ids = sorted({int(notification_id) for notification_id in notification_ids if notification_id})
+    if not ids:
+        return
+    counts = _counts_by_site(conn, ids)
+    conn.execute(text("UPDATE notifications SET is_read = 1 WHERE id IN :ids")
+                 .bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+    for project_site, unread, _ in counts:
+        if unread:
+            _take_unread(conn, project_site, unread)
+
+
+def delete_notifications(conn, notification_ids):
+    """
+    Delete notifications, taking their unread ones off their sites' counts. A site whose latest
+    notification went is recounted (deleting the newest notification is rare).
+    """
+    ids = sorted({int(notification_id) for notification_id in notification_ids if notification_id})
+    if not ids:
+        return
+    counts = _counts_by_site(conn, ids)
+    conn.execute(text("DELETE FROM notifications WHERE id IN :ids")
+                 .bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+    for project_site, unread, _ in counts:
+        summary = get_site_summary(conn, project_site)
+        if summary and summary["latest_id"] in ids:
+            refresh_site_summary(conn, project_site)
+        else:
+            _take_unread(conn, project_site, unread)
+
+
+def refresh_site_summary(conn, project_site):
+    """
+    Recount one site's summary row from its notifications and bump its version.
+    Call on the same connection/transaction as the notifications write.
+    """
+    if not project_site:
+        return
+    conn.execute(text(f"""
+        INSERT INTO notification_summary (project_site, unread_count, latest_id, version)
+        SELECT :project_site, COALESCE(MAX(unread_count), 0), MAX(latest_id), 1
+        FROM ({SUMMARY_AGGREGATE_SQL} AND i.project_site = :project_site GROUP BY i.project_site) counted
+        WHERE true
+        ON CONFLICT (project_site) DO UPDATE SET
+            unread_count = excluded.unread_count,
+            latest_id = excluded.latest_id,
+            version = notification_summary.version + 1
+    """), {"project_site": project_site})
+
+
+def rebuild_summary(conn):
+    """
+    Recount every site inside the caller's transaction (after bulk deletes, imports, restores).
+    Versions only ever go up, so memos keyed on them can't match stale data after a rebuild.
+    """
+    ensure_summary_table(conn)
+    conn.execute(text("UPDATE notification_summary SET unread_count = 0, latest_id = NULL, version = version + 1"))
+    result = conn.execute(text(f"""
+        INSERT INTO notification_summary (project_site, unread_count, latest_id, version)
+        SELECT project_site, unread_count, latest_id, 1
+        FROM ({SUMMARY_AGGREGATE_SQL} GROUP BY i.project_site) counted
+        WHERE true
+        ON CONFLICT (project_site) DO UPDATE SET
+            unread_count = excluded.unread_count,
+            latest_id = excluded.latest_id
+    """))
+    return result.rowcount
+
+
+def get_site_summary(conn, project_site):
+    """Summary row for a site as a dict, or None if the site has never had a notification"""
+    row = conn.execute(text("""
+        SELECT unread_count, latest_id, version FROM notification_summary WHERE project_site = :project_site
+    """), {"project_site": project_site}).fetchone()
+    if not row:
+        return None
+    return {"unread_count": int(row[0] or 0), "latest_id": row[1], "version": int(row[2] or 0)}
+
+
+def get_notification_summary(project_site):
+    """Summary row for a site in its own connection; None if missing or unavailable"""
+    if not project_site:
+        return None
+    try:
+        with get_engine().connect() as conn:
+            return get_site_summary(conn, project_site)
+    except Exception as e:
+        log_warning(f"Notification summary lookup failed for {project_site}: {e}")
+        return None
+
+
+def init_notification_summary():
+    """Create the summary table on startup and backfill it from existing notifications (bootstrap step; errors propagate)"""
+    engine = get_engine()
+    with engine.begin() as conn:
+        rows = rebuild_summary(conn)
+    if rows:
+        log_info(f"Backfilled notification_summary for {rows} project sites")
+
+
+def rebuild_notification_summary():
+    """Rebuild the summary in its own transaction - returns the number of site rows written"""
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            rows = rebuild_summary(conn)
+        log_info(f"Rebuilt notification_summary ({rows} sites)")
+        return rows
+    except Exception as e:
+        log_error(f"Failed to rebuild notification_summary: {e}")
+        return None
@@ -0,0 +1,258 @@
+"""
+Rerun Profiler Module
+Opt-in per-rerun timings: app sections, cached data functions and SQL queries,
+kept in a rolling in-memory history for the Admin tab
+"""
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+
+# PERF_PROFILER=1 turns profiling on at startup; admins can also toggle it from the Admin tab.
+# PERF_PROFILER_HISTORY is the number of reruns kept (oldest dropped first).
+_enabled = (os.getenv("PERF_PROFILER") or "").strip().lower() in ("1", "true", "yes", "on")
+HISTORY_SIZE = int(os.getenv("PERF_PROFILER_HISTORY") or 50)
+SLOW_QUERY_LIMIT = 5
+
+# Module state survives reruns; every Streamlit session runs its script in its own thread,
+# so the rerun being recorded is thread-local and finished reruns go to a shared history.
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+_current = threading.local()
+_hooked_engines = set()
+
+
+def profiler_enabled():
+    """Whether reruns are being recorded"""
+    return _enabled
+
+
+def set_profiler_enabled(enabled):
+    """Turn recording on or off for this server process"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def _record():
+    """The rerun being recorded on this thread, or None"""
+    return getattr(_current, "record", None)
+
+
+def start_rerun():
+    """Begin recording a rerun (no-op while the profiler is off)"""
+    if not _enabled:
+        _current.record = None
+        return
+    now = time.perf_counter()
+    _current.record = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "label": None,
+        "sections": {},
+        "calls": {},
+        "queries": 0,
+        "query_ms": 0.0,
+        "slow_queries": [],
+        "_started": now,
+        "_section": None,
+        "_section_started": now,
+    }
+
+
+def _close_section(record, now):
+    name = record["_section"]
+    if name is not None:
+        elapsed = (now - record["_section_started"]) * 1000
+        record["sections"][name] = record["sections"].get(name, 0.0) + elapsed
+    record["_section"] = None
+    record["_section_started"] = now
+
+
+def checkpoint(name):
+    """End the current section and start timing `name` (for top-level script code that can't be wrapped)"""
+    record = _record()
+    if record is None:
+        return
+    now = time.perf_counter()
+    _close_section(record, now)
+    record["_section"] = name
+
+
+@contextmanager
+def section(name):
+    """Time a block as its own section"""
+    record = _record()
+    if record is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        record["sections"][name] = record["sections"].get(name, 0.0) + elapsed
+
+
+def finish_rerun(label=None):
+    """Close the rerun and add it to the history; returns the stored record or None"""
+    record = _record()
+    _current.record = None
+    if record is None:
+        return None
+    now = time.perf_counter()
+    _close_section(record, now)
+    record["label"] = label
+    record["total_ms"] = (now - record.pop("_started")) * 1000
+    record.pop("_section")
+    record.pop("_section_started")
+    record["sections"] = {name: round(ms, 1) for name, ms in record["sections"].items()}
+    for stats in record["calls"].values():
+        stats["ms"] = round(stats["ms"], 1)
+    record["query_ms"] = round(record["query_ms"], 1)
+    record["total_ms"] = round(record["total_ms"], 1)
+    with _history_lock:
+        _history.append(record)
+    return record
+
+
+def _call_stats(record, name):
+    return record["calls"].setdefault(name, {"count": 0, "ms": 0.0, "misses": 0, "cached": False})
+
+
+def profile_call(name, cached=False):
+    """
+    Time every call of a data function. Put it above @bounded_cache and put
+    profile_miss(name) below it: calls minus misses are the cache hits.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = _record()
+            if record is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats = _call_stats(record, name)
+                stats["count"] += 1
+                stats["ms"] += (time.perf_counter() - started) * 1000
+                stats["cached"] = cached
+        if hasattr(func, "clear"):
+            wrapper.clear = func.clear  # keep the cache's .clear() reachable
+        return wrapper
+    return decorator
+
+
+def count_miss(name):
+    """Count one cache miss of a profiled data function (where profile_miss can't wrap the body)"""
+    record = _record()
+    if record is not None:
+        _call_stats(record, name)["misses"] += 1
+
+
+def profile_miss(name):
+    """Count executions of a cached function's body - it only runs on a cache miss"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            count_miss(name)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _record() is not None:
+        conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record = _record()
+    started = conn.info.get("profiler_started")
+    if record is None or not started:
+        return
+    elapsed = (time.perf_counter() - started.pop()) * 1000
+    record["queries"] += 1
+    record["query_ms"] += elapsed
+    slow = record["slow_queries"]
+    if len(slow) < SLOW_QUERY_LIMIT or elapsed > slow[-1]["ms"]:
+        slow.append({"ms": round(elapsed, 2), "sql": " ".join(statement.split())[:200]})
+        slow.sort(key=lambda query: query["ms"], reverse=True)
+        del slow[SLOW_QUERY_LIMIT:]
+
+
+def install_query_hook(engine):
+    """Count queries and their latency for the rerun running on the executing thread (idempotent)"""
+    if id(engine) in _hooked_engines:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _hooked_engines.add(id(engine))
+
+
+def get_recent_reruns():
+    """Recorded reruns, oldest first"""
+    with _history_lock:
+        return list(_history)
+
+
+def clear_history():
+    """Forget all recorded reruns"""
+    with _history_lock:
+        _history.clear()
+
+
+def summarize_reruns(reruns=None):
+    """Aggregate the history: slowest sections, queries per rerun and cache hit rate per function"""
+    reruns = get_recent_reruns() if reruns is None else reruns
+    summary = {"reruns": len(reruns), "sections": [], "functions": [], "queries_per_rerun": 0.0,
+               "query_ms_per_rerun": 0.0, "avg_rerun_ms": 0.0, "cache_hit_rate": None}
+    if not reruns:
+        return summary
+
+    sections = {}
+    for rerun in reruns:
+        for name, ms in rerun["sections"].items():
+            sections.setdefault(name, []).append(ms)
+    summary["sections"] = sorted(
+        ({"section": name, "runs": len(times), "avg_ms": round(sum(times) / len(times), 1), "max_ms": max(times)}
+         for name, times in sections.items()),
+        key=lambda row: row["avg_ms"], reverse=True
+    )
+
+    functions = {}
+    for rerun in reruns:
+        for name, stats in rerun["calls"].items():
+            total = functions.setdefault(name, {"function": name, "calls": 0, "misses": 0, "ms": 0.0, "cached": False})
+            total["calls"] += stats["count"]
+            total["misses"] += stats["misses"]
+            total["ms"] += stats["ms"]
+            total["cached"] = total["cached"] or stats["cached"]
+    hits = calls = 0
+    for total in functions.values():
+        total["avg_ms"] = round(total.pop("ms") / total["calls"], 1) if total["calls"] else 0.0
+        if total["cached"]:
+            total["hit_rate"] = round(1 - total["misses"] / total["calls"], 3) if total["calls"] else None
+            hits += total["calls"] - total["misses"]
+            calls += total["calls"]
+        else:
+            total["hit_rate"] = None
+    summary["functions"] = sorted(functions.values(), key=lambda row: row["avg_ms"], reverse=True)
+    summary["cache_hit_rate"] = round(hits / calls, 3) if calls else None
+
+    count = len(reruns)
+    summary["queries_per_rerun"] = round(sum(rerun["queries"] for rerun in reruns) / count, 1)
+    summary["query_ms_per_rerun"] = round(sum(rerun["query_ms"] for rerun in reruns) / count, 1)
+    summary["avg_rerun_ms"] = round(sum(rerun["total_ms"] for rerun in reruns) / count, 1)
+    return summary
+
+
+def export_json():
+    """Summary plus the raw rerun history as a JSON document"""
+    reruns = get_recent_reruns()
+    return json.dumps({"summary": summarize_reruns(reruns), "reruns": reruns}, indent=2, default=str)
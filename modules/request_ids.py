@@ -0,0 +1,183 @@
+"""
+Request ID Allocation Module
+Allocates ids for new requests without scanning the whole requests table
+"""
+import os
+from sqlalchemy import text
+from db import get_engine
+from logger import log_info
+from modules.schema import create_table
+
+# REQUEST_ID_MODE=reuse    -> hand out ids freed by deleted requests first (lowest first), then the sequence
+# REQUEST_ID_MODE=sequence -> always use the native SERIAL / AUTOINCREMENT id
+REQUEST_ID_MODE = (os.getenv("REQUEST_ID_MODE") or "reuse").strip().lower()
+# Most gap ids a rebuild pools (the lowest ones); a big jump in ids would otherwise write millions of rows
+REQUEST_ID_POOL_MAX_GAP_IDS = int(os.getenv("REQUEST_ID_POOL_MAX_GAP_IDS") or 10000)
+
+
+def reuse_enabled():
+    """Whether freed request ids are handed out again"""
+    return REQUEST_ID_MODE != "sequence"
+
+
+def ensure_id_pool_table(conn):
+    """Create the free-id pool table if it doesn't exist (declared in modules/schema.py)"""
+    create_table(conn, "request_id_pool")
+
+
+def rebuild_id_pool(conn):
+    """
+    Refill the pool with the lowest REQUEST_ID_POOL_MAX_GAP_IDS gaps below MAX(requests.id) in one
+    statement and resync the sequence. Used on first start and after bulk changes to requests
+    (import, restore, site deletion). Reused ids say nothing about when a request was made:
+    anything shown or paged in time order sorts on (ts, id), never on id alone.
+    """
+    ensure_id_pool_table(conn)
+    conn.execute(text("DELETE FROM request_id_pool"))
+    sync_id_sequence(conn)
+    if not reuse_enabled():
+        return 0
+    result = conn.execute(text("""
+        INSERT INTO request_id_pool (id)
+        WITH RECURSIVE bounds AS (
+            SELECT id, LEAD(id) OVER (ORDER BY id) AS next_id
+            FROM (SELECT 0 AS id UNION ALL SELECT id FROM requests) ids
+        ),
+        sized AS (
+            SELECT id, next_id,
+                   SUM(next_id - id - 1) OVER (ORDER BY id ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+                       - (next_id - id - 1) AS pooled_before
+            FROM bounds WHERE next_id > id + 1
+        ),
+        capped AS (
+            -- Gaps past the cap are left out and the one crossing it is cut short
+            SELECT id,
+                   CASE WHEN pooled_before + (next_id - id - 1) > :cap THEN id + 1 + :cap - pooled_before
+                        ELSE next_id END AS next_id
+            FROM sized WHERE pooled_before < :cap
+        ),
+        gaps AS (
+            SELECT id + 1 AS gap_id, next_id FROM capped
+            UNION ALL
+            SELECT gap_id + 1, next_id FROM gaps WHERE gap_id + 1 < next_id
+        )
+        SELECT gap_id FROM gaps
+    """), {"cap": REQUEST_ID_POOL_MAX_GAP_IDS})
+    return result.rowcount
+
+
+def sync_id_sequence(conn):
+    """Move the PostgreSQL requests sequence past MAX(id) so sequence ids never collide with reused ones"""
+    if conn.engine.url.get_backend_name() != "postgresql":
+        return
+    conn.execute(text("""
+        SELECT setval(pg_get_serial_sequence('requests', 'id'),
+                      GREATEST((SELECT COALESCE(MAX(id), 0) FROM requests), 1))
+    """))
+
+
+def release_request_id(conn, req_id):
+    """Return a deleted request's id to the pool (same transaction as the DELETE)"""
+    if not reuse_enabled() or not req_id:
+        return
+    conn.execute(text("""
+        INSERT INTO request_id_pool (id) VALUES (:id)
+        ON CONFLICT (id) DO NOTHING
+    """), {"id": int(req_id)})
+
+
+def allocate_request_id(conn):
+    """
+    Take the lowest free id from the pool, or None to let the database assign the next sequence id.
+
+    The claim is a single DELETE ... RETURNING, so two submissions can never get the same id:
+    on PostgreSQL the candidate row is locked with SKIP LOCKED (a concurrent submitter moves on
+    to the next free id), and SQLite serializes writers. Ids that were taken by an explicit insert
+    since they were pooled are skipped.
+    """
+    if not reuse_enabled():
+        return None
+    lock_clause = "FOR UPDATE SKIP LOCKED" if conn.engine.url.get_backend_name() == "postgresql" else ""
+    row = conn.execute(text(f"""
+        DELETE FROM request_id_pool
+        WHERE id = (
+            SELECT p.id FROM request_id_pool p
+            WHERE NOT EXISTS (SELECT 1 FROM requests r WHERE r.id = p.id)
+            ORDER BY p.id
+            LIMIT 1
+            {lock_clause}
+        )
+        RETURNING id
+    """)).fetchone()
+    return int(row[0]) if row else None
+
+
+def reserve_request_ids(conn, count):
+    """
+    Ids for a multi-row insert of count requests: free ids from the pool first (claimed with one
+    DELETE ... RETURNING), the rest from the sequence - PostgreSQL nextval() over a series, SQLite
+    the AUTOINCREMENT high-water mark (an index lookup, not a scan; the DELETE already holds the
+    write lock).
+    """
+    if count <= 0:
+        return []
+    backend = conn.engine.url.get_backend_name()
+    ids = []
+    if reuse_enabled():
+        lock_clause = "FOR UPDATE SKIP LOCKED" if backend == "postgresql" else ""
+        rows = conn.execute(text(f"""
+            DELETE FROM request_id_pool
+            WHERE id IN (
+                SELECT p.id FROM request_id_pool p
+                WHERE NOT EXISTS (SELECT 1 FROM requests r WHERE r.id = p.id)
+                ORDER BY p.id
+                LIMIT :count
+                {lock_clause}
+            )
+            RETURNING id
+        """), {"count": count}).fetchall()
+        ids = sorted(int(row[0]) for row in rows)
+    missing = count - len(ids)
+    if missing and backend == "postgresql":
+        rows = conn.execute(text("""
+            SELECT nextval(pg_get_serial_sequence('requests', 'id')) FROM generate_series(1, :missing)
+        """), {"missing": missing}).fetchall()
+        ids.extend(int(row[0]) for row in rows)
+    elif missing:
+        high = conn.execute(text("""
+            SELECT MAX(high) FROM (
+                SELECT MAX(id) AS high FROM requests
+                UNION ALL
+                SELECT seq FROM sqlite_sequence WHERE name = 'requests'
+            ) marks
+        """)).scalar() or 0
+        ids.extend(range(int(high) + 1, int(high) + 1 + missing))
+    return ids
+
+
+def format_request_ids(ids):
+    """
+    "#3, #7-#9" for ids [3, 7, 8, 9]: sorted, with consecutive ids joined into runs. Reused ids
+    leave a batch non-contiguous, so first-last alone would name requests that aren't in it.
+    """
+    runs = []
+    for req_id in sorted(set(int(i) for i in ids)):
+        if runs and req_id == runs[-1][1] + 1:
+            runs[-1][1] = req_id
+        else:
+            runs.append([req_id, req_id])
+    return ", ".join(f"#{first}" if first == last else f"#{first}-#{last}" for first, last in runs)
+
+
+def init_request_id_pool():
+    """Create the pool on startup and seed it with existing gaps the first time (bootstrap step; errors propagate)"""
+    engine = get_engine()
+    with engine.begin() as conn:
+        ensure_id_pool_table(conn)
+        if not reuse_enabled():
+            return
+        has_pool = conn.execute(text("SELECT 1 FROM request_id_pool LIMIT 1")).fetchone()
+        if not has_pool:
+            rows = rebuild_id_pool(conn)
+            if rows:
+                log_info(f"Seeded request_id_pool with {rows} free ids")
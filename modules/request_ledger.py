@@ -0,0 +1,168 @@
+"""
+Requested Quantity Ledger Module
+Maintains running requested/approved/pending totals per (item, building subtype)
+so over-planned checks don't have to re-aggregate the requests table
+"""
+from sqlalchemy import text
+from db import get_engine
+from logger import log_info, log_warning, log_error
+from modules.schema import create_table
+
+# Statuses that count towards the requested quantity of an item
+COUNTED_STATUSES = ('Pending', 'Approved')
+
+# Ledger rows aggregated straight from the requests table - used by rebuild and verify
+LEDGER_AGGREGATE_SQL = """
+    SELECT item_id,
+           COALESCE(TRIM(building_subtype), '') AS building_subtype,
+           SUM(qty) AS requested_qty,
+           SUM(CASE WHEN status = 'Approved' THEN qty ELSE 0 END) AS approved_qty,
+           SUM(CASE WHEN status = 'Pending' THEN qty ELSE 0 END) AS pending_qty,
+           COUNT(*) AS request_count
+    FROM requests
+    WHERE status IN ('Pending', 'Approved')
+    GROUP BY item_id, COALESCE(TRIM(building_subtype), '')
+"""
+
+
+def normalize_subtype(building_subtype):
+    """Ledger key for a building subtype (blocks are stored stripped, missing as '')"""
+    if isinstance(building_subtype, str):
+        return building_subtype.strip()
+    return ""
+
+
+def ensure_ledger_table(conn):
+    """Create the request_ledger table if it doesn't exist (declared in modules/schema.py)"""
+    create_table(conn, "request_ledger")
+
+
+def apply_ledger_delta(conn, item_id, building_subtype, status, qty, sign=1, count=1):
+    """
+    Add (sign=1) or remove (sign=-1) one request's contribution to the ledger - or, with count,
+    the summed quantity of several requests on the same (item, subtype).
+    Must be called on the same connection/transaction as the requests write.
+    """
+    if status not in COUNTED_STATUSES or qty is None:
+        return
+    qty = float(qty) * sign
+    conn.execute(text("""
+        INSERT INTO request_ledger (item_id, building_subtype, requested_qty, approved_qty, pending_qty, request_count)
+        VALUES (:item_id, :building_subtype, :qty, :approved_qty, :pending_qty, :count)
+        ON CONFLICT (item_id, building_subtype) DO UPDATE SET
+            requested_qty = request_ledger.requested_qty + excluded.requested_qty,
+            approved_qty = request_ledger.approved_qty + excluded.approved_qty,
+            pending_qty = request_ledger.pending_qty + excluded.pending_qty,
+            request_count = request_ledger.request_count + excluded.request_count
+    """), {
+        "item_id": int(item_id),
+        "building_subtype": normalize_subtype(building_subtype),
+        "qty": qty,
+        "approved_qty": qty if status == 'Approved' else 0.0,
+        "pending_qty": qty if status == 'Pending' else 0.0,
+        "count": sign * count
+    })
+
+
+def apply_ledger_transition(conn, item_id, building_subtype, old_status, new_status, qty, count=1):
+    """Move one request's quantity (or count requests' summed quantity) from its old status bucket to the new one"""
+    if old_status == new_status:
+        return
+    apply_ledger_delta(conn, item_id, building_subtype, old_status, qty, sign=-1, count=count)
+    apply_ledger_delta(conn, item_id, building_subtype, new_status, qty, sign=1, count=count)
+
+
+def get_requested_qty(conn, item_id, building_subtype):
+    """Cumulative Pending + Approved quantity for one (item, building subtype) - indexed point lookup"""
+    result = conn.execute(text("""
+        SELECT requested_qty FROM request_ledger
+        WHERE item_id = :item_id AND building_subtype = :building_subtype
+    """), {"item_id": int(item_id), "building_subtype": normalize_subtype(building_subtype)})
+    row = result.fetchone()
+    return float(row[0] or 0) if row else 0.0
+
+
+def rebuild_ledger(conn):
+    """Recompute the whole ledger from the requests table inside the caller's transaction"""
+    ensure_ledger_table(conn)
+    conn.execute(text("DELETE FROM request_ledger"))
+    result = conn.execute(text(f"""
+        INSERT INTO request_ledger (item_id, building_subtype, requested_qty, approved_qty, pending_qty, request_count)
+        {LEDGER_AGGREGATE_SQL}
+    """))
+    return result.rowcount
+
+
+def verify_ledger(conn, tolerance=1e-6):
+    """
+    Compare the ledger with a fresh aggregate of the requests table.
+    Returns a list of drifted rows as dicts (empty list means the ledger is consistent).
+    """
+    result = conn.execute(text(f"""
+        WITH expected AS ({LEDGER_AGGREGATE_SQL})
+        SELECT COALESCE(e.item_id, l.item_id) AS item_id,
+               COALESCE(e.building_subtype, l.building_subtype) AS building_subtype,
+               COALESCE(e.requested_qty, 0) AS expected_requested,
+               COALESCE(l.requested_qty, 0) AS ledger_requested,
+               COALESCE(e.approved_qty, 0) AS expected_approved,
+               COALESCE(l.approved_qty, 0) AS ledger_approved,
+               COALESCE(e.pending_qty, 0) AS expected_pending,
+               COALESCE(l.pending_qty, 0) AS ledger_pending,
+               COALESCE(e.request_count, 0) AS expected_count,
+               COALESCE(l.request_count, 0) AS ledger_count
+        FROM expected e
+        LEFT JOIN request_ledger l
+               ON l.item_id = e.item_id AND l.building_subtype = e.building_subtype
+        UNION ALL
+        SELECT l.item_id, l.building_subtype, 0, l.requested_qty, 0, l.approved_qty,
+               0, l.pending_qty, 0, l.request_count
+        FROM request_ledger l
+        WHERE NOT EXISTS (
+            SELECT 1 FROM expected e
+            WHERE e.item_id = l.item_id AND e.building_subtype = l.building_subtype
+        )
+    """))
+    drift = []
+    for row in result.mappings():
+        if (abs(row['expected_requested'] - row['ledger_requested']) > tolerance
+                or abs(row['expected_approved'] - row['ledger_approved']) > tolerance
+                or abs(row['expected_pending'] - row['ledger_pending']) > tolerance
+                or row['expected_count'] != row['ledger_count']):
+            drift.append(dict(row))
+    return drift
+
+
+def init_request_ledger():
+    """Create the ledger on startup and backfill it the first time it is created (bootstrap step; errors propagate)"""
+    engine = get_engine()
+    with engine.begin() as conn:
+        ensure_ledger_table(conn)
+        has_rows = conn.execute(text("SELECT 1 FROM request_ledger LIMIT 1")).fetchone()
+        has_requests = conn.execute(text("SELECT 1 FROM requests LIMIT 1")).fetchone()
+        if has_requests and not has_rows:
+            rows = rebuild_ledger(conn)
+            log_info(f"Backfilled request_ledger with {rows} rows")
+
+
+def rebuild_request_ledger():
+    """Rebuild the ledger in its own transaction - returns the number of ledger rows written"""
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            rows = rebuild_ledger(conn)
+        log_info(f"Rebuilt request_ledger ({rows} rows)")
+        return rows
+    except Exception as e:
+        log_error(f"Failed to rebuild request_ledger: {e}")
+        return None
+
+
+def verify_request_ledger():
+    """Check the ledger for drift against the requests table - returns the drifted rows"""
+    engine = get_engine()
+    with engine.connect() as conn:
+        ensure_ledger_table(conn)
+        drift = verify_ledger(conn)
+    if drift:
+        log_warning(f"request_ledger drift detected on {len(drift)} (item, subtype) rows")
+    return drift
@@ -0,0 +1,708 @@
+"""
+Database Schema Module
+Single declarative definition of every table and index, applied as numbered migrations
+"""
+import time
+from datetime import datetime
+import pytz
+from sqlalchemy import text
+from db import get_engine
+from logger import log_info, log_warning, log_error
+
+# The only column types that differ between backends; everything else is written once below
+DIALECT_TYPES = {
+    "sqlite": {"pk": "INTEGER PRIMARY KEY AUTOINCREMENT", "timestamp": "TEXT"},
+    "postgresql": {"pk": "SERIAL PRIMARY KEY", "timestamp": "TIMESTAMP"},
+}
+
+# table -> {"columns": [(name, spec)], "constraints": [...]}; {pk}/{timestamp} are rendered per dialect
+TABLES = {
+    "schema_version": {
+        "columns": [
+            ("version", "TEXT PRIMARY KEY"),
+            ("applied_at", "TEXT NOT NULL"),
+            ("duration_ms", "DOUBLE PRECISION"),
+        ],
+    },
+    "access_codes": {
+        "columns": [
+            ("id", "{pk}"),
+            ("admin_code", "TEXT NOT NULL"),
+            ("user_code", "TEXT NOT NULL"),
+            ("updated_at", "TEXT NOT NULL"),
+            ("updated_by", "TEXT"),
+        ],
+    },
+    "project_site_access_codes": {
+        "columns": [
+            ("id", "{pk}"),
+            ("project_site", "TEXT NOT NULL"),
+            ("admin_code", "TEXT NOT NULL"),
+            ("user_code", "TEXT NOT NULL"),
+            ("updated_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+        ],
+        "constraints": ["UNIQUE(project_site)"],
+    },
+    "project_sites": {
+        "columns": [
+            ("id", "{pk}"),
+            ("name", "TEXT UNIQUE NOT NULL"),
+            ("description", "TEXT"),
+            ("created_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+            ("is_active", "INTEGER DEFAULT 1"),
+        ],
+    },
+    "users": {
+        "columns": [
+            ("id", "{pk}"),
+            ("username", "TEXT UNIQUE NOT NULL"),
+            ("full_name", "TEXT NOT NULL"),
+            ("user_type", "TEXT CHECK(user_type IN ('admin', 'project_site', 'user')) NOT NULL"),
+            ("project_site", "TEXT"),
+            ("admin_code", "TEXT"),
+            ("created_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+            ("is_active", "INTEGER DEFAULT 1"),
+        ],
+    },
+    "items": {
+        "columns": [
+            ("id", "{pk}"),
+            # Unique per project site (idx_items_site_code), so sites can share BOQ codes
+            ("code", "TEXT"),
+            ("name", "TEXT NOT NULL"),
+            ("category", "TEXT CHECK(category IN ('materials','labour')) NOT NULL"),
+            ("unit", "TEXT"),
+            ("qty", "REAL NOT NULL DEFAULT 0"),
+            ("unit_cost", "REAL"),
+            ("budget", "TEXT"),
+            ("section", "TEXT"),
+            ("grp", "TEXT"),
+            ("building_type", "TEXT"),
+            ("project_site", "TEXT DEFAULT 'Lifecamp Kafe'"),
+            ("created_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+            # Parsed from budget on write (modules/budget_labels.py)
+            ("budget_num", "INTEGER"),
+            ("budget_building_type", "TEXT"),
+            ("budget_category", "TEXT"),
+            ("budget_subcategory", "TEXT"),
+            # Stamped by the database on every write (TRIGGERS below)
+            ("updated_at", "{timestamp}"),
+        ],
+    },
+    "requests": {
+        "columns": [
+            ("id", "{pk}"),
+            ("ts", "TEXT NOT NULL"),
+            ("section", "TEXT CHECK(section IN ('materials','labour')) NOT NULL"),
+            ("item_id", "INTEGER NOT NULL"),
+            ("qty", "REAL NOT NULL"),
+            ("requested_by", "TEXT"),
+            ("note", "TEXT"),
+            ("building_subtype", "TEXT"),
+            ("status", "TEXT CHECK(status IN ('Pending','Approved','Rejected')) NOT NULL DEFAULT 'Pending'"),
+            ("approved_by", "TEXT"),
+            ("current_price", "REAL"),
+            ("created_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+            ("updated_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+        ],
+        "constraints": ["FOREIGN KEY(item_id) REFERENCES items(id)"],
+    },
+    "notifications": {
+        "columns": [
+            ("id", "{pk}"),
+            ("notification_type", "TEXT NOT NULL"),
+            ("title", "TEXT NOT NULL"),
+            ("message", "TEXT NOT NULL"),
+            ("user_id", "INTEGER"),
+            ("request_id", "INTEGER"),
+            ("is_read", "INTEGER DEFAULT 0"),
+            ("created_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+        ],
+        "constraints": [
+            "FOREIGN KEY (user_id) REFERENCES users (id)",
+            "FOREIGN KEY (request_id) REFERENCES requests (id)",
+        ],
+    },
+    "access_logs": {
+        "columns": [
+            ("id", "{pk}"),
+            ("access_code", "TEXT NOT NULL"),
+            ("user_name", "TEXT"),
+            ("access_time", "{timestamp} NOT NULL"),
+            ("success", "INTEGER DEFAULT 1"),
+            ("role", "TEXT"),
+            # What was done, e.g. "Request #12: Approved by ..." for REQUEST_SYSTEM rows
+            ("details", "TEXT"),
+        ],
+    },
+    "actuals": {
+        "columns": [
+            ("id", "{pk}"),
+            ("item_id", "INTEGER NOT NULL"),
+            ("actual_qty", "REAL NOT NULL"),
+            ("actual_cost", "REAL NOT NULL"),
+            ("actual_date", "TEXT NOT NULL"),
+            ("recorded_by", "TEXT"),
+            ("notes", "TEXT"),
+            ("building_subtype", "TEXT"),
+            ("project_site", "TEXT DEFAULT 'Lifecamp Kafe'"),
+            ("created_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+            ("updated_at", "{timestamp}"),
+        ],
+        "constraints": ["FOREIGN KEY(item_id) REFERENCES items(id)"],
+    },
+    "deleted_requests": {
+        "columns": [
+            ("id", "{pk}"),
+            ("req_id", "INTEGER"),
+            # The request's own ts: request ids are reused, so they don't order requests in time
+            ("ts", "TEXT"),
+            ("item_name", "TEXT"),
+            ("qty", "REAL"),
+            ("requested_by", "TEXT"),
+            ("status", "TEXT"),
+            ("deleted_at", "{timestamp}"),
+            ("deleted_by", "TEXT"),
+            ("building_subtype", "TEXT"),
+            ("note", "TEXT"),
+            ("approved_by", "TEXT"),
+            ("current_price", "REAL"),
+            ("planned_price", "REAL"),
+        ],
+    },
+    "project_config": {
+        "columns": [
+            ("id", "{pk}"),
+            ("budget_num", "INTEGER"),
+            ("building_type", "TEXT"),
+            ("num_blocks", "INTEGER"),
+            ("units_per_block", "INTEGER"),
+            ("additional_notes", "TEXT"),
+            ("created_at", "TEXT"),
+            ("updated_at", "TEXT"),
+        ],
+    },
+    "dismissed_over_planned_alerts": {
+        "columns": [
+            ("id", "{pk}"),
+            ("request_id", "INTEGER NOT NULL UNIQUE"),
+            ("item_name", "TEXT"),
+            ("full_details", "TEXT"),
+            ("dismissed_at", "{timestamp} DEFAULT CURRENT_TIMESTAMP"),
+        ],
+    },
+    "request_ledger": {
+        "columns": [
+            ("item_id", "INTEGER NOT NULL"),
+            ("building_subtype", "TEXT NOT NULL DEFAULT ''"),
+            ("requested_qty", "DOUBLE PRECISION NOT NULL DEFAULT 0"),
+            ("approved_qty", "DOUBLE PRECISION NOT NULL DEFAULT 0"),
+            ("pending_qty", "DOUBLE PRECISION NOT NULL DEFAULT 0"),
+            ("request_count", "INTEGER NOT NULL DEFAULT 0"),
+        ],
+        "constraints": ["PRIMARY KEY (item_id, building_subtype)"],
+    },
+    "request_id_pool": {
+        "columns": [
+            ("id", "INTEGER PRIMARY KEY"),
+        ],
+    },
+    "notification_summary": {
+        "columns": [
+            ("project_site", "TEXT PRIMARY KEY"),
+            ("unread_count", "INTEGER NOT NULL DEFAULT 0"),
+            ("latest_id", "INTEGER"),
+            ("version", "INTEGER NOT NULL DEFAULT 0"),
+        ],
+    },
+    "budget_rollup": {
+        "columns": [
+            ("id", "{pk}"),
+            ("project_site", "TEXT"),
+            ("budget_num", "INTEGER"),
+            ("building_type", "TEXT"),
+            ("category", "TEXT"),
+            ("item_count", "INTEGER NOT NULL DEFAULT 0"),
+            ("amount", "REAL NOT NULL DEFAULT 0"),
+        ],
+    },
+    # Per (site, dataset) write counters that cached readers key on (modules/data_versions.py)
+    "data_versions": {
+        "columns": [
+            ("project_site", "TEXT NOT NULL"),
+            ("dataset", "TEXT NOT NULL"),
+            ("version", "INTEGER NOT NULL DEFAULT 0"),
+        ],
+        "constraints": ["PRIMARY KEY (project_site, dataset)"],
+    },
+    # One row per deleted items/requests/actuals row, so cached frames can drop it (modules/delta_frames.py);
+    # a '*' row per database restore makes them re-read in full
+    "tombstones": {
+        "columns": [
+            ("id", "{pk}"),
+            ("table_name", "TEXT NOT NULL"),
+            ("row_id", "INTEGER NOT NULL"),
+            ("deleted_at", "{timestamp} NOT NULL"),
+        ],
+    },
+    # Last run of each background housekeeping job, shared by every server process (modules/maintenance.py)
+    "maintenance_runs": {
+        "columns": [
+            ("job", "TEXT PRIMARY KEY"),
+            ("started_at", "TEXT NOT NULL"),
+            ("duration_ms", "DOUBLE PRECISION"),
+            ("row_count", "INTEGER"),
+            ("status", "TEXT NOT NULL"),
+            ("error", "TEXT"),
+            ("host", "TEXT"),
+        ],
+    },
+}
+
+# Codeless items are identified by these; NULL and '' context values are the same item
+NATURAL_KEY_SQL = ("project_site, name, category, COALESCE(budget, ''), COALESCE(section, ''), "
+                   "COALESCE(grp, ''), COALESCE(building_type, '')")
+
+# index name -> (table, columns); names are identical on SQLite and PostgreSQL
+INDEXES = {
+    "idx_items_budget": ("items", "budget"),
+    "idx_items_section": ("items", "section"),
+    "idx_items_building_type": ("items", "building_type"),
+    "idx_items_category": ("items", "category"),
+    "idx_items_name": ("items", "name"),
+    "idx_items_code": ("items", "code"),
+    "idx_items_project_site": ("items", "project_site"),
+    "idx_items_budget_parts": ("items", "project_site, budget_num, budget_building_type, budget_category"),
+    "idx_items_site_code": ("items", "project_site, code"),
+    "idx_items_natural_key": ("items", NATURAL_KEY_SQL),
+    "idx_budget_rollup_project_site": ("budget_rollup", "project_site"),
+    "idx_requests_status": ("requests", "status"),
+    "idx_requests_item_id": ("requests", "item_id"),
+    "idx_requests_requested_by": ("requests", "requested_by"),
+    "idx_notifications_user_id": ("notifications", "user_id"),
+    "idx_notifications_request_id": ("notifications", "request_id"),
+    "idx_actuals_item_id": ("actuals", "item_id"),
+    "idx_deleted_requests_item_name": ("deleted_requests", "item_name"),
+    "idx_items_updated_at": ("items", "updated_at"),
+    "idx_requests_updated_at": ("requests", "updated_at"),
+    # Request lists page newest first on (ts, id); ids are reused, so id alone isn't time order
+    "idx_requests_ts": ("requests", "ts, id"),
+    "idx_actuals_updated_at": ("actuals", "updated_at"),
+    "idx_tombstones_deleted_at": ("tombstones", "deleted_at, table_name"),
+    "idx_access_logs_access_time": ("access_logs", "access_time"),
+    "idx_notifications_created_at": ("notifications", "created_at"),
+    "idx_deleted_requests_deleted_at": ("deleted_requests", "deleted_at"),
+}
+
+# Indexes above that are created UNIQUE (they are ON CONFLICT targets). Rows that would break
+# them are merged first (merge_duplicate_items in modules/item_upsert.py)
+UNIQUE_INDEXES = {"idx_items_site_code", "idx_items_natural_key"}
+# Partial indexes: index -> WHERE condition
+INDEX_CONDITIONS = {"idx_items_natural_key": "code IS NULL"}
+
+# Database clock for updated_at/deleted_at, in the app's Africa/Lagos (UTC+1, no DST) local time:
+# the same text as get_nigerian_time_iso() on SQLite, a naive local TIMESTAMP on PostgreSQL
+CHANGE_CLOCK_SQL = {
+    "sqlite": "strftime('%Y-%m-%dT%H:%M:%f', 'now', '+1 hours') || '000+01:00'",
+    "postgresql": "(clock_timestamp() AT TIME ZONE 'Africa/Lagos')",
+}
+
+# Tables whose rows carry a database-maintained updated_at and leave a tombstone when deleted
+TRACKED_TABLES = ("items", "requests", "actuals")
+
+# trigger name -> (table, kind). Inserts always get a stamp; updates get one unless the statement
+# set updated_at itself (set_request_status records its own action time)
+TRIGGERS = {
+    f"trg_{table}_{kind}": (table, kind)
+    for table in TRACKED_TABLES for kind in ("stamp_insert", "stamp_update", "tombstone")
+}
+
+# PostgreSQL trigger functions (SQLite triggers carry their bodies inline)
+TRIGGER_FUNCTIONS_SQL = f"""
+    CREATE OR REPLACE FUNCTION stamp_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at = {CHANGE_CLOCK_SQL["postgresql"]};
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql;
+    CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO tombstones (table_name, row_id, deleted_at)
+        VALUES (TG_TABLE_NAME, OLD.id, {CHANGE_CLOCK_SQL["postgresql"]});
+        RETURN OLD;
+    END $$ LANGUAGE plpgsql;
+"""
+
+# Ordered, numbered migrations. Never renumber or remove an entry - append new ones at the end.
+# Columns added after a table was first shipped get an add_column entry so older databases catch up.
+MIGRATIONS = [
+    ("001", "create_table", "schema_version"),
+    ("002", "create_table", "access_codes"),
+    ("003", "create_table", "project_site_access_codes"),
+    ("004", "create_table", "project_sites"),
+    ("005", "create_table", "users"),
+    ("006", "create_table", "items"),
+    ("007", "create_table", "requests"),
+    ("008", "create_table", "notifications"),
+    ("009", "create_table", "access_logs"),
+    ("010", "create_table", "actuals"),
+    ("011", "create_table", "deleted_requests"),
+    ("012", "create_table", "project_config"),
+    ("013", "create_table", "dismissed_over_planned_alerts"),
+    ("014", "create_table", "request_ledger"),
+    ("015", "create_table", "request_id_pool"),
+    ("016", "add_column", ("requests", "current_price")),
+    ("017", "add_column", ("requests", "building_subtype")),
+    ("018", "add_column", ("requests", "created_at")),
+    ("019", "add_column", ("requests", "updated_at")),
+    ("020", "add_column", ("deleted_requests", "building_subtype")),
+    ("021", "add_column", ("deleted_requests", "note")),
+    ("022", "add_column", ("deleted_requests", "approved_by")),
+    ("023", "add_column", ("deleted_requests", "current_price")),
+    ("024", "add_column", ("deleted_requests", "planned_price")),
+    ("025", "add_column", ("actuals", "building_subtype")),
+    ("026", "add_column", ("actuals", "project_site")),
+    ("027", "add_column", ("items", "building_type")),
+    ("028", "add_column", ("items", "project_site")),
+    ("029", "add_column", ("items", "created_at")),
+    ("030", "add_column", ("users", "user_type")),
+    ("031", "add_column", ("users", "project_site")),
+    ("032", "add_column", ("users", "admin_code")),
+    ("033", "create_index", "idx_items_budget"),
+    ("034", "create_index", "idx_items_section"),
+    ("035", "create_index", "idx_items_building_type"),
+    ("036", "create_index", "idx_items_category"),
+    ("037", "create_index", "idx_items_name"),
+    ("038", "create_index", "idx_items_code"),
+    ("039", "create_index", "idx_items_project_site"),
+    ("040", "create_index", "idx_requests_status"),
+    ("041", "create_index", "idx_requests_item_id"),
+    ("042", "create_index", "idx_requests_requested_by"),
+    ("043", "create_index", "idx_notifications_user_id"),
+    ("044", "create_index", "idx_notifications_request_id"),
+    ("045", "create_index", "idx_actuals_item_id"),
+    ("046", "create_index", "idx_deleted_requests_item_name"),
+    ("047", "create_table", "notification_summary"),
+    ("048", "add_column", ("items", "budget_num")),
+    ("049", "add_column", ("items", "budget_building_type")),
+    ("050", "add_column", ("items", "budget_category")),
+    ("051", "add_column", ("items", "budget_subcategory")),
+    ("052", "create_index", "idx_items_budget_parts"),
+    ("053", "create_table", "budget_rollup"),
+    ("054", "create_index", "idx_budget_rollup_project_site"),
+    ("055", "create_index", "idx_items_site_code"),
+    ("056", "create_table", "data_versions"),
+    ("057", "add_column", ("items", "updated_at")),
+    ("058", "add_column", ("actuals", "updated_at")),
+    ("059", "create_table", "tombstones"),
+    ("060", "create_index", "idx_items_updated_at"),
+    ("061", "create_index", "idx_requests_updated_at"),
+    ("062", "create_index", "idx_actuals_updated_at"),
+    ("063", "create_index", "idx_tombstones_deleted_at"),
+    ("064", "create_trigger", "trg_items_stamp_insert"),
+    ("065", "create_trigger", "trg_items_stamp_update"),
+    ("066", "create_trigger", "trg_items_tombstone"),
+    ("067", "create_trigger", "trg_requests_stamp_insert"),
+    ("068", "create_trigger", "trg_requests_stamp_update"),
+    ("069", "create_trigger", "trg_requests_tombstone"),
+    ("070", "create_trigger", "trg_actuals_stamp_insert"),
+    ("071", "create_trigger", "trg_actuals_stamp_update"),
+    ("072", "create_trigger", "trg_actuals_tombstone"),
+    ("073", "create_table", "maintenance_runs"),
+    ("074", "create_index", "idx_access_logs_access_time"),
+    ("075", "create_index", "idx_notifications_created_at"),
+    ("076", "create_index", "idx_deleted_requests_deleted_at"),
+    ("077", "create_index", "idx_items_natural_key"),
+    ("078", "add_column", ("deleted_requests", "ts")),
+    ("079", "create_index", "idx_requests_ts"),
+    ("080", "add_column", ("access_logs", "details")),
+]
+
+# One catalog round trip lists every column, index and trigger in the database
+CATALOG_SQL = {
+    "sqlite": """
+        SELECT 'column' AS kind, m.name AS table_name, p.name AS object_name
+        FROM sqlite_master m JOIN pragma_table_info(m.name) p
+        WHERE m.type = 'table'
+        UNION ALL
+        SELECT type, tbl_name, name FROM sqlite_master WHERE type IN ('index', 'trigger')
+    """,
+    "postgresql": """
+        SELECT 'column' AS kind, table_name, column_name AS object_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+        UNION ALL
+        SELECT 'index', tablename, indexname FROM pg_indexes
+        WHERE schemaname = current_schema()
+        UNION ALL
+        SELECT DISTINCT 'trigger', event_object_table, trigger_name FROM information_schema.triggers
+        WHERE trigger_schema = current_schema()
+    """,
+}
+
+
+class MigrationError(RuntimeError):
+    """One or more migrations failed; .failed maps their versions to the errors"""
+
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__("Schema migrations failed: " + "; ".join(f"{version}: {error}" for version, error in failed.items()))
+
+
+def dialect_of(conn):
+    """Backend name used to pick dialect types ('postgresql' rules for anything that isn't SQLite)"""
+    return "sqlite" if conn.engine.url.get_backend_name() == "sqlite" else "postgresql"
+
+
+def column_spec(table, column, dialect):
+    """Rendered type/constraint text for one declared column"""
+    spec = dict(TABLES[table]["columns"])[column]
+    return spec.format(**DIALECT_TYPES[dialect])
+
+
+def create_table_sql(table, dialect):
+    """CREATE TABLE IF NOT EXISTS statement for a declared table"""
+    lines = [f"{name} {column_spec(table, name, dialect)}" for name, _ in TABLES[table]["columns"]]
+    lines += TABLES[table].get("constraints", [])
+    body = ",\n    ".join(lines)
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n    {body}\n)"
+
+
+def add_column_sql(table, column, dialect):
+    """
+    ALTER TABLE ... ADD COLUMN for a declared column. Existing rows get NULL, so NOT NULL is dropped
+    unless the column has a default, and SQLite can't add a column with a CURRENT_TIMESTAMP default.
+    """
+    spec = column_spec(table, column, dialect)
+    if "DEFAULT" not in spec:
+        spec = spec.replace(" NOT NULL", "")
+    if dialect == "sqlite":
+        spec = spec.replace(" DEFAULT CURRENT_TIMESTAMP", "")
+        return f"ALTER TABLE {table} ADD COLUMN {column} {spec}"
+    return f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {spec}"
+
+
+def create_index_sql(index):
+    """CREATE [UNIQUE] INDEX IF NOT EXISTS statement for a declared index"""
+    table, columns = INDEXES[index]
+    unique = "UNIQUE " if index in UNIQUE_INDEXES else ""
+    where = f" WHERE {INDEX_CONDITIONS[index]}" if index in INDEX_CONDITIONS else ""
+    return f"CREATE {unique}INDEX IF NOT EXISTS {index} ON {table}({columns}){where}"
+
+
+def create_trigger_sql(trigger, dialect):
+    """
+    Statement(s) creating a declared trigger. SQLite can't assign to NEW, so its stamps are an
+    AFTER trigger updating the row again (recursive triggers are off, so that doesn't re-fire it).
+    """
+    table, kind = TRIGGERS[trigger]
+    if dialect == "sqlite":
+        clock = CHANGE_CLOCK_SQL["sqlite"]
+        if kind == "tombstone":
+            return f"""
+                CREATE TRIGGER IF NOT EXISTS {trigger} AFTER DELETE ON {table} BEGIN
+                    INSERT INTO tombstones (table_name, row_id, deleted_at) VALUES ('{table}', OLD.id, {clock});
+                END"""
+        event, when = ("INSERT", "") if kind == "stamp_insert" else ("UPDATE", " WHEN NEW.updated_at IS OLD.updated_at")
+        return f"""
+            CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event} ON {table} FOR EACH ROW{when} BEGIN
+                UPDATE {table} SET updated_at = {clock} WHERE id = NEW.id;
+            END"""
+    if kind == "tombstone":
+        timing, function = "AFTER DELETE", "record_tombstone"
+    elif kind == "stamp_insert":
+        timing, function = "BEFORE INSERT", "stamp_updated_at"
+    else:
+        timing, function = "BEFORE UPDATE", "stamp_updated_at"
+    when = " WHEN (NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at)" if kind == "stamp_update" else ""
+    return f"""
+        {TRIGGER_FUNCTIONS_SQL}
+        DROP TRIGGER IF EXISTS {trigger} ON {table};
+        CREATE TRIGGER {trigger} {timing} ON {table} FOR EACH ROW{when} EXECUTE FUNCTION {function}()"""
+
+
+def migration_sql(migration, dialect):
+    """DDL for one migration entry"""
+    _, op, target = migration
+    if op == "create_table":
+        return create_table_sql(target, dialect)
+    if op == "add_column":
+        return add_column_sql(target[0], target[1], dialect)
+    if op == "create_trigger":
+        return create_trigger_sql(target, dialect)
+    return create_index_sql(target)
+
+
+def migration_version(migration):
+    """schema_version key for a migration, e.g. schema_016_add_column_requests_current_price"""
+    number, op, target = migration
+    name = "_".join(target) if isinstance(target, tuple) else target
+    return f"schema_{number}_{op}_{name}"
+
+
+def read_catalog(conn):
+    """Live columns per table, index names and trigger names, from a single catalog query"""
+    columns, indexes, triggers = {}, set(), set()
+    for kind, table, name in conn.execute(text(CATALOG_SQL[dialect_of(conn)])):
+        if kind == "column":
+            columns.setdefault(table, set()).add(name)
+        elif kind == "trigger":
+            triggers.add(name)
+        else:
+            indexes.add(name)
+    return {"columns": columns, "indexes": indexes, "triggers": triggers}
+
+
+def pending_migrations(catalog):
+    """Migrations whose table, column, index or trigger is missing from the catalog, in order"""
+    columns = {table: set(names) for table, names in catalog["columns"].items()}
+    indexes = set(catalog["indexes"])
+    triggers = set(catalog.get("triggers", ()))
+    pending = []
+    for migration in MIGRATIONS:
+        _, op, target = migration
+        if op == "create_table":
+            if target in columns:
+                continue
+            # A table created now already has every declared column
+            columns[target] = {name for name, _ in TABLES[target]["columns"]}
+        elif op == "add_column":
+            table, column = target
+            if column in columns.get(table, set()):
+                continue
+            columns.setdefault(table, set()).add(column)
+        elif op == "create_trigger":
+            if target in triggers:
+                continue
+            triggers.add(target)
+        else:
+            if target in indexes:
+                continue
+            indexes.add(target)
+        pending.append(migration)
+    return pending
+
+
+def schema_diff(catalog):
+    """Declared tables, columns, indexes and triggers that are missing from the catalog"""
+    missing = []
+    for table, definition in TABLES.items():
+        live = catalog["columns"].get(table)
+        if live is None:
+            missing.append(table)
+            continue
+        missing += [f"{table}.{name}" for name, _ in definition["columns"] if name not in live]
+    missing += [index for index in INDEXES if index not in catalog["indexes"]]
+    missing += [trigger for trigger in TRIGGERS if trigger not in catalog.get("triggers", ())]
+    return missing
+
+
+def create_table(conn, table):
+    """Create one declared table if it doesn't exist (for modules that own a table)"""
+    conn.execute(text(create_table_sql(table, dialect_of(conn))))
+
+
+def ensure_schema_version_table(conn):
+    """Create the schema_version bookkeeping table if it doesn't exist"""
+    create_table(conn, "schema_version")
+
+
+def get_applied_versions(conn):
+    """Set of versions already recorded in schema_version"""
+    result = conn.execute(text("SELECT version FROM schema_version"))
+    return {row[0] for row in result.fetchall()}
+
+
+def record_version(conn, version, duration_ms):
+    """Record a completed migration/step so no process runs it again"""
+    conn.execute(text("""
+        INSERT INTO schema_version (version, applied_at, duration_ms)
+        VALUES (:version, :applied_at, :duration_ms)
+        ON CONFLICT (version) DO NOTHING
+    """), {
+        "version": version,
+        "applied_at": datetime.now(pytz.timezone('Africa/Lagos')).isoformat(),
+        "duration_ms": round(duration_ms, 1)
+    })
+
+
+def merge_duplicates(conn):
+    """Merge items repeating a unique key, so a UNIQUE index on items can be created"""
+    # Imported here: item_upsert builds on this module
+    from modules.item_upsert import merge_duplicate_items
+    merged = merge_duplicate_items(conn)
+    if merged:
+        log_info(f"Merged or recoded {merged} duplicate items before creating a unique index")
+    return merged
+
+
+def rebuild_sqlite_table(conn, table):
+    """
+    SQLite can't drop a constraint: copy the table into a new one with the declared definition
+    (plus any undeclared live columns), then recreate its indexes and triggers. Ids, and the
+    AUTOINCREMENT counter, are kept.
+    """
+    live = conn.execute(text(f"PRAGMA table_info({table})")).fetchall()
+    declared = [name for name, _ in TABLES[table]["columns"]]
+    extra = [f"{row[1]} {row[2]}" + (f" DEFAULT {row[4]}" if row[4] is not None else "")
+             for row in live if row[1] not in declared]
+    copied = ", ".join(row[1] for row in live)
+    objects = [row[0] for row in conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = :table AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    ), {"table": table})]
+    has_sequence = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'")).first()
+    sequence = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :table"),
+                            {"table": table}).scalar() if has_sequence else None
+
+    create = create_table_sql(table, "sqlite").replace(f"CREATE TABLE IF NOT EXISTS {table} (",
+                                                       f"CREATE TABLE {table}_rebuild (", 1)
+    if extra:
+        create = create[:create.rindex("\n)")] + ",\n    " + ",\n    ".join(extra) + "\n)"
+    conn.execute(text(create))
+    conn.execute(text(f"INSERT INTO {table}_rebuild ({copied}) SELECT {copied} FROM {table}"))
+    conn.execute(text(f"DROP TABLE {table}"))
+    conn.execute(text(f"ALTER TABLE {table}_rebuild RENAME TO {table}"))
+    for sql in objects:
+        conn.execute(text(sql))
+    if sequence is not None:
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :table AND seq < :seq"),
+                     {"seq": sequence, "table": table})
+
+
+def apply_schema(engine=None):
+    """
+    Bring the database up to the declared schema: one catalog query, then only the missing
+    migrations, each in its own transaction and recorded in schema_version. A failed migration
+    doesn't undo the others or stop the unrelated ones after it; they are all reported in one
+    MigrationError at the end. Returns the versions applied (empty when current).
+    """
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        dialect = dialect_of(conn)
+        catalog = read_catalog(conn)
+    applied, failed = [], {}
+    for migration in pending_migrations(catalog):
+        _, op, target = migration
+        version = migration_version(migration)
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                if op == "create_index" and target in UNIQUE_INDEXES:
+                    # Databases from before the index can hold rows it would reject
+                    merge_duplicates(conn)
+                conn.execute(text(migration_sql(migration, dialect)))
+                record_version(conn, version, (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            log_error(f"Schema migration {version} failed: {e}")
+            failed[version] = e
+            continue
+        applied.append(version)
+    if applied:
+        log_info(f"Applied {len(applied)} schema migrations: {', '.join(applied)}")
+    if applied or failed:
+        with engine.connect() as conn:
+            leftover = schema_diff(read_catalog(conn))
+        if leftover:
+            log_warning(f"Schema still differs from the declared schema: {', '.join(leftover)}")
+    if failed:
+        raise MigrationError(failed)
+    return applied
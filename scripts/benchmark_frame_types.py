@@ -0,0 +1,89 @@
+# scripts/benchmark_frame_types.py
+# Peak RSS of one session's item, request and actuals frames, untyped vs typed (temporary SQLite database).
+# "untyped" is a plain read_sql_query; "typed" is read_frame (typed chunk by chunk at read time).
+#   python scripts/benchmark_frame_types.py [--items 50000] [--requests 200000]
+# Each mode runs in its own process so its peak RSS is its own.
+import os, sys, json, resource, tempfile, argparse, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--items", type=int, default=50000)
+parser.add_argument("--requests", type=int, default=200000)
+parser.add_argument("--mode", choices=["untyped", "typed"], help=argparse.SUPPRESS)
+parser.add_argument("--db", help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+ACTUALS_SQL = """
+    SELECT a.id, a.item_id, a.actual_qty, a.actual_cost, a.actual_date, a.recorded_by, a.notes, a.building_subtype,
+           a.created_at, a.project_site, i.name, i.code, i.budget, i.building_type, i.unit, i.category, i.section, i.grp
+    FROM actuals a JOIN items i ON a.item_id = i.id
+"""
+
+
+def seed(path):
+    from modules.schema import apply_schema
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    apply_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :items)
+            INSERT INTO items (id, code, name, category, unit, qty, unit_cost, budget, section, grp, building_type,
+                               project_site, budget_num, budget_building_type, budget_category)
+            SELECT n, 'C' || n, 'Item ' || n, 'materials', CASE n % 4 WHEN 0 THEN 'bags' WHEN 1 THEN 'tons' ELSE 'pcs' END,
+                   10 + n % 50, 100 + n % 900,
+                   'Budget ' || (1 + n % 20) || ' - Flats(' || CASE n % 2 WHEN 0 THEN 'General Materials' ELSE 'Woods' END || ')',
+                   'materials', 'MATERIAL(' || (n % 7) || ')', 'Flats', 'Bench Site', 1 + n % 20, 'Flats',
+                   CASE n % 2 WHEN 0 THEN 'General Materials' ELSE 'Woods' END
+            FROM seq
+        """), {"items": args.items})
+        conn.execute(text("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :requests)
+            INSERT INTO requests (id, ts, section, item_id, qty, requested_by, note, building_subtype, status, approved_by)
+            SELECT n, '2025-01-01T10:00:00+01:00', 'materials', 1 + n % :items, 1 + n % 5, 'Site User ' || (n % 12), '',
+                   'B' || (1 + n % 4), CASE n % 3 WHEN 0 THEN 'Approved' WHEN 1 THEN 'Pending' ELSE 'Rejected' END, 'admin'
+            FROM seq
+        """), {"requests": args.requests, "items": args.items})
+        conn.execute(text("""
+            INSERT INTO actuals (item_id, actual_qty, actual_cost, actual_date, recorded_by, project_site)
+            SELECT item_id, qty, qty * 100, '2025-01-01', requested_by, 'Bench Site' FROM requests WHERE status = 'Approved'
+        """))
+    engine.dispose()
+
+
+def session(path, typed):
+    """Load what one admin session holds and report its frame sizes and the process's peak RSS"""
+    from modules.delta_frames import ITEM_FRAME, REQUEST_FRAME
+    from modules.frame_schema import read_frame
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    frames = {}
+    with engine.connect() as conn:
+        for dataset, sql in (("items", ITEM_FRAME["select"]), ("requests", REQUEST_FRAME["select"]), ("actuals", ACTUALS_SQL)):
+            frames[dataset] = read_frame(text(sql), conn, dataset) if typed else pd.read_sql_query(text(sql), conn)
+    print(json.dumps({
+        **{dataset: frame.memory_usage(deep=True).sum() / 2**20 for dataset, frame in frames.items()},
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    if args.mode:
+        session(args.db, args.mode == "typed")
+        return
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    seed(path)
+    print(f"{args.items} items, {args.requests} requests (pandas {pd.__version__})")
+    print(f"{'':>8} | {'items MB':>8} | {'requests MB':>11} | {'actuals MB':>10} | {'peak RSS MB':>11}")
+    for mode in ("untyped", "typed"):
+        output = subprocess.run([sys.executable, __file__, "--mode", mode, "--db", path],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:>8} | {result['items']:8.1f} | {result['requests']:11.1f} | {result['actuals']:10.1f} | "
+              f"{result['peak_rss']:11.0f}")
+
+
+main()
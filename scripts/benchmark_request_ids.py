@@ -0,0 +1,75 @@
+# scripts/benchmark_request_ids.py
+# Submission latency of request id allocation at growing table sizes (temporary SQLite database).
+#   python scripts/benchmark_request_ids.py [--sizes 1000,10000,100000] [--submissions 200]
+# Compares the legacy "load every id and scan for the first gap" approach with the free-id pool.
+import os, sys, time, tempfile, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from modules.request_ids import rebuild_id_pool, allocate_request_id, release_request_id
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--sizes", default="1000,10000,100000")
+parser.add_argument("--submissions", type=int, default=200)
+parser.add_argument("--legacy-max", type=int, default=10000, help="skip the legacy scan above this size")
+args = parser.parse_args()
+
+
+def legacy_next_id(conn):
+    existing_ids = [row[0] for row in conn.execute(text("SELECT id FROM requests ORDER BY id")).fetchall()]
+    for i in range(1, len(existing_ids) + 2):
+        if i not in existing_ids:
+            return i
+
+
+def insert_request(conn, req_id):
+    if req_id is None:
+        conn.execute(text("INSERT INTO requests (ts, item_id, qty, status) VALUES ('2025-01-01', 1, 1, 'Pending')"))
+    else:
+        conn.execute(text("INSERT INTO requests (id, ts, item_id, qty, status) VALUES (:id, '2025-01-01', 1, 1, 'Pending')"),
+                     {"id": req_id})
+
+
+def seeded_engine(size):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, item_id INTEGER, qty REAL, status TEXT
+            )
+        """))
+        conn.execute(text("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :size)
+            INSERT INTO requests (id, ts, item_id, qty, status) SELECT n, '2025-01-01', 1, 1, 'Pending' FROM seq
+        """), {"size": size})
+        rebuild_id_pool(conn)
+    return engine
+
+
+def time_submissions(engine, allocate, submissions, delete_every=4):
+    """Mean/max ms per submission; every few submissions a request is deleted so gaps keep appearing"""
+    timings = []
+    for n in range(submissions):
+        if n % delete_every == 0:
+            with engine.begin() as conn:
+                victim = conn.execute(text("SELECT id FROM requests ORDER BY id LIMIT 1 OFFSET :o"), {"o": n * 7}).scalar()
+                conn.execute(text("DELETE FROM requests WHERE id = :id"), {"id": victim})
+                release_request_id(conn, victim)
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            insert_request(conn, allocate(conn))
+        timings.append((time.perf_counter() - start) * 1000)
+    return sum(timings) / len(timings), max(timings)
+
+
+print(f"{'rows':>8} | {'legacy mean/max ms':>20} | {'pool mean/max ms':>18}")
+for size in [int(s) for s in args.sizes.split(",")]:
+    pool_mean, pool_max = time_submissions(seeded_engine(size), allocate_request_id, args.submissions)
+    if size <= args.legacy_max:
+        legacy_mean, legacy_max = time_submissions(seeded_engine(size), legacy_next_id, max(args.submissions // 20, 5))
+        legacy = f"{legacy_mean:9.2f} / {legacy_max:8.2f}"
+    else:
+        legacy = "skipped"
+    print(f"{size:>8} | {legacy:>20} | {pool_mean:8.2f} / {pool_max:7.2f}")
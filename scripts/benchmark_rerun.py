@@ -0,0 +1,82 @@
+# scripts/benchmark_rerun.py
+# Wall-clock time of one Streamlit rerun per tab, against a seeded temporary SQLite database.
+#   python scripts/benchmark_rerun.py [--items 2000] [--requests 6000] [--runs 5] [--app istrominventory.py]
+# Runs the app headless with streamlit.testing as a logged-in admin.
+import os, sys, time, shutil, tempfile, argparse, statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, text
+from streamlit.testing.v1 import AppTest
+from modules.schema import apply_schema
+
+TAB_NAMES = ["Manual Entry", "Inventory", "Make Request", "Review & History", "Budget Summary", "Actuals", "Admin"]
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--app", default=os.path.join(ROOT, "istrominventory.py"))
+parser.add_argument("--items", type=int, default=2000)
+parser.add_argument("--requests", type=int, default=6000)
+parser.add_argument("--runs", type=int, default=5)
+args = parser.parse_args()
+
+
+def seed(path, items, requests):
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    apply_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :items)
+            INSERT INTO items (id, code, name, category, unit, qty, unit_cost, budget, section, grp, building_type, project_site)
+            SELECT n, 'C' || n, 'Item ' || n, CASE n % 3 WHEN 0 THEN 'labour' ELSE 'materials' END, 'pcs',
+                   10 + n % 50, 100 + n % 900,
+                   'Budget ' || (1 + n % 20) || ' - Flats(' || CASE n % 2 WHEN 0 THEN 'General Materials' ELSE 'Woods' END || ')',
+                   CASE n % 3 WHEN 0 THEN 'labour' ELSE 'materials' END, 'MATERIAL ONLY', 'Flats', 'Lifecamp Kafe'
+            FROM seq
+        """), {"items": items})
+        conn.execute(text("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :requests)
+            INSERT INTO requests (id, ts, section, item_id, qty, requested_by, note, building_subtype, status, approved_by)
+            SELECT n, '2025-01-01 10:00:00', 'materials', 1 + n % :items, 1 + n % 5, 'Site User', '', 'B' || (1 + n % 4),
+                   CASE n % 3 WHEN 0 THEN 'Approved' WHEN 1 THEN 'Pending' ELSE 'Rejected' END, 'admin'
+            FROM seq
+        """), {"requests": requests, "items": items})
+        conn.execute(text("""
+            INSERT INTO project_sites (name, description) VALUES ('Lifecamp Kafe', 'Default project site')
+        """))
+    engine.dispose()
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    seed(os.path.join(workdir, "istrominventory.db"), args.items, args.requests)
+    os.chdir(workdir)  # the app opens istrominventory.db relative to the working directory
+    try:
+        at = AppTest.from_file(args.app, default_timeout=600)
+        at.session_state["logged_in"] = True
+        at.session_state["user_type"] = "admin"
+        at.session_state["username"] = "admin"
+        at.session_state["full_name"] = "Admin"
+        at.session_state["project_site"] = "ALL"
+        at.session_state["current_project_site"] = "Lifecamp Kafe"
+        at.session_state["active_tab_index"] = 0
+        at.run()  # first run pays for bootstrap and cold caches
+
+        print(f"{args.items} items, {args.requests} requests, {args.runs} reruns per tab")
+        for index, name in enumerate(TAB_NAMES):
+            at.session_state["active_tab_index"] = index
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                at.run()
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"  {name:<18} median {statistics.median(timings):8.1f} ms   max {max(timings):8.1f} ms")
+            for exc in at.exception:
+                print(f"    exception: {exc.message}")
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
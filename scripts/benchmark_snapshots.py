@@ -0,0 +1,73 @@
+# scripts/benchmark_snapshots.py
+# Memory held by N sessions reading one site's items (temporary SQLite database, Linux RSS).
+#   python scripts/benchmark_snapshots.py [--items 20000] [--sessions 20]
+# "pickled" is st.cache_data: one pickled frame, unpickled into a private copy per caller.
+# "shared" is the delta_frames snapshot: one categorical frame, a shallow view per caller.
+import os, sys, gc, pickle, tempfile, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+import db
+from modules.schema import apply_schema
+from modules.delta_frames import refresh_frame, clear_frames, ITEM_FRAME
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--items", type=int, default=20000)
+parser.add_argument("--sessions", type=int, default=20)
+args = parser.parse_args()
+
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def seed(engine, items):
+    apply_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :items)
+            INSERT INTO items (code, name, category, unit, qty, unit_cost, budget, section, grp, building_type,
+                               project_site, budget_num, budget_building_type, budget_category)
+            SELECT 'C' || n, 'Item ' || n, 'materials', CASE n % 4 WHEN 0 THEN 'bags' WHEN 1 THEN 'tons' ELSE 'pcs' END,
+                   10 + n % 50, 100 + n % 900,
+                   'Budget ' || (1 + n % 20) || ' - Flats(' || CASE n % 2 WHEN 0 THEN 'General Materials' ELSE 'Woods' END || ')',
+                   'materials', 'MATERIAL(' || (n % 7) || ')', 'Flats', 'Bench Site', 1 + n % 20, 'Flats',
+                   CASE n % 2 WHEN 0 THEN 'General Materials' ELSE 'Woods' END
+            FROM seq
+        """), {"items": items})
+
+
+def measure(read):
+    """RSS growth while args.sessions callers each hold what read() returns"""
+    gc.collect()
+    before = rss_mb()
+    held = [read() for _ in range(args.sessions)]
+    gc.collect()
+    return rss_mb() - before, held[0]
+
+
+def main():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}", future=True)
+    db._cached_engine = engine
+    seed(engine, args.items)
+    spec, site = ITEM_FRAME, {"project_site": "Bench Site"}
+
+    with engine.connect() as conn:
+        pickled = pickle.dumps(pd.read_sql_query(text(spec["select"] + " WHERE project_site = :project_site"),
+                                                 conn, params=site))
+    pickled_mb, pickled_frame = measure(lambda: pickle.loads(pickled))
+
+    clear_frames()
+    shared_mb, shared_frame = measure(lambda: refresh_frame("bench", spec, version=(1,), **site))
+
+    print(f"{args.items} items, {args.sessions} sessions (pandas {pd.__version__})")
+    print(f"{'':>8} | {'frame MB':>9} | {'RSS growth MB':>13}")
+    for label, frame, growth in (("pickled", pickled_frame, pickled_mb + len(pickled) / 2**20),
+                                 ("shared", shared_frame, shared_mb)):
+        print(f"{label:>8} | {frame.memory_usage(deep=True).sum() / 2**20:9.2f} | {growth:13.1f}")
+
+
+main()
@@ -0,0 +1,88 @@
+# scripts/benchmark_upsert_items.py
+# Time to import an items sheet into a fresh and then an already-loaded site (temporary SQLite database).
+#   python scripts/benchmark_upsert_items.py [--rows 10000] [--coded 0.5]
+# Compares the legacy row-by-row SELECT then UPDATE/INSERT loop with the batched ON CONFLICT upsert.
+import os, sys, time, tempfile, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from modules.schema import apply_schema
+from modules.item_upsert import normalize_items, upsert_item_rows
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=10000)
+parser.add_argument("--coded", type=float, default=0.5, help="share of rows that carry a code")
+args = parser.parse_args()
+
+
+def sheet(rows, coded):
+    return pd.DataFrame({
+        "code": [f"C{n}" if n < rows * coded else None for n in range(rows)],
+        "name": [f"Item {n}" for n in range(rows)],
+        "unit": ["bags"] * rows,
+        "qty": [n % 50 + 1 for n in range(rows)],
+        "unit_cost": [float(n % 900 + 100) for n in range(rows)],
+        "budget": [f"Budget {n % 20 + 1} - Flats(General Materials)" for n in range(rows)],
+        "grp": [f"Group {n % 7}" for n in range(rows)],
+    })
+
+
+def legacy_upsert(conn, df, project_site):
+    """The pre-batching loop: one lookup plus one write per row"""
+    for _, r in df.iterrows():
+        code = str(r.get("code") or "").strip() or None
+        params = {"code": code, "name": r["name"], "category": "materials", "unit": r["unit"], "qty": float(r["qty"]),
+                  "unit_cost": float(r["unit_cost"]), "budget": r["budget"], "section": None, "grp": r["grp"],
+                  "building_type": None, "project_site": project_site}
+        if code:
+            row = conn.execute(text("SELECT id FROM items WHERE code = :code"), {"code": code}).fetchone()
+        else:
+            row = conn.execute(text("""
+                SELECT id FROM items WHERE name=:name AND category=:category
+                AND COALESCE(budget,'')=COALESCE(:budget,'') AND COALESCE(section,'')=COALESCE(:section,'')
+                AND COALESCE(grp,'')=COALESCE(:grp,'') AND COALESCE(building_type,'')=COALESCE(:building_type,'')
+                AND project_site=:project_site
+            """), params).fetchone()
+        if row:
+            conn.execute(text("""
+                UPDATE items SET name=:name, category=:category, unit=:unit, qty=:qty, unit_cost=:unit_cost,
+                budget=:budget, section=:section, grp=:grp, building_type=:building_type, project_site=:project_site
+                WHERE id=:id
+            """), dict(params, id=row[0]))
+        else:
+            conn.execute(text("""
+                INSERT INTO items(code,name,category,unit,qty,unit_cost,budget,section,grp,building_type,project_site)
+                VALUES(:code,:name,:category,:unit,:qty,:unit_cost,:budget,:section,:grp,:building_type,:project_site)
+            """), params)
+
+
+def batched_upsert(conn, df, project_site):
+    return upsert_item_rows(conn, normalize_items(df, category_guess="materials", project_site=project_site))
+
+
+def fresh_engine():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}", future=True)
+    apply_schema(engine)
+    return engine
+
+
+def time_import(upsert, df):
+    """Seconds for an import into an empty site, then for re-importing the same sheet over it"""
+    engine = fresh_engine()
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            result = upsert(conn, df, "Bench Site")
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+df = sheet(args.rows, args.coded)
+print(f"{args.rows} rows, {args.coded:.0%} with a code")
+print(f"{'':>8} | {'insert s':>9} | {'re-import s':>11}")
+for label, upsert in (("legacy", legacy_upsert), ("batched", batched_upsert)):
+    (insert_s, update_s), result = time_import(upsert, df)
+    print(f"{label:>8} | {insert_s:9.2f} | {update_s:11.2f}" + (f"   last run: {result}" if result else ""))
@@ -1,6 +1,10 @@
 # scripts/migrate_sqlite_to_pg.py
-import os, sqlite3, pandas as pd
-from sqlalchemy import create_engine, text
+import os, sys, sqlite3, pandas as pd
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.schema import apply_schema
 
 SQLITE_PATH = os.getenv("SQLITE_PATH", "istrominventory.db")
 PG_URL = os.getenv("DATABASE_URL")  # Put External URL in your local .env
@@ -12,38 +16,8 @@ if not PG_URL:
 
 pg = create_engine(PG_URL, future=True)
 
-# Create tables on Postgres (matching the app) if they don't exist
-with pg.begin() as c:
-    c.execute(text("""
-    CREATE TABLE IF NOT EXISTS items (
-        id SERIAL PRIMARY KEY,
-        name TEXT NOT NULL,
-        code TEXT,
-        budget REAL,
-        building_type TEXT,
-        unit TEXT,
-        category TEXT,
-        section TEXT,
-        grp TEXT,
-        qty REAL NOT NULL DEFAULT 0,
-        unit_cost REAL,
-        project_site TEXT DEFAULT 'Lifecamp Kafe',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """))
-    c.execute(text("""
-    CREATE TABLE IF NOT EXISTS actuals (
-        id SERIAL PRIMARY KEY,
-        item_id INTEGER NOT NULL REFERENCES items(id),
-        actual_qty REAL,
-        actual_cost REAL,
-        actual_date TEXT,
-        recorded_by TEXT,
-        notes TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        project_site TEXT
-    );
-    """))
+# Create tables on Postgres from the app's declarative schema if they don't exist
+apply_schema(pg)
 
 # Copy data table by table
 sq = sqlite3.connect(SQLITE_PATH)
@@ -0,0 +1,29 @@
+# scripts/rebuild_request_ledger.py
+# Verify the request_ledger table against requests, and rebuild it if it has drifted.
+#   python scripts/rebuild_request_ledger.py            -> verify only (exit code 1 on drift)
+#   python scripts/rebuild_request_ledger.py --rebuild  -> recompute the ledger from requests
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.request_ledger import verify_request_ledger, rebuild_request_ledger
+
+drift = verify_request_ledger()
+for row in drift[:50]:
+    print(f"item {row['item_id']} / '{row['building_subtype']}': "
+          f"requested {row['ledger_requested']} (expected {row['expected_requested']}), "
+          f"approved {row['ledger_approved']} (expected {row['expected_approved']}), "
+          f"pending {row['ledger_pending']} (expected {row['expected_pending']}), "
+          f"count {row['ledger_count']} (expected {row['expected_count']})")
+if len(drift) > 50:
+    print(f"... and {len(drift) - 50} more")
+
+if "--rebuild" in sys.argv:
+    rows = rebuild_request_ledger()
+    if rows is None:
+        raise SystemExit("Rebuild failed - see logs")
+    print(f"Ledger rebuilt: {rows} rows ✅")
+elif drift:
+    raise SystemExit(f"Ledger drift on {len(drift)} rows - rerun with --rebuild")
+else:
+    print("Ledger consistent ✅")
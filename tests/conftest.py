@@ -8,6 +8,9 @@ from unittest.mock import MagicMock, patch
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Tests run maintenance jobs and backups directly; no background threads against whichever database is patched in
+os.environ.setdefault("MAINTENANCE_SCHEDULER", "0")
+os.environ.setdefault("BACKUP_WORKER", "0")
 
 @pytest.fixture
 def mock_streamlit():
@@ -70,3 +73,47 @@ def sample_request_data():
         'approved_by': None
     }
 
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    """Isolated SQLite database with the app schema, patched in for get_engine()"""
+    from contextlib import ExitStack
+    from sqlalchemy import create_engine
+    import db
+    import istrominventory
+    import modules.request_ledger
+    import modules.request_ids
+    import modules.notification_summary
+    import modules.budget_labels
+    import modules.budget_rollup
+    import modules.item_upsert
+    import modules.data_versions
+    import modules.delta_frames
+    import modules.bounded_cache
+    import modules.maintenance
+    import modules.backup_log
+    import modules.bootstrap
+    import modules.schema
+    
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", future=True)
+    with ExitStack() as stack:
+        # Modules that bind get_engine at import time need patching individually
+        for module in (db, istrominventory, modules.request_ledger, modules.request_ids,
+                       modules.notification_summary, modules.budget_labels, modules.budget_rollup,
+                       modules.item_upsert, modules.data_versions, modules.delta_frames, modules.bootstrap,
+                       modules.schema, modules.maintenance, modules.backup_log):
+            stack.enter_context(patch.object(module, 'get_engine', return_value=engine))
+        # Some app functions use the module-level engine created at import
+        stack.enter_context(patch.object(istrominventory, 'engine', engine))
+        db.init_db()
+        # Versions restart at 0 in every fresh database, so cached frames from earlier tests must go
+        modules.data_versions.expire_versions()
+        istrominventory.st.cache_data.clear()
+        modules.bounded_cache.clear_caches()
+        modules.delta_frames.clear_frames()
+        istrominventory.init_request_ledger()
+        istrominventory.init_request_id_pool()
+        istrominventory.init_notification_summary()
+        istrominventory.init_item_keys()
+        yield engine
+    engine.dispose()
@@ -0,0 +1,126 @@
+"""
+Unit tests for the incremental background backups
+"""
+import pytest
+import sys
+import os
+import gzip
+import time
+from unittest.mock import patch
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _add_items(engine, count, start=0):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO items (name, category, qty, unit_cost, project_site) VALUES (:name, 'materials', :qty, 10, 'Site A')
+        """), [{"name": f"Item {n}", "qty": n} for n in range(start, start + count)])
+
+
+def _table(engine, table):
+    with engine.connect() as conn:
+        return {row["id"]: dict(row) for row in conn.execute(text(f"SELECT * FROM {table}")).mappings()}
+
+
+def _restored(directory):
+    from modules.backup_log import read_backup
+    backup = read_backup(directory)
+    return {table: {row["id"]: row for row in backup[table]} for table in ("items", "requests")}
+
+
+def _as_text(rows):
+    """Rows as they come back from JSON (values written with default=str)"""
+    return {row_id: {k: v if v is None or isinstance(v, (int, float)) else str(v) for k, v in row.items()}
+            for row_id, row in rows.items()}
+
+
+class TestBackupLog:
+    """Test the change log, compaction and the debounced worker"""
+
+    def test_changes_are_appended_and_replay_to_the_current_tables(self, sqlite_engine, tmp_path):
+        """After a snapshot, a backup writes only the changed and deleted rows"""
+        from modules.backup_log import run_backup, CHANGE_LOG_FILE
+
+        _add_items(sqlite_engine, 50)
+        assert run_backup(tmp_path)["kind"] == "snapshot"
+
+        time.sleep(0.01)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("UPDATE items SET qty = 99 WHERE id = 3"))
+            conn.execute(text("DELETE FROM items WHERE id = 4"))
+            conn.execute(text("INSERT INTO requests (ts, section, item_id, qty) VALUES ('2025-01-01', 'materials', 1, 2)"))
+        with patch("modules.backup_log.DELTA_OVERLAP_SECONDS", 0):
+            report = run_backup(tmp_path)
+        assert (report["kind"], report["rows"], report["deleted"]) == ("changes", 2, 1)
+        with gzip.open(tmp_path / CHANGE_LOG_FILE, "rt") as log:
+            assert len(log.readlines()) == 4  # header, delete, item 3, request 1
+
+        restored = _restored(tmp_path)
+        assert restored["items"] == _as_text(_table(sqlite_engine, "items"))
+        assert restored["requests"] == _as_text(_table(sqlite_engine, "requests"))
+        assert restored["items"][3]["qty"] == 99.0 and 4 not in restored["items"]
+
+        # Nothing changed since: no empty batch is appended
+        size = (tmp_path / CHANGE_LOG_FILE).stat().st_size
+        time.sleep(0.01)
+        with patch("modules.backup_log.DELTA_OVERLAP_SECONDS", 0):
+            report = run_backup(tmp_path)
+        assert (report["kind"], report["rows"], report["deleted"]) == ("changes", 0, 0)
+        assert (tmp_path / CHANGE_LOG_FILE).stat().st_size == size
+
+    def test_production_switches_turn_backups_off(self):
+        """PRODUCTION_MODE and BACKUP_WORKER=0 keep both queued and scheduled backups off"""
+        import modules.backup_log as backup_log
+
+        with patch.object(backup_log, "BACKUP_WORKER_ENABLED", True), patch.dict(os.environ, {"PRODUCTION_MODE": "false"}):
+            assert backup_log.backups_enabled()
+            with patch.dict(os.environ, {"PRODUCTION_MODE": "true"}):
+                assert not backup_log.backups_enabled()
+                assert backup_log.request_backup() is False
+        with patch.object(backup_log, "BACKUP_WORKER_ENABLED", False):
+            assert not backup_log.backups_enabled()
+
+    def test_oversized_log_is_compacted_and_torn_batches_are_dropped(self, sqlite_engine, tmp_path):
+        """The log folds into a new snapshot past its size limit; a half-written batch is cut off"""
+        from modules.backup_log import run_backup, read_backup, CHANGE_LOG_FILE
+
+        _add_items(sqlite_engine, 10)
+        run_backup(tmp_path)
+        _add_items(sqlite_engine, 5, start=10)
+        run_backup(tmp_path)
+        log_path = tmp_path / CHANGE_LOG_FILE
+        good_size = log_path.stat().st_size
+        with open(log_path, "ab") as log:
+            log.write(gzip.compress(b'{"batch":"9999"}\n{"t":"items","row":{"id":1')[:20])
+        assert len(read_backup(tmp_path)["items"]) == 15
+
+        _add_items(sqlite_engine, 1, start=15)
+        assert run_backup(tmp_path)["kind"] == "changes"
+        assert len(read_backup(tmp_path)["items"]) == 16
+        assert log_path.stat().st_size > good_size
+
+        with patch("modules.backup_log.BACKUP_COMPACT_BYTES", 0):
+            assert run_backup(tmp_path)["kind"] == "snapshot"
+        assert log_path.stat().st_size == 0
+        assert len(read_backup(tmp_path)["items"]) == 16
+
+    def test_writes_queue_one_backup_per_burst(self, sqlite_engine):
+        """Item writes return without backing up; a burst of them gives one backup once it settles"""
+        import istrominventory
+        import modules.backup_log as backup_log
+
+        _add_items(sqlite_engine, 3)
+        with patch.object(backup_log, "BACKUP_WORKER_ENABLED", True), \
+             patch.object(backup_log, "BACKUP_DEBOUNCE_SECONDS", 0.2), \
+             patch.object(backup_log, "run_backup") as run_backup:
+            for item_id in (1, 2, 3):
+                istrominventory.update_item_qty(item_id, 5)
+                istrominventory.update_item_rate(item_id, 7)
+            assert not run_backup.called
+            deadline = time.monotonic() + 5
+            while not run_backup.called and time.monotonic() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.3)
+        assert run_backup.call_count == 1
@@ -0,0 +1,77 @@
+"""
+Unit tests for the run-once startup bootstrap
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch, MagicMock
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fresh_bootstrap():
+    """Forget the bootstrap done at import time, and again afterwards"""
+    from modules.bootstrap import reset_bootstrap
+    reset_bootstrap()
+    yield
+    reset_bootstrap()
+
+
+class TestBootstrap:
+    """Test that startup work runs once and is recorded"""
+    
+    def test_steps_run_once_per_process(self, sqlite_engine, fresh_bootstrap):
+        """A second call in the same process does nothing"""
+        from modules.bootstrap import run_bootstrap
+        
+        step, check = MagicMock(), MagicMock()
+        run_bootstrap(steps=[("900_test_step", step)], checks=[("test_check", check)])
+        report = run_bootstrap(steps=[("900_test_step", step)], checks=[("test_check", check)])
+        
+        assert step.call_count == 1
+        assert check.call_count == 1
+        assert "900_test_step" in report["applied"]
+        assert "total_ms" in report
+    
+    def test_recorded_steps_skipped_by_new_process(self, sqlite_engine, fresh_bootstrap):
+        """Steps recorded in schema_version are skipped; checks still run"""
+        from modules.bootstrap import run_bootstrap, reset_bootstrap
+        
+        step, check = MagicMock(), MagicMock()
+        run_bootstrap(steps=[("900_test_step", step)], checks=[("test_check", check)])
+        reset_bootstrap()  # simulate a new server process
+        report = run_bootstrap(steps=[("900_test_step", step)], checks=[("test_check", check)])
+        
+        assert step.call_count == 1
+        assert check.call_count == 2
+        assert report["skipped"] == ["900_test_step"]
+        with sqlite_engine.connect() as conn:
+            versions = [row[0] for row in conn.execute(text("SELECT version FROM schema_version"))]
+        assert versions.count("900_test_step") == 1
+    
+    def test_failed_step_is_not_recorded(self, sqlite_engine, fresh_bootstrap):
+        """A failing step propagates and is retried on the next call"""
+        from modules.bootstrap import run_bootstrap
+        
+        failing = MagicMock(side_effect=RuntimeError("boom"))
+        with pytest.raises(RuntimeError):
+            run_bootstrap(steps=[("901_failing_step", failing)])
+        
+        ok = MagicMock()
+        run_bootstrap(steps=[("901_failing_step", ok)])
+        assert ok.call_count == 1
+
+    def test_steps_after_a_failed_one_still_run(self, sqlite_engine, fresh_bootstrap):
+        """Only the failed step is left unrecorded; the error names it"""
+        from modules.bootstrap import run_bootstrap, BootstrapError
+
+        failing, later = MagicMock(side_effect=RuntimeError("boom")), MagicMock()
+        with pytest.raises(BootstrapError, match="902_failing_step"):
+            run_bootstrap(steps=[("902_failing_step", failing), ("903_later_step", later)])
+        assert later.call_count == 1
+        with sqlite_engine.connect() as conn:
+            versions = {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+        assert "903_later_step" in versions and "902_failing_step" not in versions
+
@@ -0,0 +1,114 @@
+"""
+Unit tests for the bounded LRU caches with single-flight misses
+"""
+import pytest
+import sys
+import os
+import threading
+import pandas as pd
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.bounded_cache import BoundedCache, bounded_cache, get_cache
+
+
+class TestBoundedCache:
+    """Test the limits, counters, single-flight misses and what callers get back"""
+
+    def test_least_recently_used_entries_go_past_the_limits(self):
+        """Entry and byte limits both evict from the least recently used end"""
+        cache = BoundedCache("lru", max_entries=2, max_bytes=10**6)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get_or_compute("a", lambda held: 0) == 1
+        cache.put("c", 3)
+        assert cache.peek("b") is None and cache.peek("a") == 1
+
+        frames = BoundedCache("bytes", max_entries=10, max_bytes=2000)
+        for key in range(3):
+            frames.put(key, pd.DataFrame({"qty": [1.0] * 100}))
+        assert [frames.peek(key) is not None for key in range(3)] == [False, True, True]
+        frames.put("huge", pd.DataFrame({"qty": [1.0] * 1000}))
+        assert frames.peek("huge") is None
+
+        stats = cache.stats()
+        assert (stats["entries"], stats["hits"], stats["evictions"]) == (2, 1, 1)
+        assert frames.stats()["evictions"] == 2
+
+    def test_entries_expire_after_ttl(self):
+        """An entry past its TTL is computed again and counted as expired"""
+        cache = BoundedCache("ttl", ttl=60)
+        with patch("modules.bounded_cache.time.monotonic", return_value=1000.0):
+            cache.put("key", "old")
+        with patch("modules.bounded_cache.time.monotonic", return_value=1061.0):
+            assert cache.get_or_compute("key", lambda held: "new") == "new"
+        assert cache.stats()["expirations"] == 1
+
+    def test_concurrent_misses_compute_once(self):
+        """Callers missing on the same key while it is computed wait for that computation"""
+        cache = BoundedCache("flight")
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute(held):
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "value"
+
+        def caller():
+            results.append(cache.get_or_compute("key", compute))
+
+        threads = [threading.Thread(target=caller) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while cache.stats()["coalesced"] < 4:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert results == ["value"] * 5
+        stats = cache.stats()
+        assert (stats["misses"], stats["coalesced"]) == (1, 4)
+
+    def test_failed_computation_is_not_cached_and_clear_drops_in_flight_results(self):
+        """Errors reach the caller and aren't stored; a result computed across clear() isn't stored"""
+        cache = BoundedCache("errors")
+
+        def fail(held):
+            raise ValueError("database down")
+        with pytest.raises(ValueError):
+            cache.get_or_compute("key", fail)
+        assert cache.get_or_compute("key", lambda held: "ok") == "ok"
+
+        def cleared_meanwhile(held):
+            cache.clear()
+            return "stale"
+        assert cache.get_or_compute("other", cleared_meanwhile) == "stale"
+        assert cache.peek("other") is None
+
+    def test_decorated_function_hands_out_private_copies(self):
+        """Like st.cache_data, callers can modify what they get without changing the cached value"""
+        calls = []
+
+        @bounded_cache("test_copies", ttl=60)
+        def options(project_site=None):
+            calls.append(project_site)
+            return ["All", project_site], pd.DataFrame({"qty": [1.0, 2.0]})
+
+        listed, frame = options(project_site="Site A")
+        listed.append("extra")
+        frame["qty"] = 0.0
+        listed, frame = options(project_site="Site A")
+        assert listed == ["All", "Site A"] and frame["qty"].tolist() == [1.0, 2.0]
+        assert calls == ["Site A"]
+
+        options.clear()
+        options(project_site="Site A")
+        assert calls == ["Site A", "Site A"]
+        assert get_cache("test_copies").stats()["hits"] == 1
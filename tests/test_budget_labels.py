@@ -0,0 +1,117 @@
+"""
+Unit tests for budget label parsing and the structured budget columns
+"""
+import pytest
+import sys
+import os
+import pandas as pd
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.budget_labels import parse_budget, parse_budget_labels, budget_label, budget_mask, refresh_budget_columns
+
+# Labels as they appear in production data, plus the spelling and spacing variants users type
+LABEL_CORPUS = [
+    ("Budget 1 - Flats (General Materials)", (1, "Flats", "General Materials", None)),
+    ("Budget 3 - Flats(General Materials)", (3, "Flats", "General Materials", None)),
+    ("Budget 1 - Semi-detached (Labour)", (1, "Semi-detached", "Labour", None)),
+    ("Budget 2 - Fully-detached(Labour)", (2, "Fully-detached", "Labour", None)),
+    ("Budget 1 - Terraces(Irons)", (1, "Terraces", "Irons", None)),
+    ("Budget 1 - Terraces(Iron)", (1, "Terraces", "Irons", None)),
+    ("Budget 1 - Terraces (iron)", (1, "Terraces", "Irons", None)),
+    ("Budget 1 - Flats(Plumbings)", (1, "Flats", "Plumbings", None)),
+    ("Budget 1 - Flats(Plumbing)", (1, "Flats", "Plumbings", None)),
+    ("Budget 1 - Flats(Woods)", (1, "Flats", "Woods", None)),
+    ("Budget 3 - Flats(Electrical)", (3, "Flats", "Electrical", None)),
+    ("Budget 3 - Flats(Mechanical)", (3, "Flats", "Mechanical", None)),
+    ("Budget 1 - Flats", (1, "Flats", None, None)),
+    ("Budget 10 - Flats(Woods)", (10, "Flats", "Woods", None)),
+    ("  budget 12 -  semi detached ( Irons ) ", (12, "Semi-detached", "Irons", None)),
+    ("Budget 2 -Terraces  (General  Materials)", (2, "Terraces", "General Materials", None)),
+    ("Budget 5 - Terraces(General Materials - BLOCKWORK ABOVE ROOF BEAM)",
+     (5, "Terraces", "General Materials", "BLOCKWORK ABOVE ROOF BEAM")),
+    ("Budget 4 - Flats(Labour -  Roofing)", (4, "Flats", "Labour", "Roofing")),
+    ("Budget 7", (7, None, None, None)),
+    ("MATERIAL(IRONS)", (None, None, None, None)),
+    ("", (None, None, None, None)),
+    (None, (None, None, None, None)),
+]
+
+
+class TestBudgetLabelParsing:
+    """Test the label parser against real and variant labels"""
+
+    @pytest.mark.parametrize("label,expected", LABEL_CORPUS)
+    def test_parse_budget(self, label, expected):
+        """Each label parses to (budget_num, building type, category, subcategory)"""
+        parts = parse_budget(label)
+        assert (parts["budget_num"], parts["budget_building_type"],
+                parts["budget_category"], parts["budget_subcategory"]) == expected
+
+    def test_series_parsing_matches_scalar_parsing(self):
+        """parse_budget_labels gives the same parts as parse_budget, row by row"""
+        labels = pd.Series([label for label, _ in LABEL_CORPUS] * 2)
+        parsed = parse_budget_labels(labels)
+        assert list(parsed.index) == list(labels.index)
+        for index, label in labels.items():
+            expected = parse_budget(label)
+            row = parsed.loc[index]
+            assert (None if pd.isna(row["budget_num"]) else int(row["budget_num"])) == expected["budget_num"]
+            assert (None if pd.isna(row["budget_category"]) else row["budget_category"]) == expected["budget_category"]
+
+    def test_labels_round_trip(self):
+        """budget_label writes the stored format and parses back to the same parts"""
+        label = budget_label(5, "Terraces", "General Materials", "BLOCKWORK")
+        assert label == "Budget 5 - Terraces(General Materials - BLOCKWORK)"
+        assert parse_budget(label)["budget_subcategory"] == "BLOCKWORK"
+        assert budget_label(1, "Flats") == "Budget 1 - Flats"
+
+    def test_budget_mask(self):
+        """Number and type are exact; a base budget selects every category under it"""
+        items = pd.DataFrame({"budget": [
+            "Budget 1 - Flats (General Materials)", "Budget 1 - Flats(Irons)", "Budget 10 - Flats(Irons)",
+            "Budget 1 - Terraces(Irons)", None,
+        ]})
+        assert budget_mask(items, budget_num="Budget 1").tolist() == [True, True, False, True, False]
+        assert budget_mask(items, budget_num="All", building_type="Flats").tolist() == [True, True, True, False, False]
+        assert budget_mask(items, budget="Budget 1 - Flats(Iron)").tolist() == [False, True, False, False, False]
+        assert budget_mask(items, budget="Budget 1 - Flats").tolist() == [True, True, False, False, False]
+
+
+class TestBudgetColumns:
+    """Test that items get their parsed budget columns on write and on backfill"""
+
+    def test_backfill_and_cleared_budgets(self, sqlite_engine):
+        """refresh_budget_columns fills every label and clears rows whose budget was removed"""
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO items (id, name, category, budget, building_type, project_site)
+                VALUES (1, 'Rod', 'materials', 'Budget 1 - Terraces(Iron)', 'Terraces', 'Site A'),
+                       (2, 'Mason', 'labour', 'Budget 12 - Flats (Labour)', 'Flats', 'Site A'),
+                       (3, 'Misc', 'materials', NULL, NULL, 'Site A')
+            """))
+            assert refresh_budget_columns(conn) == 2
+            conn.execute(text("UPDATE items SET budget = NULL WHERE id = 2"))
+            refresh_budget_columns(conn, [None])
+            rows = conn.execute(text("""
+                SELECT id, budget_num, budget_building_type, budget_category FROM items ORDER BY id
+            """)).fetchall()
+        assert [tuple(row) for row in rows] == [
+            (1, 1, "Terraces", "Irons"), (2, None, None, None), (3, None, None, None)]
+
+    def test_upsert_items_populates_columns(self, sqlite_engine):
+        """Items written by upsert_items are filterable through the parsed columns straight away"""
+        import istrominventory
+        from unittest.mock import patch
+
+        df = pd.DataFrame([{"name": "Cement", "qty": 5, "unit_cost": 100}])
+        with patch('istrominventory.st.session_state', {'current_project_site': 'Site A'}), \
+                patch('istrominventory.request_backup'):
+            istrominventory.upsert_items(df, category_guess="materials", budget="Budget 3 - Flats (General Materials)",
+                                         building_type="Flats", project_site="Site A")
+            istrominventory.df_items_cached.clear()
+            items = istrominventory.df_items_cached("Site A")
+        row = items.iloc[0]
+        assert (row["budget_num"], row["budget_building_type"], row["budget_category"]) == (3, "Flats", "General Materials")
+        assert budget_mask(items, budget="Budget 3 - Flats(General Materials)").all()
@@ -0,0 +1,83 @@
+"""
+Unit tests for the budget rollup table behind the Budget Summary tab
+"""
+import pytest
+import sys
+import os
+import pandas as pd
+from unittest.mock import patch
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _add_items(engine):
+    """Twelve budgets on Site A (more than the old 10-budget cap) and one on Site B"""
+    from modules.budget_labels import refresh_budget_columns
+    rows = []
+    for budget_num in range(1, 13):
+        rows.append(f"({budget_num}, 'Cement {budget_num}', 'materials', 2, 100.555, "
+                    f"'Budget {budget_num} - Flats(General Materials)', 'Flats', 'Site A')")
+        rows.append(f"({100 + budget_num}, 'Mason {budget_num}', 'labour', 1, 50, "
+                    f"'Budget {budget_num} - Terraces(Labour)', 'Terraces', 'Site A')")
+    rows.append("(500, 'Sand', 'materials', 3, 10, 'Budget 1 - Flats(Woods)', 'Flats', 'Site B')")
+    rows.append("(501, 'Misc', 'materials', 1, 7, NULL, NULL, 'Site A')")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO items (id, name, category, qty, unit_cost, budget, building_type, project_site)
+            VALUES """ + ", ".join(rows)))
+        refresh_budget_columns(conn)
+
+
+class TestBudgetRollup:
+    """Test that the rollup matches the items and follows item writes"""
+
+    def test_rebuild_matches_pandas_totals(self, sqlite_engine):
+        """One GROUP BY gives the same per-budget totals as summing the items in pandas"""
+        from modules.budget_rollup import init_budget_rollup, get_budget_rollup, budget_totals
+
+        _add_items(sqlite_engine)
+        init_budget_rollup()
+        rollup = get_budget_rollup('Site A')
+        assert int(rollup['item_count'].sum()) == 25
+        assert rollup['amount'].sum() == pytest.approx(12 * (201.11 + 50) + 7)
+
+        totals = budget_totals(rollup)
+        assert list(totals.index) == list(range(1, 13))
+        assert totals.loc[12, 'Flats'] == pytest.approx(201.11)
+        assert totals.loc[12, 'Total'] == pytest.approx(251.11)
+        # All sites summed together
+        assert budget_totals(get_budget_rollup()).loc[1, 'Flats'] == pytest.approx(231.11)
+
+    def test_item_writes_refresh_their_site(self, sqlite_engine):
+        """upsert_items, update_item_qty and delete_item keep the rollup current"""
+        import istrominventory
+        from modules.budget_rollup import init_budget_rollup, get_budget_rollup, budget_totals
+
+        _add_items(sqlite_engine)
+        init_budget_rollup()
+        with patch('istrominventory.st.session_state', {'current_project_site': 'Site A'}), \
+                patch('istrominventory.request_backup'):
+            istrominventory.upsert_items(pd.DataFrame([{"name": "Rod", "qty": 4, "unit_cost": 25}]),
+                                         category_guess="materials", budget="Budget 13 - Flats(Irons)",
+                                         building_type="Flats", project_site="Site A")
+            istrominventory.update_item_qty(1, 10)
+            assert istrominventory.delete_item(500) is None
+
+        totals = budget_totals(get_budget_rollup('Site A'))
+        assert totals.loc[13, 'Flats'] == pytest.approx(100)
+        assert totals.loc[1, 'Flats'] == pytest.approx(1005.55)
+        assert get_budget_rollup('Site B').empty
+
+    @patch('istrominventory.st.session_state', {'user_type': 'admin', 'current_project_site': 'Site A'})
+    def test_summary_covers_every_budget(self, sqlite_engine):
+        """get_summary_data lists all budgets with data - no 10-budget cap"""
+        import istrominventory
+        from modules.budget_rollup import init_budget_rollup
+
+        _add_items(sqlite_engine)
+        init_budget_rollup()
+        rollup, summary_data = istrominventory.get_summary_data()
+        assert [row['Budget'] for row in summary_data] == [f"Budget {n}" for n in range(1, 13)]
+        assert summary_data[0]['Terraces (Per Unit)'] == "₦50.00"
+        assert summary_data[0]['Total (Per Unit)'] == "₦251.11"
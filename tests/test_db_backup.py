@@ -0,0 +1,91 @@
+"""
+Unit tests for the consistent full database backups and their restore
+"""
+import pytest
+import sys
+import os
+import json
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _add_items(engine, names):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO items (name, category, qty, unit_cost, project_site) VALUES (:name, 'materials', 1, 10, 'Site A')
+        """), [{"name": name} for name in names])
+
+
+def _item_names(engine):
+    with engine.connect() as conn:
+        return sorted(row[0] for row in conn.execute(text("SELECT name FROM items")))
+
+
+class TestDatabaseBackup:
+    """Test the SQLite online backup, the manifest, listing/cleanup and restores"""
+
+    def test_backup_and_restore_round_trip(self, sqlite_engine, tmp_path):
+        """A restore brings back the backed-up rows and invalidates cached versions and frames"""
+        from modules.db_backup import backup_database, restore_database
+        from modules.data_versions import bump_versions, current_versions, data_version, expire_versions
+        from modules.delta_frames import refresh_frame, ITEM_FRAME
+
+        _add_items(sqlite_engine, ["Cement", "Sand"])
+        manifest = backup_database(sqlite_engine, tmp_path / "backups")
+        assert manifest["dialect"] == "sqlite"
+        assert {entry["table"]: entry["rows"] for entry in manifest["tables"]}["items"] == 2
+        assert set(manifest["files"]) == {"database.db"}
+        with open(os.path.join(manifest["path"], "manifest.json")) as f:
+            assert json.load(f)["files"] == manifest["files"]
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("DELETE FROM items WHERE name = 'Sand'"))
+            bump_versions(conn, "items")
+        _add_items(sqlite_engine, ["Gravel"])
+        expire_versions()
+        held = refresh_frame("test_backup_items", ITEM_FRAME, version=data_version("items"))
+        assert sorted(held["name"]) == ["Cement", "Gravel"]
+        before = dict(current_versions())
+
+        restore_database(sqlite_engine, manifest["path"])
+        assert _item_names(sqlite_engine) == ["Cement", "Sand"]
+        after = current_versions()
+        assert min(after.values()) > max(before.values())
+        # The restored rows carry their old stamps; the restore marker makes the frame re-read in full
+        frame = refresh_frame("test_backup_items", ITEM_FRAME, version=data_version("items"))
+        assert sorted(frame["name"]) == ["Cement", "Sand"]
+
+    def test_listing_cleanup_and_checksums(self, sqlite_engine, tmp_path):
+        """Only complete backups are listed; a damaged or foreign backup is refused before anything is replaced"""
+        from modules.db_backup import backup_database, restore_database, list_backups, remove_backup
+
+        directory = tmp_path / "backups"
+        _add_items(sqlite_engine, ["Cement"])
+        first = backup_database(sqlite_engine, directory)
+        second = backup_database(sqlite_engine, directory)
+        (directory / "istrominventory_backup_20200101_000000.partial").mkdir()
+        legacy = directory / "istrominventory_backup_20200101_000000.db"
+        legacy.write_bytes(b"")
+        os.utime(legacy, (0, 0))
+        assert [str(path) for path in list_backups(directory)][-1] == str(legacy)
+        assert {str(path) for path in list_backups(directory)} == {first["path"], second["path"], str(legacy)}
+
+        with open(os.path.join(second["path"], "database.db"), "ab") as f:
+            f.write(b"torn")
+        _add_items(sqlite_engine, ["Sand"])
+        with pytest.raises(ValueError, match="checksum"):
+            restore_database(sqlite_engine, second["path"])
+
+        manifest_path = os.path.join(first["path"], "manifest.json")
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        with open(manifest_path, "w") as f:
+            json.dump({**manifest, "dialect": "postgresql"}, f)
+        with pytest.raises(ValueError, match="postgresql"):
+            restore_database(sqlite_engine, first["path"])
+        assert _item_names(sqlite_engine) == ["Cement", "Sand"]
+
+        remove_backup(second["path"])
+        remove_backup(legacy)
+        assert [str(path) for path in list_backups(directory)] == [first["path"]]
@@ -0,0 +1,143 @@
+"""
+Unit tests for updated_at/tombstone triggers and incrementally refreshed frames
+"""
+import pytest
+import sys
+import os
+import time
+import pandas as pd
+from unittest.mock import patch
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _add_items(engine, site, count, start=0):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO items (name, category, qty, unit_cost, budget, project_site)
+            VALUES (:name, 'materials', :qty, 10, :budget, :project_site)
+        """), [{"name": f"Item {n}", "qty": n, "budget": f"Budget {n % 3 + 1}", "project_site": site}
+               for n in range(start, start + count)])
+
+
+def _full(engine, spec, **filters):
+    """What a fresh full read returns"""
+    from modules.delta_frames import _full_read, _sorted
+    from modules.frame_schema import apply_frame_schema
+    with engine.connect() as conn:
+        return apply_frame_schema(_sorted(_full_read(conn, spec, filters), spec, "sqlite"), spec["schema"])
+
+
+class TestDeltaFrames:
+    """Test the change stamps and that merged frames match a full read"""
+
+    def test_triggers_stamp_rows_and_record_deletes(self, sqlite_engine):
+        """Inserts and updates are stamped, an explicit updated_at is kept, deletes leave tombstones"""
+        _add_items(sqlite_engine, "Site A", 1)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("INSERT INTO requests (ts, section, item_id, qty) VALUES ('2025-01-01', 'materials', 1, 2)"))
+            inserted = conn.execute(text("SELECT updated_at FROM items")).scalar()
+        time.sleep(0.01)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("UPDATE items SET qty = 5"))
+            conn.execute(text("UPDATE requests SET status = 'Approved', updated_at = '2025-01-02T10:00:00+01:00'"))
+            assert conn.execute(text("SELECT updated_at FROM items")).scalar() > inserted
+            assert conn.execute(text("SELECT updated_at FROM requests")).scalar() == '2025-01-02T10:00:00+01:00'
+            conn.execute(text("DELETE FROM requests"))
+            conn.execute(text("DELETE FROM items"))
+            assert [tuple(row) for row in conn.execute(text("SELECT table_name, row_id FROM tombstones ORDER BY id"))] == [
+                ("requests", 1), ("items", 1)]
+
+    def test_item_frame_refreshes_from_changed_rows_only(self, sqlite_engine):
+        """After a full read, a refresh reads back just the written rows and still matches a full read"""
+        import istrominventory
+        from modules.delta_frames import refresh_frame
+
+        _add_items(sqlite_engine, "Site A", 200)
+        _add_items(sqlite_engine, "Site B", 5, start=200)
+        # Stamps in the same millisecond as the mark would be read back as changed
+        time.sleep(0.01)
+        first = refresh_frame("items", istrominventory.ITEM_FRAME, project_site="Site A")
+        assert len(first) == 200
+
+        time.sleep(0.01)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("UPDATE items SET qty = 99 WHERE name = 'Item 3'"))
+            conn.execute(text("DELETE FROM items WHERE name = 'Item 4'"))
+            conn.execute(text("UPDATE items SET project_site = 'Site A' WHERE name = 'Item 200'"))
+            conn.execute(text("UPDATE items SET project_site = 'Site B' WHERE name = 'Item 5'"))
+        _add_items(sqlite_engine, "Site A", 1, start=300)
+
+        changed_rows = []
+        real_read = pd.read_sql_query
+        def counting_read(sql, *args, **kwargs):
+            frame = real_read(sql, *args, **kwargs)
+            changed_rows.append(len(frame))
+            return frame
+        with patch('modules.delta_frames.DELTA_OVERLAP_SECONDS', 0), \
+             patch('modules.delta_frames.pd.read_sql_query', side_effect=counting_read):
+            refreshed = refresh_frame("items", istrominventory.ITEM_FRAME, project_site="Site A")
+        # One query, returning the four written rows that still exist (Item 5 is read back at Site B and left out)
+        assert changed_rows == [4]
+        pd.testing.assert_frame_equal(refreshed, _full(sqlite_engine, istrominventory.ITEM_FRAME, project_site="Site A"))
+        assert refreshed.loc[refreshed["name"] == "Item 3", "qty"].tolist() == [99.0]
+
+    def test_request_frame_follows_status_and_item_changes(self, sqlite_engine):
+        """Filtered request frames pick up item edits, drop rows that leave the filter, and
+        re-read in full after an item delete"""
+        import istrominventory
+        import modules.delta_frames as delta_frames
+        from modules.delta_frames import refresh_frame
+
+        _add_items(sqlite_engine, "Site A", 3)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("INSERT INTO requests (ts, section, item_id, qty) VALUES ('2025-01-01', 'materials', :item_id, 1)"),
+                         [{"item_id": item_id} for item_id in (1, 2, 3, 3)])
+        spec = istrominventory.REQUEST_FRAME
+        assert len(refresh_frame("requests", spec, project_site="Site A", status="Pending")) == 4
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("UPDATE requests SET status = 'Approved' WHERE id = 1"))
+            conn.execute(text("UPDATE items SET name = 'Renamed' WHERE id = 2"))
+            conn.execute(text("DELETE FROM requests WHERE id = 4"))
+        pending = refresh_frame("requests", spec, project_site="Site A", status="Pending")
+        pd.testing.assert_frame_equal(pending, _full(sqlite_engine, spec, project_site="Site A", status="Pending"))
+        assert pending["item"].tolist() == ["Item 2", "Renamed"]
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("DELETE FROM items WHERE id = 3"))
+        with patch.object(delta_frames, '_full_read', wraps=delta_frames._full_read) as full_read:
+            pending = refresh_frame("requests", spec, project_site="Site A", status="Pending")
+        assert full_read.called
+        assert pending["id"].tolist() == [2]
+
+    def test_purge_keeps_recent_tombstones(self, sqlite_engine):
+        """Only tombstones past the retention window are purged"""
+        from modules.delta_frames import purge_tombstones
+
+        _add_items(sqlite_engine, "Site A", 2)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("DELETE FROM items"))
+            conn.execute(text("UPDATE tombstones SET deleted_at = '2020-01-01T00:00:00.000000+01:00' WHERE row_id = 1"))
+            assert purge_tombstones(conn) == 1
+            assert [row[0] for row in conn.execute(text("SELECT row_id FROM tombstones"))] == [2]
+
+    def test_sessions_share_one_categorical_snapshot(self, sqlite_engine):
+        """Callers at the same data version get views of one snapshot without a query; their
+        column writes stay private"""
+        import istrominventory
+        from sqlalchemy import event
+
+        _add_items(sqlite_engine, "Site A", 50)
+        first = istrominventory.df_items_cached("Site A")
+        assert isinstance(first["budget"].dtype, pd.CategoricalDtype)
+
+        statements = []
+        event.listen(sqlite_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        first["Amount"] = first["qty"] * first["unit_cost"]
+        first.loc[0, "qty"] = -1
+        second = istrominventory.df_items_cached("Site A")
+        assert statements == []
+        assert "Amount" not in second.columns and second.loc[0, "qty"] != -1
@@ -0,0 +1,72 @@
+"""
+Unit tests for the typed dataset frame schemas
+"""
+import pytest
+import sys
+import os
+import pandas as pd
+from unittest.mock import patch
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestFrameSchema:
+    """Test read-time typing and that typed frames skip fix_dataframe_types"""
+
+    def test_local_datetimes_read_every_stored_format(self):
+        """Offsets are converted to Lagos time; naive text is already Lagos time"""
+        from modules.frame_schema import local_datetimes
+
+        parsed = local_datetimes(["2025-01-02T10:00:00+01:00", "2025-01-02T09:00:00.500000Z",
+                                  "2025-01-02 10:00:00", "2025-01-02", None, "not a date"])
+        assert parsed.tolist()[:4] == [pd.Timestamp("2025-01-02 10:00:00"), pd.Timestamp("2025-01-02 10:00:00.5"),
+                                      pd.Timestamp("2025-01-02 10:00:00"), pd.Timestamp("2025-01-02")]
+        assert parsed[4:].isna().all()
+
+    def test_schema_types_columns_and_fix_dataframe_types_skips_them(self):
+        """Typed columns pass through fix_dataframe_types; untyped object columns are still fixed"""
+        import istrominventory
+        from modules.frame_schema import apply_frame_schema
+
+        raw = pd.DataFrame({"id": [1, 2], "qty": ["5", None], "status": ["Pending", "Approved"],
+                            "ts": ["2025-01-01T08:00:00+01:00", "2025-01-01 09:00:00"],
+                            "note": pd.Series([1, "x"], dtype=object)})
+        typed = apply_frame_schema(raw, "requests")
+        assert typed["qty"].dtype == "float64" and isinstance(typed["status"].dtype, pd.CategoricalDtype)
+        assert typed["ts"].dtype == "datetime64[ns]"
+
+        with patch('istrominventory.pd.to_numeric', wraps=pd.to_numeric) as to_numeric:
+            fixed = istrominventory.fix_dataframe_types(typed.drop(columns=["note"]))
+        assert not to_numeric.called
+        assert fixed.dtypes.to_dict() == typed.drop(columns=["note"]).dtypes.to_dict()
+        assert istrominventory.fix_dataframe_types(typed)["note"].tolist() == ["1", "x"]
+
+    def test_get_actuals_is_typed(self, sqlite_engine):
+        """Actuals come back with numeric, categorical and datetime columns"""
+        import istrominventory
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("INSERT INTO items (id, name, category, qty, unit, project_site) VALUES (1, 'Sand', 'materials', 1, 'tons', 'Site A')"))
+            conn.execute(text("""
+                INSERT INTO actuals (item_id, actual_qty, actual_cost, actual_date, recorded_by, project_site)
+                VALUES (1, 2, 300, '2025-03-04', 'Site A', 'Site A')
+            """))
+        actuals = istrominventory.get_actuals("Site A")
+        assert actuals["actual_date"].tolist() == [pd.Timestamp("2025-03-04")]
+        assert actuals["actual_cost"].dtype == "float64"
+        assert isinstance(actuals["unit"].dtype, pd.CategoricalDtype)
+
+    def test_chunked_read_keeps_categoricals(self, sqlite_engine):
+        """Chunks with different categories concatenate into one categorical column"""
+        from modules.frame_schema import read_frame
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("INSERT INTO items (name, category, qty, unit, project_site) VALUES (:name, 'materials', 1, :unit, 'Site A')"),
+                         [{"name": f"Item {n}", "unit": unit} for n, unit in enumerate(["bags", "bags", "tons", None, "pcs"])])
+        with sqlite_engine.connect() as conn:
+            items = read_frame(text("SELECT id, unit, qty FROM items ORDER BY id"), conn, "items", chunk_rows=2)
+        assert isinstance(items["unit"].dtype, pd.CategoricalDtype)
+        assert list(items["unit"].cat.categories) == ["bags", "pcs", "tons"]
+        assert items["unit"].tolist()[:3] == ["bags", "bags", "tons"] and pd.isna(items["unit"][3])
+        assert items.attrs["frame_schema"] == "items"
@@ -0,0 +1,165 @@
+"""
+Unit tests for the batched item upsert behind upsert_items
+"""
+import pytest
+import sys
+import os
+import pandas as pd
+from unittest.mock import patch
+from sqlalchemy import event, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _items(engine):
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text(
+            "SELECT code, name, qty, unit_cost, budget_num, project_site FROM items ORDER BY id"
+        ))]
+
+
+class TestItemUpsert:
+    """Test normalization, ON CONFLICT keys and the inserted/updated summary"""
+
+    def test_normalize_reads_aliases_and_keeps_last_duplicate(self):
+        """Alias columns, numeric coercion and context defaults are applied column-wise"""
+        from modules.item_upsert import normalize_items
+
+        raw = pd.DataFrame({
+            "item": [" Cement ", "", "Sand", "Cement"],
+            "uom": ["bag", None, "ton", "bags"],
+            "quantity": ["5", 1, "n/a", 7],
+            "unit_cost": [1000, 2, "", 3.5],
+            "code": [None, None, "S1", None],
+        })
+        rows = normalize_items(raw, category_guess="Materials", budget="Budget 2 - Flats(Woods)", project_site="Site A")
+        assert rows["name"].tolist() == ["Sand", "Cement"]
+        assert rows["qty"].tolist() == [0.0, 7.0]
+        assert rows["unit"].tolist() == ["ton", "bags"]
+        assert pd.isna(rows.loc[0, "unit_cost"]) and rows.loc[1, "unit_cost"] == 3.5
+        assert set(rows["category"]) == {"materials"}
+        assert rows["budget_num"].tolist() == [2, 2]
+        assert set(rows["budget_building_type"]) == {"Flats"}
+
+        labour = normalize_items(pd.DataFrame({"role": ["Mason"], "available_slots": [3]}), project_site="Site A")
+        assert labour.loc[0, "category"] == "labour" and labour.loc[0, "qty"] == 3.0
+
+    def test_chunked_upsert_counts_inserts_and_updates(self, sqlite_engine):
+        """Re-importing the same rows updates them in place; each chunk is one statement"""
+        from modules.item_upsert import normalize_items, upsert_item_rows
+
+        raw = pd.DataFrame({"code": ["A1", "A2", None, None, None],
+                            "name": ["Rod", "Nail", "Sand", "Gravel", "Cement"],
+                            "qty": [1, 2, 3, 4, 5], "unit_cost": [10, 20, 30, 40, 50]})
+        rows = normalize_items(raw, budget="Budget 1 - Flats(Irons)", project_site="Site A")
+        statements = []
+        event.listen(sqlite_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        with sqlite_engine.begin() as conn:
+            assert upsert_item_rows(conn, rows, chunk_rows=2) == {"inserted": 5, "updated": 0}
+        # Two coded rows in one chunk, three codeless rows in two
+        assert sum("INSERT INTO items" in statement for statement in statements) == 3
+
+        rows["qty"] = rows["qty"] * 10
+        with sqlite_engine.begin() as conn:
+            assert upsert_item_rows(conn, rows) == {"inserted": 0, "updated": 5}
+        assert [row[2] for row in _items(sqlite_engine)] == [10.0, 20.0, 30.0, 40.0, 50.0]
+        assert {row[4] for row in _items(sqlite_engine)} == {1}
+
+    def test_codes_are_unique_per_site(self, sqlite_engine):
+        """The same code on two sites is two items; on one site it is updated"""
+        import istrominventory
+
+        with patch('istrominventory.request_backup'):
+            first = istrominventory.upsert_items(pd.DataFrame([{"code": "B1", "name": "Block", "qty": 1}]),
+                                                 project_site="Site A")
+            second = istrominventory.upsert_items(pd.DataFrame([{"code": "B1", "name": "Block", "qty": 2}]),
+                                                  project_site="Site B")
+            third = istrominventory.upsert_items(pd.DataFrame([{"code": "B1", "name": "Blocks", "qty": 3}]),
+                                                 project_site="Site A")
+        assert (first, second, third) == ({"inserted": 1, "updated": 0}, {"inserted": 1, "updated": 0},
+                                          {"inserted": 0, "updated": 1})
+        assert _items(sqlite_engine) == [("B1", "Blocks", 3.0, None, None, "Site A"),
+                                         ("B1", "Block", 2.0, None, None, "Site B")]
+
+    def test_duplicates_are_merged_before_the_natural_key_index(self, sqlite_engine):
+        """Existing duplicate codeless items fold into the oldest, keeping their requests"""
+        from modules.schema import create_index_sql
+        from modules.item_upsert import merge_duplicate_items
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("DROP INDEX idx_items_natural_key"))
+            conn.execute(text("""
+                INSERT INTO items (id, name, category, qty, budget, project_site)
+                VALUES (1, 'Sand', 'materials', 1, NULL, 'Site A'), (2, 'Sand', 'materials', 2, '', 'Site A'),
+                       (3, 'Sand', 'materials', 3, NULL, 'Site B')
+            """))
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, status)
+                VALUES (1, '2025-01-01', 'materials', 2, 4, 'Pending')
+            """))
+            assert merge_duplicate_items(conn) == 1
+            conn.execute(text(create_index_sql("idx_items_natural_key")))
+        with sqlite_engine.connect() as conn:
+            assert [row[0] for row in conn.execute(text("SELECT id FROM items ORDER BY id"))] == [1, 3]
+            assert conn.execute(text("SELECT item_id FROM requests")).scalar() == 1
+            assert conn.execute(text("SELECT requested_qty FROM request_ledger WHERE item_id = 1")).scalar() == 4
+        with pytest.raises(Exception):
+            with sqlite_engine.begin() as conn:
+                conn.execute(text("INSERT INTO items (name, category, qty, project_site) VALUES ('Sand', 'materials', 1, 'Site A')"))
+
+    def test_coded_duplicates_are_merged_or_recoded(self, sqlite_engine):
+        """The same coded item folds into the oldest; a different item reusing the code is recoded"""
+        from modules.item_upsert import merge_duplicate_items
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("DROP INDEX idx_items_site_code"))
+            conn.execute(text("""
+                INSERT INTO items (id, code, name, category, qty, project_site)
+                VALUES (1, 'B1', 'Block', 'materials', 1, 'Site A'), (2, 'B1', 'Block', 'materials', 2, 'Site A'),
+                       (3, 'B1', 'Brick', 'materials', 3, 'Site A'), (4, 'B1', 'Block', 'materials', 4, 'Site B')
+            """))
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, status)
+                VALUES (1, '2025-01-01', 'materials', 2, 4, 'Pending')
+            """))
+            assert merge_duplicate_items(conn) == 2
+        with sqlite_engine.connect() as conn:
+            assert [tuple(row) for row in conn.execute(text("SELECT id, code FROM items ORDER BY id"))] == [
+                (1, "B1"), (3, "B1#3"), (4, "B1")]
+            assert conn.execute(text("SELECT item_id FROM requests")).scalar() == 1
+
+    def test_old_global_code_unique_is_dropped_on_sqlite(self, sqlite_engine):
+        """An items table declaring code UNIQUE is rebuilt, keeping its rows, ids and extra columns"""
+        from modules.item_upsert import drop_global_code_unique
+        from modules.schema import apply_schema, read_catalog, schema_diff
+        import istrominventory
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("DROP TABLE items"))
+            conn.execute(text("""
+                CREATE TABLE items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, code TEXT UNIQUE, name TEXT NOT NULL,
+                    category TEXT NOT NULL, unit TEXT, qty REAL NOT NULL DEFAULT 0, unit_cost REAL,
+                    budget TEXT, section TEXT, grp TEXT, building_type TEXT, project_site TEXT, planned_qty REAL DEFAULT 0
+                )
+            """))
+            conn.execute(text("""
+                INSERT INTO items (id, code, name, category, qty, project_site, planned_qty)
+                VALUES (7, 'B1', 'Block', 'materials', 1, 'Site A', 5), (9, NULL, 'Sand', 'materials', 2, 'Site A', 0)
+            """))
+            conn.execute(text("DELETE FROM items WHERE id = 9"))
+        apply_schema(sqlite_engine)
+        with sqlite_engine.begin() as conn:
+            assert drop_global_code_unique(conn)
+            assert not drop_global_code_unique(conn)
+        with sqlite_engine.connect() as conn:
+            assert schema_diff(read_catalog(conn)) == []
+            assert conn.execute(text("SELECT id, code, planned_qty FROM items")).fetchall() == [(7, "B1", 5.0)]
+
+        with patch('istrominventory.request_backup'):
+            istrominventory.upsert_items(pd.DataFrame([{"code": "B1", "name": "Block", "qty": 2}]), project_site="Site B")
+        with sqlite_engine.connect() as conn:
+            ids = [row[0] for row in conn.execute(text("SELECT id FROM items ORDER BY id"))]
+        # The AUTOINCREMENT counter survived the rebuild: the deleted id 9 isn't handed out again
+        assert ids == [7, 10]
@@ -0,0 +1,84 @@
+"""
+Unit tests for the background maintenance jobs and their scheduling
+"""
+import pytest
+import sys
+import os
+from datetime import timedelta
+from unittest.mock import patch
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestMaintenance:
+    """Test the retention purges, the due-job bookkeeping and the cross-process lock"""
+
+    def test_purges_delete_only_expired_rows_in_batches(self, sqlite_engine):
+        """Old access logs and read notifications go, recent and unread ones stay"""
+        from modules import maintenance
+
+        old = (maintenance._now() - timedelta(days=400)).isoformat()
+        recent = maintenance._now().isoformat()
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("INSERT INTO access_logs (access_code, user_name, access_time) VALUES ('x', 'u', :at)"),
+                         [{"at": old}] * 7 + [{"at": recent}] * 2)
+            conn.execute(text("""
+                INSERT INTO notifications (notification_type, title, message, is_read, created_at)
+                VALUES ('info', 't', 'm', :is_read, :at)
+            """), [{"is_read": 1, "at": old}, {"is_read": 0, "at": old}, {"is_read": 1, "at": recent}])
+
+        pauses = []
+        with patch.object(maintenance, "PURGE_BATCH_ROWS", 3), \
+             patch.object(maintenance.time, "sleep", side_effect=pauses.append):
+            assert maintenance.purge_access_logs(sqlite_engine) == 7
+            assert maintenance.purge_notifications(sqlite_engine) == 1
+        # 7 rows at 3 per batch: two full batches, then a short one
+        assert len(pauses) == 2
+        with sqlite_engine.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM access_logs")).scalar() == 2
+            assert [tuple(row) for row in conn.execute(text("SELECT is_read, created_at FROM notifications ORDER BY id"))] == [
+                (0, old), (1, recent)]
+
+    def test_due_jobs_run_once_per_interval_and_failures_are_recorded(self, sqlite_engine):
+        """A job runs again only after its interval; an error is recorded instead of raised"""
+        from modules import maintenance
+
+        calls = []
+
+        def failing(engine):
+            raise RuntimeError("disk full")
+        jobs = [("counted", 3600, lambda engine: calls.append(1) or 5), ("failing", 3600, failing)]
+
+        runs = maintenance.run_due_jobs(jobs)
+        assert [(run["job"], run["status"], run["row_count"]) for run in runs] == [
+            ("counted", "ok", 5), ("failing", "error", None)]
+        assert maintenance.run_due_jobs(jobs) == []
+        assert len(maintenance.run_due_jobs(jobs, force=True)) == 2
+        assert len(calls) == 2
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("UPDATE maintenance_runs SET started_at = '2020-01-01T00:00:00' WHERE job = 'counted'"))
+        assert [run["job"] for run in maintenance.run_due_jobs(jobs)] == ["counted"]
+        with patch.object(maintenance, "_jobs", jobs):
+            recorded = {run["job"]: run for run in maintenance.get_maintenance_runs()}
+        assert recorded["failing"]["error"] == "disk full"
+        assert recorded["counted"]["every_hours"] == 1.0
+
+    def test_jobs_are_skipped_while_another_process_holds_the_lock(self, sqlite_engine):
+        """The flock is non-blocking: a second holder gets False instead of waiting"""
+        from modules import maintenance
+
+        with maintenance.maintenance_lock(sqlite_engine) as first:
+            assert first
+            # flock locks belong to the open file, so a second open() behaves like another process
+            with maintenance.maintenance_lock(sqlite_engine) as second:
+                assert not second
+            assert maintenance.run_due_jobs([("job", 0, lambda engine: 1)]) == []
+
+    def test_builtin_jobs_run_on_sqlite(self, sqlite_engine):
+        """Every default job runs cleanly on a fresh database"""
+        from modules import maintenance
+
+        runs = maintenance.run_due_jobs(maintenance.MAINTENANCE_JOBS)
+        assert {run["job"]: run["status"] for run in runs} == {name: "ok" for name, _, _ in maintenance.MAINTENANCE_JOBS}
@@ -0,0 +1,84 @@
+"""
+Unit tests for the notification outbox used by request writes
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch
+from sqlalchemy import event, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _add_item(engine, planned_qty=5):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO items (id, name, category, qty, unit_cost, building_type, project_site)
+            VALUES (1, 'Cement', 'materials', :qty, 5000, 'Flats', 'Test Site')
+        """), {"qty": planned_qty})
+
+
+def _notifications(engine):
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text(
+            "SELECT notification_type, user_id, request_id, is_read FROM notifications ORDER BY id"
+        ))]
+
+
+class TestNotificationOutbox:
+    """Test that notifications are queued and written in the request transaction"""
+
+    def test_flush_writes_one_multi_row_insert(self, sqlite_engine):
+        """Queued notifications go out in a single INSERT and the outbox is emptied"""
+        from modules.notification_outbox import queue_notification, flush_notifications
+
+        outbox = []
+        queue_notification(outbox, "new_request", "New", "m1", request_id=None)
+        queue_notification(outbox, "request_submitted", "Submitted", "m2", user_id=-1, is_read=True)
+        statements = []
+        event.listen(sqlite_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        with sqlite_engine.begin() as conn:
+            assert flush_notifications(conn, outbox, "2025-01-01T10:00:00+01:00") == 2
+        assert outbox == []
+        assert sum("INSERT INTO notifications" in statement for statement in statements) == 1
+        assert _notifications(sqlite_engine) == [("new_request", None, None, 0), ("request_submitted", None, None, 1)]
+
+    @patch('istrominventory.st.session_state', {'user_type': 'admin', 'current_project_site': 'Test Site'})
+    def test_request_lifecycle_notifications_share_the_commit(self, sqlite_engine):
+        """add_request and set_request_status write their notifications without extra lookups"""
+        import istrominventory
+        from modules.notification_summary import get_notification_summary
+
+        _add_item(sqlite_engine, planned_qty=5)
+        with patch('istrominventory.create_notification') as create_notification:
+            req_id = istrominventory.add_request('materials', 1, 8, 'Test User', '', building_subtype='B1')
+            assert istrominventory.set_request_status(req_id, 'Approved', approved_by='Admin') is None
+        create_notification.assert_not_called()
+
+        assert _notifications(sqlite_engine) == [
+            ("new_request", None, req_id, 0),
+            ("request_submitted", None, req_id, 0),
+            ("over_planned", None, req_id, 0),
+            ("request_approved", None, req_id, 0),
+        ]
+        summary = get_notification_summary('Test Site')
+        assert summary['unread_count'] == 2
+        with sqlite_engine.connect() as conn:
+            logged = conn.execute(text("SELECT COUNT(*) FROM access_logs WHERE access_code = 'REQUEST_SYSTEM'")).scalar()
+        assert logged == 1
+
+    def test_failed_flush_rolls_back_the_request_write(self, sqlite_engine):
+        """Notifications and the business write commit or roll back together"""
+        from modules.notification_outbox import queue_notification, flush_notifications
+
+        _add_item(sqlite_engine)
+        outbox = []
+        queue_notification(outbox, "new_request", None, "title is NOT NULL")
+        with pytest.raises(Exception):
+            with sqlite_engine.begin() as conn:
+                conn.execute(text("UPDATE items SET qty = 99 WHERE id = 1"))
+                flush_notifications(conn, outbox, "2025-01-01T10:00:00+01:00")
+        with sqlite_engine.connect() as conn:
+            assert conn.execute(text("SELECT qty FROM items WHERE id = 1")).scalar() == 5
+        assert _notifications(sqlite_engine) == []
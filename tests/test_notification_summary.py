@@ -0,0 +1,141 @@
+"""
+Unit tests for the per-site notification summary and the notification memo
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _add_requests(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO items (id, name, category, qty, unit_cost, building_type, project_site)
+            VALUES (1, 'Cement', 'materials', 10, 5000, 'Flats', 'Site A'),
+                   (2, 'Sand', 'materials', 10, 500, 'Flats', 'Site B')
+        """))
+        conn.execute(text("""
+            INSERT INTO requests (id, ts, section, item_id, qty, requested_by, status)
+            VALUES (1, '2025-01-01 10:00:00', 'materials', 1, 2, 'User A', 'Pending'),
+                   (2, '2025-01-01 11:00:00', 'materials', 1, 3, 'User A', 'Pending'),
+                   (3, '2025-01-01 12:00:00', 'materials', 2, 1, 'User B', 'Pending')
+        """))
+
+
+def _summary(site):
+    from modules.notification_summary import get_notification_summary
+    return get_notification_summary(site)
+
+
+class TestNotificationSummary:
+    """Test that notification writes keep the per-site summary row in sync"""
+
+    def test_create_read_and_delete_update_the_summary(self, sqlite_engine):
+        """create_notification, mark_notification_read and delete_notification recount the site"""
+        import istrominventory
+
+        _add_requests(sqlite_engine)
+        assert istrominventory.create_notification('request_submitted', 'Submitted', 'r1', user_id=-1, request_id=1)
+        assert istrominventory.create_notification('request_submitted', 'Submitted', 'r2', user_id=-1, request_id=2)
+        assert istrominventory.create_notification('request_submitted', 'Submitted', 'r3', user_id=-1, request_id=3)
+        # Admin-only notification types don't touch site rows
+        assert istrominventory.create_notification('new_request', 'New', 'r1', user_id=None, request_id=1)
+
+        site_a = _summary('Site A')
+        assert site_a['unread_count'] == 2
+        assert _summary('Site B')['unread_count'] == 1
+
+        with sqlite_engine.connect() as conn:
+            first_id, latest_id = [row[0] for row in conn.execute(text(
+                "SELECT id FROM notifications WHERE request_id IN (1, 2) AND notification_type = 'request_submitted' ORDER BY id"
+            ))]
+        assert site_a['latest_id'] == latest_id
+
+        assert istrominventory.mark_notification_read(first_id) is True
+        after_read = _summary('Site A')
+        assert after_read['unread_count'] == 1
+        assert after_read['version'] > site_a['version']
+
+        assert istrominventory.delete_notification(latest_id) is True
+        after_delete = _summary('Site A')
+        assert after_delete['unread_count'] == 0
+        assert after_delete['latest_id'] == first_id
+
+    def test_writes_adjust_the_row_without_recounting_the_site(self, sqlite_engine):
+        """Inserts, reads and deletes move the counts by what they touched and agree with a recount"""
+        import istrominventory
+        from sqlalchemy import event
+        from modules.notification_outbox import queue_notification, flush_notifications
+        from modules.notification_summary import rebuild_summary
+
+        _add_requests(sqlite_engine)
+        statements = []
+        event.listen(sqlite_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        outbox = []
+        queue_notification(outbox, "request_submitted", "Submitted", "r1", request_id=1, project_site='Site A')
+        queue_notification(outbox, "request_approved", "Approved", "r2", request_id=2, project_site='Site A', is_read=True)
+        queue_notification(outbox, "request_submitted", "Submitted", "r3", request_id=3, project_site='Site B')
+        queue_notification(outbox, "new_request", "New", "r1", request_id=1, project_site='Site A')
+        with sqlite_engine.begin() as conn:
+            flush_notifications(conn, outbox, "2025-01-01T10:00:00+01:00")
+        assert istrominventory.create_notification('request_submitted', 'Submitted', 'r2', user_id=-1, request_id=2)
+        with sqlite_engine.connect() as conn:
+            ids = [row[0] for row in conn.execute(text("SELECT id FROM notifications ORDER BY id"))]
+        assert istrominventory.mark_notification_read(ids[0]) is True
+        assert istrominventory.mark_notification_read(ids[0]) is True
+        assert istrominventory.delete_notification(ids[1]) is True
+        # Every summary lookup was narrowed to the notifications the write touched
+        assert not [statement for statement in statements
+                    if "GROUP BY i.project_site" in statement and "n.id IN" not in statement]
+
+        incremental = {site: _summary(site) for site in ('Site A', 'Site B')}
+        assert (incremental['Site A']['unread_count'], incremental['Site A']['latest_id']) == (1, ids[4])
+        with sqlite_engine.begin() as conn:
+            rebuild_summary(conn)
+        for site, row in incremental.items():
+            assert (_summary(site)['unread_count'], _summary(site)['latest_id']) == (row['unread_count'], row['latest_id'])
+
+    def test_rebuild_matches_incremental_rows_and_bumps_versions(self, sqlite_engine):
+        """A rebuild recounts every site without ever lowering a version"""
+        import istrominventory
+        from modules.notification_summary import rebuild_notification_summary
+
+        _add_requests(sqlite_engine)
+        istrominventory.create_notification('request_submitted', 'Submitted', 'r1', user_id=-1, request_id=1)
+        istrominventory.create_notification('request_submitted', 'Submitted', 'r3', user_id=-1, request_id=3)
+        before = {site: _summary(site) for site in ('Site A', 'Site B')}
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("DELETE FROM notifications WHERE request_id = 3"))
+        assert rebuild_notification_summary() == 1
+
+        assert _summary('Site A')['unread_count'] == before['Site A']['unread_count']
+        assert _summary('Site B')['unread_count'] == 0
+        assert _summary('Site B')['latest_id'] is None
+        for site in before:
+            assert _summary(site)['version'] > before[site]['version']
+
+    def test_notifications_are_fetched_once_until_the_summary_changes(self, sqlite_engine):
+        """get_project_site_notifications reuses its memo while the site's version is unchanged"""
+        import istrominventory
+
+        _add_requests(sqlite_engine)
+        istrominventory.create_notification('request_submitted', 'Submitted', 'r1', user_id=-1, request_id=1)
+        session = {'user_type': 'project_site', 'project_site': 'Site A'}
+        fetch = istrominventory.fetch_project_site_notifications
+
+        with patch('istrominventory.st.session_state', session), \
+                patch('istrominventory.fetch_project_site_notifications', wraps=fetch) as fetched:
+            first = istrominventory.get_project_site_notifications()
+            second = istrominventory.get_project_site_notifications()
+            assert fetched.call_count == 1
+            assert first == second and len(first) == 1
+
+            istrominventory.mark_notification_read(first[0]['id'])
+            third = istrominventory.get_project_site_notifications()
+            assert fetched.call_count == 2
+            assert third[0]['is_read'] is True
@@ -0,0 +1,107 @@
+"""
+Unit tests for the per-rerun profiler
+"""
+import pytest
+import sys
+import os
+import json
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import profiler
+
+
+@pytest.fixture
+def recording():
+    """Profiler switched on with an empty history"""
+    was_enabled = profiler.profiler_enabled()
+    profiler.set_profiler_enabled(True)
+    profiler.clear_history()
+    yield profiler
+    profiler.finish_rerun()
+    profiler.clear_history()
+    profiler.set_profiler_enabled(was_enabled)
+
+
+class TestProfiler:
+    """Test rerun recording, hit/miss accounting and the query hook"""
+
+    def test_disabled_profiler_records_nothing(self):
+        """With the profiler off, reruns are no-ops"""
+        profiler.set_profiler_enabled(False)
+        profiler.clear_history()
+        profiler.start_rerun()
+        profiler.checkpoint("tab: Inventory")
+        assert profiler.finish_rerun("Inventory") is None
+        assert profiler.get_recent_reruns() == []
+
+    def test_checkpoints_split_the_rerun_into_sections(self, recording):
+        """Each checkpoint closes the previous section"""
+        recording.start_rerun()
+        recording.checkpoint("startup")
+        recording.checkpoint("tab: Inventory")
+        with recording.section("export"):
+            pass
+        record = recording.finish_rerun("Inventory")
+
+        assert set(record["sections"]) == {"startup", "tab: Inventory", "export"}
+        assert record["label"] == "Inventory"
+        assert recording.get_recent_reruns() == [record]
+
+    def test_cache_hits_are_calls_without_misses(self, recording):
+        """profile_call counts every call, profile_miss only body executions"""
+        cache = {}
+
+        def fake_cache(func):
+            def wrapper(key):
+                if key not in cache:
+                    cache[key] = func(key)
+                return cache[key]
+            return wrapper
+
+        @recording.profile_call("lookup", cached=True)
+        @fake_cache
+        @recording.profile_miss("lookup")
+        def lookup(key):
+            return key * 2
+
+        recording.start_rerun()
+        assert [lookup(1), lookup(1), lookup(2), lookup(1)] == [2, 2, 4, 2]
+        record = recording.finish_rerun()
+
+        assert record["calls"]["lookup"]["count"] == 4
+        assert record["calls"]["lookup"]["misses"] == 2
+        summary = recording.summarize_reruns()
+        assert summary["cache_hit_rate"] == 0.5
+        assert summary["functions"][0]["hit_rate"] == 0.5
+
+    def test_query_hook_counts_queries_per_rerun(self, recording, tmp_path):
+        """Queries on the recording thread are counted; others are not"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}", future=True)
+        recording.install_query_hook(engine)
+        recording.install_query_hook(engine)  # idempotent
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))  # not recording yet
+            recording.start_rerun()
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+            record = recording.finish_rerun()
+        engine.dispose()
+
+        assert record["queries"] == 3
+        assert len(record["slow_queries"]) == 3
+        assert recording.summarize_reruns()["queries_per_rerun"] == 3
+
+    def test_history_is_bounded_and_exportable(self, recording):
+        """Only the last HISTORY_SIZE reruns are kept and the export is valid JSON"""
+        for index in range(profiler.HISTORY_SIZE + 5):
+            recording.start_rerun()
+            recording.finish_rerun(f"run {index}")
+
+        reruns = recording.get_recent_reruns()
+        assert len(reruns) == profiler.HISTORY_SIZE
+        assert reruns[-1]["label"] == f"run {profiler.HISTORY_SIZE + 4}"
+        exported = json.loads(recording.export_json())
+        assert exported["summary"]["reruns"] == profiler.HISTORY_SIZE
+        assert len(exported["reruns"]) == profiler.HISTORY_SIZE
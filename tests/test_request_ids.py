@@ -0,0 +1,104 @@
+"""
+Unit tests for request id allocation
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch, MagicMock
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _insert_requests(engine, ids):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO items (id, name, category, qty, unit_cost, project_site)
+            VALUES (1, 'Cement', 'materials', 100, 5000, 'Test Site')
+        """))
+        for req_id in ids:
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, requested_by, status)
+                VALUES (:id, '2025-01-01T10:00:00', 'materials', 1, 1, 'Test User', 'Pending')
+            """), {"id": req_id})
+
+
+class TestRequestIdAllocation:
+    """Test the free-id pool allocator"""
+    
+    def test_rebuild_pool_finds_gaps(self, sqlite_engine):
+        """Every gap below MAX(id) is pooled in one statement"""
+        from modules.request_ids import rebuild_id_pool
+        
+        _insert_requests(sqlite_engine, [2, 3, 7, 8, 10])
+        with sqlite_engine.begin() as conn:
+            assert rebuild_id_pool(conn) == 5
+            pooled = [row[0] for row in conn.execute(text("SELECT id FROM request_id_pool ORDER BY id"))]
+        assert pooled == [1, 4, 5, 6, 9]
+    
+    def test_rebuild_pool_is_capped(self, sqlite_engine):
+        """Only the lowest REQUEST_ID_POOL_MAX_GAP_IDS gap ids are pooled, however far the ids jump"""
+        import modules.request_ids as request_ids
+        
+        _insert_requests(sqlite_engine, [2, 3, 7, 5000000])
+        with patch.object(request_ids, 'REQUEST_ID_POOL_MAX_GAP_IDS', 6):
+            with sqlite_engine.begin() as conn:
+                assert request_ids.rebuild_id_pool(conn) == 6
+                pooled = [row[0] for row in conn.execute(text("SELECT id FROM request_id_pool ORDER BY id"))]
+        assert pooled == [1, 4, 5, 6, 8, 9]
+    
+    def test_allocate_lowest_then_sequence(self, sqlite_engine):
+        """Freed ids are handed out lowest first, then the database assigns new ones"""
+        from modules.request_ids import rebuild_id_pool, allocate_request_id, release_request_id
+        
+        _insert_requests(sqlite_engine, [1, 3, 4])
+        with sqlite_engine.begin() as conn:
+            rebuild_id_pool(conn)
+            release_request_id(conn, 4)
+            conn.execute(text("DELETE FROM requests WHERE id = 4"))
+            assert allocate_request_id(conn) == 2
+            assert allocate_request_id(conn) == 4
+            assert allocate_request_id(conn) is None
+    
+    def test_allocate_skips_ids_taken_since_pooling(self, sqlite_engine):
+        """A pooled id that was re-used by an explicit insert is never handed out twice"""
+        from modules.request_ids import rebuild_id_pool, allocate_request_id
+        
+        _insert_requests(sqlite_engine, [1, 4])
+        with sqlite_engine.begin() as conn:
+            rebuild_id_pool(conn)
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, requested_by, status)
+                VALUES (2, '2025-01-01T10:00:00', 'materials', 1, 1, 'Test User', 'Pending')
+            """))
+            assert allocate_request_id(conn) == 3
+    
+    def test_sequence_mode_disables_reuse(self, sqlite_engine):
+        """REQUEST_ID_MODE=sequence always defers to the native id"""
+        import modules.request_ids as request_ids
+        
+        _insert_requests(sqlite_engine, [1, 5])
+        with patch.object(request_ids, 'REQUEST_ID_MODE', 'sequence'):
+            with sqlite_engine.begin() as conn:
+                assert request_ids.rebuild_id_pool(conn) == 0
+                request_ids.release_request_id(conn, 3)
+                assert request_ids.allocate_request_id(conn) is None
+    
+    def test_format_request_ids_lists_real_runs(self):
+        """Non-contiguous batches name only their own ids"""
+        from modules.request_ids import format_request_ids
+        
+        assert format_request_ids([9, 3, 7, 8]) == "#3, #7-#9"
+        assert format_request_ids([5]) == "#5"
+        assert format_request_ids([4, 5]) == "#4-#5"
+    
+    @patch('istrominventory.st.session_state', {'user_type': 'admin', 'current_project_site': 'Test Site'})
+    @patch('istrominventory.create_notification', MagicMock(return_value=True))
+    def test_add_request_reuses_deleted_id(self, sqlite_engine):
+        """add_request takes the id freed by delete_request"""
+        import istrominventory
+        
+        _insert_requests(sqlite_engine, [1, 2, 3])
+        assert istrominventory.delete_request(2) is True
+        assert istrominventory.add_request('materials', 1, 2, 'Test User', '') == 2
+        assert istrominventory.add_request('materials', 1, 2, 'Test User', '') == 4
@@ -0,0 +1,115 @@
+"""
+Unit tests for the requested-quantity ledger
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch, MagicMock
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _add_item(engine, planned_qty=10):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO items (id, name, category, qty, unit_cost, building_type, project_site)
+            VALUES (1, 'Cement', 'materials', :qty, 5000, 'Flats', 'Test Site')
+        """), {"qty": planned_qty})
+
+
+def _ledger_row(engine, subtype='B1'):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT requested_qty, approved_qty, pending_qty, request_count
+            FROM request_ledger WHERE item_id = 1 AND building_subtype = :subtype
+        """), {"subtype": subtype}).fetchone()
+
+
+class TestRequestLedger:
+    """Test that request writes keep the ledger in sync"""
+    
+    @patch('istrominventory.st.session_state', {'user_type': 'admin', 'current_project_site': 'Test Site'})
+    @patch('istrominventory.create_notification', MagicMock(return_value=True))
+    @patch('istrominventory.log_request_activity', MagicMock())
+    def test_ledger_follows_request_lifecycle(self, sqlite_engine):
+        """add_request, set_request_status and delete_request update the ledger in-transaction"""
+        import istrominventory
+        from modules.request_ledger import verify_request_ledger
+        
+        _add_item(sqlite_engine)
+        first = istrominventory.add_request('materials', 1, 4, 'Test User', '', building_subtype='B1')
+        second = istrominventory.add_request('materials', 1, 3, 'Test User', '', building_subtype=' B1 ')
+        assert tuple(_ledger_row(sqlite_engine)) == (7, 0, 7, 2)
+        
+        assert istrominventory.set_request_status(first, 'Approved', approved_by='Admin') is None
+        assert tuple(_ledger_row(sqlite_engine)) == (7, 4, 3, 2)
+        
+        assert istrominventory.set_request_status(second, 'Rejected', approved_by='Admin') is None
+        assert tuple(_ledger_row(sqlite_engine)) == (4, 4, 0, 1)
+        
+        assert istrominventory.delete_request(first) is True
+        assert tuple(_ledger_row(sqlite_engine)) == (0, 0, 0, 0)
+        assert verify_request_ledger() == []
+    
+    def test_verify_detects_and_rebuild_fixes_drift(self, sqlite_engine):
+        """verify_request_ledger reports drift and rebuild_request_ledger recomputes it"""
+        from modules.request_ledger import verify_request_ledger, rebuild_request_ledger
+        
+        _add_item(sqlite_engine)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO requests (ts, section, item_id, qty, requested_by, building_subtype, status)
+                VALUES ('2025-01-01T10:00:00', 'materials', 1, 5, 'Test User', 'B1', 'Approved'),
+                       ('2025-01-01T11:00:00', 'materials', 1, 2, 'Test User', NULL, 'Pending')
+            """))
+        
+        drift = verify_request_ledger()
+        assert {row['building_subtype'] for row in drift} == {'B1', ''}
+        
+        assert rebuild_request_ledger() == 2
+        assert verify_request_ledger() == []
+        assert tuple(_ledger_row(sqlite_engine, 'B1')) == (5, 5, 0, 1)
+    
+    @patch('istrominventory.st.session_state', {'user_type': 'admin', 'project_site': 'ALL'})
+    @patch('istrominventory.create_notification', MagicMock(return_value=True))
+    def test_over_planned_requests_use_ledger(self, sqlite_engine):
+        """Over-planned alerts are listed from ledger totals"""
+        import istrominventory
+        
+        _add_item(sqlite_engine, planned_qty=5)
+        istrominventory.add_request('materials', 1, 4, 'Test User', '', building_subtype='B1')
+        latest = istrominventory.add_request('materials', 1, 3, 'Site Lead', '', building_subtype='B2')
+        
+        rows = istrominventory._get_over_planned_requests.__wrapped__(user_type='admin', project_site='ALL')
+        assert len(rows) == 1
+        assert rows[0][0] == latest
+        assert rows[0][1] == 7
+        assert rows[0][4] == 'Site Lead'
+    
+    @patch('istrominventory.create_notification', MagicMock(return_value=True))
+    def test_admin_alerts_refresh_on_writes_at_other_sites(self, sqlite_engine):
+        """The admin's cached alerts follow every site's writes, not just the session's site"""
+        import istrominventory
+        
+        _add_item(sqlite_engine, planned_qty=5)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("UPDATE items SET project_site = 'Site B' WHERE id = 1"))
+        istrominventory.clear_request_caches()
+        seen = []
+        real = istrominventory._get_over_planned_requests
+        
+        def record(**kwargs):
+            seen.append(real(**kwargs))
+            return seen[-1]
+        
+        session = {'user_type': 'admin', 'project_site': 'Site A', 'current_project_site': 'Site A'}
+        with patch('istrominventory.st') as st, patch('istrominventory.is_admin', return_value=True), \
+                patch('istrominventory._get_over_planned_requests', side_effect=record):
+            st.session_state = session
+            istrominventory.show_over_planned_notifications()
+            with patch('istrominventory.st.session_state', {**session, 'current_project_site': 'Site B'}):
+                latest = istrominventory.add_request('materials', 1, 8, 'Site Lead', '', building_subtype='B1')
+            istrominventory.show_over_planned_notifications()
+        assert len(seen[0]) == 0
+        assert [row[0] for row in seen[1]] == [latest]
@@ -49,3 +49,368 @@ class TestRequestFunctions:
         assert hasattr(istrominventory, 'add_request')
         assert callable(getattr(istrominventory, 'add_request', None))
 
+    
+    def test_cumulative_quantity_functions_exist(self):
+        """Test that the single-query cumulative helpers exist"""
+        import istrominventory
+        
+        assert callable(getattr(istrominventory, 'get_request_cumulative_quantities', None))
+        assert callable(getattr(istrominventory, 'get_deleted_request_cumulative_quantities', None))
+
+
+class TestCumulativeQuantities:
+    """Test cumulative requested quantities computed with window functions"""
+    
+    def _seed(self, engine):
+        from sqlalchemy import text
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO items (id, name, category, qty, unit_cost, project_site)
+                VALUES (1, 'Cement', 'materials', 10, 5000, 'Test Site')
+            """))
+            rows = [
+                (1, 4, 'B1', 'Approved'),
+                (2, 5, 'B1', 'Pending'),
+                (3, 3, 'B1', 'Rejected'),
+                (4, 2, 'B1', 'Pending'),   # 11 > 10: first request over planned
+                (5, 6, 'B1', 'Pending'),
+                (6, 8, 'B2', 'Pending'),   # separate block, stays under planned
+            ]
+            for req_id, qty, subtype, status in rows:
+                conn.execute(text("""
+                    INSERT INTO requests (id, ts, section, item_id, qty, requested_by, building_subtype, status)
+                    VALUES (:id, '2025-01-01T10:00:00', 'materials', 1, :qty, 'Test User', :subtype, :status)
+                """), {"id": req_id, "qty": qty, "subtype": subtype, "status": status})
+    
+    def test_request_cumulative_quantities(self, sqlite_engine):
+        """Running totals per (item, block) and the first request that crossed planned"""
+        import istrominventory
+        
+        self._seed(sqlite_engine)
+        result = istrominventory.get_request_cumulative_quantities([1, 2, 3, 4, 5, 6])
+        
+        assert result['cumulative_qty'].to_dict() == {1: 4, 2: 9, 3: 9, 4: 11, 5: 17, 6: 8}
+        assert set(result.index[result['exceeds_planned']]) == {4}
+        assert istrominventory.get_request_cumulative_quantities([]).empty
+    
+    def test_deleted_request_cumulative_quantities(self, sqlite_engine):
+        """Deleted requests accumulate live and deleted quantities before them"""
+        import istrominventory
+        from sqlalchemy import text
+        
+        self._seed(sqlite_engine)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO deleted_requests (id, req_id, item_name, qty, requested_by, status)
+                VALUES (1, 7, 'Cement', 1, 'Test User', 'Pending'),
+                       (2, 8, 'Unknown Item', 3, 'Test User', 'Pending')
+            """))
+        
+        result = istrominventory.get_deleted_request_cumulative_quantities()
+        
+        # No ts or deleted_at: after every live Pending/Approved request, 4 + 5 + 2 + 6 + 8 = 25, plus its own qty
+        assert result.loc[1, 'cumulative_qty'] == 26
+        assert result.loc[1, 'project_site'] == 'Test Site'
+        assert result.loc[2, 'cumulative_qty'] == 3
+        assert result.loc[2, 'project_site'] == 'Unknown'
+        assert not result['exceeds_planned'].any()
+
+    def test_running_totals_follow_request_time_not_id(self, sqlite_engine):
+        """A reused (lower) id made later counts after the requests made before it"""
+        import istrominventory
+        from sqlalchemy import text
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO items (id, name, category, qty, unit_cost, project_site)
+                VALUES (1, 'Cement', 'materials', 10, 5000, 'Test Site')
+            """))
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, requested_by, building_subtype, status)
+                VALUES (2, '2025-01-01T10:00:00', 'materials', 1, 6, 'U', 'B1', 'Pending'),
+                       (3, '2025-01-02T10:00:00', 'materials', 1, 3, 'U', 'B1', 'Pending'),
+                       (1, '2025-01-03T10:00:00', 'materials', 1, 4, 'U', 'B1', 'Pending')
+            """))
+            conn.execute(text("""
+                INSERT INTO deleted_requests (id, req_id, ts, item_name, qty, requested_by, status)
+                VALUES (1, 4, '2025-01-01T12:00:00', 'Cement', 2, 'U', 'Pending')
+            """))
+
+        result = istrominventory.get_request_cumulative_quantities([1, 2, 3])
+        assert result['cumulative_qty'].to_dict() == {2: 6, 3: 9, 1: 13}
+        assert set(result.index[result['exceeds_planned']]) == {1}
+        # Made between requests 2 and 3, although its id is higher than both
+        assert istrominventory.get_deleted_request_cumulative_quantities().loc[1, 'cumulative_qty'] == 8
+
+
+    def test_running_totals_key_blocks_like_the_ledger(self, sqlite_engine):
+        """Blocks differing only by surrounding spaces share one running total, as in the request ledger"""
+        import istrominventory
+        from sqlalchemy import text
+        from modules.request_ledger import rebuild_request_ledger
+
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO items (id, name, category, qty, unit_cost, project_site)
+                VALUES (1, 'Cement', 'materials', 10, 5000, 'Test Site')
+            """))
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, requested_by, building_subtype, status)
+                VALUES (1, '2025-01-01T10:00:00', 'materials', 1, 6, 'U', 'B1', 'Pending'),
+                       (2, '2025-01-02T10:00:00', 'materials', 1, 5, 'U', ' B1 ', 'Pending')
+            """))
+        rebuild_request_ledger()
+
+        result = istrominventory.get_request_cumulative_quantities([1, 2])
+        assert result['cumulative_qty'].to_dict() == {1: 6, 2: 11}
+        assert set(result.index[result['exceeds_planned']]) == {2}
+        with sqlite_engine.connect() as conn:
+            assert conn.execute(text("SELECT requested_qty FROM request_ledger WHERE item_id = 1")).scalar() == 11
+
+
+class TestBulkStatusChange:
+    """Test set_requests_status_bulk against a real SQLite database"""
+    
+    def _seed(self, engine):
+        from sqlalchemy import text
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO items (id, name, category, qty, unit_cost, building_type, project_site)
+                VALUES (1, 'Cement', 'materials', 100, 5000, 'Flats', 'Site A'),
+                       (2, 'Sand', 'materials', 100, 500, 'Flats', 'Site B')
+            """))
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, requested_by, building_subtype, status, current_price)
+                VALUES (1, '2025-01-01', 'materials', 1, 2, 'User A', 'B1', 'Pending', 6000),
+                       (2, '2025-01-01', 'materials', 1, 3, 'User A', 'B1', 'Pending', NULL),
+                       (3, '2025-01-01', 'materials', 2, 4, 'User B', NULL, 'Pending', NULL),
+                       (4, '2025-01-01', 'materials', 2, 1, 'User B', NULL, 'Rejected', NULL)
+            """))
+        from modules.request_ledger import rebuild_request_ledger
+        rebuild_request_ledger()
+    
+    @patch('istrominventory.st.session_state', {'user_type': 'admin', 'current_project_site': None})
+    def test_bulk_approve_then_reject(self, sqlite_engine):
+        """Side effects match the single-request path and the ledger stays consistent"""
+        import istrominventory
+        from sqlalchemy import text
+        from modules.request_ledger import verify_request_ledger
+        from modules.notification_summary import get_notification_summary
+        
+        self._seed(sqlite_engine)
+        updated, err = istrominventory.set_requests_status_bulk([1, 2, 3, 4, 4], 'Approved', 'Admin')
+        assert err is None
+        assert updated == [1, 2, 3, 4]
+        assert verify_request_ledger() == []
+        
+        with sqlite_engine.connect() as conn:
+            actuals = conn.execute(text(
+                "SELECT item_id, actual_qty, actual_cost, notes, project_site FROM actuals ORDER BY id"
+            )).fetchall()
+            notifications = conn.execute(text(
+                "SELECT request_id, notification_type FROM notifications ORDER BY request_id"
+            )).fetchall()
+            statuses = conn.execute(text("SELECT status, approved_by FROM requests ORDER BY id")).fetchall()
+            audit = [row[0] for row in conn.execute(text(
+                "SELECT details FROM access_logs WHERE access_code = 'REQUEST_SYSTEM' ORDER BY id"
+            ))]
+        assert [entry.split(':')[0] for entry in audit] == ['Request #1', 'Request #2', 'Request #3', 'Request #4']
+        assert audit[0].startswith('Request #1: Approved by Admin - ')
+        assert [tuple(a) for a in actuals][:2] == [
+            (1, 2.0, 12000.0, 'Auto-generated from approved request #1', 'Site A'),
+            (1, 3.0, 15000.0, 'Auto-generated from approved request #2', 'Site A'),
+        ]
+        assert len(actuals) == 4
+        assert [tuple(n) for n in notifications] == [(i, 'request_approved') for i in (1, 2, 3, 4)]
+        assert {tuple(s) for s in statuses} == {('Approved', 'Admin')}
+        assert get_notification_summary('Site A')['unread_count'] == 2
+        
+        updated, err = istrominventory.set_requests_status_bulk([1, 3], 'Rejected', 'Admin', note='Over budget')
+        assert err is None and updated == [1, 3]
+        assert verify_request_ledger() == []
+        with sqlite_engine.connect() as conn:
+            remaining = [row[0] for row in conn.execute(text("SELECT notes FROM actuals ORDER BY id"))]
+            notes = conn.execute(text("SELECT note FROM requests WHERE id IN (1, 3)")).fetchall()
+        assert remaining == ['Auto-generated from approved request #2', 'Auto-generated from approved request #4']
+        assert {row[0] for row in notes} == {'Over budget'}
+    
+    def test_bulk_validation_and_no_op(self, sqlite_engine):
+        """Invalid input is rejected and requests already in the target status are skipped"""
+        import istrominventory
+        
+        self._seed(sqlite_engine)
+        assert istrominventory.set_requests_status_bulk([1], 'Done', 'Admin')[1]
+        assert istrominventory.set_requests_status_bulk([1], 'Approved', ' ')[1]
+        assert istrominventory.set_requests_status_bulk([], 'Approved', 'Admin')[1]
+        with patch('istrominventory.st.session_state', {'user_type': 'admin'}):
+            assert istrominventory.set_requests_status_bulk([4], 'Rejected', 'Admin') == ([], None)
+
+
+class TestBatchRequests:
+    """Test add_requests_batch against a real SQLite database"""
+    
+    def _seed(self, engine):
+        from sqlalchemy import text
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO items (id, name, category, qty, unit_cost, building_type, project_site)
+                VALUES (1, 'Cement', 'materials', 10, 5000, 'Flats', 'Site A'),
+                       (2, 'Sand', 'materials', 100, 500, 'Flats', 'Site A')
+            """))
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, requested_by, building_subtype, status)
+                VALUES (1, '2025-01-01', 'materials', 1, 6, 'User A', 'B1', 'Pending'),
+                       (3, '2025-01-01', 'materials', 2, 1, 'User A', 'B1', 'Approved')
+            """))
+        from modules.request_ledger import rebuild_request_ledger
+        rebuild_request_ledger()
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM request_id_pool"))
+            conn.execute(text("INSERT INTO request_id_pool (id) VALUES (2)"))
+    
+    @patch('istrominventory.st.session_state', {'user_type': 'project_site', 'current_project_site': 'Site A'})
+    def test_batch_inserts_all_lines_and_flags_over_planned(self, sqlite_engine):
+        """One batch: pooled id first, sequence ids after, cumulative checks across lines"""
+        import istrominventory
+        from sqlalchemy import text
+        from modules.request_ledger import verify_request_ledger
+        
+        self._seed(sqlite_engine)
+        lines = [
+            {'section': 'materials', 'item_id': 1, 'qty': 3, 'current_price': 5500, 'building_subtype': 'B1'},
+            {'section': 'materials', 'item_id': 2, 'qty': 4, 'building_subtype': 'B1'},
+            {'section': 'materials', 'item_id': 1, 'qty': 2, 'building_subtype': ' B1 '},
+        ]
+        result = istrominventory.add_requests_batch(lines, 'Site User', 'Block B1 order')
+        
+        assert result['request_ids'] == [2, 4, 5]
+        # 6 already requested + 3 = 9 (within 10), + 2 = 11 crosses the plan on the third line
+        assert [(w['request_id'], w['cumulative'], w['excess']) for w in result['over_planned']] == [(5, 11.0, 1.0)]
+        assert verify_request_ledger() == []
+        with sqlite_engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT id, item_id, qty, building_subtype, current_price, status FROM requests WHERE id IN (2, 4, 5) ORDER BY id"
+            )).fetchall()
+            notifications = conn.execute(text(
+                "SELECT notification_type, request_id FROM notifications ORDER BY id"
+            )).fetchall()
+        assert [tuple(r) for r in rows] == [
+            (2, 1, 3.0, 'B1', 5500.0, 'Pending'),
+            (4, 2, 4.0, 'B1', None, 'Pending'),
+            (5, 1, 2.0, 'B1', None, 'Pending'),
+        ]
+        assert [tuple(n) for n in notifications] == [('new_request', 2), ('request_submitted', 2), ('over_planned', 5)]
+    
+    @patch('istrominventory.st.session_state', {'user_type': 'project_site', 'current_project_site': 'Site A'})
+    def test_invalid_line_writes_nothing(self, sqlite_engine):
+        """A bad line rejects the whole cart"""
+        import istrominventory
+        from sqlalchemy import text
+        
+        self._seed(sqlite_engine)
+        lines = [
+            {'section': 'materials', 'item_id': 1, 'qty': 1, 'building_subtype': 'B1'},
+            {'section': 'materials', 'item_id': 99, 'qty': 1, 'building_subtype': 'B1'},
+        ]
+        with patch('istrominventory.st.error') as error:
+            assert istrominventory.add_requests_batch(lines, 'Site User', 'note') is None
+        error.assert_called_once()
+        with sqlite_engine.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM requests")).scalar() == 2
+
+
+class TestRequestPages:
+    """Test keyset-paginated, server-filtered request pages"""
+    
+    def _seed(self, engine):
+        from sqlalchemy import text
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO items (id, name, category, qty, unit_cost, budget, building_type, project_site)
+                VALUES (1, 'Cement', 'materials', 100, 5000, 'Budget 1 - Flats', 'Flats', 'Site A'),
+                       (2, 'Sand', 'materials', 100, 500, 'Budget 2 - Terraces', 'Terraces', 'Site B')
+            """))
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, requested_by, status)
+                VALUES (1, '2025-01-01T09:00:00+01:00', 'materials', 1, 1, 'Ada Obi', 'Approved'),
+                       (2, '2025-01-02 10:00:00', 'materials', 2, 1, 'Ben', 'Approved'),
+                       (3, '2025-01-02T23:59:00+01:00', 'materials', 1, 1, 'ada obi', 'Approved'),
+                       (4, '2025-01-03 08:00:00', 'materials', 1, 1, 'Ben', 'Approved'),
+                       (5, '2025-01-04 08:00:00', 'materials', 2, 1, 'Ada Obi', 'Rejected'),
+                       (6, '2025-01-05 08:00:00', 'materials', 1, 1, 'Ben', 'Pending')
+            """))
+            conn.execute(text("""
+                INSERT INTO deleted_requests (id, req_id, item_name, qty, requested_by, status, deleted_at)
+                VALUES (1, 7, 'Cement', 1, 'Ada', 'Pending', '2025-01-01 10:00:00'),
+                       (2, 8, 'Sand', 1, 'Ben', 'Pending', '2025-01-02 10:00:00'),
+                       (3, 9, 'Cement', 1, 'Ben', 'Approved', '2025-01-03 10:00:00')
+            """))
+    
+    def test_keyset_pages_cover_every_row_once(self, sqlite_engine):
+        """Following the (ts, id) cursor walks the matching rows newest first with a stable total"""
+        import istrominventory
+        self._seed(sqlite_engine)
+        istrominventory.clear_request_caches()
+        
+        first, total = istrominventory.df_requests_page(limit=2, status='Approved')
+        assert total == 4
+        assert first['id'].tolist() == [4, 3]
+        second, _ = istrominventory.df_requests_page(limit=2, status='Approved',
+                                                     **istrominventory.request_page_cursor(first))
+        assert second['id'].tolist() == [2, 1]
+        last, _ = istrominventory.df_requests_page(limit=2, status='Approved',
+                                                   **istrominventory.request_page_cursor(second))
+        assert last.empty
+    
+    def test_pages_follow_request_time_not_id(self, sqlite_engine):
+        """A reused low id on a new request is paged as the newest, and nothing is skipped after it"""
+        import istrominventory
+        from sqlalchemy import text
+        self._seed(sqlite_engine)
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("DELETE FROM requests WHERE id = 2"))
+            conn.execute(text("""
+                INSERT INTO requests (id, ts, section, item_id, qty, requested_by, status)
+                VALUES (2, '2025-01-09 08:00:00', 'materials', 1, 1, 'Ben', 'Approved')
+            """))
+        istrominventory.clear_request_caches()
+        
+        first, _ = istrominventory.df_requests_page(limit=2, status='Approved')
+        assert first['id'].tolist() == [2, 4]
+        second, _ = istrominventory.df_requests_page(limit=2, status='Approved',
+                                                     **istrominventory.request_page_cursor(first))
+        assert second['id'].tolist() == [3, 1]
+    
+    def test_filters_are_applied_in_sql(self, sqlite_engine):
+        """Site, dates (inclusive), requester, building type and budget narrow both page and count"""
+        import istrominventory
+        self._seed(sqlite_engine)
+        istrominventory.clear_request_caches()
+        
+        def ids(**filters):
+            page, total = istrominventory.df_requests_page(**filters)
+            assert total == len(page)
+            return page['id'].tolist()
+        
+        assert ids(project_site='Site A') == [6, 4, 3, 1]
+        assert ids(date_from='2025-01-02', date_to='2025-01-02') == [3, 2]
+        assert ids(requested_by=' ADA ') == [5, 3, 1]
+        assert ids(building_type='Terraces', status='Rejected') == [5]
+        assert ids(budget='budget 1', date_to='2025-01-03') == [4, 3, 1]
+        assert istrominventory.request_status_counts(project_site='Site A') == {
+            'Pending': 1, 'Approved': 3, 'Rejected': 0, 'Total': 4}
+    
+    def test_deleted_requests_page(self, sqlite_engine):
+        """Deleted log pages filter by site (through the item name), requester and deleted_at"""
+        import istrominventory
+        self._seed(sqlite_engine)
+        istrominventory.clear_request_caches()
+        
+        page, total = istrominventory.df_deleted_requests_page(limit=2)
+        assert (page['id'].tolist(), total) == ([3, 2], 3)
+        page, total = istrominventory.df_deleted_requests_page(project_site='Site A', requested_by='ben')
+        assert (page['id'].tolist(), total) == ([3], 1)
+        page, total = istrominventory.df_deleted_requests_page(date_to='2025-01-02', before_id=2)
+        assert (page['id'].tolist(), total) == ([1], 2)
+        cumulative = istrominventory.get_deleted_request_cumulative_quantities([1, 3])
+        assert sorted(cumulative.index) == [1, 3]
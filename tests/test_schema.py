@@ -0,0 +1,138 @@
+"""
+Unit tests for the declarative schema and its numbered migrations
+"""
+import pytest
+import sys
+import os
+import shutil
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.schema import (
+    TABLES, INDEXES, TRIGGERS, MIGRATIONS, apply_schema, read_catalog, schema_diff, migration_version
+)
+
+
+@pytest.fixture
+def empty_engine(tmp_path):
+    """Engine on an empty SQLite file"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}", future=True)
+    yield engine
+    engine.dispose()
+
+
+class TestSchema:
+    """Test that the declared schema is applied once and completely"""
+
+    def test_migrations_are_numbered_in_order(self):
+        """Migration numbers are unique and ascending, and every target is declared"""
+        numbers = [number for number, _, _ in MIGRATIONS]
+        assert numbers == sorted(numbers)
+        assert len(set(numbers)) == len(numbers)
+        created = {target for _, op, target in MIGRATIONS if op == "create_table"}
+        indexed = {target for _, op, target in MIGRATIONS if op == "create_index"}
+        assert created == set(TABLES)
+        assert indexed == set(INDEXES)
+        assert {target for _, op, target in MIGRATIONS if op == "create_trigger"} == set(TRIGGERS)
+
+    def test_fresh_database_gets_full_schema(self, empty_engine):
+        """All migrations run on an empty database and leave no diff"""
+        applied = apply_schema(empty_engine)
+
+        with empty_engine.connect() as conn:
+            assert schema_diff(read_catalog(conn)) == []
+            recorded = {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+        assert set(applied) == recorded
+        # Columns of freshly created tables are not re-added
+        assert not any("add_column" in version for version in applied)
+
+    def test_second_apply_is_a_no_op(self, empty_engine):
+        """An up-to-date database needs no migrations"""
+        apply_schema(empty_engine)
+        assert apply_schema(empty_engine) == []
+
+    def test_legacy_database_is_upgraded(self, empty_engine):
+        """Only the missing columns, tables and indexes are added to an old database"""
+        with empty_engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE requests (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts TEXT NOT NULL,
+                    section TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    qty REAL NOT NULL,
+                    requested_by TEXT,
+                    note TEXT,
+                    status TEXT NOT NULL DEFAULT 'Pending',
+                    approved_by TEXT
+                )
+            """))
+            conn.execute(text("""
+                INSERT INTO requests (ts, section, item_id, qty, requested_by, status)
+                VALUES ('2025-01-01', 'materials', 1, 5, 'Site A', 'Pending')
+            """))
+
+        applied = apply_schema(empty_engine)
+
+        assert migration_version(("016", "add_column", ("requests", "current_price"))) in applied
+        assert migration_version(("007", "create_table", "requests")) not in applied
+        with empty_engine.connect() as conn:
+            assert schema_diff(read_catalog(conn)) == []
+            row = conn.execute(text("SELECT qty, building_subtype, updated_at FROM requests")).fetchone()
+        assert row == (5.0, None, None)
+
+    def test_duplicate_item_codes_do_not_block_the_unique_indexes(self, empty_engine):
+        """Items an old schema let repeat a site and code are merged or recoded, not a failed upgrade"""
+        with empty_engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, code TEXT, name TEXT NOT NULL,
+                    category TEXT NOT NULL, unit TEXT, qty REAL NOT NULL DEFAULT 0, unit_cost REAL,
+                    budget TEXT, section TEXT, grp TEXT, building_type TEXT, project_site TEXT
+                )
+            """))
+            conn.execute(text("""
+                INSERT INTO items (code, name, category, project_site)
+                VALUES ('B1', 'Block', 'materials', 'Site A'), ('B1', 'Brick', 'materials', 'Site A')
+            """))
+
+        apply_schema(empty_engine)
+
+        with empty_engine.connect() as conn:
+            assert schema_diff(read_catalog(conn)) == []
+            assert [row[0] for row in conn.execute(text("SELECT code FROM items ORDER BY id"))] == ["B1", "B1#2"]
+
+    def test_failed_migration_keeps_the_others(self, empty_engine):
+        """Each migration commits on its own; the failed one is reported and applied on the next run"""
+        from unittest.mock import patch
+        from modules import schema
+
+        broken = ("056", "create_table", "data_versions")
+        real_sql = schema.migration_sql
+
+        def migration_sql(migration, dialect):
+            return "CREATE TABLE broken (" if migration == broken else real_sql(migration, dialect)
+        with patch.object(schema, "migration_sql", migration_sql):
+            with pytest.raises(schema.MigrationError) as error:
+                apply_schema(empty_engine)
+        assert list(error.value.failed) == [migration_version(broken)]
+        with empty_engine.connect() as conn:
+            assert schema_diff(read_catalog(conn)) == ["data_versions"]
+
+        assert apply_schema(empty_engine) == [migration_version(broken)]
+
+    def test_shipped_sqlite_database_is_upgraded(self, tmp_path):
+        """The bundled istrominventory.db (an older layout) upgrades without leftovers"""
+        source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "istrominventory.db")
+        if not os.path.exists(source):
+            pytest.skip("No bundled SQLite database")
+        target = tmp_path / "shipped.db"
+        shutil.copy(source, target)
+        engine = create_engine(f"sqlite:///{target}", future=True)
+        try:
+            apply_schema(engine)
+            with engine.connect() as conn:
+                assert schema_diff(read_catalog(conn)) == []
+        finally:
+            engine.dispose()